@@ -0,0 +1,104 @@
+"""partition market by day
+
+Revision ID: 8b4e1d6c2a90
+Revises: 3f9c2a7d5b61
+Create Date: 2026-10-17 15:30:12.803114
+
+"""
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '8b4e1d6c2a90'
+down_revision: str | None = '3f9c2a7d5b61'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+SCHEMA = 'smart_trade_ai'
+# Секции на несколько дней вперед; дальше их создает MarketStorageService
+DAYS_AHEAD = 3
+
+
+def upgrade() -> None:
+    # Секционированную таблицу нельзя получить ALTER TABLE: создаем новую и переносим данные
+    op.rename_table('market', 'market_unpartitioned', schema=SCHEMA)
+    op.execute(f'ALTER SEQUENCE {SCHEMA}.market_id_seq RENAME TO market_unpartitioned_id_seq')
+    op.execute(f'ALTER INDEX {SCHEMA}.market_pkey RENAME TO market_unpartitioned_pkey')
+
+    op.create_table('market',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('currency', sa.String(length=20), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('data', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'created'),
+    schema=SCHEMA,
+    postgresql_partition_by='RANGE (created)'
+    )
+    op.create_index('ix_market_currency_kind_created', 'market', ['currency', 'kind', 'created'], schema=SCHEMA)
+    op.create_index('ix_market_created_brin', 'market', ['created'], schema=SCHEMA, postgresql_using='brin')
+
+    # Секция по умолчанию страхует запись, если плановое создание секций не успело отработать.
+    # Дневные секции покрывают все существующие строки, чтобы перенос не оставил их в секции по умолчанию
+    op.execute(f'CREATE TABLE {SCHEMA}.market_default PARTITION OF {SCHEMA}.market DEFAULT')
+    op.execute(f"""
+        DO $$
+        DECLARE
+            day date;
+        BEGIN
+            FOR day IN
+                SELECT generate_series(
+                    coalesce((SELECT min(created)::date FROM {SCHEMA}.market_unpartitioned), current_date),
+                    greatest(
+                        (SELECT max(created)::date FROM {SCHEMA}.market_unpartitioned),
+                        current_date + {DAYS_AHEAD}
+                    ),
+                    interval '1 day'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE {SCHEMA}.%I PARTITION OF {SCHEMA}.market FOR VALUES FROM (%L) TO (%L)',
+                    'market_p' || to_char(day, 'YYYYMMDD'), day, day + 1
+                );
+            END LOOP;
+        END $$
+    """)
+
+    op.execute(f"""
+        INSERT INTO {SCHEMA}.market (id, currency, created, kind, data)
+        SELECT id, currency, created, kind, data FROM {SCHEMA}.market_unpartitioned
+    """)
+    op.execute(
+        f"SELECT setval('{SCHEMA}.market_id_seq', "
+        f"coalesce((SELECT max(id) FROM {SCHEMA}.market), 0) + 1, false)"
+    )
+    op.drop_table('market_unpartitioned', schema=SCHEMA)
+
+
+def downgrade() -> None:
+    op.rename_table('market', 'market_partitioned', schema=SCHEMA)
+    op.execute(f'ALTER SEQUENCE {SCHEMA}.market_id_seq RENAME TO market_partitioned_id_seq')
+    op.execute(f'ALTER INDEX {SCHEMA}.market_pkey RENAME TO market_partitioned_pkey')
+
+    op.create_table('market',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('currency', sa.String(length=20), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('data', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    schema=SCHEMA
+    )
+    op.execute(f"""
+        INSERT INTO {SCHEMA}.market (id, currency, created, kind, data)
+        SELECT id, currency, created, kind, data FROM {SCHEMA}.market_partitioned
+    """)
+    op.execute(
+        f"SELECT setval('{SCHEMA}.market_id_seq', "
+        f"coalesce((SELECT max(id) FROM {SCHEMA}.market), 0) + 1, false)"
+    )
+    # Секции удаляются вместе с родительской таблицей
+    op.drop_table('market_partitioned', schema=SCHEMA)
@@ -14,11 +14,7 @@ from config.settings import Settings
 class ApplicationContainer(DeclarativeContainer):
     """Application container."""
 
-    wiring_config = WiringConfiguration(
-        modules=[
-
-        ]
-    )
+    wiring_config = WiringConfiguration(modules=[])
     config: Configuration = Configuration(default=Settings().model_dump(mode="json"))
 
     repositories: RepositoriesContainer = Container(  # type: ignore[assignment]
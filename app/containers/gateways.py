@@ -1,11 +1,12 @@
 """Gateways container."""
-import aiogram
+
 from dependency_injector.containers import DeclarativeContainer
 from dependency_injector.providers import Configuration, Provider, Singleton, Resource
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from app.resources.bybit import BybitWebSocket, BybitRest
+from app.resources.bybit import BybitWebSocketPool, BybitRest
 from app.resources.database import Database
+from app.resources.openai_client import OpenAIClient
 from app.resources.redis_client import RedisClient
 
 
@@ -27,16 +28,36 @@ class GatewaysContainer(DeclarativeContainer):
         pool_pre_ping=True,
         application_name="smart_trade_ai",
     )
-    bybit_websocket: Provider[BybitWebSocket] = Singleton(
-        BybitWebSocket
+    bybit_websocket: Provider[BybitWebSocketPool] = Singleton(
+        BybitWebSocketPool,
+        connections=config.bybit.ws_connections,
+        topics_per_connection=config.bybit.ws_topics_per_connection,
+        subscribe_batch=config.bybit.ws_subscribe_batch,
+        url=config.bybit.ws_url,
+        ping_interval=config.bybit.ws_ping_interval,
+        codec=config.ingest.codec,
     )
     bybit_rest: Provider[BybitRest] = Singleton(
-        BybitRest,
-        api_key=config.bybit.api_key,
-        api_secret=config.bybit.api_secret
+        BybitRest, api_key=config.bybit.api_key, api_secret=config.bybit.api_secret
     )
     redis: Provider[RedisClient] = Singleton(
         RedisClient,
-        password=config.redis.password
+        password=config.redis.password,
+        codec=config.ingest.codec,
+        queue_format=config.redis.queue_format,
+        stream_max_deliveries=config.redis.stream_max_deliveries,
+    )
+    openai: Provider[OpenAIClient] = Singleton(
+        OpenAIClient,
+        api_key=config.chatgpt.api_key,
+        base_url=config.chatgpt.base_url,
+        requests_per_minute=config.chatgpt.requests_per_minute,
+        tokens_per_minute=config.chatgpt.tokens_per_minute,
+        max_concurrency=config.chatgpt.max_concurrency,
+        max_retries=config.chatgpt.max_retries,
+        request_timeout=config.chatgpt.request_timeout,
+        deadline=config.chatgpt.deadline,
+        failure_threshold=config.chatgpt.failure_threshold,
+        reset_timeout=config.chatgpt.reset_timeout,
     )
     scheduler = Resource(AsyncIOScheduler)
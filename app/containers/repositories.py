@@ -6,9 +6,23 @@ from dependency_injector.providers import Configuration, Provider, Factory
 from app.models.balance import Balance
 from app.models.trade import Trade, TradeRecommendation
 from app.repositories.db import DBRepository
-from app.models.market import Market
+from app.models.market import (
+    Kline,
+    Liquidation,
+    Market,
+    MarketRollup,
+    OrderbookSnapshot,
+    PublicTrade,
+)
 from app.schemas.balance import BalanceSchema
-from app.schemas.market import MarketSchema
+from app.schemas.market import (
+    KlineSchema,
+    LiquidationSchema,
+    MarketRollupSchema,
+    MarketSchema,
+    OrderbookSnapshotSchema,
+    PublicTradeSchema,
+)
 from app.schemas.trade import TradeSchema, TradeRecommendationSchema
 
 
@@ -20,13 +34,41 @@ class RepositoriesContainer(DeclarativeContainer):
     market: Provider[DBRepository[Market, MarketSchema]] = Factory(
         DBRepository[Market, MarketSchema], model=Market, schema=MarketSchema
     )
+    kline: Provider[DBRepository[Kline, KlineSchema]] = Factory(
+        DBRepository[Kline, KlineSchema], model=Kline, schema=KlineSchema
+    )
+    public_trade: Provider[DBRepository[PublicTrade, PublicTradeSchema]] = Factory(
+        DBRepository[PublicTrade, PublicTradeSchema],
+        model=PublicTrade,
+        schema=PublicTradeSchema,
+    )
+    orderbook_snapshot: Provider[
+        DBRepository[OrderbookSnapshot, OrderbookSnapshotSchema]
+    ] = Factory(
+        DBRepository[OrderbookSnapshot, OrderbookSnapshotSchema],
+        model=OrderbookSnapshot,
+        schema=OrderbookSnapshotSchema,
+    )
+    liquidation: Provider[DBRepository[Liquidation, LiquidationSchema]] = Factory(
+        DBRepository[Liquidation, LiquidationSchema],
+        model=Liquidation,
+        schema=LiquidationSchema,
+    )
+    market_rollup: Provider[DBRepository[MarketRollup, MarketRollupSchema]] = Factory(
+        DBRepository[MarketRollup, MarketRollupSchema],
+        model=MarketRollup,
+        schema=MarketRollupSchema,
+    )
     balance: Provider[DBRepository[Balance, BalanceSchema]] = Factory(
         DBRepository[Balance, BalanceSchema], model=Balance, schema=BalanceSchema
     )
     trade: Provider[DBRepository[Trade, TradeSchema]] = Factory(
         DBRepository[Trade, TradeSchema], model=Trade, schema=TradeSchema
     )
-    trade_recommendation: Provider[DBRepository[TradeRecommendation, TradeRecommendationSchema]] = Factory(
-        DBRepository[TradeRecommendation, TradeRecommendationSchema], model=TradeRecommendation,
-        schema=TradeRecommendationSchema
+    trade_recommendation: Provider[
+        DBRepository[TradeRecommendation, TradeRecommendationSchema]
+    ] = Factory(
+        DBRepository[TradeRecommendation, TradeRecommendationSchema],
+        model=TradeRecommendation,
+        schema=TradeRecommendationSchema,
     )
@@ -3,14 +3,21 @@
 from dependency_injector.containers import DeclarativeContainer
 from dependency_injector.providers import (
     Configuration,
-    DependenciesContainer, Provider, Singleton,
+    DependenciesContainer,
+    Dict,
+    Provider,
+    Singleton,
 )
 
 from app.containers.gateways import GatewaysContainer
 from app.containers.repositories import RepositoriesContainer
+from app.services.analysis_backend import RuleBasedBackend
 from app.services.bybit_stream import WebSocketService
 from app.services.chat_gpt import ChatGPTService
 from app.services.market import MarketService
+from app.services.market_storage import MarketStorageService
+from app.services.market_writer import MarketBulkWriter
+from app.services.response_cache import ResponseCache
 from app.services.scheduler import SchedulerService
 from app.services.trade import TradeService
 
@@ -25,12 +32,50 @@ class ServicesContainer(DeclarativeContainer):
     market: Provider[MarketService] = Singleton(
         MarketService,
         db=gateways.db,
-        repository=repositories.market
+        repository=repositories.market,
+        redis_client=gateways.redis,
+        repository_kline=repositories.kline,
+        repository_public_trade=repositories.public_trade,
+        repository_orderbook_snapshot=repositories.orderbook_snapshot,
+        repository_liquidation=repositories.liquidation,
+        repository_rollup=repositories.market_rollup,
+        downsample_after_hours=config.storage.downsample_after_hours,
+    )
+    market_writer: Provider[MarketBulkWriter] = Singleton(
+        MarketBulkWriter,
+        market_service=market,
+        batch_size=config.ingest.batch_size,
+        flush_interval=config.ingest.flush_interval,
+        max_pending=config.ingest.max_pending,
+        max_retries=config.ingest.max_retries,
+    )
+    market_storage: Provider[MarketStorageService] = Singleton(
+        MarketStorageService,
+        db=gateways.db,
+        partition_days_ahead=config.storage.partition_days_ahead,
+        raw_retention_days=config.storage.raw_retention_days,
+        downsample_after_hours=config.storage.downsample_after_hours,
+        archive_dir=config.storage.archive_dir,
+        archive_compression=config.storage.archive_compression,
+    )
+    response_cache: Provider[ResponseCache] = Singleton(
+        ResponseCache,
+        backend=gateways.redis,
+        ttl=config.chatgpt.cache_ttl,
+        max_size=config.chatgpt.cache_max_size,
     )
     chatgpt_service: Provider[ChatGPTService] = Singleton(
         ChatGPTService,
-        api_key=config.chatgpt.api_key
+        api_key=config.chatgpt.api_key,
+        model=config.chatgpt.model,
+        response_format=config.chatgpt.response_format,
+        stream=config.chatgpt.stream,
+        prompt_token_budget=config.chatgpt.prompt_token_budget,
+        prompt_precision=config.chatgpt.prompt_precision,
+        cache=response_cache,
+        client=gateways.openai,
     )
+    local_analysis: Provider[RuleBasedBackend] = Singleton(RuleBasedBackend)
 
     trade: Provider[TradeService] = Singleton(
         TradeService,
@@ -38,7 +83,9 @@ class ServicesContainer(DeclarativeContainer):
         repository_trade=repositories.trade,
         repository_trade_recommendation=repositories.trade_recommendation,
         market_service=market,
-        chatgpt_service=chatgpt_service
+        chatgpt_service=chatgpt_service,
+        backends=Dict(local=local_analysis),
+        redis_client=gateways.redis,
     )
 
     bybit_stream: Provider[WebSocketService] = Singleton(
@@ -46,10 +93,39 @@ class ServicesContainer(DeclarativeContainer):
         market_service=market,
         bybit_ws=gateways.bybit_websocket,
         redis_client=gateways.redis,
+        market_writer=market_writer,
+        consumer_batch_size=config.ingest.consumer_batch_size,
+        consumer_block_timeout=config.ingest.consumer_block_timeout,
+        stats_interval=config.ingest.stats_interval,
+        transport=config.redis.transport,
+        stream_maxlen=config.redis.stream_maxlen,
+        consumer_group=config.redis.consumer_group,
+        consumer_name=config.redis.consumer_name,
+        claim_idle_ms=config.redis.claim_idle_ms,
+        flush_size=config.ingest.flush_size,
+        flush_max_age_ms=config.ingest.flush_max_age_ms,
+        buffer_capacity=config.ingest.buffer_capacity,
+        overflow_policy=config.ingest.overflow_policy,
+        orderbook_publish_interval=config.ingest.orderbook_publish_interval,
+        aggregate_windows=config.ingest.aggregate_windows,
+        aggregate_publish_interval=config.ingest.aggregate_publish_interval,
+        aggregate_persist_interval=config.ingest.aggregate_persist_interval,
+        write_jsonb=config.ingest.write_jsonb,
+        codec=config.ingest.codec,
     )
 
     scheduler: Provider[SchedulerService] = Singleton(
         SchedulerService,
         scheduler=gateways.scheduler,
-        trade_service=trade
+        trade_service=trade,
+        market_storage=market_storage,
+        maintenance_interval_minutes=config.storage.maintenance_interval_minutes,
+        analysis_concurrency=config.scheduler.analysis_concurrency,
+        symbol_timeout=config.scheduler.symbol_timeout,
+        response_cache=response_cache,
+        long_term_batch=config.scheduler.long_term_batch,
+        batch_poll_interval=config.scheduler.batch_poll_interval,
+        batch_timeout=config.scheduler.batch_timeout,
+        short_term_backend=config.scheduler.short_term_backend,
+        long_term_backend=config.scheduler.long_term_backend,
     )
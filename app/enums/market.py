@@ -1,13 +1,29 @@
 import enum
 
-TOP_20_SYMBOLS = (
-    "NEARUSDT",
-)
+TOP_20_SYMBOLS = ("NEARUSDT",)
 
 
 class MarketKindEnums(enum.StrEnum):
     """."""
+
     ORDERBOOK = "orderbook"
     KLINE = "kline"
     TRADE_HISTORY = "trade_history"
     LIQUIDATION = "liquidation"
+
+    @classmethod
+    def from_topic(cls, topic: str) -> "MarketKindEnums | None":
+        """
+        Тип данных по префиксу топика Bybit (orderbook.50.BTCUSDT, publicTrade.BTCUSDT и
+        т.д.).
+        """
+        return TOPIC_PREFIXES.get(topic.split(".", 1)[0])
+
+
+TOPIC_PREFIXES = {
+    "orderbook": MarketKindEnums.ORDERBOOK,
+    "kline": MarketKindEnums.KLINE,
+    "publicTrade": MarketKindEnums.TRADE_HISTORY,
+    "liquidation": MarketKindEnums.LIQUIDATION,
+    "allLiquidation": MarketKindEnums.LIQUIDATION,
+}
@@ -12,7 +12,7 @@ logger = logging.getLogger(__name__)
 
 
 async def start_analyze(
-        container: ApplicationContainer | None = None, log_level: str = "INFO"
+    container: ApplicationContainer | None = None, log_level: str = "INFO"
 ) -> None:
     """Create app."""
     if container is None:
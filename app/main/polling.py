@@ -12,7 +12,10 @@ logger = logging.getLogger(__name__)
 
 
 async def start_polling(
-        container: ApplicationContainer | None = None, log_level: str = "INFO"
+    container: ApplicationContainer | None = None,
+    log_level: str = "INFO",
+    shard_index: int = 0,
+    shard_count: int = 1,
 ) -> None:
     """Create app."""
     if container is None:
@@ -26,7 +29,9 @@ async def start_polling(
         logging.getLogger("httpx").handlers = []
         logging.getLogger("httpx").propagate = False
 
-    ws_service = container.services.bybit_stream()
+    ws_service = container.services.bybit_stream(
+        shard_index=shard_index, shard_count=shard_count
+    )
 
     try:
         await ws_service.start()
@@ -39,6 +44,8 @@ class ArgsNamespace(argparse.Namespace):
     """Args namespace."""
 
     log_level: str = "info"
+    shard_index: int = 0
+    shard_count: int = 1
 
 
 def server_parser_args() -> typing.Type[ArgsNamespace]:  # noqa: WPS213
@@ -52,6 +59,20 @@ def server_parser_args() -> typing.Type[ArgsNamespace]:  # noqa: WPS213
         choices=["critical", "error", "warning", "info", "debug", "trace"],
         help="Log level.",
     )
+    parser.add_argument(
+        "--shard-index",
+        dest="shard_index",
+        type=int,
+        default=0,
+        help="Index of this process among --shard-count ingest processes.",
+    )
+    parser.add_argument(
+        "--shard-count",
+        dest="shard_count",
+        type=int,
+        default=1,
+        help="Number of ingest processes the symbols are split across.",
+    )
     return parser.parse_args(namespace=ArgsNamespace)
 
 
@@ -61,7 +82,15 @@ def main() -> None:
     log_level: str = args.log_level.upper()
     logging.basicConfig(level=getattr(logging, log_level))
     logger.info("Starting smart trade ai in pooling mode, v%s", version)
-    asyncio.run(start_polling(log_level=log_level))
+    if not 0 <= args.shard_index < args.shard_count:
+        raise SystemExit("--shard-index must be in [0, --shard-count)")
+    asyncio.run(
+        start_polling(
+            log_level=log_level,
+            shard_index=args.shard_index,
+            shard_count=args.shard_count,
+        )
+    )
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -2,7 +2,25 @@
 
 from .base import Base
 from .balance import Balance
-from .market import Market
+from .market import (
+    Kline,
+    Liquidation,
+    Market,
+    MarketRollup,
+    OrderbookSnapshot,
+    PublicTrade,
+)
 from .trade import Trade, TradeRecommendation
 
-__all__ = ("Base", "Balance", "Market", "Trade", "TradeRecommendation")
+__all__ = (
+    "Base",
+    "Balance",
+    "Kline",
+    "Liquidation",
+    "Market",
+    "MarketRollup",
+    "OrderbookSnapshot",
+    "PublicTrade",
+    "Trade",
+    "TradeRecommendation",
+)
@@ -17,8 +17,10 @@ class Balance(Base):
         event (datetime): Время события (например, падение баланса).
         balance (float): Текущий баланс на момент события.
         percentage_drop (float): Процентное снижение баланса.
-        action_taken (str): Описание предпринятых действий (например, остановка торговли).
+        action_taken (str): Описание предпринятых действий (например, остановка
+        торговли).
     """
+
     id: Mapped[int] = mapped_column(sa.Integer, primary_key=True, autoincrement=True)
     event: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
     balance: Mapped[float] = mapped_column(sa.Numeric)
@@ -3,7 +3,7 @@
 import datetime
 
 import sqlalchemy as sa
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.models.base import Base
@@ -18,11 +18,187 @@ class Market(Base):
         currency (str): Валютная пара, например, BTC/USDT.
         created (datetime): Время создания записи.
         kind (str): Тип данных (например, рыночные данные, данные о ценах и т.д.).
-        data (dict): Данные о рынке в формате JSON (например, данные стакана, цены, ордера).
+        data (dict): Данные о рынке в формате JSON (например, данные стакана, цены,
+        ордера).
+
+    Таблица секционирована по дням (RANGE по created), поэтому created входит в
+    первичный ключ. Секции создаются и удаляются MarketStorageService.
     """
-    id: Mapped[int] = mapped_column(sa.Integer, primary_key=True, autoincrement=True)
+
+    __table_args__ = (
+        sa.Index("ix_market_currency_kind_created", "currency", "kind", "created"),
+        sa.Index("ix_market_created_brin", "created", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (created)"},
+    )
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
     currency: Mapped[str] = mapped_column(sa.String(20))
-    created: Mapped[datetime.datetime] = mapped_column(sa.DateTime, default=datetime.datetime.now(), nullable=False)
+    created: Mapped[datetime.datetime] = mapped_column(
+        sa.DateTime, primary_key=True, default=datetime.datetime.utcnow, nullable=False
+    )
     kind: Mapped[str] = mapped_column(sa.String)
     data: Mapped[dict] = mapped_column(JSONB, nullable=False)
 
+
+class Kline(Base):
+    """
+    Модель для хранения закрытых свечей (топик kline).
+
+    Атрибуты:
+        id (int): Уникальный идентификатор записи.
+        currency (str): Валютная пара, например, BTCUSDT.
+        interval (str): Интервал свечи (например, 1, 5, 60, D).
+        start (datetime): Время открытия свечи.
+        end (datetime): Время закрытия свечи.
+        open, high, low, close (float): Цены свечи.
+        volume (float): Объем в базовой валюте.
+        turnover (float): Оборот в валюте котировки.
+        created (datetime): Время получения данных.
+    """
+
+    __table_args__ = (
+        sa.Index("ix_kline_currency_interval_start", "currency", "interval", "start"),
+    )
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    currency: Mapped[str] = mapped_column(sa.String(20))
+    interval: Mapped[str] = mapped_column(sa.String(4))
+    start: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+    end: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+    open: Mapped[float] = mapped_column(sa.Double)
+    high: Mapped[float] = mapped_column(sa.Double)
+    low: Mapped[float] = mapped_column(sa.Double)
+    close: Mapped[float] = mapped_column(sa.Double)
+    volume: Mapped[float] = mapped_column(sa.Double)
+    turnover: Mapped[float] = mapped_column(sa.Double)
+    created: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+
+
+class PublicTrade(Base):
+    """
+    Модель для хранения публичных сделок (топик publicTrade).
+
+    Атрибуты:
+        id (int): Уникальный идентификатор записи.
+        currency (str): Валютная пара.
+        ts (datetime): Время сделки.
+        trade_id (str): Идентификатор сделки Bybit.
+        side (str): Сторона агрессора (Buy или Sell).
+        price (float): Цена сделки.
+        size (float): Объем сделки.
+        tick_direction (str): Направление тика.
+        block_trade (bool): Блочная сделка.
+        created (datetime): Время получения данных.
+    """
+
+    __table_args__ = (sa.Index("ix_public_trade_currency_ts", "currency", "ts"),)
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    currency: Mapped[str] = mapped_column(sa.String(20))
+    ts: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+    trade_id: Mapped[str] = mapped_column(sa.String(64))
+    side: Mapped[str] = mapped_column(sa.String(4))
+    price: Mapped[float] = mapped_column(sa.Double)
+    size: Mapped[float] = mapped_column(sa.Double)
+    tick_direction: Mapped[str] = mapped_column(sa.String(16))
+    block_trade: Mapped[bool] = mapped_column(sa.Boolean)
+    created: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+
+
+class OrderbookSnapshot(Base):
+    """
+    Модель для хранения сообщений стакана (топик orderbook): snapshot и delta.
+
+    Атрибуты:
+        id (int): Уникальный идентификатор записи.
+        currency (str): Валютная пара.
+        ts (datetime): Время формирования данных на стороне Bybit.
+        type (str): snapshot или delta.
+        update_id (int): Идентификатор обновления (u).
+        seq (int): Кросс-последовательность (seq).
+        bid_prices, bid_sizes (list[float]): Уровни bids (нулевой объем в delta —
+        удаление уровня). ask_prices, ask_sizes (list[float]): Уровни asks. created
+        (datetime): Время получения данных.
+    """
+
+    __table_args__ = (sa.Index("ix_orderbook_snapshot_currency_ts", "currency", "ts"),)
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    currency: Mapped[str] = mapped_column(sa.String(20))
+    ts: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+    type: Mapped[str] = mapped_column(sa.String(8))
+    update_id: Mapped[int] = mapped_column(sa.BigInteger)
+    seq: Mapped[int] = mapped_column(sa.BigInteger)
+    bid_prices: Mapped[list[float]] = mapped_column(ARRAY(sa.Double))
+    bid_sizes: Mapped[list[float]] = mapped_column(ARRAY(sa.Double))
+    ask_prices: Mapped[list[float]] = mapped_column(ARRAY(sa.Double))
+    ask_sizes: Mapped[list[float]] = mapped_column(ARRAY(sa.Double))
+    created: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+
+
+class Liquidation(Base):
+    """
+    Модель для хранения ликвидаций (топик liquidation).
+
+    Атрибуты:
+        id (int): Уникальный идентификатор записи.
+        currency (str): Валютная пара.
+        ts (datetime): Время ликвидации.
+        side (str): Сторона ликвидированной позиции.
+        price (float): Цена ликвидации.
+        size (float): Объем ликвидации.
+        created (datetime): Время получения данных.
+    """
+
+    __table_args__ = (sa.Index("ix_liquidation_currency_ts", "currency", "ts"),)
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    currency: Mapped[str] = mapped_column(sa.String(20))
+    ts: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+    side: Mapped[str] = mapped_column(sa.String(4))
+    price: Mapped[float] = mapped_column(sa.Double)
+    size: Mapped[float] = mapped_column(sa.Double)
+    created: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+
+
+class MarketRollup(Base):
+    """
+    Модель для хранения агрегатов сырых данных (сделки и ликвидации) с разрешением 1m,
+    5m и 1h.
+
+    Атрибуты:
+        id (int): Уникальный идентификатор записи.
+        currency (str): Валютная пара.
+        resolution (str): Разрешение агрегата: 1m, 5m или 1h.
+        bucket (datetime): Начало интервала.
+        open, high, low, close (float | None): Цены сделок за интервал (None, если
+        сделок не было). volume (float): Объем сделок. turnover (float): Оборот сделок.
+        trades (int): Количество сделок. buy_volume, sell_volume (float): Объем сделок
+        по стороне агрессора. liquidations (int): Количество ликвидаций.
+        liquidation_volume (float): Объем ликвидаций.
+    """
+
+    __table_args__ = (
+        sa.UniqueConstraint(
+            "currency",
+            "resolution",
+            "bucket",
+            name="uq_market_rollup_currency_resolution_bucket",
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    currency: Mapped[str] = mapped_column(sa.String(20))
+    resolution: Mapped[str] = mapped_column(sa.String(4))
+    bucket: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+    open: Mapped[float | None] = mapped_column(sa.Double)
+    high: Mapped[float | None] = mapped_column(sa.Double)
+    low: Mapped[float | None] = mapped_column(sa.Double)
+    close: Mapped[float | None] = mapped_column(sa.Double)
+    volume: Mapped[float] = mapped_column(sa.Double)
+    turnover: Mapped[float] = mapped_column(sa.Double)
+    trades: Mapped[int] = mapped_column(sa.Integer)
+    buy_volume: Mapped[float] = mapped_column(sa.Double)
+    sell_volume: Mapped[float] = mapped_column(sa.Double)
+    liquidations: Mapped[int] = mapped_column(sa.Integer)
+    liquidation_volume: Mapped[float] = mapped_column(sa.Double)
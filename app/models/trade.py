@@ -16,10 +16,12 @@ class TradeRecommendation(Base):
         id (int): Уникальный идентификатор записи.
         currency (str): Валютная пара, для которой сделана рекомендация.
         recommended (datetime): Время, когда была сделана рекомендация.
-        recommended_action (str): Рекомендованное действие (например, открыть длинную или короткую позицию).
-        confidence (float): Уровень уверенности в рекомендации.
-        data (dict): Дополнительные данные, связанные с рекомендацией (например, технические индикаторы, свечные паттерны).
+        recommended_action (str): Рекомендованное действие (например, открыть длинную
+        или короткую позицию). confidence (float): Уровень уверенности в рекомендации.
+        data (dict): Дополнительные данные, связанные с рекомендацией (например,
+        технические индикаторы, свечные паттерны).
     """
+
     id: Mapped[int] = mapped_column(sa.Integer, primary_key=True, autoincrement=True)
     currency: Mapped[str] = mapped_column(sa.String(20))
     recommended: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
@@ -46,6 +48,7 @@ class Trade(Base):
         exit_price (float): Цена закрытия позиции.
         pnl (float): Прибыль или убыток от сделки.
     """
+
     id: Mapped[int] = mapped_column(sa.Integer, primary_key=True, autoincrement=True)
     currency: Mapped[str] = mapped_column(sa.String(20))
     opened: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
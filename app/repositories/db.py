@@ -32,9 +32,9 @@ class DBRepository(typing.Generic[TModel, TSchema]):
         return pydantic.TypeAdapter(list[self.schema])
 
     async def item(
-            self,
-            session: AsyncSession,
-            statement: TStatement,
+        self,
+        session: AsyncSession,
+        statement: TStatement,
     ) -> TSchema | None:
         """."""
         item = await self.scalar(session, statement)
@@ -42,11 +42,11 @@ class DBRepository(typing.Generic[TModel, TSchema]):
             return self.schema.model_validate(item)
 
     async def items(
-            self,
-            session: AsyncSession,
-            statement: sa.Select | sa.Update,
-            limit: int | None = None,
-            offset: int = 0,
+        self,
+        session: AsyncSession,
+        statement: sa.Select | sa.Update,
+        limit: int | None = None,
+        offset: int = 0,
     ) -> RepositoryOutSchema[TSchema]:
         """."""
         items, total = await self._items(session, statement, limit, offset)
@@ -58,18 +58,18 @@ class DBRepository(typing.Generic[TModel, TSchema]):
         )
 
     async def scalar(
-            self,
-            session: AsyncSession,
-            statement: TStatement,
+        self,
+        session: AsyncSession,
+        statement: TStatement,
     ) -> TModel | None:
         """."""
         session_result: Result = await session.execute(statement)
         return session_result.scalar()
 
     async def scalars(
-            self,
-            session: AsyncSession,
-            statement: TStatement,
+        self,
+        session: AsyncSession,
+        statement: TStatement,
     ) -> ScalarResult[TModel]:
         """."""
         session_result: Result = await session.execute(statement)
@@ -86,10 +86,10 @@ class DBRepository(typing.Generic[TModel, TSchema]):
         return session_result.scalar() or 0
 
     def limit_and_offset(
-            self,
-            statement: sa.Select,
-            limit: int | None = None,
-            offset: int = 0,
+        self,
+        statement: sa.Select,
+        limit: int | None = None,
+        offset: int = 0,
     ) -> sa.Select:
         """."""
         if limit and limit > 0:
@@ -97,12 +97,12 @@ class DBRepository(typing.Generic[TModel, TSchema]):
         return statement.offset(offset)
 
     async def _items(
-            self,
-            session: AsyncSession,
-            statement: TStatement,
-            limit: int | None = None,
-            offset: int = 0,
-            unique: bool = False,
+        self,
+        session: AsyncSession,
+        statement: TStatement,
+        limit: int | None = None,
+        offset: int = 0,
+        unique: bool = False,
     ) -> tuple[typing.Sequence, int]:
         total: int = await self.total(session, statement)
         if total > 0 and limit:
@@ -1,72 +1,433 @@
 import asyncio
+import dataclasses
+import itertools
 import logging
+import math
+import time
+import typing
 
-from pybit.unified_trading import WebSocket
+import aiohttp
 from pybit.unified_trading import HTTP
 
-from websocket._exceptions import WebSocketConnectionClosedException
+from app.resources.codec import RawMessage, get_codec
 
 logger = logging.getLogger(__name__)
 
 
+# Публичный поток деривативов USDT
+PUBLIC_LINEAR_URL = "wss://stream.bybit.com/v5/public/linear"
+
+
 class BybitWebSocket:
-    def __init__(self):
-        """Инициализация WebSocket с нужным адресом"""
-        # Сохраняем ссылку на основной event loop
-        self.loop = asyncio.get_event_loop()
-        # Создаем исходное соединение
-        self.ws = WebSocket(testnet=False, channel_type="linear")
-        # Патчим метод send для безопасного вызова и реконнекта
-        self._patch_send()
-
-    def _patch_send(self):
-        """Оборачивает метод send объекта ws в безопасную функцию с реконнектом."""
-        original_send = self.ws.ws.send
-
-        def safe_send(data, *args, **kwargs):
+    """
+    Публичный поток Bybit v5 на asyncio: сообщения читаются в event loop и передаются в
+    колбэк напрямую, без потока чтения, переходов между потоками и задачи на каждое
+    сообщение.
+
+    - subscribe/unsubscribe отправляются пачками по `subscribe_batch` топиков в одном
+      запросе;
+    - каждые `ping_interval` секунд отправляется {"op": "ping"}; если pong на прошлый
+      ping не пришел, соединение считается зависшим и закрывается;
+    - при разрыве соединение восстанавливается с экспоненциальной паузой и
+      переподписывается на все текущие топики.
+
+    Сообщения топиков передаются как RawMessage с исходным кадром, чтобы не
+    сериализовать их повторно.
+    """
+
+    def __init__(
+        self,
+        url: str = PUBLIC_LINEAR_URL,
+        ping_interval: float = 20.0,
+        subscribe_batch: int = 10,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 30.0,
+        connect_timeout: float = 10.0,
+        codec: str = "auto",
+    ):
+        """
+        :param url: Адрес публичного потока.
+        :param ping_interval: Интервал ping, с.
+        :param subscribe_batch: Топиков в одном запросе subscribe/unsubscribe.
+        :param reconnect_delay: Начальная пауза перед переподключением, с; удваивается
+            до `max_reconnect_delay`.
+        :param max_reconnect_delay: Максимальная пауза перед переподключением, с.
+        :param connect_timeout: Таймаут подключения, с.
+        :param codec: Кодек разбора кадров (app.resources.codec.get_codec).
+        """
+        self.url = url
+        self.ping_interval = ping_interval
+        self.subscribe_batch = subscribe_batch
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.connect_timeout = connect_timeout
+        self.codec = get_codec(codec)
+        # Текущие топики, восстанавливаются после переподключения
+        self.topics: list[str] = []
+        self.reconnects = 0
+        # Кадры, которые не удалось разобрать: пропускаются, соединение продолжает
+        # чтение
+        self.decode_errors = 0
+        self.callback: typing.Callable[[dict], None] | None = None
+        self.session: aiohttp.ClientSession | None = None
+        self.ws: aiohttp.ClientWebSocketResponse | None = None
+        self._connected = asyncio.Event()
+        self._closed = False
+        self._runner: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._req_id = itertools.count(1)
+        self._pong = True
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    async def connect(self, callback: typing.Callable[[dict], None]):
+        """
+        Запускает чтение потока и ждет первого подключения.
+
+        :param callback: Вызывается в event loop с каждым сообщением топика.
+        :raises TimeoutError: Не удалось подключиться за `connect_timeout`; попытки
+            продолжаются в фоне.
+        """
+        self.callback = callback
+        self._closed = False
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+        await asyncio.wait_for(self._connected.wait(), self.connect_timeout)
+
+    async def _run(self):
+        """Подключение, чтение и переподключение до вызова close()."""
+        delay = self.reconnect_delay
+        while not self._closed:
+            pinger = None
+            try:
+                self.ws = await self.session.ws_connect(
+                    self.url,
+                    timeout=aiohttp.ClientWSTimeout(ws_close=self.connect_timeout),
+                )
+                self._pong = True
+                if self.topics:
+                    await self._send("subscribe", self.topics)
+                self._connected.set()
+                delay = self.reconnect_delay
+                pinger = asyncio.create_task(self._ping())
+                await self._read(self.ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠ Ошибка WebSocket {self.url}: {e}")
+            finally:
+                self._connected.clear()
+                if pinger is not None:
+                    pinger.cancel()
+                if self.ws is not None and not self.ws.closed:
+                    await self.ws.close()
+            if self._closed:
+                break
+            self.reconnects += 1
+            logger.warning(
+                f"Соединение {self.url} закрыто. Переподключение через {delay:g} с..."
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _read(self, ws: aiohttp.ClientWebSocketResponse):
+        """Читает сообщения до закрытия соединения."""
+        async for frame in ws:
+            if frame.type is not aiohttp.WSMsgType.TEXT:
+                if frame.type is aiohttp.WSMsgType.ERROR:
+                    raise ws.exception() or ConnectionError("Ошибка чтения WebSocket")
+                continue
             try:
-                return original_send(data, *args, **kwargs)
-            except WebSocketConnectionClosedException:
-                logger.warning("Соединение закрыто. Инициирую реконнект.")
-                # Запускаем асинхронный реконнект через главный event loop
-                asyncio.run_coroutine_threadsafe(self.reconnect(), self.loop)
-                return None
-
-        self.ws.ws.send = safe_send
-
-    async def reconnect(self):
-        """Переподключается к WebSocket: закрывает старое соединение и создает новое."""
-        logger.info("Начало реконнекта к WebSocket...")
-        try:
-            self.ws.ws.close()
-        except Exception as e:
-            logger.error(f"Ошибка при закрытии старого соединения: {e}")
-        # Небольшая пауза перед созданием нового соединения
-        await asyncio.sleep(1)
-        self.ws = WebSocket(testnet=False, channel_type="linear")
-        self._patch_send()
-        logger.info("Реконнект выполнен успешно.")
-
-    def subscribe_orderbook(self, symbol: str, callback, depth: int = 50):
-        """Подписка на стакан"""
-        self.ws.orderbook_stream(symbol=symbol, callback=callback, depth=depth)
-
-    def subscribe_candles(self, symbol: str, interval: int, callback):
-        """Подписка на свечи"""
-        self.ws.kline_stream(symbol=symbol, interval=interval, callback=callback)
-
-    def subscribe_trades(self, symbol: str, callback):
-        """Подписка на историю сделок"""
-        self.ws.trade_stream(symbol=symbol, callback=callback)
-
-    def subscribe_liquidations(self, symbol: str, callback):
-        """Подписка на ликвидации"""
-        self.ws.liquidation_stream(symbol=symbol, callback=callback)
-
-    def subscribe_derivatives(self, symbol: str, callback):
-        """Подписка на данные по деривативам (Futures & Options API)"""
-        topic = f"derivatives.{symbol}"
-        self.ws.subscribe(topic, callback, symbol)
+                message = self.codec.loads(frame.data)
+                if not isinstance(message, dict):
+                    raise ValueError(
+                        f"ожидался объект, получен {type(message).__name__}"
+                    )
+            except ValueError as e:
+                self.decode_errors += 1
+                logger.error(
+                    f"⚠ Не удалось разобрать кадр {self.url}: {e}. Кадр: "
+                    f"{frame.data[:200]!r}"
+                )
+                continue
+            if "topic" in message:
+                try:
+                    self.callback(RawMessage(message, frame.data))
+                except Exception as e:
+                    logger.error(
+                        f"⚠ Ошибка обработки сообщения {message.get('topic')}: {e}"
+                    )
+            elif message.get("op") == "pong" or message.get("ret_msg") == "pong":
+                self._pong = True
+            elif message.get("success") is False:
+                logger.warning(
+                    f"⚠ Bybit отклонил {message.get('op')}: {message.get('ret_msg')}"
+                )
+
+    async def _ping(self):
+        """
+        Отправляет ping и закрывает соединение, если pong на прошлый ping не пришел.
+        """
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            if not self._pong:
+                logger.warning(
+                    f"⚠ Нет pong от {self.url} за {self.ping_interval:g} с. "
+                    "Переподключение."
+                )
+                await self.ws.close()
+                return
+            self._pong = False
+            await self.ws.send_json({"op": "ping", "req_id": str(next(self._req_id))})
+
+    async def _send(self, op: str, topics: list[str]):
+        for start in range(0, len(topics), self.subscribe_batch):
+            await self.ws.send_json(
+                {
+                    "op": op,
+                    "req_id": str(next(self._req_id)),
+                    "args": topics[start : start + self.subscribe_batch],
+                }
+            )
+
+    async def subscribe(self, topics: list[str]):
+        """Подписка на топики; без соединения они будут отправлены при подключении."""
+        topics = [topic for topic in topics if topic not in self.topics]
+        self.topics.extend(topics)
+        if self.connected and topics:
+            await self._send("subscribe", topics)
+
+    async def unsubscribe(self, topics: list[str]):
+        """Отписка от топиков."""
+        topics = [topic for topic in topics if topic in self.topics]
+        self.topics = [topic for topic in self.topics if topic not in topics]
+        if self.connected and topics:
+            await self._send("unsubscribe", topics)
+
+    def resubscribe(self, topic: str):
+        """
+        Переподписка на топик для получения нового snapshot. Вызывается из обработчика
+        сообщения, поэтому отправка выполняется отдельной задачей.
+        """
+
+        async def send():
+            if self.connected:
+                await self._send("unsubscribe", [topic])
+                await self._send("subscribe", [topic])
+
+        task = asyncio.get_running_loop().create_task(send())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        """Закрывает соединение и останавливает переподключение."""
+        self._closed = True
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        if self.ws is not None and not self.ws.closed:
+            await self.ws.close()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        self._connected.clear()
+
+
+# Потоки рынка: шаблон топика Bybit по символу
+STREAMS: dict[str, str] = {
+    "orderbook": "orderbook.{depth}.{symbol}",
+    "trades": "publicTrade.{symbol}",
+    "candles": "kline.{interval}.{symbol}",
+    "liquidations": "liquidation.{symbol}",
+}
+
+
+@dataclasses.dataclass
+class ShardStats:
+    """Счетчики соединения."""
+
+    index: int
+    topics: int = 0
+    messages: int = 0
+    # Задержка сообщения: время получения минус ts биржи, мс (включает расхождение
+    # часов)
+    lag_sum: float = 0.0
+    lag_count: int = 0
+    max_lag: float = 0.0
+    # Значения на момент прошлого отчета для расчета скорости
+    reported_messages: int = 0
+    reported_at: float = dataclasses.field(default_factory=time.monotonic)
+
+
+class BybitWebSocketPool:
+    """
+    Распределяет топики символ × поток по нескольким соединениям.
+
+    На одно соединение приходится не больше `topics_per_connection` топиков, а разрыв
+    одного соединения не останавливает остальные. Топики раздаются по кругу в порядке
+    поток -> символ, так что каждое соединение получает равную долю тяжелых стаканов.
+    Подписка отправляется пачками по `subscribe_batch` топиков в одном запросе.
+    """
+
+    def __init__(
+        self,
+        connections: int = 1,
+        topics_per_connection: int = 200,
+        subscribe_batch: int = 10,
+        url: str = PUBLIC_LINEAR_URL,
+        ping_interval: float = 20.0,
+        codec: str = "auto",
+        factory: typing.Callable[..., BybitWebSocket] = BybitWebSocket,
+    ):
+        """
+        :param connections: Минимальное число соединений; добавляются новые, если
+            топиков больше лимита.
+        :param topics_per_connection: Максимум топиков на соединение.
+        :param subscribe_batch: Топиков в одном запросе subscribe.
+        :param url: Адрес публичного потока.
+        :param ping_interval: Интервал ping соединений, с.
+        :param codec: Кодек разбора кадров.
+        :param factory: Создает соединение по url, ping_interval, subscribe_batch и
+            codec.
+        """
+        self.connections = max(1, connections)
+        self.topics_per_connection = topics_per_connection
+        self.subscribe_batch = subscribe_batch
+        self.url = url
+        self.ping_interval = ping_interval
+        self.codec = codec
+        self.factory = factory
+        self.shards: list[BybitWebSocket] = []
+        self.shard_stats: list[ShardStats] = []
+        # Топик -> номер соединения, для переподписки
+        self.topics: dict[str, int] = {}
+
+    def plan(self, symbols: typing.Sequence[str]) -> list[list[tuple[str, str]]]:
+        """Распределение пар (поток, символ) по соединениям."""
+        pairs = [(stream, symbol) for stream in STREAMS for symbol in symbols]
+        count = max(
+            self.connections, math.ceil(len(pairs) / self.topics_per_connection)
+        )
+        plan: list[list[tuple[str, str]]] = [[] for _ in range(count)]
+        for i, pair in enumerate(pairs):
+            plan[i % count].append(pair)
+        return plan
+
+    async def subscribe(
+        self,
+        symbols: typing.Sequence[str],
+        callback: typing.Callable[[dict], None],
+        depth: int = 50,
+        interval: int = 1,
+    ):
+        """
+        Открывает соединения параллельно и подписывает их на свои топики.
+
+        :param symbols: Символы.
+        :param callback: Колбэк сообщений, вызывается в event loop.
+        :param depth: Глубина стакана.
+        :param interval: Интервал свечей, мин.
+        """
+        await self.close()
+        shards = []
+        for index, pairs in enumerate(self.plan(symbols)):
+            topics = [
+                STREAMS[stream].format(depth=depth, interval=interval, symbol=symbol)
+                for stream, symbol in pairs
+            ]
+            self.topics.update(dict.fromkeys(topics, index))
+            self.shard_stats.append(ShardStats(index=index, topics=len(topics)))
+            self.shards.append(
+                self.factory(
+                    url=self.url,
+                    ping_interval=self.ping_interval,
+                    subscribe_batch=self.subscribe_batch,
+                    codec=self.codec,
+                )
+            )
+            shards.append(topics)
+
+        async def open_shard(ws: BybitWebSocket, stats: ShardStats, topics: list[str]):
+            await ws.subscribe(topics)
+            await ws.connect(self._counting(stats, callback))
+
+        await asyncio.gather(
+            *(
+                open_shard(ws, stats, topics)
+                for ws, stats, topics in zip(self.shards, self.shard_stats, shards)
+            )
+        )
+        logger.info(
+            f"✅ Bybit WebSocket: {len(self.topics)} топиков в {len(self.shards)} "
+            f"соединениях (до {self.topics_per_connection} на соединение, по "
+            f"{self.subscribe_batch} в запросе)"
+        )
+
+    @staticmethod
+    def _counting(
+        stats: ShardStats, callback: typing.Callable[[dict], None]
+    ) -> typing.Callable[[dict], None]:
+        def on_message(message: dict):
+            stats.messages += 1
+            ts = message.get("ts")
+            if ts:
+                lag = time.time() * 1000 - ts
+                stats.lag_sum += lag
+                stats.lag_count += 1
+                stats.max_lag = max(stats.max_lag, lag)
+            callback(message)
+
+        return on_message
+
+    async def close(self):
+        """Закрывает соединения."""
+        for result in await asyncio.gather(
+            *(shard.close() for shard in self.shards), return_exceptions=True
+        ):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка при закрытии соединения: {result}")
+        self.shards, self.shard_stats, self.topics = [], [], {}
+
+    def resubscribe(self, topic: str):
+        """Переподписка на топик в соединении, которое его обслуживает."""
+        self.shards[self.topics[topic]].resubscribe(topic)
+
+    def stats(self) -> list[dict]:
+        """Скорость сообщений и задержка по соединениям с прошлого вызова."""
+        now = time.monotonic()
+        report = []
+        for stats, shard in zip(self.shard_stats, self.shards):
+            messages, lag_sum, lag_count = (
+                stats.messages,
+                stats.lag_sum,
+                stats.lag_count,
+            )
+            elapsed = now - stats.reported_at
+            report.append(
+                {
+                    "connection": stats.index,
+                    "topics": stats.topics,
+                    "connected": shard.connected,
+                    "reconnects": shard.reconnects,
+                    "decode_errors": shard.decode_errors,
+                    "messages": messages,
+                    "rate": (
+                        round((messages - stats.reported_messages) / elapsed, 2)
+                        if elapsed > 0
+                        else 0.0
+                    ),
+                    "lag_ms": round(lag_sum / lag_count, 1) if lag_count else None,
+                    "max_lag_ms": round(stats.max_lag, 1) if lag_count else None,
+                }
+            )
+            stats.reported_messages, stats.reported_at = messages, now
+            stats.lag_sum, stats.lag_count, stats.max_lag = 0.0, 0, 0.0
+        return report
 
 
 class BybitRest:
@@ -77,7 +438,14 @@ class BybitRest:
         """Получение баланса"""
         return self.rest_client.get_wallet_balance()
 
-    def place_order(self, symbol: str, side: str, qty: float, price: float, order_type: str = "Limit"):
+    def place_order(
+        self,
+        symbol: str,
+        side: str,
+        qty: float,
+        price: float,
+        order_type: str = "Limit",
+    ):
         """Открытие ордера"""
         return self.rest_client.place_order(
             category="linear",
@@ -86,7 +454,7 @@ class BybitRest:
             qty=qty,
             price=price,
             orderType=order_type,
-            timeInForce="GoodTillCancel"
+            timeInForce="GoodTillCancel",
         )
 
     def close_order(self, order_id: str):
@@ -0,0 +1,164 @@
+import json
+import typing
+
+try:
+    import orjson
+except ImportError:  # Быстрые кодеки опциональны, без них используется json
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+from app.schemas.market import BybitMessage
+
+
+class Codec(typing.Protocol):
+    """Кодирование сообщений в JSON (bytes) и обратно."""
+
+    name: str
+
+    def dumps(self, value: typing.Any) -> bytes: ...
+
+    def loads(self, data: bytes | str) -> typing.Any: ...
+
+    def decode_message(self, data: bytes | str) -> BybitMessage:
+        """
+        Сообщение топика Bybit с проверкой формы.
+
+        :raises ValueError: Не JSON или не сообщение топика.
+        """
+        ...
+
+
+def check_message(message: typing.Any) -> BybitMessage:
+    """
+    Проверка сообщения на границе ingest вместо модели Pydantic на каждое сообщение:
+    topic — строка, ts — целое, data есть.
+
+    :raises ValueError: Сообщение другой формы.
+    """
+    if (
+        not isinstance(message, dict)
+        or not isinstance(message.get("topic"), str)
+        or not isinstance(message.get("ts"), int)
+        or "data" not in message
+    ):
+        raise ValueError(f"Не сообщение топика Bybit: {str(message)[:200]}")
+    return message
+
+
+class RawMessage(dict):
+    """
+    Сообщение, полученное из сокета, вместе с исходным кадром. encode() возвращает кадр
+    как есть, поэтому сообщение попадает в Redis без повторной сериализации.
+    """
+
+    __slots__ = ("raw",)
+
+    def __init__(self, message: dict, raw: bytes | str):
+        super().__init__(message)
+        self.raw = raw
+
+
+def _default(value: typing.Any) -> typing.Any:
+    """Скаляры и массивы NumPy (индикаторы, агрегаты) в типы JSON."""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class JsonCodec:
+    """Стандартный json."""
+
+    name = "json"
+
+    def dumps(self, value: typing.Any) -> bytes:
+        return json.dumps(
+            value, separators=(",", ":"), ensure_ascii=False, default=_default
+        ).encode()
+
+    def loads(self, data: bytes | str) -> typing.Any:
+        return json.loads(data)
+
+    def decode_message(self, data: bytes | str) -> BybitMessage:
+        return check_message(self.loads(data))
+
+
+class OrjsonCodec:
+    """orjson: кодирование и разбор в несколько раз быстрее json."""
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError("Для кодека orjson нужен пакет orjson")
+
+    def dumps(self, value: typing.Any) -> bytes:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    def loads(self, data: bytes | str) -> typing.Any:
+        return orjson.loads(data)
+
+    def decode_message(self, data: bytes | str) -> BybitMessage:
+        return check_message(self.loads(data))
+
+
+class MsgspecCodec:
+    """
+    msgspec.json; сообщения топиков декодируются скомпилированным декодером
+    BybitMessage.
+    """
+
+    name = "msgspec"
+
+    def __init__(self):
+        if msgspec is None:
+            raise RuntimeError("Для кодека msgspec нужен пакет msgspec")
+        self.encoder = msgspec.json.Encoder(enc_hook=_default)
+        self.decoder = msgspec.json.Decoder()
+        self.message_decoder = msgspec.json.Decoder(BybitMessage)
+
+    def dumps(self, value: typing.Any) -> bytes:
+        return self.encoder.encode(value)
+
+    def loads(self, data: bytes | str) -> typing.Any:
+        return self.decoder.decode(data)
+
+    def decode_message(self, data: bytes | str) -> BybitMessage:
+        # Проверка типов выполняется при разборе; поля вне BybitMessage отбрасываются
+        return self.message_decoder.decode(data)
+
+
+CODECS: dict[str, type[Codec]] = {
+    "json": JsonCodec,
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+}
+_instances: dict[str, Codec] = {}
+
+
+def get_codec(name: str = "auto") -> Codec:
+    """
+    Кодек по имени.
+
+    :param name: json, orjson, msgspec или auto — orjson, если установлен, иначе json.
+    :raises ValueError: Неизвестный кодек.
+    :raises RuntimeError: Пакет кодека не установлен.
+    """
+    if name == "auto":
+        name = "orjson" if orjson is not None else "json"
+    if name not in CODECS:
+        raise ValueError(
+            f"Неизвестный кодек {name}, доступны: auto, {', '.join(CODECS)}"
+        )
+    if name not in _instances:
+        _instances[name] = CODECS[name]()
+    return _instances[name]
+
+
+def encode(codec: Codec, message: typing.Any) -> bytes | str:
+    """Кодирует сообщение; для RawMessage возвращает исходный кадр без сериализации."""
+    if isinstance(message, RawMessage):
+        return message.raw
+    return codec.dumps(message)
@@ -19,20 +19,20 @@ class Database:
     _factory_ro: sessionmaker
 
     def __init__(
-            self,
-            url_rw: str,
-            url_ro: str | None = None,
-            echo: bool = False,
-            pool_size: int = 5,
-            pool_timeout: int = 30,
-            pool_recycle: int = 1800,
-            max_overflow: int = 10,
-            expire_on_commit: bool = False,
-            pool_pre_ping: bool = True,
-            application_name: str = "",
+        self,
+        url_rw: str,
+        url_ro: str | None = None,
+        echo: bool = False,
+        pool_size: int = 5,
+        pool_timeout: int = 30,
+        pool_recycle: int = 1800,
+        max_overflow: int = 10,
+        expire_on_commit: bool = False,
+        pool_pre_ping: bool = True,
+        application_name: str = "",
     ):
         """."""
-        application_name = application_name or const.APP
+        application_name = application_name or "smart_trade_ai"
         url_ro = url_ro or url_rw
         self._engine_rw = create_async_engine(
             url_rw,
@@ -59,6 +59,8 @@ class Database:
             pool_size=pool_size,
             max_overflow=max_overflow,
             pool_pre_ping=pool_pre_ping,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
             connect_args={
                 "server_settings": {"application_name": application_name},
             },
@@ -73,7 +75,7 @@ class Database:
 
     @contextlib.asynccontextmanager
     async def session_rw(
-            self, session: AsyncSession | None = None
+        self, session: AsyncSession | None = None
     ) -> typing.AsyncGenerator[AsyncSession, None]:
         """Session factory."""
         if session:
@@ -87,7 +89,7 @@ class Database:
 
     @contextlib.asynccontextmanager
     async def session_ro(
-            self, session: AsyncSession | None = None
+        self, session: AsyncSession | None = None
     ) -> typing.AsyncGenerator[AsyncSession, None]:
         """Session factory."""
         if session:
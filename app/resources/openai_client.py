@@ -0,0 +1,542 @@
+import asyncio
+import dataclasses
+import json
+import logging
+import random
+import time
+import typing
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+from openai.types import Batch, CompletionUsage, FileObject
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+logger = logging.getLogger(__name__)
+
+T = typing.TypeVar("T")
+
+# Статусы, после которых запрос повторяется
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_FINAL_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
+
+
+class CircuitOpenError(RuntimeError):
+    """Вызовы временно не выполняются: API подряд отвечал ошибками."""
+
+
+class TokenBucket:
+    """
+    Ограничение скорости «токен-бакет»: `rate_per_minute` единиц в минуту с запасом не
+    больше `capacity`.
+
+    Ожидающие обслуживаются по очереди. Расход можно скорректировать после вызова
+    (adjust), когда известно фактическое число токенов, при перерасходе бакет уходит в
+    минус.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        """Ждет, пока в бакете наберется `amount` единиц, и списывает их."""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def adjust(self, amount: float):
+        """
+        Дополнительно списывает (или возвращает при отрицательном `amount`) единицы.
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class CircuitBreaker:
+    """
+    Размыкатель: после `failure_threshold` ошибок подряд вызовы отклоняются
+    `reset_timeout` секунд, затем пропускается один пробный вызов — успех замыкает цепь,
+    ошибка снова размыкает.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def before_call(self):
+        """Проверяет, можно ли выполнить вызов; иначе CircuitOpenError."""
+        state = self.state
+        if state == "open" or state == "half_open" and self._trial:
+            raise CircuitOpenError("Вызовы OpenAI приостановлены после серии ошибок")
+        if state == "half_open":
+            self._trial = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def release(self):
+        """Вызов прерван без результата: пробный вызов можно повторить."""
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial:
+                logger.error(
+                    f"⚠ OpenAI: {self.failures} ошибок подряд, вызовы приостановлены "
+                    f"на {self.reset_timeout} с"
+                )
+            self.opened_at = time.monotonic()
+        self._trial = False
+
+
+@dataclasses.dataclass
+class StreamedChat:
+    """Ответ, прочитанный из потока chat.completions."""
+
+    content: str
+    # Время до первого фрагмента ответа и до конца чтения от начала успешной попытки,
+    # сек.
+    first_token: float | None
+    elapsed: float
+    finish_reason: str | None
+    usage: CompletionUsage | None
+    # Чтение прекращено досрочно по решению наблюдателя
+    stopped: bool
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Задержка из заголовков Retry-After / retry-after-ms ответа, сек."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return (
+        isinstance(error, openai.APIStatusError) and error.status_code in RETRY_STATUSES
+    )
+
+
+class OpenAIClient:
+    """
+    Клиент OpenAI с ограничением нагрузки и повторами.
+
+    - не больше `max_concurrency` одновременных запросов;
+    - токен-бакеты на запросы в минуту и токены в минуту (оценка промта плюс
+      `completion_tokens`, после ответа корректируется по usage);
+    - повторы на 429/5xx/сетевые ошибки с экспоненциальной задержкой и джиттером;
+      Retry-After от API соблюдается и приостанавливает все запросы клиента;
+    - общий дедлайн на вызов вместе с повторами;
+    - размыкатель после серии ошибок сервера;
+    - чтение ответа потоком (chat_stream) с замером первого токена и досрочной
+      остановкой;
+    - пакетные задания Batch API для запросов, которым не важна задержка (submit_batch,
+      wait_batch, batch_results).
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str | None = None,
+        requests_per_minute: int = 500,
+        tokens_per_minute: int = 200_000,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        request_timeout: float = 60.0,
+        deadline: float = 120.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        completion_tokens: int = 1500,
+        http_client: httpx.AsyncClient | None = None,
+    ):
+        """
+        :param api_key: API-ключ OpenAI.
+        :param base_url: Адрес API, None — api.openai.com (например, совместимый прокси
+            или заглушка в тестах).
+        :param requests_per_minute: Лимит запросов в минуту.
+        :param tokens_per_minute: Лимит токенов в минуту.
+        :param max_concurrency: Максимум одновременных запросов.
+        :param max_retries: Сколько раз повторять запрос.
+        :param backoff_base: Начальная задержка повтора, сек.
+        :param backoff_max: Максимальная задержка повтора, сек.
+        :param request_timeout: Таймаут одного HTTP-запроса, сек.
+        :param deadline: Дедлайн вызова вместе с повторами по умолчанию, сек.
+        :param failure_threshold: Ошибок подряд до размыкания.
+        :param reset_timeout: Время размыкания, сек.
+        :param completion_tokens: Резерв на ответ в лимите токенов до получения usage.
+        :param http_client: HTTP-клиент для AsyncOpenAI (например, с тестовым
+            транспортом).
+        """
+        # Повторы выполняются здесь, встроенные повторы SDK отключены
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url or None,
+            max_retries=0,
+            timeout=request_timeout,
+            http_client=http_client,
+        )
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_timeout = request_timeout
+        self.deadline = deadline
+        self.completion_tokens = completion_tokens
+        self._paused_until = 0.0
+
+    async def close(self):
+        """Закрывает HTTP-соединения клиента."""
+        await self.client.close()
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        # Full jitter: случайная задержка до base * 2^attempt
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    async def _request(
+        self,
+        send: typing.Callable[[float], typing.Awaitable[T]],
+        tokens: int = 0,
+        deadline: float | None = None,
+    ) -> T:
+        """
+        Запрос к API с лимитами, повторами, дедлайном и размыкателем.
+
+        :param send: Выполняет запрос, получает таймаут HTTP-запроса в секундах.
+        :param tokens: Резерв в лимите токенов в минуту.
+        :param deadline: Дедлайн вызова вместе с ожиданием лимитов и повторами, сек.
+        :raises TimeoutError: Дедлайн истек.
+        :raises CircuitOpenError: Вызовы приостановлены размыкателем.
+        :raises openai.APIError: Ошибка API, которую не удалось исправить повторами.
+        """
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + (deadline if deadline is not None else self.deadline)
+        async with asyncio.timeout_at(expires):
+            attempt = 0
+            while True:
+                self.breaker.before_call()
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                await self.requests.acquire()
+                await self.tokens.acquire(tokens)
+                try:
+                    async with self.semaphore:
+                        response = await send(
+                            min(self.request_timeout, max(expires - loop.time(), 0.001))
+                        )
+                except openai.APIError as e:
+                    status = getattr(e, "status_code", None)
+                    # Размыкатель учитывает только недоступность сервера; 4xx и 429 —
+                    # API работает
+                    if status is None or status >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    if not _is_retryable(e):
+                        raise
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self._backoff(attempt, e)
+                    if status == 429:
+                        self._paused_until = max(
+                            self._paused_until, time.monotonic() + delay
+                        )
+                    if loop.time() + delay >= expires:
+                        raise
+                    attempt += 1
+                    logger.warning(
+                        f"⚠ OpenAI: {status or type(e).__name__}, повтор "
+                        f"{attempt}/{self.max_retries} через {delay:.1f} с"
+                    )
+                    await asyncio.sleep(delay)
+                    continue
+                except BaseException:
+                    # Отмена или отказ от ответа на нашей стороне: пробный вызов можно
+                    # повторить
+                    self.breaker.release()
+                    raise
+
+                self.breaker.record_success()
+                return response
+
+    async def chat(
+        self,
+        messages: list[dict],
+        model: str,
+        temperature: float,
+        prompt_tokens: int,
+        response_format: dict | None = None,
+        deadline: float | None = None,
+    ) -> ChatCompletion:
+        """
+        Запрос chat.completions с лимитами, повторами и дедлайном (см. _request).
+
+        :param messages: Сообщения запроса.
+        :param model: Модель.
+        :param temperature: Температура.
+        :param prompt_tokens: Оценка токенов промта для лимита токенов в минуту.
+        :param response_format: Формат ответа (JSON-схема, JSON-режим), None — текст.
+        :param deadline: Дедлайн вызова вместе с ожиданием лимитов и повторами, сек.
+        """
+        reserved = prompt_tokens + self.completion_tokens
+        extra = {"response_format": response_format} if response_format else {}
+        response: ChatCompletion = await self._request(
+            lambda timeout: self.client.chat.completions.create(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                timeout=timeout,
+                **extra,
+            ),
+            tokens=reserved,
+            deadline=deadline,
+        )
+        if response.usage is not None:
+            self.tokens.adjust(response.usage.total_tokens - reserved)
+        return response
+
+    async def chat_stream(
+        self,
+        messages: list[dict],
+        model: str,
+        temperature: float,
+        prompt_tokens: int,
+        monitor: typing.Callable[[], typing.Callable[[str], bool]] | None = None,
+        response_format: dict | None = None,
+        deadline: float | None = None,
+    ) -> StreamedChat:
+        """
+        Запрос chat.completions с чтением ответа потоком: измеряется задержка первого
+        токена, чтение можно прекратить досрочно. Лимиты, повторы и дедлайн — как в
+        chat; обрыв потока повторяется с начала.
+
+        :param messages: Сообщения запроса.
+        :param model: Модель.
+        :param temperature: Температура.
+        :param prompt_tokens: Оценка токенов промта для лимита токенов в минуту.
+        :param monitor: Создает наблюдателя на каждую попытку; наблюдатель получает
+            фрагменты ответа, True — прекратить чтение (ответ готов), исключение —
+            прервать запрос без повторов.
+        :param response_format: Формат ответа (JSON-схема, JSON-режим), None — текст.
+        :param deadline: Дедлайн вызова вместе с ожиданием лимитов и повторами, сек.
+        """
+        reserved = prompt_tokens + self.completion_tokens
+        extra = {"response_format": response_format} if response_format else {}
+
+        async def send(timeout: float) -> StreamedChat:
+            started = time.monotonic()
+            observe = monitor() if monitor is not None else None
+            parts: list[str] = []
+            first_token = finish_reason = usage = None
+            stopped = False
+            stream = await self.client.chat.completions.create(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                timeout=timeout,
+                stream=True,
+                stream_options={"include_usage": True},
+                **extra,
+            )
+            async with stream:
+                try:
+                    chunk: ChatCompletionChunk
+                    async for chunk in stream:
+                        usage = chunk.usage or usage
+                        for choice in chunk.choices:
+                            finish_reason = choice.finish_reason or finish_reason
+                            delta = choice.delta.content
+                            if not delta:
+                                continue
+                            if first_token is None:
+                                first_token = time.monotonic() - started
+                            parts.append(delta)
+                            if observe is not None and observe(delta):
+                                stopped = True
+                        if stopped:
+                            break
+                except httpx.TransportError as e:
+                    # Обрыв соединения посреди потока повторяется как сетевая ошибка
+                    raise openai.APIConnectionError(
+                        message=str(e), request=stream.response.request
+                    ) from e
+            return StreamedChat(
+                content="".join(parts),
+                first_token=first_token,
+                elapsed=time.monotonic() - started,
+                finish_reason=finish_reason,
+                usage=usage,
+                stopped=stopped,
+            )
+
+        response = await self._request(send, tokens=reserved, deadline=deadline)
+        if response.usage is not None:
+            self.tokens.adjust(response.usage.total_tokens - reserved)
+        return response
+
+    async def submit_batch(
+        self, requests: dict[str, dict], metadata: dict[str, str] | None = None
+    ) -> Batch:
+        """
+        Отправляет запросы chat.completions одним пакетным заданием (Batch API).
+
+        Пакетные запросы не расходуют лимиты синхронных вызовов, выполняются в течение
+        24 часов и стоят дешевле.
+
+        :param requests: custom_id -> тело запроса chat.completions (model, messages,
+            temperature).
+        :param metadata: Метаданные задания.
+        :return: Созданное задание.
+        """
+        lines = (
+            json.dumps(
+                {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": body,
+                },
+                ensure_ascii=False,
+            )
+            for custom_id, body in requests.items()
+        )
+        content = ("\n".join(lines) + "\n").encode()
+        file: FileObject = await self._request(
+            lambda timeout: self.client.files.create(
+                file=("batch.jsonl", content), purpose="batch", timeout=timeout
+            )
+        )
+        batch: Batch = await self._request(
+            lambda timeout: self.client.batches.create(
+                input_file_id=file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window="24h",
+                metadata=metadata,
+                timeout=timeout,
+            )
+        )
+        logger.info(
+            f"✅ OpenAI: пакетное задание {batch.id} создано, запросов: {len(requests)}"
+        )
+        return batch
+
+    async def wait_batch(
+        self, batch_id: str, poll_interval: float = 60.0, timeout: float = 86400.0
+    ) -> Batch:
+        """
+        Ждет завершения пакетного задания.
+
+        :param batch_id: Идентификатор задания.
+        :param poll_interval: Интервал опроса, сек.
+        :param timeout: Максимальное время ожидания, сек.; по истечении задание
+            отменяется.
+        :return: Задание в конечном статусе (completed, failed, expired, cancelled).
+        """
+        started = time.monotonic()
+        while True:
+            batch: Batch = await self._request(
+                lambda request_timeout: self.client.batches.retrieve(
+                    batch_id, timeout=request_timeout
+                )
+            )
+            if batch.status in BATCH_FINAL_STATUSES:
+                counts = batch.request_counts
+                logger.info(
+                    f"OpenAI: пакетное задание {batch_id} — {batch.status}"
+                    + (
+                        f", выполнено {counts.completed}/{counts.total}, ошибок "
+                        f"{counts.failed}"
+                        if counts
+                        else ""
+                    )
+                )
+                return batch
+            if time.monotonic() - started >= timeout:
+                logger.error(
+                    f"⚠ OpenAI: пакетное задание {batch_id} не завершилось за "
+                    f"{timeout} с, отмена"
+                )
+                await self._request(
+                    lambda request_timeout: self.client.batches.cancel(
+                        batch_id, timeout=request_timeout
+                    )
+                )
+                raise TimeoutError(
+                    f"Пакетное задание {batch_id} не завершилось за {timeout} с"
+                )
+            await asyncio.sleep(poll_interval)
+
+    async def batch_results(self, batch: Batch) -> dict[str, ChatCompletion | str]:
+        """
+        Результаты завершенного пакетного задания.
+
+        :return: custom_id -> ответ или текст ошибки запроса.
+        """
+        results: dict[str, ChatCompletion | str] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await self._request(
+                lambda timeout: self.client.files.content(file_id, timeout=timeout)
+            )
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                if item.get("error") or response.get("status_code") != 200:
+                    results[item["custom_id"]] = str(
+                        item.get("error") or response.get("body")
+                    )
+                else:
+                    results[item["custom_id"]] = ChatCompletion.model_validate(
+                        response["body"]
+                    )
+        return results
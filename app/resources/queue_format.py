@@ -0,0 +1,285 @@
+import typing
+
+try:
+    import msgpack
+except ImportError:  # Бинарный формат очереди опционален
+    msgpack = None
+
+from app.enums.market import MarketKindEnums
+from app.schemas.market import BybitMessage
+from app.resources.codec import Codec, check_message, encode
+
+# Первый байт бинарной записи: 0xC1 не используется в msgpack и не может начинать JSON
+MAGIC = 0xC1
+# Формат записи -> версия; версия 0 — JSON-объект сообщения без заголовка
+FORMATS = {"json": 0, "msgpack": 1}
+
+# Позиционная раскладка элементов data: поля по порядку и поля, которые передаются
+# числами
+LAYOUTS: dict[MarketKindEnums, tuple[tuple[str, ...], frozenset[str]]] = {
+    MarketKindEnums.TRADE_HISTORY: (
+        ("T", "s", "S", "v", "p", "L", "i", "BT"),
+        frozenset({"v", "p"}),
+    ),
+    MarketKindEnums.KLINE: (
+        (
+            "start",
+            "end",
+            "interval",
+            "open",
+            "close",
+            "high",
+            "low",
+            "volume",
+            "turnover",
+            "confirm",
+            "timestamp",
+        ),
+        frozenset({"open", "close", "high", "low", "volume", "turnover"}),
+    ),
+    MarketKindEnums.LIQUIDATION: (
+        ("updatedTime", "symbol", "side", "size", "price"),
+        frozenset({"size", "price"}),
+    ),
+}
+ORDERBOOK_FIELDS = ("s", "u", "seq")
+# Максимум знаков после точки для целочисленной записи уровней стакана
+MAX_SCALE = 15
+# Поля сообщения вне раскладки: topic, type, ts, data
+MESSAGE_FIELDS = ("topic", "type", "ts", "data")
+
+
+class UnknownFormatError(ValueError):
+    """
+    Запись в формате, который этот консьюмер еще не читает (продюсер новее); сама запись
+    не повреждена.
+    """
+
+
+def _number(value: typing.Any) -> typing.Any:
+    """
+    Строковое число Bybit в float; нечисловые значения (пустая строка) остаются как
+    есть.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _extras(item: dict, fields: tuple[str, ...]) -> dict | None:
+    """
+    Поля вне раскладки и поля со значением None: передаются словарем, чтобы не потерять
+    их.
+    """
+    extras = {
+        key: value for key, value in item.items() if key not in fields or value is None
+    }
+    return extras or None
+
+
+def _pack_row(item: dict, fields: tuple[str, ...], numeric: frozenset[str]) -> list:
+    row = [
+        _number(item[key]) if key in numeric and key in item else item.get(key)
+        for key in fields
+    ]
+    extras = _extras(item, fields)
+    return row + [extras] if extras else row
+
+
+def _unpack_row(row: list, fields: tuple[str, ...]) -> dict:
+    item = {key: value for key, value in zip(fields, row) if value is not None}
+    if len(row) > len(fields):
+        item.update(row[len(fields)])
+    return item
+
+
+def _flat_levels(levels: list) -> list[float]:
+    """[[цена, объем], ...] в плоский список [цена, объем, цена, объем, ...]."""
+    return [_number(value) for level in levels for value in level]
+
+
+def _scaled(values: list) -> tuple[int, list[int]] | None:
+    """
+    Десятичные строки в целые с общим множителем 10^scale: "43510.5", "0.006" -> 3,
+    [43510500, 6]. Целое, деленное на 10^scale, дает тот же float, что и float(строки).
+
+    :return: (scale, целые) или None, если значения не простые десятичные строки.
+    """
+    scale = 0
+    for value in values:
+        if (
+            value.__class__ is not str
+            or not value.replace(".", "", 1).lstrip("-").isdigit()
+        ):
+            return None
+        point = value.find(".")
+        if point >= 0 and len(value) - point - 1 > scale:
+            scale = len(value) - point - 1
+    if scale > MAX_SCALE:
+        return None
+    # Погрешность float(value) * 10^scale много меньше 0.5, пока целое меньше 2^53
+    multiplier = 10**scale
+    integers = [round(float(value) * multiplier) for value in values]
+    if any(abs(integer) >= 2**53 for integer in integers):
+        return None
+    return scale, integers
+
+
+def _pack_orderbook(data: dict) -> list:
+    """
+    Стакан: цены и объемы целыми с общим множителем (раскладка 4), иначе числами
+    (раскладка 1).
+    """
+    row = [data.get(key) for key in ORDERBOOK_FIELDS]
+    extras = _extras(data, ORDERBOOK_FIELDS + ("b", "a"))
+    bids, asks = data.get("b", ()), data.get("a", ())
+    prices = _scaled([level[0] for level in bids] + [level[0] for level in asks])
+    sizes = _scaled([level[1] for level in bids] + [level[1] for level in asks])
+    if (
+        prices is None
+        or sizes is None
+        or any(len(level) != 2 for level in (*bids, *asks))
+    ):
+        row += [_flat_levels(bids), _flat_levels(asks)]
+        return [1, row + [extras] if extras else row]
+    (price_scale, price_values), (size_scale, size_values) = prices, sizes
+    row += [price_scale, size_scale, len(bids), price_values, size_values]
+    return [4, row + [extras] if extras else row]
+
+
+def _unpack_orderbook(layout: int, packed: list) -> dict:
+    data = {
+        key: value for key, value in zip(ORDERBOOK_FIELDS, packed) if value is not None
+    }
+    if layout == 1:
+        bids, asks = packed[3], packed[4]
+        data["b"] = [bids[i : i + 2] for i in range(0, len(bids), 2)]
+        data["a"] = [asks[i : i + 2] for i in range(0, len(asks), 2)]
+        extras = packed[5:]
+    else:
+        price_scale, size_scale, bid_count, prices, sizes = packed[3:8]
+        price_divisor, size_divisor = 10**price_scale, 10**size_scale
+        levels = [
+            [price / price_divisor, size / size_divisor]
+            for price, size in zip(prices, sizes)
+        ]
+        data["b"], data["a"] = levels[:bid_count], levels[bid_count:]
+        extras = packed[8:]
+    if extras:
+        data.update(extras[0])
+    return data
+
+
+# Раскладка data: 0 — как есть, 1 и 4 — стакан, 2 — список элементов LAYOUTS, 3 — один
+# элемент
+def _pack_data(kind: MarketKindEnums | None, data: typing.Any) -> list:
+    if kind is MarketKindEnums.ORDERBOOK and isinstance(data, dict):
+        return _pack_orderbook(data)
+    if kind in LAYOUTS and isinstance(data, (list, dict)):
+        fields, numeric = LAYOUTS[kind]
+        items = data if isinstance(data, list) else [data]
+        if all(isinstance(item, dict) for item in items):
+            rows = [_pack_row(item, fields, numeric) for item in items]
+            return [2 if isinstance(data, list) else 3, rows]
+    return [0, data]
+
+
+def _unpack_data(
+    kind: MarketKindEnums | None, layout: int, packed: typing.Any
+) -> typing.Any:
+    if layout == 0:
+        return packed
+    if layout in (1, 4):
+        return _unpack_orderbook(layout, packed)
+    fields = LAYOUTS[kind][0]
+    items = [_unpack_row(row, fields) for row in packed]
+    return items if layout == 2 else items[0]
+
+
+def pack_message(message: dict) -> list:
+    """
+    Сообщение Bybit в компактную структуру версии 1: [topic, type, ts, раскладка data,
+    data, прочие поля]. Ключи элементов data не повторяются, цены и объемы передаются
+    числами.
+    """
+    topic = message.get("topic", "")
+    kind = MarketKindEnums.from_topic(topic)
+    extras = {key: value for key, value in message.items() if key not in MESSAGE_FIELDS}
+    return [
+        topic,
+        message.get("type"),
+        message.get("ts"),
+        *_pack_data(kind, message.get("data")),
+        extras or None,
+    ]
+
+
+def unpack_message(packed: list) -> dict:
+    """Структура версии 1 обратно в сообщение Bybit (цены и объемы — числа)."""
+    topic, kind_type, ts, layout, data, extras = packed
+    message = {"topic": topic, "type": kind_type, "ts": ts}
+    message = {key: value for key, value in message.items() if value is not None}
+    message["data"] = _unpack_data(MarketKindEnums.from_topic(topic), layout, data)
+    if extras:
+        message.update(extras)
+    return message
+
+
+class QueueFormat:
+    """
+    Формат записей очереди и стрима websocket_messages.
+
+    Записываются в формате `write`, читаются записи любой известной версии: JSON (версия
+    0, кодек `codec`) или [0xC1, версия, msgpack]. Поэтому консьюмеры обновляются
+    первыми, а продюсеры переключаются на новый формат после них. Запись msgpack требует
+    кодирования на стороне продюсера, исходный кадр сокета (RawMessage) в ней не
+    используется.
+    """
+
+    def __init__(self, codec: Codec, write: str = "json"):
+        """
+        :param codec: Кодек JSON-записей.
+        :param write: Формат новых записей: json или msgpack.
+        :raises ValueError: Неизвестный формат.
+        :raises RuntimeError: Для msgpack не установлен пакет msgpack.
+        """
+        if write not in FORMATS:
+            raise ValueError(
+                f"Неизвестный формат очереди {write}, доступны: {', '.join(FORMATS)}"
+            )
+        if write == "msgpack" and msgpack is None:
+            raise RuntimeError("Для формата очереди msgpack нужен пакет msgpack")
+        self.codec = codec
+        self.write = write
+        self._header = bytes((MAGIC, FORMATS[write]))
+
+    def encode(self, message: typing.Any) -> bytes | str:
+        """Запись очереди в формате `write`."""
+        if self.write == "json":
+            return encode(self.codec, message)
+        return self._header + msgpack.packb(pack_message(message), use_bin_type=True)
+
+    def decode(self, data: bytes | str) -> BybitMessage:
+        """
+        Сообщение из записи любой известной версии, проверенное на границе ingest
+        (check_message).
+
+        :raises UnknownFormatError: Неизвестная версия (продюсер новее консьюмера) или
+            нет пакета msgpack.
+        :raises ValueError: Запись повреждена или не является сообщением топика.
+        """
+        if isinstance(data, bytes) and data[:1] == bytes((MAGIC,)):
+            version = data[1]
+            if version != FORMATS["msgpack"]:
+                raise UnknownFormatError(f"Неизвестная версия записи очереди {version}")
+            if msgpack is None:
+                raise UnknownFormatError(
+                    "Запись очереди в формате msgpack, но пакет msgpack не установлен"
+                )
+            return check_message(
+                unpack_message(
+                    msgpack.unpackb(data[2:], raw=False, strict_map_key=False)
+                )
+            )
+        return self.codec.decode_message(data)
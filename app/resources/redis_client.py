@@ -1,19 +1,75 @@
 import asyncio
 import logging
+import time
 
-import json
 import redis.asyncio as aioredis
+from redis.exceptions import ResponseError
+
+from app.resources.codec import get_codec
+from app.resources.queue_format import QueueFormat, UnknownFormatError
+
+STREAM_FIELD = b"m"
+# Поврежденные записи стрима после stream_max_deliveries доставок переносятся сюда и
+# подтверждаются
+DEAD_LETTER_STREAM = "{stream}:dead"
 
 logger = logging.getLogger(__name__)
 
 
+class QueueStats:
+    """Статистика вычитывания очереди: сколько сообщений забрано и с какой скоростью."""
+
+    def __init__(self, window: float = 10.0):
+        self.window = window
+        self.total = 0
+        self.rate = 0.0
+        self._window_started = time.monotonic()
+        self._window_count = 0
+
+    def add(self, count: int):
+        """
+        Учитывает `count` забранных сообщений и пересчитывает скорость (сообщений/сек).
+        """
+        self.total += count
+        self._window_count += count
+        now = time.monotonic()
+        elapsed = now - self._window_started
+        if elapsed >= self.window:
+            self.rate = self._window_count / elapsed
+            self._window_started = now
+            self._window_count = 0
+
+
 class RedisClient:
-    def __init__(self, redis_url="redis://localhost:6379", password=None, max_connections: int = 100):
+    def __init__(
+        self,
+        redis_url="redis://localhost:6379",
+        password=None,
+        max_connections: int = 100,
+        codec: str = "auto",
+        queue_format: str = "json",
+        stream_max_deliveries: int = 3,
+    ):
+        """
+        :param codec: Кодек значений и JSON-сообщений очередей
+            (app.resources.codec.get_codec). Сообщения RawMessage пишутся исходным
+            кадром без повторной сериализации.
+        :param queue_format: Формат новых записей очередей и стримов: json или msgpack.
+            Читаются записи любого формата (app.resources.queue_format.QueueFormat).
+        :param stream_max_deliveries: После скольких доставок поврежденная запись стрима
+            переносится в DEAD_LETTER_STREAM.
+        """
         self.redis_url = redis_url
         self.password = password
         self.pool = None
         self.redis = None
         self.max_connections = max_connections
+        self.codec = get_codec(codec)
+        self.queue_format = QueueFormat(self.codec, queue_format)
+        self.stream_max_deliveries = stream_max_deliveries
+        # Redis < 7 не знает BLMPOP: выясняется при первом вызове pop_batch_from_queue
+        self.has_blmpop = True
+        self.queue_stats: dict[str, QueueStats] = {}
 
     async def connect(self):
         """
@@ -36,9 +92,7 @@ class RedisClient:
 
         # Создаем новый пул соединений.
         self.pool = aioredis.ConnectionPool.from_url(
-            self.redis_url,
-            password=self.password,
-            max_connections=self.max_connections
+            self.redis_url, password=self.password, max_connections=self.max_connections
         )
         self.redis = aioredis.Redis(connection_pool=self.pool)
         logger.info("✅ Подключено к Redis с пулом подключений")
@@ -70,43 +124,296 @@ class RedisClient:
     async def set(self, key: str, value: dict, expire: int = 60):
         """Сохранение данных в кэш Redis с использованием пула подключений."""
         try:
-            await self.redis.set(key, json.dumps(value), ex=expire)
+            await self.redis.set(key, self.codec.dumps(value), ex=expire)
         except Exception as e:
             logger.error(f"Ошибка записи в Redis (set): {e}")
             await self._reconnect()
-            await self.redis.set(key, json.dumps(value), ex=expire)
+            await self.redis.set(key, self.codec.dumps(value), ex=expire)
+
+    async def get(self, key: str) -> dict | None:
+        """Чтение данных из кэша Redis."""
+        try:
+            data = await self.redis.get(key)
+        except Exception as e:
+            logger.error(f"Ошибка чтения из Redis (get): {e}")
+            await self._reconnect()
+            data = await self.redis.get(key)
+        return self.codec.loads(data) if data else None
+
+    async def delete(self, key: str):
+        """Удаление ключа из кэша Redis."""
+        try:
+            await self.redis.delete(key)
+        except Exception as e:
+            logger.error(f"Ошибка удаления из Redis (delete): {e}")
+            await self._reconnect()
+            await self.redis.delete(key)
 
     async def add_to_queue(self, queue_name: str, message: dict):
         """Добавление одного сообщения в очередь Redis."""
         try:
-            await self.redis.lpush(queue_name, json.dumps(message))
+            await self.redis.lpush(queue_name, self.queue_format.encode(message))
         except Exception as e:
             logger.error(f"Ошибка записи в Redis (add_to_queue): {e}")
             await self._reconnect()
-            await self.redis.lpush(queue_name, json.dumps(message))
+            await self.redis.lpush(queue_name, self.queue_format.encode(message))
 
-    async def add_to_queue_batch(self, queue_name: str, message_buffer: list, batch_size: int = 100):
+    async def add_to_queue_batch(
+        self, queue_name: str, message_buffer: list, batch_size: int = 100
+    ):
         """Добавление нескольких сообщений в очередь пакетами."""
         try:
             for i in range(0, len(message_buffer), batch_size):
-                batch = message_buffer[i:i + batch_size]
-                await self.redis.lpush(queue_name, *[json.dumps(msg) for msg in batch])
+                batch = message_buffer[i : i + batch_size]
+                await self.redis.lpush(
+                    queue_name, *[self.queue_format.encode(msg) for msg in batch]
+                )
         except Exception as e:
             logger.error(f"Ошибка записи в Redis (add_to_queue_batch): {e}")
             await self._reconnect()
             # Опционально можно повторить попытку:
             for i in range(0, len(message_buffer), batch_size):
-                batch = message_buffer[i:i + batch_size]
-                await self.redis.lpush(queue_name, *[json.dumps(msg) for msg in batch])
+                batch = message_buffer[i : i + batch_size]
+                await self.redis.lpush(
+                    queue_name, *[self.queue_format.encode(msg) for msg in batch]
+                )
 
     async def pop_from_queue(self, queue_name: str):
         """Извлекает одно сообщение (dict) из очереди."""
         try:
             data = await self.redis.rpop(queue_name)
-            if data:
-                return json.loads(data)
-            return None
         except Exception as e:
             logger.error(f"Ошибка чтения из Redis (pop_from_queue): {e}")
             await self._reconnect()
             return None
+        return self._decode(data) if data else None
+
+    async def pop_batch_from_queue(
+        self, queue_name: str, count: int = 1000, timeout: float = 1.0
+    ) -> list[dict]:
+        """
+        Извлекает до `count` сообщений из очереди за один вызов.
+
+        Если очередь пуста, блокируется до `timeout` секунд (BLMPOP) вместо опроса.
+        На Redis < 7 используется RPOP с count и пауза при пустой очереди: после первой
+        ошибки BLMPOP следующие вызовы сразу идут через RPOP.
+        """
+        try:
+            items = None
+            if self.has_blmpop:
+                try:
+                    result = await self.redis.blmpop(
+                        timeout, 1, queue_name, direction="RIGHT", count=count
+                    )
+                    items = result[1] if result else []
+                except ResponseError as e:
+                    if "unknown command" in str(e).lower():
+                        self.has_blmpop = False
+                        logger.warning(
+                            "⚠ Redis не поддерживает BLMPOP (< 7), очередь читается "
+                            "через RPOP"
+                        )
+            if items is None:
+                items = await self.redis.rpop(queue_name, count) or []
+                if not items:
+                    await asyncio.sleep(timeout)
+        except Exception as e:
+            logger.error(f"Ошибка чтения из Redis (pop_batch_from_queue): {e}")
+            await self._reconnect()
+            return []
+
+        self.queue_stats.setdefault(queue_name, QueueStats()).add(len(items))
+        return self._decode_messages(items)
+
+    async def queue_length(self, queue_name: str) -> int:
+        """Текущая глубина очереди."""
+        try:
+            return await self.redis.llen(queue_name)
+        except Exception as e:
+            logger.error(f"Ошибка чтения из Redis (queue_length): {e}")
+            return 0
+
+    async def add_to_stream_batch(
+        self, stream_name: str, message_buffer: list, maxlen: int | None = None
+    ):
+        """
+        Добавление нескольких сообщений в Redis Stream одним пайплайном.
+
+        :param maxlen: Приблизительное ограничение длины стрима (XADD MAXLEN ~).
+        """
+
+        async def _add():
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for msg in message_buffer:
+                    pipe.xadd(
+                        stream_name,
+                        {STREAM_FIELD: self.queue_format.encode(msg)},
+                        maxlen=maxlen,
+                        approximate=True,
+                    )
+                await pipe.execute()
+
+        try:
+            await _add()
+        except Exception as e:
+            logger.error(f"Ошибка записи в Redis (add_to_stream_batch): {e}")
+            await self._reconnect()
+            await _add()
+
+    async def ensure_consumer_group(self, stream_name: str, group_name: str):
+        """Создает группу консьюмеров (и сам стрим), если их еще нет."""
+        try:
+            await self.redis.xgroup_create(
+                stream_name, group_name, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read_stream_group(
+        self,
+        stream_name: str,
+        group_name: str,
+        consumer_name: str,
+        count: int = 1000,
+        timeout: float = 1.0,
+    ) -> list[tuple[bytes, dict]]:
+        """
+        Читает новые сообщения группы (XREADGROUP), блокируясь до `timeout` секунд.
+
+        :return: Список пар (id сообщения, сообщение). Сообщения нужно подтвердить через
+            ack_stream.
+        """
+        try:
+            response = await self.redis.xreadgroup(
+                group_name,
+                consumer_name,
+                {stream_name: ">"},
+                count=count,
+                block=int(timeout * 1000),
+            )
+        except Exception as e:
+            logger.error(f"Ошибка чтения из Redis (read_stream_group): {e}")
+            await self._reconnect()
+            return []
+
+        entries = response[0][1] if response else []
+        self.queue_stats.setdefault(stream_name, QueueStats()).add(len(entries))
+        return await self._decode_stream_entries(stream_name, group_name, entries)
+
+    async def claim_stale_stream_entries(
+        self,
+        stream_name: str,
+        group_name: str,
+        consumer_name: str,
+        min_idle_ms: int = 60000,
+        count: int = 1000,
+    ) -> list[tuple[bytes, dict]]:
+        """
+        Забирает себе сообщения, которые другие консьюмеры получили, но не подтвердили
+        за `min_idle_ms` (например, процесс упал посреди обработки).
+        """
+        try:
+            response = await self.redis.xautoclaim(
+                stream_name,
+                group_name,
+                consumer_name,
+                min_idle_time=min_idle_ms,
+                count=count,
+            )
+        except Exception as e:
+            logger.error(f"Ошибка чтения из Redis (claim_stale_stream_entries): {e}")
+            return []
+        return await self._decode_stream_entries(stream_name, group_name, response[1])
+
+    async def ack_stream(self, stream_name: str, group_name: str, ids: list[bytes]):
+        """Подтверждает обработку сообщений группы (XACK)."""
+        if ids:
+            await self.redis.xack(stream_name, group_name, *ids)
+
+    async def stream_length(self, stream_name: str) -> int:
+        """Текущая длина стрима."""
+        try:
+            return await self.redis.xlen(stream_name)
+        except Exception as e:
+            logger.error(f"Ошибка чтения из Redis (stream_length): {e}")
+            return 0
+
+    def _decode(self, data: bytes) -> dict | None:
+        try:
+            return self.queue_format.decode(data)
+        except Exception as e:
+            logger.error(
+                f"⚠ Не удалось декодировать запись очереди ({len(data)} байт): {e}"
+            )
+            return None
+
+    def _decode_messages(self, items: list[bytes]) -> list[dict]:
+        """Декодирует записи очереди; записи неизвестного формата пропускаются."""
+        messages = [self._decode(item) for item in items]
+        return [message for message in messages if message is not None]
+
+    async def _decode_stream_entries(
+        self, stream_name: str, group_name: str, entries: list
+    ) -> list[tuple[bytes, dict]]:
+        """
+        Декодирует записи стрима; удаленные (trimmed по MAXLEN) записи приходят без
+        полей. Записи неизвестного формата не возвращаются и не подтверждаются: они
+        остаются в pending, пока их не заберет обновленный консьюмер. Поврежденные
+        записи тоже не возвращаются, а после `stream_max_deliveries` доставок
+        переносятся в DEAD_LETTER_STREAM.
+        """
+        decoded = []
+        corrupt = []
+        for entry_id, fields in entries:
+            if not fields or STREAM_FIELD not in fields:
+                continue
+            data = fields[STREAM_FIELD]
+            try:
+                decoded.append((entry_id, self.queue_format.decode(data)))
+            except UnknownFormatError as e:
+                logger.error(
+                    f"⚠ Запись стрима {entry_id!r} ждет обновленного консьюмера: {e}"
+                )
+            except Exception as e:
+                logger.error(
+                    f"⚠ Поврежденная запись стрима {entry_id!r} ({len(data)} байт): {e}"
+                )
+                corrupt.append((entry_id, data, e))
+        if corrupt:
+            try:
+                await self._dead_letter(stream_name, group_name, corrupt)
+            except Exception as e:
+                logger.error(
+                    f"Ошибка переноса поврежденных записей в Redis (dead_letter): {e}"
+                )
+        return decoded
+
+    async def _dead_letter(
+        self,
+        stream_name: str,
+        group_name: str,
+        corrupt: list[tuple[bytes, bytes, Exception]],
+    ):
+        """
+        Переносит поврежденные записи, доставленные `stream_max_deliveries` раз, в
+        DEAD_LETTER_STREAM.
+        """
+        dead_letter = DEAD_LETTER_STREAM.format(stream=stream_name)
+        moved = []
+        for entry_id, data, error in corrupt:
+            pending = await self.redis.xpending_range(
+                stream_name, group_name, min=entry_id, max=entry_id, count=1
+            )
+            if pending and pending[0]["times_delivered"] < self.stream_max_deliveries:
+                continue
+            await self.redis.xadd(
+                dead_letter, {STREAM_FIELD: data, b"id": entry_id, b"error": str(error)}
+            )
+            moved.append(entry_id)
+        if moved:
+            await self.redis.xack(stream_name, group_name, *moved)
+            logger.warning(
+                f"⚠ {len(moved)} поврежденных записей {stream_name} перенесено в "
+                f"{dead_letter}"
+            )
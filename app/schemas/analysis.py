@@ -0,0 +1,81 @@
+"""."""
+
+import json
+import re
+import typing
+
+import pydantic
+
+from app.schemas.base import BaseSchema
+
+# Синонимы действий, которые модель использует вне строгого режима
+ACTIONS = {"long": "buy", "short": "sell", "wait": "hold", "neutral": "hold"}
+
+
+def _text(value: typing.Any) -> typing.Any:
+    """Вложенные объекты вне строгого режима сохраняются компактным JSON."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return value
+
+
+def _percent(value: typing.Any) -> typing.Any:
+    if isinstance(value, str) and (
+        match := re.fullmatch(r"\s*(-?\d+(?:[.,]\d+)?)\s*%?\s*", value)
+    ):
+        return float(match.group(1).replace(",", "."))
+    return value
+
+
+Text = typing.Annotated[str, pydantic.BeforeValidator(_text)]
+Percent = typing.Annotated[
+    float, pydantic.Field(ge=0, le=100), pydantic.BeforeValidator(_percent)
+]
+
+
+class IndexGPTSchema(BaseSchema):
+    """Index GPT: вероятности роста и падения цены в процентах."""
+
+    growth_probability: Percent
+    fall_probability: Percent
+
+
+class AnalysisResult(BaseSchema):
+    """
+    Ответ ChatGPT на запрос анализа. По этой модели строится JSON-схема ответа
+    (strict_json_schema), ответ валидируется в нее. Ключи финального анализа (final_*)
+    принимаются для совместимости.
+    """
+
+    technical_indicators: Text
+    candlestick_patterns: Text
+    index_gpt: IndexGPTSchema = pydantic.Field(
+        validation_alias=pydantic.AliasChoices(
+            "index_gpt", "final_index_gpt", "indexGpt"
+        )
+    )
+    recommended_action: typing.Literal["buy", "sell", "hold"] = pydantic.Field(
+        validation_alias=pydantic.AliasChoices(
+            "recommended_action", "final_recommended_action", "recommendedAction"
+        )
+    )
+    detailed_recommendations: Text = pydantic.Field(
+        validation_alias=pydantic.AliasChoices(
+            "detailed_recommendations",
+            "final_detailed_recommendations",
+            "detailedRecommendations",
+        )
+    )
+    decision_tree: Text | None = None
+
+    @pydantic.field_validator("recommended_action", mode="before")
+    @classmethod
+    def _action(cls, value: typing.Any) -> typing.Any:
+        if isinstance(value, str):
+            value = value.strip().lower()
+            return ACTIONS.get(value, value)
+        return value
+
+    @property
+    def growth_probability(self) -> float:
+        return self.index_gpt.growth_probability
@@ -1,4 +1,5 @@
 """."""
+
 import datetime
 
 from app.schemas.base import BaseSchema
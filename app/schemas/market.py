@@ -1,12 +1,14 @@
 """."""
+
 import datetime
+import typing
 
-from app.enums.market import MarketKindEnums
 from app.schemas.base import BaseSchema
 
 
 class MarketSchema(BaseSchema):
     """."""
+
     id: int
     currency: str
     created: datetime.datetime
@@ -20,14 +22,123 @@ class MarketCreateSchema(BaseSchema):
     data: dict
 
 
+class BybitMessage(typing.TypedDict):
+    """
+    Сообщение топика Bybit на входе ingest. Проверяется один раз при декодировании
+    (app.resources.codec), дальше передается обычным dict без моделей Pydantic.
+    """
+
+    topic: str
+    ts: int
+    data: typing.Any
+    type: typing.NotRequired[str]
+    cts: typing.NotRequired[int]
+
+
+class MarketRecord(typing.NamedTuple):
+    """Строка JSONB-таблицы market в порядке колонок COPY, data — готовый JSON."""
+
+    currency: str
+    created: datetime.datetime
+    kind: str
+    data: str
+
+
+class KlineSchema(BaseSchema):
+    """."""
+
+    id: int
+    currency: str
+    interval: str
+    start: datetime.datetime
+    end: datetime.datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    turnover: float
+    created: datetime.datetime
+
+
+class PublicTradeSchema(BaseSchema):
+    """."""
+
+    id: int
+    currency: str
+    ts: datetime.datetime
+    trade_id: str
+    side: str
+    price: float
+    size: float
+    tick_direction: str
+    block_trade: bool
+    created: datetime.datetime
+
+
+class OrderbookSnapshotSchema(BaseSchema):
+    """."""
+
+    id: int
+    currency: str
+    ts: datetime.datetime
+    type: str
+    update_id: int
+    seq: int
+    bid_prices: list[float]
+    bid_sizes: list[float]
+    ask_prices: list[float]
+    ask_sizes: list[float]
+    created: datetime.datetime
+
+
+class LiquidationSchema(BaseSchema):
+    """."""
+
+    id: int
+    currency: str
+    ts: datetime.datetime
+    side: str
+    price: float
+    size: float
+    created: datetime.datetime
+
+
+class MarketRollupSchema(BaseSchema):
+    """."""
+
+    id: int
+    currency: str
+    resolution: str
+    bucket: datetime.datetime
+    open: float | None
+    high: float | None
+    low: float | None
+    close: float | None
+    volume: float
+    turnover: float
+    trades: int
+    buy_volume: float
+    sell_volume: float
+    liquidations: int
+    liquidation_volume: float
+
+
 class AggregatedGroup(BaseSchema):
     """."""
+
     entries: list[MarketSchema]
     count: int
 
 
 class AggregatedMarketData(BaseSchema):
     """."""
+
     currency: str
     time_range: str
     grouped_data: dict[str, AggregatedGroup]
+    orderbook: dict | None = None
+    summary: dict | None = None
+    history: list[MarketRollupSchema] | None = None
+    indicators: dict | None = None
+    patterns: list[dict] | None = None
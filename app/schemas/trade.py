@@ -1,4 +1,5 @@
 """."""
+
 import datetime
 
 from app.schemas.base import BaseSchema
@@ -6,6 +7,7 @@ from app.schemas.base import BaseSchema
 
 class TradeRecommendationSchema(BaseSchema):
     """."""
+
     id: int
     currency: str
     recommended: datetime.datetime
@@ -16,6 +18,7 @@ class TradeRecommendationSchema(BaseSchema):
 
 class TradeSchema(BaseSchema):
     """."""
+
     id: int
     currency: str
     opened: datetime.datetime
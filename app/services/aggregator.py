@@ -0,0 +1,373 @@
+"""."""
+
+import collections
+import logging
+import time
+import typing
+
+from app.services.market_parser import liquidation_keys
+
+logger = logging.getLogger(__name__)
+
+# Ключ Redis, под которым публикуется агрегат символа за окно
+AGGREGATE_KEY = "market:aggregate:{symbol}:{minutes}"
+# Ключ Redis с корзинами символа для восстановления окон после перезапуска
+AGGREGATE_STATE_KEY = "market:aggregate_state:{symbol}"
+
+BUCKET_MS = 60_000
+
+ADDITIVE_FIELDS = (
+    "volume",
+    "turnover",
+    "trades",
+    "buy_volume",
+    "sell_volume",
+    "liquidations",
+    "liquidation_volume",
+    "liquidation_buy_volume",
+    "liquidation_sell_volume",
+    "orderbook_samples",
+    "spread_sum",
+    "imbalance_sum",
+)
+
+
+class Bucket:
+    """Минутная корзина статистики по символу."""
+
+    __slots__ = ("start", "open", "high", "low", "close", "last_mid") + ADDITIVE_FIELDS
+
+    def __init__(self, start: int):
+        self.start = start
+        self.open: float | None = None
+        self.high: float | None = None
+        self.low: float | None = None
+        self.close: float | None = None
+        self.last_mid: float | None = None
+        for field in ADDITIVE_FIELDS:
+            setattr(self, field, 0.0)
+
+    def to_list(self) -> list:
+        """Значения полей по порядку __slots__ для сохранения в Redis."""
+        return [getattr(self, field) for field in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values: list) -> "Bucket":
+        bucket = cls(values[0])
+        for field, value in zip(cls.__slots__, values):
+            setattr(bucket, field, value)
+        return bucket
+
+
+class RollingWindow:
+    """
+    Скользящее окно из минутных корзин.
+
+    Суммы аддитивных полей поддерживаются инкрементально (добавление/вычитание корзины),
+    максимум и минимум — монотонными очередями, поэтому запрос к окну выполняется за
+    O(1).
+    """
+
+    def __init__(self, minutes: int):
+        self.minutes = minutes
+        self.buckets: collections.deque[Bucket] = collections.deque()
+        self.totals = dict.fromkeys(ADDITIVE_FIELDS, 0.0)
+        self._highs: collections.deque[tuple[int, float]] = collections.deque()
+        self._lows: collections.deque[tuple[int, float]] = collections.deque()
+        # (начало корзины, open, close) для корзин, в которых были сделки
+        self._prices: collections.deque[tuple[int, float, float]] = collections.deque()
+
+    def push(self, bucket: Bucket):
+        """Добавляет закрытую корзину."""
+        self.buckets.append(bucket)
+        for field in ADDITIVE_FIELDS:
+            self.totals[field] += getattr(bucket, field)
+        if bucket.high is not None:
+            while self._highs and self._highs[-1][1] <= bucket.high:
+                self._highs.pop()
+            self._highs.append((bucket.start, bucket.high))
+            while self._lows and self._lows[-1][1] >= bucket.low:
+                self._lows.pop()
+            self._lows.append((bucket.start, bucket.low))
+            self._prices.append((bucket.start, bucket.open, bucket.close))
+
+    def evict(self, current_start: int):
+        """Удаляет корзины, вышедшие за окно относительно текущей минуты."""
+        threshold = current_start - (self.minutes - 1) * BUCKET_MS
+        while self.buckets and self.buckets[0].start < threshold:
+            bucket = self.buckets.popleft()
+            for field in ADDITIVE_FIELDS:
+                self.totals[field] -= getattr(bucket, field)
+        while self._highs and self._highs[0][0] < threshold:
+            self._highs.popleft()
+        while self._lows and self._lows[0][0] < threshold:
+            self._lows.popleft()
+        while self._prices and self._prices[0][0] < threshold:
+            self._prices.popleft()
+
+    def summary(self, current: Bucket | None) -> dict:
+        """Агрегат окна с учетом текущей (незакрытой) корзины."""
+        totals = dict(self.totals)
+        highs = [self._highs[0][1]] if self._highs else []
+        lows = [self._lows[0][1]] if self._lows else []
+        opens = [self._prices[0][1]] if self._prices else []
+        close = self._prices[-1][2] if self._prices else None
+        last_mid = self.buckets[-1].last_mid if self.buckets else None
+        since = self.buckets[0].start if self.buckets else None
+
+        if current is not None:
+            for field in ADDITIVE_FIELDS:
+                totals[field] += getattr(current, field)
+            if current.high is not None:
+                highs.append(current.high)
+                lows.append(current.low)
+                opens.append(current.open)
+                close = current.close
+            last_mid = current.last_mid if current.last_mid is not None else last_mid
+            since = since if since is not None else current.start
+
+        volume = totals["volume"]
+        samples = totals["orderbook_samples"]
+        return {
+            "window_minutes": self.minutes,
+            "since": since,
+            "open": opens[0] if opens else None,
+            "high": max(highs) if highs else None,
+            "low": min(lows) if lows else None,
+            "close": close,
+            "volume": volume,
+            "vwap": totals["turnover"] / volume if volume else None,
+            "trades": int(totals["trades"]),
+            "buy_volume": totals["buy_volume"],
+            "sell_volume": totals["sell_volume"],
+            "liquidations": int(totals["liquidations"]),
+            "liquidation_volume": totals["liquidation_volume"],
+            "liquidation_buy_volume": totals["liquidation_buy_volume"],
+            "liquidation_sell_volume": totals["liquidation_sell_volume"],
+            "avg_spread": totals["spread_sum"] / samples if samples else None,
+            "avg_imbalance": totals["imbalance_sum"] / samples if samples else None,
+            "last_mid": last_mid,
+        }
+
+
+def window_covered(summary: dict, minutes: int, now_ms: int | None = None) -> bool:
+    """
+    Покрывают ли данные агрегата все окно `minutes` минут до `now_ms`.
+    После перезапуска без восстановленного состояния окно покрыто только с первой полной
+    минуты.
+    """
+    covered_since = summary.get("covered_since")
+    if covered_since is None:
+        return False
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    current_start = now_ms - now_ms % BUCKET_MS
+    return covered_since <= current_start - (minutes - 1) * BUCKET_MS
+
+
+class SymbolAggregator:
+    """
+    Инкрементальная статистика одного символа по нескольким окнам.
+
+    `covered_since` — начало минуты, с которой корзины содержат все данные символа:
+    первая полная минута после запуска или момент из восстановленного состояния.
+    """
+
+    def __init__(self, symbol: str, windows: typing.Iterable[int]):
+        self.symbol = symbol
+        self.windows = {minutes: RollingWindow(minutes) for minutes in windows}
+        self.current: Bucket | None = None
+        self.covered_since: int | None = None
+
+    def _bucket(self, ts_ms: int) -> Bucket | None:
+        """
+        Корзина для метки времени; при смене минуты закрывает текущую. Запоздавшие
+        данные отбрасываются.
+        """
+        start = ts_ms - ts_ms % BUCKET_MS
+        if self.current is None:
+            self.current = Bucket(start)
+            if self.covered_since is None:
+                # Первая минута после запуска неполная
+                self.covered_since = start + BUCKET_MS
+        elif start > self.current.start:
+            for window in self.windows.values():
+                window.push(self.current)
+                window.evict(start)
+            self.current = Bucket(start)
+        elif start < self.current.start:
+            return None
+        return self.current
+
+    def on_trade(self, ts_ms: int, price: float, size: float, side: str):
+        """Учитывает публичную сделку."""
+        bucket = self._bucket(ts_ms)
+        if bucket is None:
+            return
+        if bucket.open is None:
+            bucket.open = bucket.high = bucket.low = price
+        else:
+            bucket.high = max(bucket.high, price)
+            bucket.low = min(bucket.low, price)
+        bucket.close = price
+        bucket.volume += size
+        bucket.turnover += price * size
+        bucket.trades += 1
+        if side == "Buy":
+            bucket.buy_volume += size
+        else:
+            bucket.sell_volume += size
+
+    def on_liquidation(self, ts_ms: int, size: float, side: str):
+        """Учитывает ликвидацию."""
+        bucket = self._bucket(ts_ms)
+        if bucket is None:
+            return
+        bucket.liquidations += 1
+        bucket.liquidation_volume += size
+        if side == "Buy":
+            bucket.liquidation_buy_volume += size
+        else:
+            bucket.liquidation_sell_volume += size
+
+    def on_orderbook(
+        self,
+        ts_ms: int,
+        mid: float | None,
+        spread: float | None,
+        imbalance: float | None,
+    ):
+        """Учитывает состояние стакана."""
+        bucket = self._bucket(ts_ms)
+        if bucket is None or spread is None or imbalance is None:
+            return
+        bucket.orderbook_samples += 1
+        bucket.spread_sum += spread
+        bucket.imbalance_sum += imbalance
+        bucket.last_mid = mid
+
+    def summary(self, minutes: int, now_ms: int | None = None) -> dict | None:
+        """Агрегат за окно `minutes` минут; None, если окно не настроено."""
+        window = self.windows.get(minutes)
+        if window is None:
+            return None
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        current_start = now_ms - now_ms % BUCKET_MS
+        window.evict(current_start)
+        current = (
+            self.current
+            if self.current is not None
+            and self.current.start >= current_start - (minutes - 1) * BUCKET_MS
+            else None
+        )
+        return {
+            "symbol": self.symbol,
+            **window.summary(current),
+            "covered_since": self.covered_since,
+        }
+
+    def state(self, now_ms: int | None = None) -> dict:
+        """
+        Корзины самого длинного окна и текущая корзина для восстановления после
+        перезапуска.
+        """
+        longest = max(
+            self.windows.values(), key=lambda window: window.minutes, default=None
+        )
+        buckets = list(longest.buckets) if longest is not None else []
+        if self.current is not None:
+            buckets.append(self.current)
+        return {
+            "saved_at": now_ms if now_ms is not None else int(time.time() * 1000),
+            "covered_since": self.covered_since,
+            "buckets": [bucket.to_list() for bucket in buckets],
+        }
+
+    def restore(
+        self, state: dict, now_ms: int | None = None, max_gap_ms: int = BUCKET_MS
+    ):
+        """
+        Восстанавливает окна из state(). Вызывается до поступления данных символа.
+
+        :param max_gap_ms: Если состояние сохранено раньше, данные за перерыв считаются
+            потерянными и окно покрыто только с первой полной минуты после перезапуска.
+        """
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        current_start = now_ms - now_ms % BUCKET_MS
+        for values in state["buckets"]:
+            bucket = Bucket.from_list(values)
+            if bucket.start >= current_start:
+                self.current = bucket
+                continue
+            for window in self.windows.values():
+                window.push(bucket)
+        for window in self.windows.values():
+            window.evict(current_start)
+        if now_ms - state["saved_at"] <= max_gap_ms:
+            self.covered_since = state["covered_since"]
+        else:
+            self.covered_since = current_start + BUCKET_MS
+
+
+class MarketAggregator:
+    """
+    Потоковая агрегация рыночных данных по символам.
+
+    Сообщения Bybit разбираются по префиксу топика: publicTrade и liquidation обновляют
+    корзины напрямую, состояние стакана передается через on_orderbook.
+    """
+
+    def __init__(self, windows: typing.Iterable[int] = (5, 1440)):
+        self.windows = tuple(windows)
+        self.symbols: dict[str, SymbolAggregator] = {}
+
+    def get(self, symbol: str) -> SymbolAggregator:
+        aggregator = self.symbols.get(symbol)
+        if aggregator is None:
+            aggregator = self.symbols[symbol] = SymbolAggregator(symbol, self.windows)
+        return aggregator
+
+    def apply(self, message: dict):
+        """Учитывает сообщение сделок или ликвидаций."""
+        topic = message.get("topic", "")
+        data = message.get("data")
+        if not data:
+            return
+        items = data if isinstance(data, list) else [data]
+        if topic.startswith("publicTrade"):
+            for trade in items:
+                self.get(trade["s"]).on_trade(
+                    int(trade["T"]), float(trade["p"]), float(trade["v"]), trade["S"]
+                )
+        elif topic.startswith("liquidation") or topic.startswith("allLiquidation"):
+            for liquidation in items:
+                symbol, ts, side, _, size = liquidation_keys(liquidation)
+                ts = liquidation.get(ts)
+                if ts is None:
+                    ts = message.get("ts")
+                self.get(liquidation[symbol]).on_liquidation(
+                    int(ts), float(liquidation[size]), liquidation[side]
+                )
+
+    def on_orderbook(
+        self,
+        symbol: str,
+        ts_ms: int,
+        mid: float | None,
+        spread: float | None,
+        imbalance: float | None,
+    ):
+        """Учитывает состояние стакана символа."""
+        self.get(symbol).on_orderbook(ts_ms, mid, spread, imbalance)
+
+    def summaries(
+        self, now_ms: int | None = None
+    ) -> typing.Iterator[tuple[str, int, dict]]:
+        """Агрегаты всех символов по всем окнам: (символ, окно, агрегат)."""
+        for symbol, aggregator in self.symbols.items():
+            for minutes in self.windows:
+                yield symbol, minutes, aggregator.summary(minutes, now_ms)
+
+    def states(self, now_ms: int | None = None) -> typing.Iterator[tuple[str, dict]]:
+        """Состояния всех символов для сохранения: (символ, состояние)."""
+        for symbol, aggregator in self.symbols.items():
+            yield symbol, aggregator.state(now_ms)
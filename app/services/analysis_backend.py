@@ -0,0 +1,197 @@
+"""."""
+
+import math
+import typing
+
+from app.schemas.analysis import AnalysisResult
+from app.services.indicators import ATR_PERIOD, EMA_PERIODS, RSI_PERIOD
+
+# Веса сигналов локальной оценки; отсутствующие сигналы исключаются, веса остальных
+# нормируются
+WEIGHTS = {
+    "trend": 0.25,
+    "momentum": 0.2,
+    "rsi": 0.15,
+    "bollinger": 0.1,
+    "vwap": 0.1,
+    "patterns": 0.1,
+    "orderbook": 0.1,
+}
+SIGNAL_VALUES = {"bullish": 1.0, "bearish": -1.0, "neutral": 0.0}
+# Стоп-лосс и тейк-профит в ATR
+STOP_ATR = 1.5
+TAKE_ATR = 3.0
+
+
+class AnalysisBackend(typing.Protocol):
+    """Источник торговых рекомендаций по агрегированным рыночным данным."""
+
+    # Имя для настроек и логов
+    name: str
+    # Нужны ли сырые записи окна (grouped_data, history) или достаточно индикаторов,
+    # паттернов и стакана
+    raw_data: bool
+
+    async def recommend(
+        self, aggregated_data: dict, previous_recommendation: dict | None = None
+    ) -> AnalysisResult: ...
+
+
+def _clip(value: float) -> float:
+    return max(-1.0, min(1.0, value))
+
+
+def _number(data: dict, key: str) -> float | None:
+    value = data.get(key)
+    if value is None or isinstance(value, bool):
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+class RuleBasedBackend:
+    """
+    Локальная оценка без вызова модели: взвешенная сумма сигналов индикаторов, свечных
+    паттернов и дисбаланса стакана в диапазоне [-1, 1].
+
+    - trend: EMA(20) - EMA(50) в ATR;
+    - momentum: гистограмма MACD в ATR;
+    - rsi: (50 - RSI) / 20, перекупленность — сигнал на продажу;
+    - bollinger: положение цены в канале, у нижней границы — на покупку;
+    - vwap: отклонение цены от VWAP в ATR;
+    - patterns: среднее направление паттернов окна;
+    - orderbook: дисбаланс объемов стакана по первым уровням.
+
+    Вероятность роста 50 + 50 * оценка; buy/sell при оценке за пределами ±`threshold`,
+    иначе hold. Стоп-лосс и тейк-профит — STOP_ATR и TAKE_ATR от цены закрытия.
+    """
+
+    name = "local"
+    raw_data = False
+
+    def __init__(self, threshold: float = 0.2, weights: dict[str, float] | None = None):
+        """
+        :param threshold: Порог оценки для buy/sell.
+        :param weights: Веса сигналов, по умолчанию WEIGHTS.
+        """
+        self.threshold = threshold
+        self.weights = weights if weights is not None else WEIGHTS
+
+    def signals(self, aggregated_data: dict) -> dict[str, float]:
+        """Сигналы в диапазоне [-1, 1] по доступным данным."""
+        indicators = aggregated_data.get("indicators") or {}
+        close = _number(indicators, "close")
+        atr = _number(indicators, f"atr_{ATR_PERIOD}")
+        signals = {}
+
+        fast, slow = (_number(indicators, f"ema_{period}") for period in EMA_PERIODS)
+        macd_hist = _number(indicators, "macd_hist")
+        vwap = _number(indicators, "vwap")
+        if atr:
+            if fast is not None and slow is not None:
+                signals["trend"] = _clip((fast - slow) / atr)
+            if macd_hist is not None:
+                signals["momentum"] = _clip(macd_hist / atr)
+            if close is not None and vwap is not None:
+                signals["vwap"] = _clip((close - vwap) / atr)
+
+        rsi = _number(indicators, f"rsi_{RSI_PERIOD}")
+        if rsi is not None:
+            signals["rsi"] = _clip((50 - rsi) / 20)
+
+        upper, middle = _number(indicators, "bb_upper"), _number(
+            indicators, "bb_middle"
+        )
+        if (
+            close is not None
+            and upper is not None
+            and middle is not None
+            and upper > middle
+        ):
+            signals["bollinger"] = _clip((middle - close) / (upper - middle))
+
+        patterns = aggregated_data.get("patterns") or []
+        if patterns:
+            signals["patterns"] = sum(
+                SIGNAL_VALUES.get(item.get("signal"), 0.0) for item in patterns
+            ) / len(patterns)
+
+        orderbook = aggregated_data.get("orderbook") or {}
+        imbalance = _number(orderbook, "imbalance_10")
+        if imbalance is None:
+            imbalance = _number(orderbook, "imbalance")
+        if imbalance is not None:
+            signals["orderbook"] = _clip(imbalance)
+        return signals
+
+    def score(self, signals: dict[str, float]) -> float:
+        """Взвешенная оценка сигналов в диапазоне [-1, 1]."""
+        total = sum(self.weights.get(name, 0.0) for name in signals)
+        if not total:
+            return 0.0
+        return (
+            sum(self.weights.get(name, 0.0) * value for name, value in signals.items())
+            / total
+        )
+
+    async def recommend(
+        self, aggregated_data: dict, previous_recommendation: dict | None = None
+    ) -> AnalysisResult:
+        """
+        Рекомендация по индикаторам, паттернам и стакану.
+
+        :param aggregated_data: Агрегированные рыночные данные.
+        :param previous_recommendation: Не используется: оценка строится только по
+            текущим данным.
+        :raises ValueError: Нет индикаторов (недостаточно свечей).
+        """
+        if (
+            not aggregated_data.get("indicators")
+            or aggregated_data["indicators"].get("candles") == 0
+        ):
+            raise ValueError(
+                "Недостаточно данных для локального анализа "
+                f"{aggregated_data.get('currency')}"
+            )
+
+        signals = self.signals(aggregated_data)
+        score = self.score(signals)
+        if score >= self.threshold:
+            action = "buy"
+        elif score <= -self.threshold:
+            action = "sell"
+        else:
+            action = "hold"
+
+        indicators = aggregated_data["indicators"]
+        close = _number(indicators, "close")
+        atr = _number(indicators, f"atr_{ATR_PERIOD}")
+        if action == "hold" or close is None or not atr:
+            details = "Без позиции: сигналы не дают перевеса."
+        else:
+            side = 1 if action == "buy" else -1
+            details = (
+                f"{'Длинная' if side > 0 else 'Короткая'} позиция от {close:.6g}, "
+                f"стоп-лосс {close - side * STOP_ATR * atr:.6g}, тейк-профит "
+                f"{close + side * TAKE_ATR * atr:.6g} (риск/прибыль "
+                f"1:{TAKE_ATR / STOP_ATR:g}); плечо — не больше 1% риска депозита на "
+                "стоп."
+            )
+
+        patterns = aggregated_data.get("patterns") or []
+        return AnalysisResult(
+            technical_indicators=", ".join(
+                f"{name}={value:+.2f}" for name, value in signals.items()
+            ),
+            candlestick_patterns=", ".join(
+                f"{item['pattern']} ({item.get('signal')})" for item in patterns
+            )
+            or "не найдены",
+            index_gpt={
+                "growth_probability": round(50 + 50 * score, 2),
+                "fall_probability": round(50 - 50 * score, 2),
+            },
+            recommended_action=action,
+            detailed_recommendations=details,
+            decision_tree=f"score={score:+.3f}, порог ±{self.threshold:g} -> {action}",
+        )
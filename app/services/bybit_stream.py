@@ -1,129 +1,518 @@
 import asyncio
+import datetime
 import logging
+import os
+import socket
 import time
+from collections import defaultdict
 
 from app.enums.market import TOP_20_SYMBOLS
-from app.resources.bybit import BybitWebSocket
+from app.models.base import Base
+from app.models.market import Market
+from app.resources.bybit import BybitWebSocketPool
+from app.resources.codec import get_codec
 from app.resources.redis_client import RedisClient
-from app.schemas.market import MarketCreateSchema
+from app.schemas.market import BybitMessage
 from app.services.market import MarketService
+from app.services.aggregator import AGGREGATE_KEY, AGGREGATE_STATE_KEY, MarketAggregator
+from app.services.indicators import CANDLE_FIELDS, INDICATORS_KEY, IndicatorEngine
+from app.services.ingest_buffer import IngestBuffer
+from app.services.market_parser import market_row, parse_message
+from app.services.market_writer import MarketBulkWriter
+from app.services.orderbook import ORDERBOOK_KEY, OrderBookManager
 
 logger = logging.getLogger(__name__)
 
+QUEUE_NAME = "websocket_messages"
+STREAM_NAME = "websocket_messages_stream"
+ORDERBOOK_DEPTH = 50
+# Свечей истории для начального состояния индикаторов (сутки — для VWAP)
+INDICATOR_HISTORY = 1440
+
 
 class WebSocketService:
     def __init__(
-            self,
-            market_service: MarketService,
-            bybit_ws: BybitWebSocket,
-            redis_client: RedisClient,
-            symbols=None
+        self,
+        market_service: MarketService,
+        bybit_ws: BybitWebSocketPool,
+        redis_client: RedisClient,
+        market_writer: MarketBulkWriter,
+        symbols=None,
+        consumer_batch_size: int = 1000,
+        consumer_block_timeout: float = 1.0,
+        stats_interval: float = 30.0,
+        transport: str = "list",
+        stream_maxlen: int | None = None,
+        consumer_group: str = "market_ingest",
+        consumer_name: str = "",
+        claim_idle_ms: int = 60000,
+        flush_size: int = 500,
+        flush_max_age_ms: int = 200,
+        buffer_capacity: int = 100000,
+        overflow_policy: str = "drop_oldest",
+        orderbook_publish_interval: float = 1.0,
+        aggregate_windows: tuple[int, ...] = (5, 1440),
+        aggregate_publish_interval: float = 5.0,
+        aggregate_persist_interval: float = 30.0,
+        write_jsonb: bool = False,
+        shard_index: int = 0,
+        shard_count: int = 1,
+        codec: str = "auto",
     ):
+        """
+        :param shard_index: Номер процесса среди `shard_count` процессов сбора: процесс
+            обслуживает символы с номерами shard_index, shard_index + shard_count, ...
+        :param shard_count: Число процессов сбора.
+        :param aggregate_persist_interval: Период (сек.) сохранения корзин скользящих
+            окон в Redis для восстановления после перезапуска.
+        :param codec: Кодек data для JSONB-таблицы market.
+        """
         self.market_service = market_service
+        self.market_writer = market_writer
         self.bybit_ws = bybit_ws
         self.redis_client = redis_client
-        self.symbols = symbols or TOP_20_SYMBOLS
+        self.symbols = list(symbols or TOP_20_SYMBOLS)[shard_index::shard_count]
+        self.shard_index = shard_index
+        self.shard_count = shard_count
         self.is_running = True
+        self.consumer_batch_size = consumer_batch_size
+        self.consumer_block_timeout = consumer_block_timeout
+        self.stats_interval = stats_interval
+
+        # Транспорт сообщений: список (один консьюмер) или Redis Stream с группой
+        # консьюмеров
+        self.transport = transport
+        self.stream_maxlen = stream_maxlen
+        self.consumer_group = consumer_group
+        self.consumer_name = consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_idle_ms = claim_idle_ms
+
+        # Буфер сообщений WebSocket -> Redis: сброс по размеру или по возрасту, одна
+        # задача-флашер
+        self.ingest_buffer = IngestBuffer(
+            sink=self.flush_to_redis,
+            max_size=flush_size,
+            max_age_ms=flush_max_age_ms,
+            capacity=buffer_capacity,
+            overflow_policy=overflow_policy,
+        )
 
-        # Убираем прямое хранение loop (или создаём сами, если нужно).
-        self.loop = asyncio.get_event_loop()
+        # Стаканы в памяти, собранные из snapshot + delta. Сводки публикуются в Redis
+        # для анализа.
+        self.orderbooks = OrderBookManager(on_gap=self._request_orderbook_snapshot)
+        self.orderbook_publish_interval = orderbook_publish_interval
 
-        self.message_buffer = []
-        self.batch_size = 10
+        # Скользящие агрегаты по окнам, публикуются в Redis вместо пересчета из сырых
+        # строк
+        self.aggregator = MarketAggregator(windows=aggregate_windows)
+        self.aggregate_publish_interval = aggregate_publish_interval
+        self.aggregate_persist_interval = aggregate_persist_interval
 
-    async def handle_message(self, message: dict):
+        # Индикаторы по закрытым минутным свечам, обновляются инкрементально и
+        # публикуются в Redis
+        self.indicators: dict[str, IndicatorEngine] = {}
+        self._indicators_updated: set[str] = set()
+
+        # Сообщения известных топиков пишутся в типизированные таблицы, JSONB — только
+        # по запросу
+        self.write_jsonb = write_jsonb
+        self.codec = get_codec(codec)
+
+        # Фоновые задачи: консьюмер Redis при остановке дожидается, остальные отменяются
+        self._consumer: asyncio.Task | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def handle_message(self, message: BybitMessage):
         """Обрабатывает входящие данные и записывает их в БД"""
-        if "data" in message:
+        await self.handle_messages([message])
+
+    async def handle_messages(self, messages: list[BybitMessage]):
+        """
+        Обрабатывает пакет входящих сообщений и передает их в пакетную запись БД.
+        Известные топики раскладываются по типизированным таблицам, остальные пишутся в
+        JSONB-таблицу market. Форма сообщений проверена при декодировании из Redis,
+        моделей Pydantic на сообщение не создается.
+        """
+        created = datetime.datetime.utcnow()
+        tables: defaultdict[type[Base], list[tuple]] = defaultdict(list)
+        for message in messages:
             try:
-                data = message["data"]
-                if isinstance(data, list):
-                    if not data:
-                        logger.warning(f"⚠ Пустой массив данных: {message}")
-                        return
-                    data = data[0]  # Берем первый элемент списка
-
-                payload = MarketCreateSchema(
-                    currency=message["topic"].split(".")[1],
-                    kind=message["topic"],
-                    data=data
-                )
-                await self.market_service.create(payload)
+                parsed = parse_message(message, created)
+                if parsed is not None:
+                    model, rows = parsed
+                    tables[model].extend(rows)
+                if parsed is None or self.write_jsonb:
+                    row = market_row(message, created, self.codec)
+                    if row is not None:
+                        tables[Market].append(row)
             except Exception as e:
                 logger.error(f"⚠ Ошибка обработки сообщения: {e}\nmessage: {message}")
+        for model, rows in tables.items():
+            await self.market_writer.add_rows(model, rows)
 
-    def _handle_sync_message(self, message: dict):
+    def _on_message(self, message: dict):
         """
-        Обертка для вызова add_to_redis в event loop.
-        Если bybit_ws вызывает этот колбэк из другого потока,
-        то нужен call_soon_threadsafe.
+        Обновляет стакан и агрегаты в памяти и кладет сообщение в буфер для Redis.
+        Вызывается соединением bybit_ws в event loop; задача на каждое сообщение не
+        создается: буфер сбрасывается своей фоновой задачей.
         """
-        self.loop.call_soon_threadsafe(asyncio.create_task, self.add_to_redis(message))
+        try:
+            if message.get("topic", "").startswith("orderbook"):
+                book = self.orderbooks.apply(message)
+                if book.is_synced:
+                    self.aggregator.on_orderbook(
+                        book.symbol,
+                        int(message["ts"]),
+                        book.mid,
+                        book.spread,
+                        book.imbalance(),
+                    )
+            elif message.get("topic", "").startswith("kline"):
+                self._on_kline(message)
+            else:
+                self.aggregator.apply(message)
+        except Exception as e:
+            logger.error(f"⚠ Ошибка обновления состояния рынка: {e}")
+        self.ingest_buffer.append(message)
 
-    async def add_to_redis(self, message: dict):
-        """Добавление сообщений в пакет"""
-        self.message_buffer.append(message)
-        if len(self.message_buffer) >= self.batch_size:
-            await self.flush_to_redis()
+    def _on_kline(self, message: dict):
+        """Обновляет индикаторы символа по закрытым свечам"""
+        symbol = message["topic"].rsplit(".", 1)[-1]
+        data = message.get("data") or []
+        for kline in data if isinstance(data, list) else [data]:
+            if not kline.get("confirm"):
+                continue
+            engine = self.indicators.get(symbol)
+            if engine is None:
+                engine = self.indicators[symbol] = IndicatorEngine(symbol)
+            if engine.update(
+                int(kline["start"]),
+                float(kline["high"]),
+                float(kline["low"]),
+                float(kline["close"]),
+                float(kline["volume"]),
+            ):
+                self._indicators_updated.add(symbol)
 
-    async def flush_to_redis(self):
-        """Запись пакета в Redis"""
-        if self.message_buffer:
+    async def seed_indicators(self):
+        """
+        Строит начальное состояние индикаторов по свечам из БД, чтобы не ждать разогрева
+        """
+        for symbol in self.symbols:
             try:
-                logger.info(f'Отправляю сообщения в redis')
-                # Вместо time.sleep(5) используем асинхронную паузу
-                await asyncio.sleep(5)
-                await self.redis_client.add_to_queue_batch('websocket_messages', self.message_buffer)
-                self.message_buffer.clear()
-                logger.info('Сообщения отправлены успешно')
+                async with self.market_service.db.session() as session:
+                    arrays = await self.market_service.get_kline_arrays(
+                        symbol, INDICATOR_HISTORY, session
+                    )
+                engine = self.indicators[symbol] = IndicatorEngine(symbol)
+                engine.seed(**{name: arrays[name] for name in CANDLE_FIELDS})
+                if engine.candles:
+                    self._indicators_updated.add(symbol)
             except Exception as e:
-                logger.error(f"Ошибка записи в Redis: {e}")
+                logger.error(f"⚠ Ошибка загрузки истории свечей {symbol}: {e}")
+
+    def _request_orderbook_snapshot(self, symbol: str):
+        """
+        Переподписывается на стакан символа, чтобы получить новый snapshot после разрыва
+        """
+        try:
+            self.bybit_ws.resubscribe(f"orderbook.{ORDERBOOK_DEPTH}.{symbol}")
+        except Exception as e:
+            logger.error(f"⚠ Не удалось запросить snapshot стакана {symbol}: {e}")
+
+    async def publish_orderbooks(self):
+        """Периодически публикует сводки стаканов в Redis"""
+        while self.is_running:
+            await asyncio.sleep(self.orderbook_publish_interval)
+            for symbol, summary in self.orderbooks.summaries().items():
+                try:
+                    await self.redis_client.set(
+                        ORDERBOOK_KEY.format(symbol=symbol),
+                        summary,
+                        expire=max(int(self.orderbook_publish_interval * 10), 10),
+                    )
+                except Exception as e:
+                    logger.error(f"⚠ Ошибка публикации стакана {symbol}: {e}")
+
+    async def flush_to_redis(self, messages: list[dict]):
+        """Запись пакета в Redis"""
+        if self.transport == "stream":
+            await self.redis_client.add_to_stream_batch(
+                STREAM_NAME, messages, self.stream_maxlen
+            )
         else:
-            logger.debug("Буфер пустой, нет данных для записи в Redis.")
+            await self.redis_client.add_to_queue_batch(
+                QUEUE_NAME, messages, batch_size=len(messages)
+            )
+        logger.debug(f"Отправлено в Redis {len(messages)} сообщений")
 
     async def process_redis_queue(self):
         """Фоновая задача для обработки очереди Redis и записи данных в БД"""
         while self.is_running:
             try:
-                message = await self.redis_client.pop_from_queue('websocket_messages')
-                if message:
-                    await self.handle_message(message)
+                messages = await self.redis_client.pop_batch_from_queue(
+                    QUEUE_NAME,
+                    count=self.consumer_batch_size,
+                    timeout=self.consumer_block_timeout,
+                )
+                if messages:
+                    await self.handle_messages(messages)
             except Exception as e:
                 logger.error(f"⚠ Ошибка при обработке очереди Redis: {e}")
-            await asyncio.sleep(1)
+                await asyncio.sleep(1)
+
+    async def process_redis_stream(self):
+        """
+        Фоновая задача обработки Redis Stream в группе консьюмеров.
+
+        Сообщения подтверждаются (XACK) только после записи в БД, поэтому при падении
+        процесса они остаются в pending и забираются другим консьюмером через
+        XAUTOCLAIM.
+        """
+        await self.redis_client.ensure_consumer_group(STREAM_NAME, self.consumer_group)
+        last_claim = 0.0
+        while self.is_running:
+            try:
+                entries = []
+                if time.monotonic() - last_claim >= self.claim_idle_ms / 1000:
+                    entries = await self.redis_client.claim_stale_stream_entries(
+                        STREAM_NAME,
+                        self.consumer_group,
+                        self.consumer_name,
+                        min_idle_ms=self.claim_idle_ms,
+                        count=self.consumer_batch_size,
+                    )
+                    last_claim = time.monotonic()
+                    if entries:
+                        logger.warning(
+                            f"Забрано {len(entries)} неподтвержденных сообщений других "
+                            "консьюмеров"
+                        )
+                if not entries:
+                    entries = await self.redis_client.read_stream_group(
+                        STREAM_NAME,
+                        self.consumer_group,
+                        self.consumer_name,
+                        count=self.consumer_batch_size,
+                        timeout=self.consumer_block_timeout,
+                    )
+                if not entries:
+                    continue
+
+                await self.handle_messages([message for _, message in entries])
+                if await self.market_writer.flush(requeue=False):
+                    await self.redis_client.ack_stream(
+                        STREAM_NAME,
+                        self.consumer_group,
+                        [entry_id for entry_id, _ in entries],
+                    )
+            except Exception as e:
+                logger.error(f"⚠ Ошибка при обработке стрима Redis: {e}")
+                await asyncio.sleep(1)
+
+    async def restore_aggregates(self):
+        """
+        Восстанавливает скользящие окна символов из состояния, сохраненного до
+        перезапуска
+        """
+        for symbol in self.symbols:
+            try:
+                state = await self.redis_client.get(
+                    AGGREGATE_STATE_KEY.format(symbol=symbol)
+                )
+                if state is not None:
+                    self.aggregator.get(symbol).restore(state)
+                    logger.info(
+                        f"Восстановлено {len(state['buckets'])} минутных корзин "
+                        f"агрегатов {symbol}"
+                    )
+            except Exception as e:
+                logger.error(f"⚠ Ошибка восстановления агрегатов {symbol}: {e}")
+
+    async def persist_aggregates(self):
+        """Сохраняет корзины скользящих окон в Redis на время самого длинного окна"""
+        expire = max(self.aggregator.windows, default=0) * 60 + 600
+        for symbol, state in self.aggregator.states():
+            try:
+                await self.redis_client.set(
+                    AGGREGATE_STATE_KEY.format(symbol=symbol), state, expire=expire
+                )
+            except Exception as e:
+                logger.error(f"⚠ Ошибка сохранения агрегатов {symbol}: {e}")
+
+    async def publish_aggregates(self):
+        """
+        Периодически публикует скользящие агрегаты символов и сохраняет их состояние в
+        Redis
+        """
+        last_persist = time.monotonic()
+        while self.is_running:
+            await asyncio.sleep(self.aggregate_publish_interval)
+            if time.monotonic() - last_persist >= self.aggregate_persist_interval:
+                await self.persist_aggregates()
+                last_persist = time.monotonic()
+            for symbol, minutes, summary in self.aggregator.summaries():
+                try:
+                    await self.redis_client.set(
+                        AGGREGATE_KEY.format(symbol=symbol, minutes=minutes),
+                        summary,
+                        expire=max(int(self.aggregate_publish_interval * 10), 60),
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"⚠ Ошибка публикации агрегата {symbol} за {minutes} мин.: {e}"
+                    )
+
+    async def publish_indicators(self):
+        """Периодически публикует обновленные индикаторы символов в Redis"""
+        while self.is_running:
+            await asyncio.sleep(self.aggregate_publish_interval)
+            updated, self._indicators_updated = self._indicators_updated, set()
+            for symbol in updated:
+                try:
+                    await self.redis_client.set(
+                        INDICATORS_KEY.format(symbol=symbol),
+                        self.indicators[symbol].snapshot(),
+                        expire=180,
+                    )
+                except Exception as e:
+                    logger.error(f"⚠ Ошибка публикации индикаторов {symbol}: {e}")
+
+    async def queue_stats(self) -> dict:
+        """Глубина очереди и скорость ее вычитывания"""
+        if self.transport == "stream":
+            name = STREAM_NAME
+            depth = await self.redis_client.stream_length(STREAM_NAME)
+        else:
+            name = QUEUE_NAME
+            depth = await self.redis_client.queue_length(QUEUE_NAME)
+        stats = self.redis_client.queue_stats.get(name)
+        return {
+            "depth": depth,
+            "drained_total": stats.total if stats else 0,
+            "drain_rate": round(stats.rate, 2) if stats else 0.0,
+            "ingest_buffered": len(self.ingest_buffer),
+            "ingest_dropped": self.ingest_buffer.dropped,
+            "db_pending": self.market_writer.pending,
+            "db_written": self.market_writer.rows_written,
+            "connections": self.bybit_ws.stats(),
+        }
+
+    async def report_queue_stats(self):
+        """Периодически логирует отставание консьюмера и публикует статистику в Redis"""
+        while self.is_running:
+            await asyncio.sleep(self.stats_interval)
+            try:
+                stats = await self.queue_stats()
+                connections = stats["connections"]
+                lags = [
+                    connection["max_lag_ms"]
+                    for connection in connections
+                    if connection["max_lag_ms"] is not None
+                ]
+                logger.info(
+                    f"Очередь {self.transport}: глубина {stats['depth']}, "
+                    f"скорость {stats['drain_rate']} сообщ./с, в буфере БД "
+                    f"{stats['db_pending']}; WebSocket: {len(connections)} соединений, "
+                    f"{sum(connection['rate'] for connection in connections):.0f} "
+                    "сообщ./с"
+                    + (f", макс. задержка {max(lags):.0f} мс" if lags else "")
+                )
+                await self.redis_client.set(
+                    f"{QUEUE_NAME}:stats:{self.consumer_name}",
+                    stats,
+                    expire=int(self.stats_interval * 2),
+                )
+            except Exception as e:
+                logger.error(f"⚠ Ошибка сбора статистики очереди: {e}")
 
     async def start(self):
         """Запускает подписку на WebSocket и обработку сообщений из Redis"""
         # Подключаемся к Redis
         await self.redis_client.connect()
 
+        # Запускаем пакетную запись в БД. В режиме стрима буфер сбрасывается консьюмером
+        # перед XACK, чтобы подтверждать только записанные сообщения.
+        if self.transport != "stream":
+            await self.market_writer.start()
+
+        # Запускаем сброс буфера WebSocket -> Redis
+        await self.ingest_buffer.start()
+
         # Запускаем фоновую задачу обработки очереди Redis
-        asyncio.create_task(self.process_redis_queue())
+        if self.transport == "stream":
+            self._consumer = asyncio.create_task(self.process_redis_stream())
+        else:
+            self._consumer = asyncio.create_task(self.process_redis_queue())
+        self._tasks.append(asyncio.create_task(self.report_queue_stats()))
+        self._tasks.append(asyncio.create_task(self.publish_orderbooks()))
+        # Окна восстанавливаются до подписки, пока по символам нет новых данных
+        await self.restore_aggregates()
+        self._tasks.append(asyncio.create_task(self.publish_aggregates()))
+        await self.seed_indicators()
+        self._tasks.append(asyncio.create_task(self.publish_indicators()))
 
-        # Подключаемся к WebSocket и подписываемся на нужные топики
+        # Подключаемся к WebSocket и подписываемся на нужные топики: соединения пула
+        # открываются параллельно, подписки отправляются пачками
         while self.is_running:
             try:
-                for symbol in self.symbols:
-                    self.bybit_ws.subscribe_orderbook(symbol=symbol, callback=self._handle_sync_message)
-                    self.bybit_ws.subscribe_trades(symbol=symbol, callback=self._handle_sync_message)
-                    self.bybit_ws.subscribe_candles(symbol=symbol, interval=1, callback=self._handle_sync_message)
-                    self.bybit_ws.subscribe_liquidations(symbol=symbol, callback=self._handle_sync_message)
-                    await asyncio.sleep(5)
+                await self.bybit_ws.subscribe(
+                    self.symbols, self._on_message, depth=ORDERBOOK_DEPTH, interval=1
+                )
 
-                logger.info(f"✅ Подписаны на {len(self.symbols)} валютных пар")
+                logger.info(
+                    f"✅ Подписаны на {len(self.symbols)} валютных пар"
+                    + (
+                        f" (процесс {self.shard_index + 1}/{self.shard_count})"
+                        if self.shard_count > 1
+                        else ""
+                    )
+                )
 
                 # Основной цикл удерживает задачу "живой"
                 while self.is_running:
                     await asyncio.sleep(1)
 
             except Exception as e:
-                logger.error(f"⚠ Ошибка WebSocket: {e}. Переподключение через 5 секунд...")
+                logger.error(
+                    f"⚠ Ошибка WebSocket: {e}. Переподключение через 5 секунд..."
+                )
                 await asyncio.sleep(5)
 
     async def stop(self):
         """Останавливает WebSocket и фоновую задачу"""
         self.is_running = False
-        # Если нужно, отписываемся от топиков и закрываем WebSocket
-        # self.bybit_ws.close()  # в зависимости от реализации
+        # Закрываем соединения WebSocket
+        await self.bybit_ws.close()
+
+        # Консьюмер не отменяется: пакет, уже забранный из Redis, должен дойти до буфера
+        # БД до его остановки. Цикл завершается после текущего пакета (не дольше
+        # consumer_block_timeout)
+        if self._consumer is not None:
+            try:
+                await self._consumer
+            except Exception as e:
+                logger.error(f"Ошибка консьюмера Redis: {e}")
+            self._consumer = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Сохраняем окна агрегатов, чтобы продолжить их после перезапуска
+        await self.persist_aggregates()
+
+        # Отправляем в Redis остаток буфера WebSocket
+        try:
+            await self.ingest_buffer.stop()
+        except Exception as e:
+            logger.error(f"Ошибка сброса буфера в Redis: {e}")
+
+        # Дописываем в БД все, что накопилось в буфере
+        try:
+            await self.market_writer.stop()
+        except Exception as e:
+            logger.error(f"Ошибка сброса буфера в БД: {e}")
 
         # Закрываем Redis-подключение (если это нужно по логике вашего RedisClient)
         try:
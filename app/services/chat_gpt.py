@@ -1,140 +1,439 @@
-import asyncio
-import json
-
-import openai
+import functools
 import logging
+import typing
 
-from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletion
 
+from app.resources.openai_client import OpenAIClient, StreamedChat
+from app.schemas.analysis import AnalysisResult
+from app.services.prompt_serializer import PromptSerializer, estimate_tokens
+from app.services.response_cache import ResponseCache, normalize_data
+from app.services.structured_output import (
+    JSONStreamScanner,
+    MalformedOutputError,
+    parse_analysis,
+    build_response_format,
+)
+
 logger = logging.getLogger(__name__)
 
+# Пояснение к компактному формату данных в промте
+DATA_FORMAT = (
+    "Формат данных: 'ключ=значение' или JSON без отступов; списки записей — таблицы "
+    "'имя [показано/всего]:' с CSV-заголовком, длинные ряды равномерно прорежены, "
+    "числа округлены."
+)
+# Ключи ответа, общие для всех запросов анализа (схема AnalysisResult)
+RESPONSE_KEYS = (
+    "Предоставь ответ в структурированном формате JSON с ключами:\n"
+    "  - technical_indicators: интерпретация индикаторов (текст)\n"
+    "  - candlestick_patterns: интерпретация свечных паттернов (текст)\n"
+    "  - index_gpt: объект с ключами growth_probability и fall_probability — "
+    "вероятности роста и падения цены в процентах (0–100)\n"
+    "  - recommended_action: одно из buy, sell, hold\n"
+    "  - detailed_recommendations: подробные рекомендации (текст)\n"
+    "  - decision_tree: дерево решений (текст) или null"
+)
+
 
 class ChatGPTService:
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo", temperature: float = 0.7):
+    # Имя бэкенда анализа (AnalysisBackend)
+    name = "chatgpt"
+    raw_data = True
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-4o-mini",
+        temperature: float = 0.7,
+        prompt_token_budget: int = 6000,
+        prompt_precision: int = 6,
+        cache: ResponseCache | None = None,
+        client: OpenAIClient | None = None,
+        response_format: str = "json_schema",
+        stream: bool = True,
+    ):
         """
         Инициализация сервиса ChatGPT.
 
         :param api_key: Ваш API-ключ для OpenAI.
-        :param model: Модель для анализа (по умолчанию gpt-3.5-turbo).
+        :param model: Модель для анализа (по умолчанию gpt-4o-mini).
         :param temperature: Параметр креативности (по умолчанию 0.7).
+        :param prompt_token_budget: Бюджет токенов на данные в промте.
+        :param prompt_precision: Значащих цифр у чисел в промте.
+        :param cache: Кэш ответов по содержимому запроса; None — вызывать модель всегда.
+        :param client: Клиент OpenAI с лимитами и повторами; по умолчанию создается с
+            настройками по умолчанию.
+        :param response_format: Формат ответа: json_schema (схема AnalysisResult,
+            gpt-4o-mini и новее), json_object или text; ответ в любом случае
+            валидируется в AnalysisResult.
+        :param stream: Читать ответ потоком: замер первого токена и прерывание
+            некорректного ответа.
         """
         self.api_key = api_key
         self.model = model
         self.temperature = temperature
-        self.client = AsyncOpenAI(api_key=api_key)
+        self.client = client if client is not None else OpenAIClient(api_key=api_key)
+        self.serializer = PromptSerializer(
+            token_budget=prompt_token_budget, precision=prompt_precision
+        )
+        self.cache = cache
+        self.response_format = build_response_format(response_format)
+        self.stream = stream
 
-    async def analyze(self, aggregated_data: dict, prompt: str = None) -> dict:
+    async def analyze(
+        self, aggregated_data: dict, prompt: str = None, key_prompt: str | None = None
+    ) -> AnalysisResult:
         """
         Отправляет запрос в ChatGPT и возвращает ответ.
 
         :param aggregated_data: Данные для анализа.
         :param prompt: Текст запроса. Если не передан, он создается автоматически.
-        :return: Ответ от ChatGPT в виде строки.
+        :param key_prompt: Тот же запрос по данным normalize_data — ключ кэша ответов
+            (см. _key_prompt). Если не передан вместе с prompt, ключом служит сам
+            prompt.
+        :return: Ответ от ChatGPT, провалидированный в AnalysisResult.
+        :raises MalformedOutputError: Ответ не удалось привести к схеме AnalysisResult.
         """
         if prompt is None:
             prompt = self._create_prompt(aggregated_data)
+            key_prompt = self._key_prompt(self._create_prompt, aggregated_data)
 
+        messages = self._messages(prompt)
+        if self.cache is None:
+            return AnalysisResult.model_validate(await self._complete(messages))
+        key = self.cache.key(
+            self.model,
+            self.temperature,
+            self._messages(key_prompt or prompt),
+            self.response_format,
+        )
+        return AnalysisResult.model_validate(
+            await self.cache.get_or_call(key, lambda: self._complete(messages))
+        )
+
+    def _key_prompt(
+        self, build: typing.Callable[..., str], *data: dict | None
+    ) -> str | None:
+        """
+        Запрос для ключа кэша: `build` по данным без меток времени и номеров обновлений,
+        с числами, округленными как в промте. Так запуски на неизменившемся рынке
+        получают закэшированный ответ.
+        """
+        if self.cache is None:
+            return None
+        return build(
+            *(normalize_data(item, self.serializer.precision) for item in data)
+        )
+
+    @staticmethod
+    def _messages(prompt: str) -> list[dict]:
+        return [
+            {
+                "role": "system",
+                "content": (
+                    "Ты являешься финансовым аналитиком, специализирующимся на "
+                    "криптовалютном рынке."
+                ),
+            },
+            {"role": "user", "content": prompt},
+        ]
+
+    @staticmethod
+    def _parse(completion: ChatCompletion) -> AnalysisResult:
+        """Разбор ответа модели в AnalysisResult."""
         try:
-            response: ChatCompletion = await self.client.chat.completions.create(
-                messages=[
-                    {"role": "system",
-                     "content": "Ты являешься финансовым аналитиком, специализирующимся на криптовалютном рынке."},
-                    {"role": "user", "content": prompt}
-                ],
+            return parse_analysis(completion.choices[0].message.content)
+        except MalformedOutputError as e:
+            logger.error(f"Некорректный ответ ChatGPT: {e}")
+            raise
+
+    async def analyze_batch(
+        self,
+        prompts: dict[str, str],
+        poll_interval: float = 60.0,
+        timeout: float = 86400.0,
+    ) -> dict[str, AnalysisResult | Exception]:
+        """
+        Анализ нескольких запросов одним пакетным заданием Batch API: дешевле синхронных
+        вызовов и не расходует их лимиты, но результат приходит в течение 24 часов.
+
+        :param prompts: Идентификатор (например, валютная пара) -> текст запроса.
+        :param poll_interval: Интервал опроса статуса задания, сек.
+        :param timeout: Максимальное время ожидания задания, сек.
+        :return: Идентификатор -> ответ в AnalysisResult или ошибка этого запроса.
+        """
+        batch_id = await self.submit_batch(prompts)
+        return await self.batch_results(
+            batch_id, prompts, poll_interval=poll_interval, timeout=timeout
+        )
+
+    async def submit_batch(self, prompts: dict[str, str]) -> str:
+        """
+        Отправляет запросы пакетным заданием Batch API, не дожидаясь результата.
+
+        :param prompts: Идентификатор (например, валютная пара) -> текст запроса.
+        :return: Идентификатор задания для batch_results.
+        """
+        extra = (
+            {"response_format": self.response_format} if self.response_format else {}
+        )
+        batch = await self.client.submit_batch(
+            {
+                custom_id: {
+                    "model": self.model,
+                    "temperature": self.temperature,
+                    "messages": self._messages(prompt),
+                    **extra,
+                }
+                for custom_id, prompt in prompts.items()
+            },
+            metadata={"source": "smart_trade_ai"},
+        )
+        return batch.id
+
+    async def batch_results(
+        self,
+        batch_id: str,
+        custom_ids: typing.Iterable[str],
+        poll_interval: float = 60.0,
+        timeout: float = 86400.0,
+    ) -> dict[str, AnalysisResult | Exception]:
+        """
+        Ждет завершения пакетного задания и разбирает ответы. Подходит и для задания,
+        отправленного до перезапуска процесса.
+
+        :param batch_id: Идентификатор задания из submit_batch.
+        :param custom_ids: Идентификаторы запросов задания.
+        :param poll_interval: Интервал опроса статуса задания, сек.
+        :param timeout: Максимальное время ожидания задания, сек.
+        :return: Идентификатор -> ответ в AnalysisResult или ошибка этого запроса.
+        """
+        batch = await self.client.wait_batch(
+            batch_id, poll_interval=poll_interval, timeout=timeout
+        )
+        completions = await self.client.batch_results(batch)
+
+        results: dict[str, AnalysisResult | Exception] = {}
+        for custom_id in custom_ids:
+            completion = completions.get(custom_id)
+            if completion is None:
+                results[custom_id] = RuntimeError(
+                    f"Нет результата в пакетном задании {batch.id} ({batch.status})"
+                )
+            elif isinstance(completion, str):
+                results[custom_id] = RuntimeError(completion)
+            else:
+                try:
+                    results[custom_id] = self._parse(completion)
+                except ValueError as e:
+                    results[custom_id] = e
+        return results
+
+    async def _complete(self, messages: list[dict]) -> dict:
+        """
+        Вызов модели и разбор ответа; результат — AnalysisResult в виде словаря (для
+        кэша).
+        """
+        prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        try:
+            if not self.stream:
+                completion: ChatCompletion = await self.client.chat(
+                    messages=messages,
+                    model=self.model,
+                    temperature=self.temperature,
+                    prompt_tokens=prompt_tokens,
+                    response_format=self.response_format,
+                )
+                logger.info("Успешно получен ответ от ChatGPT")
+                return self._parse(completion).model_dump(mode="json")
+
+            response: StreamedChat = await self.client.chat_stream(
+                messages=messages,
                 model=self.model,
-                temperature=self.temperature
+                temperature=self.temperature,
+                prompt_tokens=prompt_tokens,
+                monitor=lambda: JSONStreamScanner().feed,
+                response_format=self.response_format,
             )
-            analysis = response.choices[0].message.content
-            logger.info("Успешно получен ответ от ChatGPT")
-            return json.loads(analysis)
+        except MalformedOutputError as e:
+            logger.error(f"Ответ ChatGPT прерван: {e}")
+            raise
         except Exception as e:
-            logger.error(f"Ошибка при вызове ChatGPT API: {e}")
-            raise ValueError("Ошибка при вызове ChatGPT API")
+            logger.error(f"Ошибка при вызове ChatGPT API: {type(e).__name__}: {e}")
+            raise
+        logger.info(
+            "Успешно получен ответ от ChatGPT: первый токен через "
+            + (
+                f"{response.first_token:.2f} с"
+                if response.first_token is not None
+                else "— (пустой ответ)"
+            )
+            + f", всего {response.elapsed:.2f} с"
+            + (", чтение остановлено после JSON-объекта" if response.stopped else "")
+        )
+        try:
+            return parse_analysis(response.content).model_dump(mode="json")
+        except MalformedOutputError as e:
+            logger.error(
+                f"Некорректный ответ ChatGPT (finish_reason={response.finish_reason}): "
+                f"{e}"
+            )
+            raise
 
-    def _create_prompt(self, aggregated_data: dict, stage: int = 1, decision_tree: bool = False) -> str:
+    def _create_prompt(
+        self, aggregated_data: dict, stage: int = 1, decision_tree: bool = False
+    ) -> str:
         """
         Формирует структурированный запрос для ChatGPT.
 
         :param aggregated_data: Словарь с агрегированными данными.
         :param stage: Этап анализа (1 – первичный, 2 – дополнительный).
-        :param decision_tree: Если True, добавить инструкции для построения дерева решений.
+        :param decision_tree: Если True, добавить инструкции для построения дерева
+            решений.
         :return: Строка запроса для ChatGPT.
         """
-        # Преобразуем данные в отформатированный JSON
-        data_str = json.dumps(aggregated_data, default=str, indent=2)
+        # Компактное представление данных в пределах бюджета токенов
+        data_str = f"{DATA_FORMAT}\n{self.serializer.serialize(aggregated_data).text}"
 
         if stage == 1:
             prompt = (
                 "На основе следующих данных проведи первичный анализ:\n\n"
                 f"{data_str}\n\n"
                 "Выполни следующие задачи:\n"
-                "1. Рассчитай технические индикаторы: SMA, EMA, RSI, MACD, ATR.\n"
-                "2. Определи свечные паттерны: Hammer, Inverted Hammer, Bullish Engulfing, Three White Soldiers, "
-                "Piercing Line, Hanging Man, Bearish Engulfing, Three Black Crows, Dark Cloud Cover, Doji.\n"
-                "3. Оцени вероятность роста и падения цены в процентах. Это значение назови 'Index GPT'.\n"
-                "4. Дай подробные торговые рекомендации с учетом использования плеча.\n\n"
-                "Предоставь ответ в структурированном формате JSON с ключами:\n"
-                "  - technical_indicators\n"
-                "  - candlestick_patterns\n"
-                "  - index_gpt\n"
-                "  - recommended_action\n"
-                "  - detailed_recommendations"
+                "1. Интерпретируй рассчитанные технические индикаторы из поля "
+                "'indicators' (SMA, EMA, RSI, MACD, ATR, полосы Боллинджера, VWAP, "
+                "OBV), не пересчитывай их.\n"
+                "2. Интерпретируй найденные свечные паттерны из поля 'patterns' (время "
+                "свечи, паттерн, направление сигнала): Hammer, Inverted Hammer, "
+                "Bullish Engulfing, Three White Soldiers, Piercing Line, Hanging Man, "
+                "Bearish Engulfing, Three Black Crows, Dark Cloud Cover, Doji; не ищи "
+                "их заново.\n"
+                "3. Оцени вероятность роста и падения цены в процентах. Это значение "
+                "назови 'Index GPT'.\n"
+                "4. Дай подробные торговые рекомендации с учетом использования "
+                "плеча.\n\n"
+                f"{RESPONSE_KEYS}"
             )
         elif stage == 2:
             prompt = (
-                "Исходя из предыдущего анализа, проведи дополнительное сравнение с архивными данными и реальными изменениями рынка.\n\n"
+                "Исходя из предыдущего анализа, проведи дополнительное сравнение с "
+                "архивными данными и реальными изменениями рынка.\n\n"
                 f"{data_str}\n\n"
                 "Выполни следующие задачи:\n"
-                "1. Проведи поиск паттернов и дополнительный анализ для уточнения 'Index GPT'.\n"
+                "1. Проведи поиск паттернов и дополнительный анализ для уточнения "
+                "'Index GPT'.\n"
                 "2. Сравни текущие данные с архивом, оценив изменения динамики.\n"
-                "3. На основе этого сформируй итоговый вывод с рекомендацией, включая вероятность изменения цены в процентах.\n"
-                "Ответ предоставь в виде JSON с ключами:\n"
-                "  - final_index_gpt\n"
-                "  - final_recommended_action\n"
-                "  - final_detailed_recommendations"
+                "3. На основе этого сформируй итоговый вывод с рекомендацией, включая "
+                "вероятность изменения цены в процентах.\n"
+                f"{RESPONSE_KEYS}"
             )
             if decision_tree:
                 prompt += (
-                    "\nДополнительно, построи дерево решений, подробно описывающее промежуточные шаги анализа и обоснование каждого решения."
+                    "\nДополнительно, построи дерево решений, подробно описывающее "
+                    "промежуточные шаги анализа и обоснование каждого решения, в ключе "
+                    "decision_tree."
                 )
         else:
             prompt = f"Данные для анализа:\n{data_str}"
         return prompt
 
-    async def analyze_experimental(self, aggregated_data: dict, stage: int = 1, decision_tree: bool = False) -> dict:
+    async def analyze_experimental(
+        self, aggregated_data: dict, stage: int = 1, decision_tree: bool = False
+    ) -> AnalysisResult:
         """
         Проводит анализ с экспериментальными настройками промта.
 
         :param aggregated_data: Данные для анализа.
         :param stage: Этап анализа (1 - первичный, 2 - дополнительный).
         :param decision_tree: Если True, включить построение дерева решений.
-        :return: Распарсенный JSON-ответ от ChatGPT как словарь.
+        :return: Ответ от ChatGPT в AnalysisResult.
         """
-        prompt = self._create_prompt(aggregated_data, stage=stage, decision_tree=decision_tree)
-        response: dict = await self.analyze(aggregated_data, prompt=prompt)
+        build = functools.partial(
+            self._create_prompt, stage=stage, decision_tree=decision_tree
+        )
+        response: AnalysisResult = await self.analyze(
+            aggregated_data,
+            prompt=build(aggregated_data),
+            key_prompt=self._key_prompt(build, aggregated_data),
+        )
         return response
 
-    async def final_analysis(self, primary_analysis: dict, secondary_analysis: dict) -> dict:
+    async def final_analysis(
+        self, primary_analysis: dict, secondary_analysis: dict
+    ) -> AnalysisResult:
+        """
+        Проводит финальный анализ, объединяя первичный и дополнительный отчеты, и
+        возвращает итоговый вывод.
+
+        :param primary_analysis: Результат первичного анализа.
+        :param secondary_analysis: Результат дополнительного анализа.
+        :return: Финальные рекомендации в AnalysisResult.
+        """
+        combined_data = {
+            "primary_analysis": primary_analysis,
+            "secondary_analysis": secondary_analysis,
+        }
+        prompt = self._create_final_prompt(primary_analysis, secondary_analysis)
+        key_prompt = self._key_prompt(
+            self._create_final_prompt, primary_analysis, secondary_analysis
+        )
+        final_response: AnalysisResult = await self.analyze(
+            combined_data, prompt=prompt, key_prompt=key_prompt
+        )
+        return final_response
+
+    async def recommend(
+        self, aggregated_data: dict, previous_recommendation: dict | None = None
+    ) -> AnalysisResult:
+        """
+        Рекомендация ChatGPT (AnalysisBackend): первичный анализ или финальный с учетом
+        предыдущей рекомендации.
+
+        :param aggregated_data: Агрегированные рыночные данные.
+        :param previous_recommendation: Предыдущая рекомендация по валютной паре.
+        """
+        return await self.analyze(
+            aggregated_data,
+            prompt=self.build_prompt(aggregated_data, previous_recommendation),
+            key_prompt=self._key_prompt(
+                self.build_prompt, aggregated_data, previous_recommendation
+            ),
+        )
+
+    def build_prompt(
+        self, aggregated_data: dict, previous_recommendation: dict | None = None
+    ) -> str:
+        """
+        Запрос анализа: первичный (stage 1) или финальный, если есть предыдущая
+        рекомендация.
+
+        :param aggregated_data: Агрегированные рыночные данные.
+        :param previous_recommendation: Предыдущая рекомендация по валютной паре.
+        :return: Строка запроса для ChatGPT.
+        """
+        if previous_recommendation is not None:
+            return self._create_final_prompt(previous_recommendation, aggregated_data)
+        return self._create_prompt(aggregated_data)
+
+    def _create_final_prompt(
+        self, primary_analysis: dict, secondary_analysis: dict
+    ) -> str:
         """
-        Проводит финальный анализ, объединяя первичный и дополнительный отчеты, и возвращает итоговый вывод.
+        Формирует запрос финального анализа.
 
         :param primary_analysis: Результат первичного анализа.
         :param secondary_analysis: Результат дополнительного анализа.
-        :return: Словарь с финальными рекомендациями.
+        :return: Строка запроса для ChatGPT.
         """
         combined_data = {
             "primary_analysis": primary_analysis,
-            "secondary_analysis": secondary_analysis
+            "secondary_analysis": secondary_analysis,
         }
-        prompt = (
-            "На основе следующих данных, где 'primary_analysis' содержит первоначальный отчет, а 'secondary_analysis' "
-            "содержит дополнительный анализ с учетом архивных данных, проведи итоговый анализ:\n\n"
-            f"{json.dumps(combined_data, indent=2, default=str)}\n\n"
-            "Пожалуйста, предоставь итоговый вывод в формате JSON с ключами:\n"
-            "  - final_index_gpt\n"
-            "  - final_recommended_action\n"
-            "  - final_detailed_recommendations"
+        return (
+            "На основе следующих данных, где 'primary_analysis' содержит "
+            "первоначальный отчет, а 'secondary_analysis' содержит дополнительный "
+            "анализ с учетом архивных данных, проведи итоговый анализ:\n\n"
+            f"{DATA_FORMAT}\n{self.serializer.serialize(combined_data).text}\n\n"
+            f"{RESPONSE_KEYS}"
         )
-        final_response: dict = await self.analyze(combined_data, prompt=prompt)
-        return final_response
\ No newline at end of file
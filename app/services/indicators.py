@@ -0,0 +1,448 @@
+"""."""
+
+import collections
+import logging
+import math
+import typing
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Ключ Redis, под которым публикуются индикаторы символа по закрытым минутным свечам
+INDICATORS_KEY = "market:indicators:{symbol}"
+
+SMA_PERIODS = (20, 50)
+EMA_PERIODS = (20, 50)
+RSI_PERIOD = 14
+MACD_PERIODS = (12, 26, 9)
+ATR_PERIOD = 14
+BOLLINGER_PERIOD = 20
+BOLLINGER_WIDTH = 2.0
+DAY_MS = 86_400_000
+# Массивы свечей, по которым считаются индикаторы
+CANDLE_FIELDS = ("start", "high", "low", "close", "volume")
+
+# Сколько свечей нужно, чтобы все индикаторы вышли из разогрева (MACD: 26 + 9 - 1)
+MIN_CANDLES = max(
+    *SMA_PERIODS,
+    *EMA_PERIODS,
+    RSI_PERIOD + 1,
+    MACD_PERIODS[1] + MACD_PERIODS[2] - 1,
+    ATR_PERIOD,
+)
+
+
+def ewm(values: np.ndarray, alpha: float, seed_index: int, seed: float) -> np.ndarray:
+    """
+    Экспоненциальное сглаживание y[t] = alpha * x[t] + (1 - alpha) * y[t - 1], начиная с
+    y[seed_index] = seed.
+
+    Рекурсия раскрывается в замкнутую форму через cumsum блоками: внутри блока веса (1 -
+    alpha)^-k не выходят за пределы float64, поэтому расчет векторный без цикла по
+    элементам. До seed_index значения NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if seed_index >= len(values):
+        return out
+    out[seed_index] = seed
+    tail = values[seed_index + 1 :]
+    if alpha >= 1:
+        out[seed_index + 1 :] = tail
+        return out
+
+    decay = 1.0 - alpha
+    block = max(1, int(300 / -math.log(decay)))
+    previous = seed
+    position = seed_index + 1
+    for i in range(0, len(tail), block):
+        chunk = tail[i : i + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        smoothed = powers * (previous + alpha * np.cumsum(chunk / powers))
+        out[position + i : position + i + len(chunk)] = smoothed
+        previous = smoothed[-1]
+    return out
+
+
+def sma(values: np.ndarray, period: int) -> np.ndarray:
+    """Простое скользящее среднее."""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        out[period - 1 :] = np.lib.stride_tricks.sliding_window_view(
+            values, period
+        ).mean(axis=1)
+    return out
+
+
+def ema(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    Экспоненциальное скользящее среднее, начальное значение — SMA первых `period`
+    значений.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < period:
+        return np.full(len(values), np.nan)
+    return ewm(values, 2.0 / (period + 1), period - 1, values[:period].mean())
+
+
+def wilder(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    Сглаживание Уайлдера (RMA, alpha = 1 / period), начальное значение — SMA первых
+    `period` значений.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < period:
+        return np.full(len(values), np.nan)
+    return ewm(values, 1.0 / period, period - 1, values[:period].mean())
+
+
+def _rsi_from_averages(
+    gain: np.ndarray | float, loss: np.ndarray | float
+) -> np.ndarray:
+    gain, loss = np.asarray(gain, dtype=np.float64), np.asarray(loss, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = 100.0 - 100.0 / (1.0 + gain / loss)
+    return np.where(loss == 0, np.where(gain == 0, 50.0, 100.0), value)
+
+
+def rsi(close: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    """RSI Уайлдера."""
+    close = np.asarray(close, dtype=np.float64)
+    delta = np.diff(close)
+    gain = wilder(np.clip(delta, 0, None), period)
+    loss = wilder(np.clip(-delta, 0, None), period)
+    out = np.full(len(close), np.nan)
+    valid = ~np.isnan(gain)
+    out[1:][valid] = _rsi_from_averages(gain[valid], loss[valid])
+    return out
+
+
+def macd(
+    close: np.ndarray,
+    fast: int = MACD_PERIODS[0],
+    slow: int = MACD_PERIODS[1],
+    signal: int = MACD_PERIODS[2],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    MACD: линия (EMA fast - EMA slow), сигнальная линия (EMA signal от линии) и
+    гистограмма.
+    """
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = np.full(len(line), np.nan)
+    signal_line[slow - 1 :] = ema(line[slow - 1 :], signal)
+    return line, signal_line, line - signal_line
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """Истинный диапазон; для первой свечи — high - low."""
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    previous = np.concatenate(([np.nan], close[:-1]))
+    return np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+
+
+def atr(
+    high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = ATR_PERIOD
+) -> np.ndarray:
+    """ATR Уайлдера."""
+    return wilder(true_range(high, low, close), period)
+
+
+def bollinger(
+    close: np.ndarray, period: int = BOLLINGER_PERIOD, width: float = BOLLINGER_WIDTH
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Полосы Боллинджера (верхняя, средняя, нижняя), стандартное отклонение генеральной
+    совокупности.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    middle = sma(close, period)
+    std = np.full(len(close), np.nan)
+    if len(close) >= period:
+        std[period - 1 :] = np.lib.stride_tricks.sliding_window_view(close, period).std(
+            axis=1
+        )
+    return middle + width * std, middle, middle - width * std
+
+
+def vwap(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    volume: np.ndarray,
+    start: np.ndarray,
+) -> np.ndarray:
+    """
+    VWAP по типичной цене (high + low + close) / 3 с накоплением от начала суток UTC.
+    """
+    high, low, close, volume = (
+        np.asarray(a, dtype=np.float64) for a in (high, low, close, volume)
+    )
+    pv = np.cumsum((high + low + close) / 3 * volume)
+    cumulative_volume = np.cumsum(volume)
+
+    # Вычитаем накопленное до начала суток свечи
+    day = np.asarray(start, dtype=np.int64) // DAY_MS
+    first = np.concatenate(([0], np.flatnonzero(np.diff(day)) + 1))
+    first_of = first[np.searchsorted(first, np.arange(len(day)), side="right") - 1]
+    pv_before = np.concatenate(([0.0], pv))[first_of]
+    volume_before = np.concatenate(([0.0], cumulative_volume))[first_of]
+    day_volume = cumulative_volume - volume_before
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(day_volume > 0, (pv - pv_before) / day_volume, np.nan)
+
+
+def obv(close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """On-Balance Volume от начала ряда."""
+    close, volume = np.asarray(close, dtype=np.float64), np.asarray(
+        volume, dtype=np.float64
+    )
+    return np.concatenate(([0.0], np.cumsum(np.sign(np.diff(close)) * volume[1:])))
+
+
+def _value(value: typing.Any) -> float | None:
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def compute_indicators(
+    start: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    volume: np.ndarray,
+) -> dict[str, np.ndarray]:
+    """
+    Полные ряды индикаторов по массивам свечей.
+
+    :param start: Время открытия свечей, мс.
+    :return: Ряды той же длины, что и входные массивы (NaN на участке разогрева).
+    """
+    series = {}
+    for period in SMA_PERIODS:
+        series[f"sma_{period}"] = sma(close, period)
+    for period in EMA_PERIODS:
+        series[f"ema_{period}"] = ema(close, period)
+    series[f"rsi_{RSI_PERIOD}"] = rsi(close)
+    series["macd"], series["macd_signal"], series["macd_hist"] = macd(close)
+    series[f"atr_{ATR_PERIOD}"] = atr(high, low, close)
+    series["bb_upper"], series["bb_middle"], series["bb_lower"] = bollinger(close)
+    series["vwap"] = vwap(high, low, close, volume, start)
+    series["obv"] = obv(close, volume)
+    return series
+
+
+def latest(series: dict[str, np.ndarray], close: np.ndarray) -> dict:
+    """Последние значения индикаторов в формате для анализа."""
+    if not len(close):
+        return {"candles": 0}
+    return {"candles": len(close), "close": _value(close[-1])} | {
+        name: _value(values[-1]) for name, values in series.items()
+    }
+
+
+class _Smoothing:
+    """
+    Инкрементальное сглаживание с разогревом: первые `period` значений усредняются в
+    начальное значение.
+    """
+
+    __slots__ = ("alpha", "period", "value", "_seed")
+
+    def __init__(self, alpha: float, period: int):
+        self.alpha = alpha
+        self.period = period
+        self.value = math.nan
+        self._seed: list[float] = []
+
+    def update(self, x: float) -> float:
+        if math.isnan(self.value):
+            self._seed.append(x)
+            if len(self._seed) == self.period:
+                self.value = sum(self._seed) / self.period
+                self._seed = []
+        else:
+            self.value = self.alpha * x + (1 - self.alpha) * self.value
+        return self.value
+
+    def seed(self, series: np.ndarray, source: np.ndarray):
+        """
+        Состояние после векторного расчета: последнее значение ряда или накопленные
+        значения разогрева.
+        """
+        self.value = float(series[-1]) if len(series) else math.nan
+        self._seed = (
+            []
+            if not math.isnan(self.value)
+            else [float(x) for x in source[-self.period :]]
+        )
+
+
+class IndicatorEngine:
+    """
+    Индикаторы одного символа по закрытым свечам с обновлением за O(1) на свечу.
+
+    Начальное состояние строится векторным расчетом по истории (seed), далее каждая
+    новая свеча обновляет состояние (update). Значения совпадают с compute_indicators по
+    тем же свечам.
+    """
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.reset()
+
+    def reset(self):
+        """Сбрасывает состояние."""
+        self.candles = 0
+        self.last_start: int | None = None
+        self.close = math.nan
+        self._closes: collections.deque[float] = collections.deque(
+            maxlen=max(*SMA_PERIODS, BOLLINGER_PERIOD)
+        )
+        self._ema = {
+            period: _Smoothing(2.0 / (period + 1), period) for period in EMA_PERIODS
+        }
+        fast, slow, signal = MACD_PERIODS
+        self._macd_fast = _Smoothing(2.0 / (fast + 1), fast)
+        self._macd_slow = _Smoothing(2.0 / (slow + 1), slow)
+        self._macd_signal = _Smoothing(2.0 / (signal + 1), signal)
+        self._macd = (math.nan, math.nan)
+        self._gain = _Smoothing(1.0 / RSI_PERIOD, RSI_PERIOD)
+        self._loss = _Smoothing(1.0 / RSI_PERIOD, RSI_PERIOD)
+        self._atr = _Smoothing(1.0 / ATR_PERIOD, ATR_PERIOD)
+        self._day: int | None = None
+        self._day_pv = 0.0
+        self._day_volume = 0.0
+        self._obv = 0.0
+
+    def seed(
+        self,
+        start: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        volume: np.ndarray,
+    ):
+        """Строит состояние по истории свечей векторным расчетом."""
+        start, high, low, close, volume = (
+            np.asarray(a) for a in (start, high, low, close, volume)
+        )
+        close = close.astype(np.float64)
+        self.reset()
+        if not len(close):
+            return
+
+        self.candles = len(close)
+        self.last_start = int(start[-1])
+        self.close = float(close[-1])
+        self._closes.extend(float(x) for x in close[-self._closes.maxlen :])
+        for period, state in self._ema.items():
+            state.seed(ema(close, period), close)
+
+        fast, slow, signal = MACD_PERIODS
+        self._macd_fast.seed(ema(close, fast), close)
+        self._macd_slow.seed(ema(close, slow), close)
+        line, signal_line, _ = macd(close)
+        self._macd_signal.seed(signal_line[slow - 1 :], line[slow - 1 :])
+        self._macd = (float(line[-1]), float(signal_line[-1]))
+
+        delta = np.diff(close)
+        self._gain.seed(
+            wilder(np.clip(delta, 0, None), RSI_PERIOD), np.clip(delta, 0, None)
+        )
+        self._loss.seed(
+            wilder(np.clip(-delta, 0, None), RSI_PERIOD), np.clip(-delta, 0, None)
+        )
+        tr = true_range(high, low, close)
+        self._atr.seed(wilder(tr, ATR_PERIOD), tr)
+
+        day = np.asarray(start, dtype=np.int64) // DAY_MS
+        today = day == day[-1]
+        self._day = int(day[-1])
+        self._day_pv = float(np.sum(((high + low + close) / 3 * volume)[today]))
+        self._day_volume = float(np.sum(volume[today]))
+        self._obv = float(obv(close, volume)[-1])
+
+    def update(
+        self, start: int, high: float, low: float, close: float, volume: float
+    ) -> bool:
+        """
+        Учитывает новую закрытую свечу. Значения индикаторов возвращает snapshot().
+
+        :param start: Время открытия свечи, мс.
+        :return: False, если свеча уже учтена.
+        """
+        if self.last_start is not None and start <= self.last_start:
+            return False
+        previous = self.close
+        self.last_start = start
+        self.candles += 1
+        self.close = close
+        self._closes.append(close)
+        for state in self._ema.values():
+            state.update(close)
+
+        fast = self._macd_fast.update(close)
+        slow = self._macd_slow.update(close)
+        line = fast - slow
+        self._macd = (
+            line,
+            self._macd_signal.update(line) if not math.isnan(line) else math.nan,
+        )
+
+        if not math.isnan(previous):
+            delta = close - previous
+            self._gain.update(max(delta, 0.0))
+            self._loss.update(max(-delta, 0.0))
+            self._atr.update(max(high - low, abs(high - previous), abs(low - previous)))
+            self._obv += math.copysign(volume, delta) if delta else 0.0
+        else:
+            self._atr.update(high - low)
+
+        day = start // DAY_MS
+        if day != self._day:
+            self._day, self._day_pv, self._day_volume = day, 0.0, 0.0
+        self._day_pv += (high + low + close) / 3 * volume
+        self._day_volume += volume
+        return True
+
+    def _sma(self, period: int) -> float:
+        if len(self._closes) < period:
+            return math.nan
+        return sum(list(self._closes)[-period:]) / period
+
+    def snapshot(self) -> dict:
+        """Текущие значения индикаторов в том же формате, что и latest()."""
+        if not self.candles:
+            return {"candles": 0}
+        line, signal = self._macd
+        middle = self._sma(BOLLINGER_PERIOD)
+        if len(self._closes) >= BOLLINGER_PERIOD:
+            window = list(self._closes)[-BOLLINGER_PERIOD:]
+            std = math.sqrt(sum((x - middle) ** 2 for x in window) / BOLLINGER_PERIOD)
+        else:
+            std = math.nan
+        values = {"candles": self.candles, "close": self.close}
+        values |= {f"sma_{period}": self._sma(period) for period in SMA_PERIODS}
+        values |= {f"ema_{period}": state.value for period, state in self._ema.items()}
+        values[f"rsi_{RSI_PERIOD}"] = (
+            float(_rsi_from_averages(self._gain.value, self._loss.value))
+            if not math.isnan(self._gain.value)
+            else math.nan
+        )
+        values |= {"macd": line, "macd_signal": signal, "macd_hist": line - signal}
+        values[f"atr_{ATR_PERIOD}"] = self._atr.value
+        values |= {
+            "bb_upper": middle + BOLLINGER_WIDTH * std,
+            "bb_middle": middle,
+            "bb_lower": middle - BOLLINGER_WIDTH * std,
+        }
+        values["vwap"] = (
+            self._day_pv / self._day_volume if self._day_volume else math.nan
+        )
+        values["obv"] = self._obv
+        return {
+            name: value if name == "candles" else _value(value)
+            for name, value in values.items()
+        }
@@ -0,0 +1,158 @@
+"""."""
+
+import asyncio
+import collections
+import logging
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+
+class IngestBuffer:
+    """
+    Буфер входящих сообщений с ограничением по размеру и по времени.
+
+    append() синхронный и не создает задач: его можно вызывать через
+    loop.call_soon_threadsafe прямо из колбэка WebSocket. Единственная фоновая задача
+    забирает накопленный буфер целиком (подменяя его новым) и передает в `sink`, когда
+    набралось `max_size` сообщений или самое старое сообщение ждет дольше `max_age_ms`.
+    Если `sink` не успевает и в буфере уже `capacity` сообщений, лишние отбрасываются
+    согласно `overflow_policy`.
+    """
+
+    def __init__(
+        self,
+        sink: typing.Callable[[list], typing.Awaitable[typing.Any]],
+        max_size: int = 500,
+        max_age_ms: int = 200,
+        capacity: int = 100000,
+        overflow_policy: str = DROP_OLDEST,
+    ):
+        """
+        :param sink: Корутина, получающая пакет сообщений (например, запись в Redis).
+        :param max_size: Размер пакета, при котором сброс запускается сразу.
+        :param max_age_ms: Максимальное время ожидания сообщения в буфере, мс.
+        :param capacity: Максимальное число сообщений в буфере.
+        :param overflow_policy: drop_oldest или drop_newest.
+        """
+        if overflow_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Неизвестная политика переполнения: {overflow_policy}")
+        self.sink = sink
+        self.max_size = max_size
+        self.max_age = max_age_ms / 1000
+        self.capacity = max(capacity, max_size)
+        self.overflow_policy = overflow_policy
+
+        self._active: collections.deque = self._new_buffer()
+        self._first_at: float | None = None
+        self._not_empty = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+        self.received = 0
+        self.flushed = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    def _new_buffer(self) -> collections.deque:
+        if self.overflow_policy == DROP_OLDEST:
+            return collections.deque(maxlen=self.capacity)
+        return collections.deque()
+
+    def append(self, message: typing.Any):
+        """Добавляет сообщение в буфер. Должен вызываться из потока event loop."""
+        self.received += 1
+        if len(self._active) >= self.capacity:
+            self.dropped += 1
+            if self.overflow_policy == DROP_NEWEST:
+                return
+        if not self._active:
+            self._first_at = time.monotonic()
+            self._not_empty.set()
+        self._active.append(message)
+        if len(self._active) >= self.max_size:
+            self._full.set()
+
+    async def start(self):
+        """Запускает фоновую задачу сброса."""
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Останавливает фоновую задачу и сбрасывает остаток буфера.
+        Задача не отменяется: текущий сброс доводит уже забранный пакет до sink.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._not_empty.set()
+            self._full.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        """
+        Забирает текущий буфер и передает его в sink. При ошибке или отмене сообщения
+        возвращаются в буфер.
+        """
+        if not self._active:
+            return
+        batch, self._active = self._active, self._new_buffer()
+        first_at, self._first_at = self._first_at, None
+        self._not_empty.clear()
+        self._full.clear()
+
+        try:
+            await self.sink(list(batch))
+            self.flushed += len(batch)
+        except BaseException:
+            self._requeue(batch, first_at)
+            raise
+
+    def _requeue(self, batch: collections.deque, first_at: float | None):
+        """Возвращает неотправленный пакет в начало буфера с учетом capacity."""
+        pending = list(batch) + list(self._active)
+        overflow = len(pending) - self.capacity
+        if overflow > 0:
+            self.dropped += overflow
+            pending = (
+                pending[overflow:]
+                if self.overflow_policy == DROP_OLDEST
+                else pending[: self.capacity]
+            )
+        self._active = self._new_buffer()
+        self._active.extend(pending)
+        if self._active:
+            self._first_at = first_at or time.monotonic()
+            self._not_empty.set()
+
+    async def _run(self):
+        """
+        Сбрасывает буфер по размеру или по возрасту самого старого сообщения до вызова
+        stop().
+        """
+        while not self._stopping:
+            await self._not_empty.wait()
+            if len(self._active) < self.max_size and self._first_at is not None:
+                timeout = self._first_at + self.max_age - time.monotonic()
+                if timeout > 0:
+                    try:
+                        await asyncio.wait_for(self._full.wait(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(
+                    f"⚠ Ошибка сброса буфера ({len(self._active)} сообщений): {e}"
+                )
+                await asyncio.sleep(1)
@@ -1,97 +1,760 @@
 """."""
+
 import datetime
+import itertools
+import json
 import logging
+import typing
 from collections import defaultdict
 
+import numpy as np
 import sqlalchemy as sa
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.repositories.db import DBRepository
 from app.resources.database import Database
-from app.schemas.market import MarketSchema, MarketCreateSchema, AggregatedGroup, AggregatedMarketData
-from app.models.market import Market
+from app.resources.redis_client import RedisClient
+from app.schemas.market import (
+    AggregatedGroup,
+    AggregatedMarketData,
+    KlineSchema,
+    LiquidationSchema,
+    MarketCreateSchema,
+    MarketRollupSchema,
+    MarketSchema,
+    OrderbookSnapshotSchema,
+    PublicTradeSchema,
+)
+from app.models.base import Base
+from app.models.market import (
+    Kline,
+    Liquidation,
+    Market,
+    MarketRollup,
+    OrderbookSnapshot,
+    PublicTrade,
+)
 from app.schemas.repository import RepositoryOutSchema
+from app.services.aggregator import AGGREGATE_KEY, window_covered
+from app.services.indicators import (
+    CANDLE_FIELDS,
+    INDICATORS_KEY,
+    MIN_CANDLES,
+    compute_indicators,
+    latest,
+)
+from app.services.market_parser import COPY_COLUMNS, market_record
+from app.services.market_storage import floor_hour, resolution_for
+from app.services.orderbook import ORDERBOOK_KEY
+from app.services.patterns import PATTERN_HISTORY, PatternScanner
 
 logger = logging.getLogger(__name__)
 
+# Сколько последних свечных паттернов передавать в анализ
+PATTERNS_LIMIT = 30
+# Записи market, которые MarketStorageService сворачивает в агрегаты market_rollup
+ROLLED_UP_KINDS = sa.or_(
+    Market.kind.like("publicTrade%"),
+    Market.kind.like("liquidation%"),
+    Market.kind.like("allLiquidation%"),
+)
+
 
 class MarketService:
     db: Database
     repository: DBRepository[Market, MarketSchema]
+    repository_kline: DBRepository[Kline, KlineSchema] | None
+    repository_public_trade: DBRepository[PublicTrade, PublicTradeSchema] | None
+    repository_orderbook_snapshot: (
+        DBRepository[OrderbookSnapshot, OrderbookSnapshotSchema] | None
+    )
+    repository_liquidation: DBRepository[Liquidation, LiquidationSchema] | None
+    repository_rollup: DBRepository[MarketRollup, MarketRollupSchema] | None
+    redis_client: RedisClient | None
 
     def __init__(
-            self,
-            db: Database,
-            repository: DBRepository[Market, MarketSchema]
+        self,
+        db: Database,
+        repository: DBRepository[Market, MarketSchema],
+        redis_client: RedisClient | None = None,
+        repository_kline: DBRepository[Kline, KlineSchema] | None = None,
+        repository_public_trade: (
+            DBRepository[PublicTrade, PublicTradeSchema] | None
+        ) = None,
+        repository_orderbook_snapshot: (
+            DBRepository[OrderbookSnapshot, OrderbookSnapshotSchema] | None
+        ) = None,
+        repository_liquidation: (
+            DBRepository[Liquidation, LiquidationSchema] | None
+        ) = None,
+        repository_rollup: DBRepository[MarketRollup, MarketRollupSchema] | None = None,
+        downsample_after_hours: int | None = None,
     ) -> None:
+        """
+        :param downsample_after_hours: Возраст сырых данных (ч.), старше которого чтение
+            идет из агрегатов market_rollup. None — всегда читать сырые данные.
+        """
         self.db = db
         self.repository = repository
+        self.redis_client = redis_client
+        self.repository_kline = repository_kline
+        self.repository_public_trade = repository_public_trade
+        self.repository_orderbook_snapshot = repository_orderbook_snapshot
+        self.repository_liquidation = repository_liquidation
+        self.repository_rollup = repository_rollup
+        self.downsample_after_hours = downsample_after_hours
+        self.patterns = PatternScanner()
+
+    async def get_orderbook(self, currency: str) -> dict | None:
+        """
+        Возвращает актуальную сводку стакана, которую публикует WebSocketService.
+
+        :param currency: Валютная пара, например, "BTCUSDT".
+        :return: Сводка стакана или None, если стакан не публикуется.
+        """
+        return await self._get_published(ORDERBOOK_KEY.format(symbol=currency))
+
+    async def get_market_summary(self, currency: str, minutes: int) -> dict | None:
+        """
+        Возвращает скользящий агрегат (OHLCV, VWAP, объемы покупок/продаж, ликвидации,
+        статистика стакана), который WebSocketService поддерживает инкрементально для
+        настроенных окон.
+
+        :param currency: Валютная пара, например, "BTCUSDT".
+        :param minutes: Окно в минутах.
+        :return: Агрегат или None, если окно не настроено, не публикуется или покрыто не
+            полностью (сбор данных перезапускался внутри окна без восстановления
+            состояния).
+        """
+        summary = await self._get_published(
+            AGGREGATE_KEY.format(symbol=currency, minutes=minutes)
+        )
+        if summary is not None and not window_covered(summary, minutes):
+            logger.warning(
+                f"Агрегат {currency} за {minutes} мин. покрывает окно не полностью "
+                f"(данные с {summary.get('covered_since')}), используются данные БД"
+            )
+            return None
+        return summary
+
+    async def _get_published(self, key: str) -> dict | None:
+        """Чтение состояния, опубликованного WebSocketService в Redis."""
+        if self.redis_client is None:
+            return None
+        try:
+            await self.redis_client.connect()
+            return await self.redis_client.get(key)
+        except Exception as e:
+            logger.error(f"Ошибка чтения {key} из Redis: {e}")
+            return None
 
     @staticmethod
     def compare_orderbooks(prev_data: dict, new_data: dict) -> dict:
         """
         Сравнивает два снимка стакана.
-        Возвращает разницу в формате {'bids': {'added': [], 'removed': [], 'updated': []}, 'asks': {...}}
+        Возвращает разницу в формате {'bids': {'added': [], 'removed': [], 'updated':
+        []}, 'asks': {...}}
         """
 
         def process_side(prev: list, new: list):
             """Сравнивает стороны стакана (bids или asks)"""
-            prev_dict = {price: float(size) for price, size in prev}  # Преобразуем в словарь {цена: объем}
+            prev_dict = {
+                price: float(size) for price, size in prev
+            }  # Преобразуем в словарь {цена: объем}
             new_dict = {price: float(size) for price, size in new}
 
-            added = [(price, size) for price, size in new_dict.items() if price not in prev_dict]
-            removed = [(price, size) for price, size in prev_dict.items() if price not in new_dict]
-            updated = [(price, size) for price, size in new_dict.items()
-                       if price in prev_dict and prev_dict[price] != size]
+            added = [
+                (price, size)
+                for price, size in new_dict.items()
+                if price not in prev_dict
+            ]
+            removed = [
+                (price, size)
+                for price, size in prev_dict.items()
+                if price not in new_dict
+            ]
+            updated = [
+                (price, size)
+                for price, size in new_dict.items()
+                if price in prev_dict and prev_dict[price] != size
+            ]
+
+            return {"added": added, "removed": removed, "updated": updated}
+
+        return {
+            "bids": process_side(prev_data["b"], new_data["b"]),
+            "asks": process_side(prev_data["a"], new_data["a"]),
+        }
+
+    @staticmethod
+    def orderbook_levels_to_arrays(
+        levels: typing.Sequence[list],
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Переводит одну сторону нескольких снимков стакана в плоские массивы.
+
+        :param levels: Для каждого снимка список уровней [[price, size], ...] (строки
+            или числа).
+        :return: (число уровней в каждом снимке, цены, объемы).
+        """
+        counts = np.fromiter(
+            (len(side) for side in levels), dtype=np.int64, count=len(levels)
+        )
+        # Строки и числа разбираются одним преобразованием NumPy, без float() для
+        # каждого значения
+        flat = np.asarray(
+            list(itertools.chain.from_iterable(levels)), dtype=np.float64
+        ).reshape(-1, 2)
+        return counts, flat[:, 0], flat[:, 1]
+
+    @staticmethod
+    def compare_orderbook_arrays(
+        counts: np.ndarray, prices: np.ndarray, sizes: np.ndarray
+    ) -> dict[str, np.ndarray]:
+        """
+        Векторизованное сравнение одной стороны последовательности снимков стакана.
+
+        Каждый уровень кодируется ключом (номер снимка, индекс цены). После одной
+        сортировки ключи предыдущего и следующего снимка для всех шагов сопоставляются
+        бинарным поиском.
+
+        :param counts: Число уровней в каждом снимке.
+        :param prices: Цены всех уровней подряд.
+        :param sizes: Объемы всех уровней подряд.
+        :return: Массивы длиной len(counts) - 1: added_count, removed_count,
+            updated_count, added_volume, removed_volume, updated_delta.
+        """
+        snapshots = len(counts)
+        steps = max(snapshots - 1, 0)
+        rows = np.repeat(np.arange(snapshots, dtype=np.int64), counts)
+        unique_prices, price_index = np.unique(prices, return_inverse=True)
+        width = max(len(unique_prices), 1)
+
+        keys = rows * width + price_index
+        order = np.argsort(keys)
+        keys, sizes = keys[order], sizes[order]
+
+        # Уровни снимка t сравниваются с уровнями снимка t + 1 на шаге t
+        prev_mask = keys < steps * width
+        new_mask = keys >= width
+        prev_keys, prev_sizes = keys[prev_mask], sizes[prev_mask]
+        new_keys, new_sizes = keys[new_mask] - width, sizes[new_mask]
+
+        def match(
+            source: np.ndarray, target: np.ndarray
+        ) -> tuple[np.ndarray, np.ndarray]:
+            """Для каждого ключа source: есть ли он в target и его позиция там"""
+            if not len(target):
+                return np.zeros(len(source), dtype=bool), np.zeros(
+                    len(source), dtype=np.int64
+                )
+            position = np.minimum(np.searchsorted(target, source), len(target) - 1)
+            return target[position] == source, position
+
+        new_found, new_position = match(new_keys, prev_keys)
+        prev_found, _ = match(prev_keys, new_keys)
+
+        new_steps, prev_steps = new_keys // width, prev_keys // width
+        added, removed = ~new_found, ~prev_found
+        size_delta = new_sizes[new_found] - prev_sizes[new_position[new_found]]
+        changed = size_delta != 0
+        updated_steps = new_steps[new_found][changed]
+
+        return {
+            "added_count": np.bincount(new_steps[added], minlength=steps),
+            "removed_count": np.bincount(prev_steps[removed], minlength=steps),
+            "updated_count": np.bincount(updated_steps, minlength=steps),
+            "added_volume": np.bincount(
+                new_steps[added], weights=new_sizes[added], minlength=steps
+            ),
+            "removed_volume": np.bincount(
+                prev_steps[removed], weights=prev_sizes[removed], minlength=steps
+            ),
+            "updated_delta": np.bincount(
+                updated_steps, weights=size_delta[changed], minlength=steps
+            ),
+        }
 
-            return {'added': added, 'removed': removed, 'updated': updated}
+    @classmethod
+    def compare_orderbooks_series(
+        cls, snapshots: typing.Sequence[dict]
+    ) -> dict[str, dict[str, np.ndarray]]:
+        """
+        Сравнивает последовательность снимков стакана за один проход вместо попарных
+        compare_orderbooks.
 
+        :param snapshots: Снимки стакана в формате Bybit ({'b': [[price, size], ...],
+            'a': [...]}).
+        :return: {'bids': {...}, 'asks': {...}} с массивами изменений по шагам (см.
+            compare_orderbook_arrays).
+        """
         return {
-            'bids': process_side(prev_data['b'], new_data['b']),
-            'asks': process_side(prev_data['a'], new_data['a']),
+            "bids": cls.compare_orderbook_arrays(
+                *cls.orderbook_levels_to_arrays(
+                    [snapshot["b"] for snapshot in snapshots]
+                )
+            ),
+            "asks": cls.compare_orderbook_arrays(
+                *cls.orderbook_levels_to_arrays(
+                    [snapshot["a"] for snapshot in snapshots]
+                )
+            ),
         }
 
     async def create(self, payload: MarketCreateSchema):
+        """Запись одного сообщения в JSONB-таблицу market."""
+        await self.create_many([payload])
+
+    async def create_many(self, payloads: typing.Sequence[MarketCreateSchema]) -> int:
+        """
+        Пакетная запись рыночных данных в JSONB-таблицу market.
+
+        :param payloads: Список записей для сохранения.
+        :return: Количество записанных строк.
+        """
+        created = datetime.datetime.utcnow()
+        return await self.copy_rows(
+            Market, [market_record(payload, created) for payload in payloads]
+        )
+
+    async def copy_rows(
+        self, model: type[Base], records: typing.Sequence[tuple]
+    ) -> int:
+        """
+        Пакетная запись строк в таблицу одним COPY вместо INSERT+commit на каждое
+        сообщение.
+
+        Если драйвер не поддерживает COPY (не asyncpg), используется многострочный
+        INSERT.
+
+        :param model: Модель таблицы (Market, Kline, PublicTrade, OrderbookSnapshot,
+            Liquidation).
+        :param records: Записи в порядке колонок COPY_COLUMNS[model].
+        :return: Количество записанных строк.
+        """
+        if not records:
+            return 0
+
+        columns = COPY_COLUMNS[model]
         async with self.db.session() as session:
-            stmt = (
-                insert(Market)
-                .values(payload.model_dump())
-            )
-            # Выполняем запрос без использования scalars, так как он не возвращает строки.
-            await session.execute(stmt)
+            connection = await session.connection()
+            raw_connection = await connection.get_raw_connection()
+            driver_connection = raw_connection.driver_connection
+
+            if hasattr(driver_connection, "copy_records_to_table"):
+                await driver_connection.copy_records_to_table(
+                    model.__tablename__,
+                    schema_name=model.metadata.schema,
+                    columns=columns,
+                    records=records,
+                )
+            else:
+                if model is Market:
+                    records = [
+                        (*record[:3], json.loads(record[3])) for record in records
+                    ]
+                await session.execute(
+                    insert(model), [dict(zip(columns, record)) for record in records]
+                )
             await session.commit()
+        return len(records)
+
+    async def get_klines(
+        self,
+        currency: str,
+        interval: str,
+        since: datetime.datetime,
+        session: AsyncSession,
+    ) -> list[KlineSchema]:
+        """
+        Закрытые свечи валютной пары начиная с `since`.
+
+        :param currency: Валютная пара, например, "BTCUSDT".
+        :param interval: Интервал свечи, например, "1".
+        :param since: Начало выборки по времени открытия свечи.
+        :param session: Сессия БД.
+        """
+        stmt = (
+            sa.select(Kline)
+            .where(
+                Kline.currency == currency,
+                Kline.interval == interval,
+                Kline.start >= since,
+            )
+            .order_by(Kline.start)
+        )
+        return (
+            await self.repository_kline.items(session=session, statement=stmt)
+        ).items
+
+    async def get_kline_arrays(
+        self,
+        currency: str,
+        limit: int,
+        session: AsyncSession,
+        interval: str = "1",
+        after: datetime.datetime | None = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        Последние `limit` закрытых свечей в виде массивов NumPy (start в мс, open, high,
+        low, close, volume), отсортированных по времени.
+
+        :param after: Только свечи, открытые позже этого времени.
+        """
+        stmt = (
+            sa.select(
+                Kline.start,
+                Kline.open,
+                Kline.high,
+                Kline.low,
+                Kline.close,
+                Kline.volume,
+            )
+            .where(
+                Kline.currency == currency,
+                Kline.interval == interval,
+            )
+            .order_by(Kline.start.desc())
+            .limit(limit)
+        )
+        if after is not None:
+            stmt = stmt.where(Kline.start > after)
+        rows = (await session.execute(stmt)).all()[::-1]
+        start = np.array(
+            [
+                int(row.start.replace(tzinfo=datetime.UTC).timestamp() * 1000)
+                for row in rows
+            ],
+            dtype=np.int64,
+        )
+        values = np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, 5)
+        return {
+            "start": start,
+            "open": values[:, 0],
+            "high": values[:, 1],
+            "low": values[:, 2],
+            "close": values[:, 3],
+            "volume": values[:, 4],
+        }
+
+    async def get_indicators(
+        self, currency: str, session: AsyncSession, limit: int = 1440
+    ) -> dict | None:
+        """
+        Технические индикаторы (SMA, EMA, RSI, MACD, ATR, Bollinger, VWAP, OBV) по
+        закрытым минутным свечам.
+
+        Берутся из Redis, где WebSocketService обновляет их инкрементально на каждую
+        свечу; если они не публикуются — рассчитываются векторно по последним `limit`
+        свечам из БД.
+
+        :param currency: Валютная пара, например, "BTCUSDT".
+        :param session: Сессия БД.
+        :param limit: Количество свечей для расчета (не меньше суток для VWAP).
+        :return: Последние значения индикаторов или None, если свечей недостаточно.
+        """
+        indicators = await self._get_published(INDICATORS_KEY.format(symbol=currency))
+        if indicators is not None:
+            return indicators
+        if self.repository_kline is None:
+            return None
+
+        arrays = await self.get_kline_arrays(currency, limit, session)
+        if len(arrays["close"]) < MIN_CANDLES:
+            return None
+        return latest(
+            compute_indicators(**{name: arrays[name] for name in CANDLE_FIELDS}),
+            arrays["close"],
+        )
+
+    async def get_patterns(
+        self,
+        currency: str,
+        since: datetime.datetime,
+        session: AsyncSession,
+        interval: str = "1",
+    ) -> list[dict] | None:
+        """
+        Свечные паттерны (Hammer, Engulfing, Three White Soldiers, Doji и др.) на
+        закрытых свечах.
+
+        Результаты кэшируются по символу и интервалу, из БД дочитываются и сканируются
+        только свечи новее последней учтенной.
+
+        :param currency: Валютная пара, например, "BTCUSDT".
+        :param since: Начало окна анализа по времени открытия свечи.
+        :param session: Сессия БД.
+        :param interval: Интервал свечи.
+        :return: Не больше PATTERNS_LIMIT последних паттернов окна или None, если свечи
+            не хранятся.
+        """
+        if self.repository_kline is None:
+            return None
+
+        last_start = self.patterns.last_start(currency, interval)
+        after = None
+        if last_start is not None:
+            after = datetime.datetime.fromtimestamp(
+                last_start / 1000, datetime.UTC
+            ).replace(tzinfo=None)
+        arrays = await self.get_kline_arrays(
+            currency, PATTERN_HISTORY, session, interval, after=after
+        )
+        if after is not None and len(arrays["start"]) == PATTERN_HISTORY:
+            # Пропущено больше свечей, чем помещается в выборку: контекст кэша не
+            # примыкает к новым свечам
+            self.patterns.reset(currency, interval)
+        self.patterns.update(
+            currency,
+            interval,
+            arrays["start"],
+            arrays["open"],
+            arrays["high"],
+            arrays["low"],
+            arrays["close"],
+        )
+        since_ms = int(since.replace(tzinfo=datetime.UTC).timestamp() * 1000)
+        return self.patterns.recent(
+            currency, interval, since=since_ms, limit=PATTERNS_LIMIT
+        )
+
+    async def get_public_trades(
+        self, currency: str, since: datetime.datetime, session: AsyncSession
+    ) -> list[PublicTradeSchema]:
+        """Публичные сделки валютной пары начиная с `since`."""
+        stmt = (
+            sa.select(PublicTrade)
+            .where(PublicTrade.currency == currency, PublicTrade.ts >= since)
+            .order_by(PublicTrade.ts)
+        )
+        return (
+            await self.repository_public_trade.items(session=session, statement=stmt)
+        ).items
+
+    async def get_orderbook_snapshots(
+        self, currency: str, since: datetime.datetime, session: AsyncSession
+    ) -> list[OrderbookSnapshotSchema]:
+        """Сообщения стакана (snapshot и delta) валютной пары начиная с `since`."""
+        stmt = (
+            sa.select(OrderbookSnapshot)
+            .where(
+                OrderbookSnapshot.currency == currency, OrderbookSnapshot.ts >= since
+            )
+            .order_by(OrderbookSnapshot.ts)
+        )
+        return (
+            await self.repository_orderbook_snapshot.items(
+                session=session, statement=stmt
+            )
+        ).items
+
+    async def get_liquidations(
+        self, currency: str, since: datetime.datetime, session: AsyncSession
+    ) -> list[LiquidationSchema]:
+        """Ликвидации валютной пары начиная с `since`."""
+        stmt = (
+            sa.select(Liquidation)
+            .where(Liquidation.currency == currency, Liquidation.ts >= since)
+            .order_by(Liquidation.ts)
+        )
+        return (
+            await self.repository_liquidation.items(session=session, statement=stmt)
+        ).items
+
+    async def get_rollups(
+        self,
+        currency: str,
+        resolution: str,
+        since: datetime.datetime,
+        until: datetime.datetime,
+        session: AsyncSession,
+    ) -> list[MarketRollupSchema]:
+        """
+        Агрегаты сделок и ликвидаций за интервал [since, until).
+
+        :param currency: Валютная пара, например, "BTCUSDT".
+        :param resolution: Разрешение: 1m, 5m или 1h.
+        :param since: Начало интервала.
+        :param until: Конец интервала.
+        :param session: Сессия БД.
+        """
+        stmt = (
+            sa.select(MarketRollup)
+            .where(
+                MarketRollup.currency == currency,
+                MarketRollup.resolution == resolution,
+                MarketRollup.bucket >= since,
+                MarketRollup.bucket < until,
+            )
+            .order_by(MarketRollup.bucket)
+        )
+        return (
+            await self.repository_rollup.items(session=session, statement=stmt)
+        ).items
+
+    async def get_raw_boundary(
+        self, currency: str, now: datetime.datetime, session: AsyncSession
+    ) -> datetime.datetime | None:
+        """
+        Граница уровней хранения: раньше нее сделки и ликвидации читаются из агрегатов,
+        позже — из сырых таблиц.
+
+        Не позже `downsample_after_hours` назад и не позже последнего часа, который
+        MarketStorageService уже свернул в агрегаты для валютной пары (агрегирование
+        идет целыми часами по расписанию).
+
+        :return: Граница или None, если агрегатов нет и читать нужно только сырые
+            данные.
+        """
+        if self.downsample_after_hours is None or self.repository_rollup is None:
+            return None
+        last = await session.scalar(
+            sa.select(sa.func.max(MarketRollup.bucket)).where(
+                MarketRollup.currency == currency, MarketRollup.resolution == "1m"
+            )
+        )
+        if last is None:
+            return None
+        return min(
+            floor_hour(now - datetime.timedelta(hours=self.downsample_after_hours)),
+            floor_hour(last) + datetime.timedelta(hours=1),
+        )
+
+    async def _get_typed_entries(
+        self,
+        currency: str,
+        since: datetime.datetime,
+        with_orderbook: bool,
+        session: AsyncSession,
+        trades_since: datetime.datetime | None = None,
+    ) -> list[MarketSchema]:
+        """
+        Строки типизированных таблиц в формате MarketSchema, чтобы анализ получал данные
+        в той же структуре, что и из JSONB-таблицы market. kind — префикс топика Bybit.
+
+        :param trades_since: Начало чтения сделок и ликвидаций, если более ранние взяты
+            из агрегатов.
+        """
+        if self.repository_kline is None:
+            return []
+
+        trades_since = trades_since or since
+        rows: list[tuple[str, typing.Any]] = []
+        rows += [
+            ("kline", row)
+            for row in await self.get_klines(currency, "1", since, session)
+        ]
+        rows += [
+            ("publicTrade", row)
+            for row in await self.get_public_trades(currency, trades_since, session)
+        ]
+        rows += [
+            ("liquidation", row)
+            for row in await self.get_liquidations(currency, trades_since, session)
+        ]
+        if with_orderbook:
+            rows += [
+                ("orderbook", row)
+                for row in await self.get_orderbook_snapshots(currency, since, session)
+            ]
+
+        return [
+            MarketSchema(
+                id=row.id,
+                currency=row.currency,
+                created=row.created,
+                kind=kind,
+                data=row.model_dump(mode="json", exclude={"id", "currency", "created"}),
+            )
+            for kind, row in rows
+        ]
 
     async def get_aggregated_market_data(
-            self,
-            currency: str,
-            minutes: int = 5,
-            session: AsyncSession | None = None
+        self,
+        currency: str,
+        minutes: int = 5,
+        session: AsyncSession | None = None,
+        raw: bool = True,
     ) -> AggregatedMarketData:
         """
-        Извлекает и агрегирует данные из модели Market за последние `minutes` минут для указанной валютной пары,
-        группируя их по типу данных (первая часть поля `kind`).
+        Извлекает и агрегирует данные из модели Market за последние `minutes` минут для
+        указанной валютной пары, группируя их по типу данных (первая часть поля `kind`).
 
         :param currency: Валютная пара, например, "BTCUSDT".
         :param minutes: Интервал выборки в минутах (по умолчанию 5).
-        :param session: Сессия, если вызвана из другого контекста.
+        :param session: Сессия, если вызвана из другого контекста; иначе открывается
+            сессия только для чтения.
+        :param raw: Читать записи и агрегаты окна; False — только сводка, индикаторы,
+            паттерны и стакан.
         :return: Экземпляр AggregatedMarketData с агрегированными данными.
         """
-        time_threshold = datetime.datetime.utcnow() - datetime.timedelta(minutes=minutes)
-        async with self.db.session() as session:
+        now = datetime.datetime.utcnow()
+        time_threshold = now - datetime.timedelta(minutes=minutes)
+        # Стакан берем из движка в памяти, а не пересобираем из снимков в БД
+        orderbook = await self.get_orderbook(currency)
+
+        # Для настроенных окон агрегат уже посчитан потоково, сырые строки не читаем
+        summary = await self.get_market_summary(currency, minutes)
+        if summary is not None or not raw:
+            async with self.db.session_ro(session) as session:
+                indicators = await self.get_indicators(currency, session)
+                patterns = await self.get_patterns(currency, time_threshold, session)
+            return AggregatedMarketData(
+                currency=currency,
+                time_range=f"Последние {minutes} минут",
+                grouped_data={},
+                orderbook=orderbook,
+                summary=summary,
+                indicators=indicators,
+                patterns=patterns,
+            )
+
+        # Сделки и ликвидации старой части окна читаются из агрегатов, сырые — только
+        # после границы уровней. Остальные данные (свечи, стакан) в агрегаты не
+        # сворачиваются и читаются за все окно
+        history = None
+        raw_threshold = time_threshold
+        async with self.db.session_ro(session) as session:
+            boundary = await self.get_raw_boundary(currency, now, session)
+            if boundary is not None and time_threshold < boundary:
+                history = await self.get_rollups(
+                    currency, resolution_for(minutes), time_threshold, boundary, session
+                )
+                raw_threshold = boundary
+
             stmt = sa.select(Market).where(
-                Market.currency == currency,
-                Market.created >= time_threshold
+                Market.currency == currency, Market.created >= time_threshold
+            )
+            if raw_threshold > time_threshold:
+                stmt = stmt.where(
+                    sa.or_(Market.created >= raw_threshold, sa.not_(ROLLED_UP_KINDS))
+                )
+            if orderbook is not None:
+                stmt = stmt.where(Market.kind.not_like("orderbook%"))
+            market_entries: RepositoryOutSchema[MarketSchema] = (
+                await self.repository.items(session=session, statement=stmt)
             )
-            market_entries: RepositoryOutSchema[MarketSchema] = await self.repository.items(
+            typed_entries = await self._get_typed_entries(
+                currency,
+                time_threshold,
+                with_orderbook=orderbook is None,
                 session=session,
-                statement=stmt
+                trades_since=raw_threshold,
             )
+            indicators = await self.get_indicators(currency, session)
+            patterns = await self.get_patterns(currency, time_threshold, session)
 
         # Группировка записей по типу (первая часть поля kind до первой точки).
         grouped = defaultdict(lambda: {"entries": [], "count": 0})
-        for entry in market_entries.items:
-            kind_main = entry.kind.split('.')[0]
+        for entry in itertools.chain(market_entries.items, typed_entries):
+            kind_main = entry.kind.split(".")[0]
+            # Свечи уже сведены в индикаторы и паттерны, сырые значения в анализ не
+            # передаются
+            if kind_main == "kline" and (
+                indicators is not None or patterns is not None
+            ):
+                continue
             grouped[kind_main]["entries"].append(entry.model_dump())
             grouped[kind_main]["count"] += 1
 
@@ -104,6 +767,10 @@ class MarketService:
         aggregated_data = AggregatedMarketData(
             currency=currency,
             time_range=f"Последние {minutes} минут",
-            grouped_data=pydantic_grouped
+            grouped_data=pydantic_grouped,
+            orderbook=orderbook,
+            history=history,
+            indicators=indicators,
+            patterns=patterns,
         )
         return aggregated_data
@@ -0,0 +1,229 @@
+"""."""
+
+import datetime
+import typing
+
+from app.enums.market import MarketKindEnums
+from app.models.base import Base
+from app.models.market import Kline, Liquidation, Market, OrderbookSnapshot, PublicTrade
+from app.resources.codec import Codec, get_codec
+from app.schemas.market import MarketCreateSchema, MarketRecord
+
+# Колонки типизированных таблиц в порядке полей записей, которые возвращает
+# parse_message
+COPY_COLUMNS: dict[type[Base], tuple[str, ...]] = {
+    Market: ("currency", "created", "kind", "data"),
+    Kline: (
+        "currency",
+        "interval",
+        "start",
+        "end",
+        "open",
+        "high",
+        "low",
+        "close",
+        "volume",
+        "turnover",
+        "created",
+    ),
+    PublicTrade: (
+        "currency",
+        "ts",
+        "trade_id",
+        "side",
+        "price",
+        "size",
+        "tick_direction",
+        "block_trade",
+        "created",
+    ),
+    OrderbookSnapshot: (
+        "currency",
+        "ts",
+        "type",
+        "update_id",
+        "seq",
+        "bid_prices",
+        "bid_sizes",
+        "ask_prices",
+        "ask_sizes",
+        "created",
+    ),
+    Liquidation: ("currency", "ts", "side", "price", "size", "created"),
+}
+
+
+# Ключи полей (symbol, ts, side, price, size) ликвидации в полной и короткой форме
+# сообщения Bybit
+LIQUIDATION_KEYS = ("symbol", "updatedTime", "side", "price", "size")
+SHORT_LIQUIDATION_KEYS = ("s", "T", "S", "p", "v")
+
+
+def from_ms(value: int | str) -> datetime.datetime:
+    """
+    Метка времени Bybit (мс) в naive UTC datetime, как и остальные колонки DateTime.
+    """
+    return datetime.datetime.fromtimestamp(int(value) / 1000, tz=datetime.UTC).replace(
+        tzinfo=None
+    )
+
+
+def market_record(
+    payload: MarketCreateSchema,
+    created: datetime.datetime | None = None,
+    codec: Codec | None = None,
+) -> MarketRecord:
+    """Запись для JSONB-таблицы market в порядке COPY_COLUMNS[Market]."""
+    data = (codec or get_codec()).dumps(payload.data).decode()
+    return MarketRecord(
+        payload.currency, created or datetime.datetime.utcnow(), payload.kind, data
+    )
+
+
+def market_row(
+    message: dict, created: datetime.datetime, codec: Codec | None = None
+) -> MarketRecord | None:
+    """
+    Запись JSONB-таблицы market прямо из сообщения Bybit, без валидации
+    MarketCreateSchema: data (первый элемент, если это список) кодируется один раз.
+
+    :return: Запись в порядке COPY_COLUMNS[Market] или None, если данных нет.
+    """
+    data = message.get("data")
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if data is None:
+        return None
+    topic = message["topic"]
+    return MarketRecord(
+        topic.rsplit(".", 1)[-1],
+        created,
+        topic,
+        (codec or get_codec()).dumps(data).decode(),
+    )
+
+
+def _symbol(message: dict) -> str:
+    return message["topic"].rsplit(".", 1)[-1]
+
+
+def _items(data: typing.Any) -> list[dict]:
+    return data if isinstance(data, list) else [data]
+
+
+def liquidation_keys(liquidation: dict) -> tuple[str, str, str, str, str]:
+    """
+    Ключи полей (symbol, ts, side, price, size) ликвидации для ее формы: полной
+    (`liquidation.{symbol}`: symbol, updatedTime, side, price, size) или короткой
+    (`allLiquidation.{symbol}`: s, T, S, p, v). Форма определяется по наличию ключа,
+    поэтому нулевые значения не подменяются полями другой формы.
+    """
+    return SHORT_LIQUIDATION_KEYS if "s" in liquidation else LIQUIDATION_KEYS
+
+
+def _parse_kline(message: dict, created: datetime.datetime) -> list[tuple]:
+    """
+    Сохраняются только закрытые свечи: промежуточные обновления приходят несколько раз в
+    секунду.
+    """
+    symbol = _symbol(message)
+    return [
+        (
+            symbol,
+            str(kline["interval"]),
+            from_ms(kline["start"]),
+            from_ms(kline["end"]),
+            float(kline["open"]),
+            float(kline["high"]),
+            float(kline["low"]),
+            float(kline["close"]),
+            float(kline["volume"]),
+            float(kline["turnover"]),
+            created,
+        )
+        for kline in _items(message["data"])
+        if kline.get("confirm")
+    ]
+
+
+def _parse_trade(message: dict, created: datetime.datetime) -> list[tuple]:
+    return [
+        (
+            trade["s"],
+            from_ms(trade["T"]),
+            str(trade["i"]),
+            trade["S"],
+            float(trade["p"]),
+            float(trade["v"]),
+            trade.get("L", ""),
+            bool(trade.get("BT", False)),
+            created,
+        )
+        for trade in _items(message["data"])
+    ]
+
+
+def _parse_orderbook(message: dict, created: datetime.datetime) -> list[tuple]:
+    data = message["data"]
+    bids, asks = data.get("b", ()), data.get("a", ())
+    return [
+        (
+            data["s"],
+            from_ms(message.get("cts") or message["ts"]),
+            message.get("type", "delta"),
+            int(data["u"]),
+            int(data.get("seq", 0)),
+            [float(price) for price, _ in bids],
+            [float(size) for _, size in bids],
+            [float(price) for price, _ in asks],
+            [float(size) for _, size in asks],
+            created,
+        )
+    ]
+
+
+def _parse_liquidation(message: dict, created: datetime.datetime) -> list[tuple]:
+    rows = []
+    for liquidation in _items(message["data"]):
+        symbol, ts, side, price, size = liquidation_keys(liquidation)
+        ts = liquidation.get(ts)
+        rows.append(
+            (
+                liquidation[symbol],
+                from_ms(message["ts"] if ts is None else ts),
+                liquidation[side],
+                float(liquidation[price]),
+                float(liquidation[size]),
+                created,
+            )
+        )
+    return rows
+
+
+PARSERS: dict[
+    MarketKindEnums,
+    tuple[type[Base], typing.Callable[[dict, datetime.datetime], list[tuple]]],
+] = {
+    MarketKindEnums.KLINE: (Kline, _parse_kline),
+    MarketKindEnums.TRADE_HISTORY: (PublicTrade, _parse_trade),
+    MarketKindEnums.ORDERBOOK: (OrderbookSnapshot, _parse_orderbook),
+    MarketKindEnums.LIQUIDATION: (Liquidation, _parse_liquidation),
+}
+
+
+def parse_message(
+    message: dict, created: datetime.datetime | None = None
+) -> tuple[type[Base], list[tuple]] | None:
+    """
+    Разбирает сообщение Bybit в строки типизированной таблицы по префиксу топика.
+
+    :param message: Сообщение Bybit с ключами topic и data.
+    :param created: Время получения; по умолчанию текущее (UTC).
+    :return: (модель, записи в порядке COPY_COLUMNS[модель]) или None для неизвестного
+        топика.
+    """
+    kind = MarketKindEnums.from_topic(message.get("topic", ""))
+    if kind is None or not message.get("data"):
+        return None
+    model, parser = PARSERS[kind]
+    return model, parser(message, created or datetime.datetime.utcnow())
@@ -0,0 +1,620 @@
+"""."""
+
+import asyncio
+import datetime
+import json
+import logging
+import pathlib
+import re
+
+import sqlalchemy as sa
+
+from app.models.base import Base
+from app.models.market import (
+    Liquidation,
+    Market,
+    MarketRollup,
+    OrderbookSnapshot,
+    PublicTrade,
+)
+from app.resources.database import Database
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Архивирование в Parquet опционально
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+# Дневные секции market: market_pYYYYMMDD, диапазон [день, день + 1)
+PARTITION_NAME = "{table}_p{day:%Y%m%d}"
+PARTITION_PATTERN = re.compile(r"_p(\d{8})$")
+# Секция по умолчанию: строки, для дня которых еще нет секции
+DEFAULT_PARTITION = "{table}_default"
+
+# Разрешения агрегатов: 1m считается из сырых данных, остальные — из 1m
+ROLLUP_RESOLUTIONS = {"1m": "1 minute", "5m": "5 minutes", "1h": "1 hour"}
+# За один проход агрегируется не больше суток, чтобы не держать длинную транзакцию
+DOWNSAMPLE_CHUNK = datetime.timedelta(days=1)
+ARCHIVE_BATCH_SIZE = 50000
+
+# Типизированные таблицы сырых данных (не секционированы): старые строки удаляются по
+# дням
+RAW_TABLES: dict[type[Base], sa.Column] = {
+    PublicTrade: PublicTrade.ts,
+    Liquidation: Liquidation.ts,
+    OrderbookSnapshot: OrderbookSnapshot.ts,
+}
+
+ROLLUP_COLUMNS = (
+    "currency, resolution, bucket, open, high, low, close, volume, turnover, trades, "
+    "buy_volume, sell_volume, liquidations, liquidation_volume"
+)
+ROLLUP_UPSERT = (
+    "ON CONFLICT (currency, resolution, bucket) DO UPDATE SET "
+    "open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low, close = "
+    "EXCLUDED.close, volume = EXCLUDED.volume, turnover = EXCLUDED.turnover, trades = "
+    "EXCLUDED.trades, buy_volume = EXCLUDED.buy_volume, sell_volume = "
+    "EXCLUDED.sell_volume, liquidations = EXCLUDED.liquidations, liquidation_volume = "
+    "EXCLUDED.liquidation_volume"
+)
+
+# Минутные агрегаты из сделок и ликвидаций: типизированные таблицы плюс JSONB-строки
+# market (данные до перехода на типизированные таблицы или при ingest.write_jsonb)
+ROLLUP_1M_SQL = """
+INSERT INTO {schema}.market_rollup ({columns})
+WITH trades AS (
+    SELECT currency, ts, price, size, side
+    FROM {schema}.public_trade WHERE ts >= :start AND ts < :end
+    UNION ALL
+    SELECT currency, created, (data->>'p')::float8, (data->>'v')::float8, data->>'S'
+    FROM {schema}.market
+    WHERE kind LIKE 'publicTrade%' AND created >= :start AND created < :end
+), liquidations AS (
+    SELECT currency, ts, size
+    FROM {schema}.liquidation WHERE ts >= :start AND ts < :end
+    UNION ALL
+    SELECT currency, created, coalesce(data->>'size', data->>'v')::float8
+    FROM {schema}.market
+    WHERE (kind LIKE 'liquidation%' OR kind LIKE 'allLiquidation%')
+        AND created >= :start AND created < :end
+), trade_buckets AS (
+    SELECT currency, date_trunc('minute', ts) AS bucket,
+        (array_agg(price ORDER BY ts))[1] AS open,
+        max(price) AS high, min(price) AS low,
+        (array_agg(price ORDER BY ts DESC))[1] AS close,
+        sum(size) AS volume, sum(price * size) AS turnover, count(*) AS trades,
+        coalesce(sum(size) FILTER (WHERE side = 'Buy'), 0) AS buy_volume,
+        coalesce(sum(size) FILTER (WHERE side <> 'Buy'), 0) AS sell_volume
+    FROM trades GROUP BY 1, 2
+), liquidation_buckets AS (
+    SELECT currency, date_trunc('minute', ts) AS bucket,
+        count(*) AS liquidations, sum(size) AS liquidation_volume
+    FROM liquidations GROUP BY 1, 2
+)
+SELECT coalesce(t.currency, l.currency), '1m', coalesce(t.bucket, l.bucket),
+    t.open, t.high, t.low, t.close,
+    coalesce(t.volume, 0), coalesce(t.turnover, 0), coalesce(t.trades, 0),
+    coalesce(t.buy_volume, 0), coalesce(t.sell_volume, 0),
+    coalesce(l.liquidations, 0), coalesce(l.liquidation_volume, 0)
+FROM trade_buckets t
+FULL OUTER JOIN liquidation_buckets l
+    ON t.currency = l.currency AND t.bucket = l.bucket
+{upsert}
+"""
+
+# Агрегаты 5m и 1h из минутных
+ROLLUP_CASCADE_SQL = """
+INSERT INTO {schema}.market_rollup ({columns})
+SELECT currency, CAST(:resolution AS varchar),
+    date_bin(CAST(:step AS interval), bucket, TIMESTAMP '2000-01-01'),
+    (array_agg(open ORDER BY bucket) FILTER (WHERE open IS NOT NULL))[1],
+    max(high), min(low),
+    (array_agg(close ORDER BY bucket DESC) FILTER (WHERE close IS NOT NULL))[1],
+    sum(volume), sum(turnover), sum(trades), sum(buy_volume), sum(sell_volume),
+    sum(liquidations), sum(liquidation_volume)
+FROM {schema}.market_rollup
+WHERE resolution = '1m' AND bucket >= :start AND bucket < :end
+GROUP BY 1, 3
+{upsert}
+"""
+
+
+def floor_hour(value: datetime.datetime) -> datetime.datetime:
+    """Начало часа."""
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def resolution_for(minutes: int) -> str:
+    """Разрешение агрегатов для окна анализа: не больше нескольких сотен точек."""
+    if minutes <= 360:
+        return "1m"
+    if minutes <= 3 * 1440:
+        return "5m"
+    return "1h"
+
+
+class MarketStorageService:
+    """
+    Обслуживание хранилища сырых рыночных данных.
+
+    Таблица market секционирована по дням (RANGE по created): секции создаются заранее
+    на `partition_days_ahead` дней, а секции старше `raw_retention_days` удаляются
+    целиком (DROP TABLE вместо DELETE — без раздувания таблицы и долгого VACUUM).
+
+    Сырые сделки и ликвидации старше `downsample_after_hours` сворачиваются в агрегаты
+    market_rollup (1m, 5m, 1h). Перед удалением сырые данные выгружаются в Parquet
+    в `archive_dir`, если он задан (нужен pyarrow).
+    """
+
+    db: Database
+
+    def __init__(
+        self,
+        db: Database,
+        partition_days_ahead: int = 3,
+        raw_retention_days: int = 30,
+        downsample_after_hours: int = 6,
+        archive_dir: str = "",
+        archive_compression: str = "zstd",
+    ):
+        """
+        :param db: База данных.
+        :param partition_days_ahead: На сколько дней вперед создавать секции.
+        :param raw_retention_days: Сколько дней хранить сырые данные.
+        :param downsample_after_hours: Возраст сырых данных (ч.), после которого они
+            сворачиваются в агрегаты.
+        :param archive_dir: Каталог архива Parquet; пустая строка — удалять без
+            архивирования.
+        :param archive_compression: Сжатие Parquet (zstd, snappy, gzip).
+        """
+        self.db = db
+        self.partition_days_ahead = partition_days_ahead
+        self.raw_retention_days = raw_retention_days
+        self.downsample_after_hours = downsample_after_hours
+        self.archive_dir = pathlib.Path(archive_dir) if archive_dir else None
+        self.archive_compression = archive_compression
+
+    @staticmethod
+    def partition_name(day: datetime.date, table: str = Market.__tablename__) -> str:
+        """Имя дневной секции."""
+        return PARTITION_NAME.format(table=table, day=day)
+
+    @staticmethod
+    def partition_day(name: str) -> datetime.date | None:
+        """День секции по ее имени; None для секции по умолчанию и чужих таблиц."""
+        match = PARTITION_PATTERN.search(name)
+        if match is None:
+            return None
+        return datetime.datetime.strptime(match.group(1), "%Y%m%d").date()
+
+    async def list_partitions(self, table: str = Market.__tablename__) -> list[str]:
+        """Имена секций таблицы."""
+        schema = Market.metadata.schema
+        async with self.db.session() as session:
+            result = await session.execute(
+                sa.text(
+                    "SELECT child.relname FROM pg_inherits "
+                    "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                    "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                    "JOIN pg_namespace ns ON ns.oid = parent.relnamespace "
+                    "WHERE parent.relname = :table AND ns.nspname = :schema "
+                    "ORDER BY child.relname"
+                ),
+                {"table": table, "schema": schema},
+            )
+            return list(result.scalars())
+
+    async def ensure_partitions(self, today: datetime.date | None = None) -> list[str]:
+        """
+        Создает недостающие дневные секции от сегодняшнего дня на `partition_days_ahead`
+        дней вперед. Каждая секция создается в своей транзакции: ошибка одного дня не
+        отменяет остальные.
+
+        :param today: Текущая дата (UTC), параметр для тестов.
+        :return: Имена созданных секций.
+        """
+        today = today or datetime.datetime.utcnow().date()
+        table = Market.__tablename__
+        existing = set(await self.list_partitions(table))
+        default = DEFAULT_PARTITION.format(table=table)
+        created = []
+        for offset in range(self.partition_days_ahead + 1):
+            day = today + datetime.timedelta(days=offset)
+            name = self.partition_name(day, table)
+            if name in existing:
+                continue
+            try:
+                async with self.db.session() as session:
+                    moved = await self._create_partition(
+                        session,
+                        table,
+                        name,
+                        day,
+                        default if default in existing else None,
+                    )
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"⚠ Секция {name} не создана: {e}")
+                continue
+            created.append(name)
+            if moved:
+                logger.warning(f"Перенесено {moved} строк из {default} в {name}")
+        if created:
+            logger.info(f"✅ Созданы секции {table}: {', '.join(created)}")
+        if default in existing:
+            await self._check_default_partition(default)
+        return created
+
+    @staticmethod
+    async def _create_partition(
+        session, table: str, name: str, day: datetime.date, default: str | None
+    ) -> int:
+        """
+        Создает секцию дня. Если строки этого дня уже попали в секцию по умолчанию,
+        CREATE ... PARTITION OF нарушил бы ее ограничение: секция по умолчанию
+        отсоединяется, строки переносятся в новую секцию, после чего она присоединяется
+        обратно.
+
+        :return: Количество перенесенных строк.
+        """
+        schema = Market.metadata.schema
+        bounds = {"start": day, "end": day + datetime.timedelta(days=1)}
+        create = (
+            f'CREATE TABLE IF NOT EXISTS "{schema}"."{name}" '
+            f'PARTITION OF "{schema}"."{table}" '
+            f"FOR VALUES FROM ('{bounds['start'].isoformat()}') TO "
+            f"('{bounds['end'].isoformat()}')"
+        )
+        moved = 0
+        if default is not None:
+            moved = await session.scalar(
+                sa.text(
+                    f'SELECT count(*) FROM "{schema}"."{default}" '
+                    "WHERE created >= :start AND created < :end"
+                ),
+                bounds,
+            )
+        if not moved:
+            await session.execute(sa.text(create))
+            return 0
+
+        await session.execute(
+            sa.text(
+                f'ALTER TABLE "{schema}"."{table}" '
+                f'DETACH PARTITION "{schema}"."{default}"'
+            )
+        )
+        await session.execute(sa.text(create))
+        await session.execute(
+            sa.text(
+                f'INSERT INTO "{schema}"."{table}" '
+                f'SELECT * FROM "{schema}"."{default}" '
+                "WHERE created >= :start AND created < :end"
+            ),
+            bounds,
+        )
+        await session.execute(
+            sa.text(
+                f'DELETE FROM "{schema}"."{default}" '
+                "WHERE created >= :start AND created < :end"
+            ),
+            bounds,
+        )
+        await session.execute(
+            sa.text(
+                f'ALTER TABLE "{schema}"."{table}" '
+                f'ATTACH PARTITION "{schema}"."{default}" DEFAULT'
+            )
+        )
+        return moved
+
+    async def _check_default_partition(self, default: str):
+        """
+        Предупреждает о строках в секции по умолчанию: для их дней нет дневных секций.
+        """
+        schema = Market.metadata.schema
+        try:
+            async with self.db.session() as session:
+                count, first, last = (
+                    await session.execute(
+                        sa.text(
+                            "SELECT count(*), min(created), max(created) "
+                            f'FROM "{schema}"."{default}"'
+                        )
+                    )
+                ).one()
+        except Exception as e:
+            logger.error(f"⚠ Ошибка проверки секции {default}: {e}")
+            return
+        if count:
+            logger.warning(
+                f"⚠ В секции {default} {count} строк без дневной секции: {first} — "
+                f"{last}"
+            )
+
+    async def downsample(
+        self, now: datetime.datetime | None = None
+    ) -> datetime.datetime | None:
+        """
+        Сворачивает сырые сделки и ликвидации старше `downsample_after_hours` в агрегаты
+        1m, 5m и 1h.
+
+        Обрабатываются целые часы от последнего агрегированного часа до границы. Запись
+        идет через upsert, поэтому повторная обработка интервала безопасна.
+
+        :param now: Текущее время (UTC), параметр для тестов.
+        :return: Граница, до которой данные агрегированы, или None, если агрегировать
+            нечего.
+        """
+        cutoff = floor_hour(
+            (now or datetime.datetime.utcnow())
+            - datetime.timedelta(hours=self.downsample_after_hours)
+        )
+        schema = Market.metadata.schema
+
+        async with self.db.session() as session:
+            last = await session.scalar(
+                sa.select(sa.func.max(MarketRollup.bucket)).where(
+                    MarketRollup.resolution == "1m"
+                )
+            )
+            if last is None:
+                last = await session.scalar(
+                    sa.select(
+                        sa.func.least(
+                            sa.select(sa.func.min(PublicTrade.ts)).scalar_subquery(),
+                            sa.select(sa.func.min(Liquidation.ts)).scalar_subquery(),
+                            sa.select(sa.func.min(Market.created))
+                            .where(
+                                sa.or_(
+                                    Market.kind.like("publicTrade%"),
+                                    Market.kind.like("%iquidation%"),
+                                )
+                            )
+                            .scalar_subquery(),
+                        )
+                    )
+                )
+            if last is None:
+                return None
+
+            start = floor_hour(last)
+            rollup_1m = sa.text(
+                ROLLUP_1M_SQL.format(
+                    schema=schema, columns=ROLLUP_COLUMNS, upsert=ROLLUP_UPSERT
+                )
+            )
+            cascade = sa.text(
+                ROLLUP_CASCADE_SQL.format(
+                    schema=schema, columns=ROLLUP_COLUMNS, upsert=ROLLUP_UPSERT
+                )
+            )
+            while start < cutoff:
+                end = min(start + DOWNSAMPLE_CHUNK, cutoff)
+                await session.execute(rollup_1m, {"start": start, "end": end})
+                for resolution, step in ROLLUP_RESOLUTIONS.items():
+                    if resolution != "1m":
+                        await session.execute(
+                            cascade,
+                            {
+                                "resolution": resolution,
+                                "step": step,
+                                "start": start,
+                                "end": end,
+                            },
+                        )
+                await session.commit()
+                logger.info(f"✅ Агрегированы сырые данные за {start} — {end}")
+                start = end
+        return cutoff
+
+    async def archive(
+        self, session, statement: sa.Select | sa.TextClause, path: pathlib.Path
+    ) -> int | None:
+        """
+        Выгружает результат запроса в сжатый Parquet (через временный файл).
+
+        :param session: Сессия БД.
+        :param statement: Запрос строк для архива.
+        :param path: Путь файла архива.
+        :return: Количество выгруженных строк или None, если архивирование выключено.
+        """
+        if self.archive_dir is None:
+            return None
+        if pa is None:
+            raise RuntimeError("Для архивирования в Parquet нужен пакет pyarrow")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        writer = None
+        rows = 0
+        try:
+            result = await session.stream(statement)
+            async for partition in result.mappings().partitions(ARCHIVE_BATCH_SIZE):
+                table = pa.Table.from_pylist(
+                    [
+                        {
+                            key: json.dumps(value) if isinstance(value, dict) else value
+                            for key, value in row.items()
+                        }
+                        for row in partition
+                    ],
+                    schema=writer.schema if writer is not None else None,
+                )
+                if writer is None:
+                    writer = pq.ParquetWriter(
+                        tmp_path, table.schema, compression=self.archive_compression
+                    )
+                await asyncio.to_thread(writer.write_table, table)
+                rows += len(partition)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is not None:
+            tmp_path.replace(path)
+        return rows
+
+    async def drop_expired_partitions(
+        self, today: datetime.date | None = None, until: datetime.datetime | None = None
+    ) -> list[str]:
+        """
+        Удаляет секции, все строки которых старше `raw_retention_days` дней,
+        предварительно архивируя их. Из секции по умолчанию удаляются (с архивированием)
+        строки старше той же границы.
+
+        :param today: Текущая дата (UTC), параметр для тестов.
+        :param until: Граница агрегирования: секции после нее не удаляются, пока не
+            свернуты в агрегаты.
+        :return: Имена удаленных секций.
+        """
+        today = today or datetime.datetime.utcnow().date()
+        threshold = today - datetime.timedelta(days=self.raw_retention_days)
+        if until is not None:
+            threshold = min(threshold, until.date())
+        schema, table = Market.metadata.schema, Market.__tablename__
+        partitions = await self.list_partitions(table)
+        expired = [
+            (name, day)
+            for name in partitions
+            if (day := self.partition_day(name)) is not None and day < threshold
+        ]
+
+        dropped = []
+        for name, day in expired:
+            try:
+                async with self.db.session() as session:
+                    rows = await self.archive(
+                        session,
+                        sa.text(f'SELECT * FROM "{schema}"."{name}"'),
+                        self._archive_path(table, day),
+                    )
+                    await session.execute(
+                        sa.text(f'DROP TABLE IF EXISTS "{schema}"."{name}"')
+                    )
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"⚠ Секция {name} не удалена: {e}")
+                continue
+            dropped.append(name)
+            logger.info(
+                f"✅ Удалена секция {name}"
+                + (f", в архиве {rows} строк" if rows is not None else "")
+            )
+        if DEFAULT_PARTITION.format(table=table) in partitions:
+            await self._purge_default_partition(threshold)
+        return dropped
+
+    async def _purge_default_partition(self, threshold: datetime.date) -> int:
+        """
+        Удаляет из секции по умолчанию строки старше `threshold`, предварительно
+        архивируя их.
+
+        :return: Количество удаленных строк.
+        """
+        schema, table = Market.metadata.schema, Market.__tablename__
+        default = DEFAULT_PARTITION.format(table=table)
+        condition = {"threshold": datetime.datetime.combine(threshold, datetime.time())}
+        # Строки секции по умолчанию удаляются частями, поэтому каждый архив получает
+        # свое имя
+        path = (
+            (self.archive_dir or pathlib.Path())
+            / table
+            / f"default-{datetime.datetime.utcnow():%Y%m%dT%H%M%S}.parquet"
+        )
+        try:
+            async with self.db.session() as session:
+                await self.archive(
+                    session,
+                    sa.text(
+                        f'SELECT * FROM "{schema}"."{default}" '
+                        "WHERE created < :threshold"
+                    ).bindparams(**condition),
+                    path,
+                )
+                result = await session.execute(
+                    sa.text(
+                        f'DELETE FROM "{schema}"."{default}" WHERE created < :threshold'
+                    ),
+                    condition,
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"⚠ Строки {default} старше {threshold} не удалены: {e}")
+            return 0
+        if result.rowcount:
+            logger.info(
+                f"✅ Удалено {result.rowcount} строк {default} старше {threshold}"
+            )
+        return result.rowcount
+
+    async def purge_expired_rows(
+        self, today: datetime.date | None = None, until: datetime.datetime | None = None
+    ) -> int:
+        """
+        Удаляет по дням строки типизированных таблиц старше `raw_retention_days` дней,
+        предварительно архивируя их.
+
+        :param today: Текущая дата (UTC), параметр для тестов.
+        :param until: Граница агрегирования, как в drop_expired_partitions.
+        :return: Количество удаленных строк.
+        """
+        today = today or datetime.datetime.utcnow().date()
+        threshold = today - datetime.timedelta(days=self.raw_retention_days)
+        if until is not None:
+            threshold = min(threshold, until.date())
+        deleted = 0
+        for model, column in RAW_TABLES.items():
+            async with self.db.session() as session:
+                oldest = await session.scalar(sa.select(sa.func.min(column)))
+            day = oldest.date() if oldest is not None else threshold
+            while day < threshold:
+                start = datetime.datetime.combine(day, datetime.time())
+                condition = sa.and_(
+                    column >= start, column < start + datetime.timedelta(days=1)
+                )
+                try:
+                    async with self.db.session() as session:
+                        await self.archive(
+                            session,
+                            sa.select(model.__table__).where(condition),
+                            self._archive_path(model.__tablename__, day),
+                        )
+                        result = await session.execute(
+                            sa.delete(model).where(condition)
+                        )
+                        await session.commit()
+                except Exception as e:
+                    logger.error(
+                        f"⚠ Строки {model.__tablename__} за {day} не удалены: {e}"
+                    )
+                    break
+                deleted += result.rowcount
+                day += datetime.timedelta(days=1)
+        if deleted:
+            logger.info(f"✅ Удалено {deleted} строк сырых данных старше {threshold}")
+        return deleted
+
+    def _archive_path(self, table: str, day: datetime.date) -> pathlib.Path:
+        return (self.archive_dir or pathlib.Path()) / table / f"{day:%Y-%m-%d}.parquet"
+
+    async def maintain(self):
+        """
+        Плановое обслуживание: создание будущих секций, агрегирование сырых данных
+        и удаление (с архивированием) устаревших.
+        """
+        try:
+            await self.ensure_partitions()
+        except Exception as e:
+            logger.error(f"⚠ Ошибка создания секций market: {e}")
+        try:
+            until = await self.downsample()
+        except Exception as e:
+            logger.error(f"⚠ Ошибка агрегирования сырых данных: {e}")
+            return
+        if until is None:
+            # Сделок и ликвидаций нет — удалять можно по сроку хранения
+            until = datetime.datetime.utcnow()
+        await self.drop_expired_partitions(until=until)
+        await self.purge_expired_rows(until=until)
@@ -0,0 +1,193 @@
+"""."""
+
+import asyncio
+import datetime
+import logging
+import time
+from collections import defaultdict
+
+from app.models.base import Base
+from app.models.market import Market
+from app.schemas.market import MarketCreateSchema
+from app.services.market import MarketService
+from app.services.market_parser import market_record
+
+logger = logging.getLogger(__name__)
+
+
+class MarketBulkWriter:
+    """
+    Накопитель рыночных данных для пакетной записи в БД.
+
+    Строки копятся отдельно для каждой таблицы и сбрасываются через
+    MarketService.copy_rows, когда буфер достигает `batch_size` или с момента последнего
+    сброса прошло `flush_interval` секунд. Если в буфере `max_pending` строк, add() ждет
+    следующего сброса (back-pressure).
+
+    Пакет, который не удалось записать, возвращается в буфер и повторяется при следующих
+    сбросах, после `max_retries` неудачных попыток он отбрасывается и учитывается в
+    `rows_failed`.
+    """
+
+    market_service: MarketService
+
+    def __init__(
+        self,
+        market_service: MarketService,
+        batch_size: int = 5000,
+        flush_interval: float = 1.0,
+        max_pending: int = 50000,
+        max_retries: int = 3,
+    ):
+        """
+        :param market_service: Сервис записи рыночных данных.
+        :param batch_size: Размер пакета, при котором запись запускается сразу.
+        :param flush_interval: Максимальное время (сек.) между сбросами буфера.
+        :param max_pending: Максимальное число строк в буфере до блокировки add().
+        :param max_retries: Число попыток записи пакета, после которого он
+            отбрасывается.
+        """
+        self.market_service = market_service
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, batch_size)
+        self.max_retries = max(max_retries, 1)
+
+        self._rows: defaultdict[type[Base], list[tuple]] = defaultdict(list)
+        # Пакеты, не записанные с прошлых сбросов: (таблица, строки, число неудачных
+        # попыток)
+        self._retry: list[tuple[type[Base], list[tuple], int]] = []
+        self._pending = 0
+        self._flush_lock = asyncio.Lock()
+        self._flush_requested = asyncio.Event()
+        self._has_space = asyncio.Event()
+        self._has_space.set()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+        self.rows_written = 0
+        self.rows_failed = 0
+
+    @property
+    def pending(self) -> int:
+        """Количество строк, ожидающих записи."""
+        return self._pending
+
+    async def start(self):
+        """Запускает фоновую задачу сброса буфера."""
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Останавливает фоновую задачу и записывает остаток буфера.
+        Задача не отменяется: текущий сброс дописывает уже извлеченные из буфера строки.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._flush_requested.set()
+            await self._task
+            self._task = None
+        # Повторяем неудачные пакеты, пока они не записаны или не исчерпали попытки
+        while self._pending:
+            await self.flush()
+
+    async def add(self, payload: MarketCreateSchema):
+        """Добавляет одну строку в буфер."""
+        await self.add_many([payload])
+
+    async def add_many(self, payloads: list[MarketCreateSchema]):
+        """Добавляет строки JSONB-таблицы market."""
+        created = datetime.datetime.utcnow()
+        await self.add_rows(
+            Market, [market_record(payload, created) for payload in payloads]
+        )
+
+    async def add_rows(self, model: type[Base], rows: list[tuple]):
+        """
+        Добавляет строки таблицы в буфер, ожидая освобождения места при переполнении.
+
+        :param model: Модель таблицы.
+        :param rows: Записи в порядке колонок COPY_COLUMNS[model].
+        """
+        if not rows:
+            return
+        while self._pending >= self.max_pending:
+            self._has_space.clear()
+            self._flush_requested.set()
+            await self._has_space.wait()
+
+        self._rows[model].extend(rows)
+        self._pending += len(rows)
+        if self._pending >= self.batch_size:
+            self._flush_requested.set()
+
+    async def flush(self, requeue: bool = True) -> bool:
+        """
+        Записывает накопленные строки в БД пакетами по `batch_size`.
+
+        :param requeue: Вернуть неудачные пакеты в буфер для повтора. Консьюмер стрима
+            передает False: неподтвержденные сообщения и так будут прочитаны повторно.
+        :return: True, если все строки записаны без ошибок.
+        """
+        async with self._flush_lock:
+            tables, self._rows = self._rows, defaultdict(list)
+            retry, self._retry = self._retry, []
+            total, self._pending = self._pending, 0
+            self._has_space.set()
+            if not total:
+                return True
+
+            batches = retry + [
+                (model, rows[i : i + self.batch_size], 0)
+                for model, rows in tables.items()
+                for i in range(0, len(rows), self.batch_size)
+            ]
+            success = True
+            started = time.monotonic()
+            for model, batch, attempts in batches:
+                try:
+                    self.rows_written += await self.market_service.copy_rows(
+                        model, batch
+                    )
+                except Exception as e:
+                    success = False
+                    attempts += 1
+                    if requeue and attempts < self.max_retries:
+                        self._retry.append((model, batch, attempts))
+                        self._pending += len(batch)
+                        logger.error(
+                            f"⚠ Ошибка пакетной записи в {model.__tablename__} "
+                            f"({len(batch)} строк, попытка "
+                            f"{attempts}/{self.max_retries}), пакет возвращен в буфер: "
+                            f"{e}"
+                        )
+                    else:
+                        self.rows_failed += len(batch)
+                        logger.error(
+                            f"⚠ Ошибка пакетной записи в {model.__tablename__} "
+                            f"({len(batch)} строк), пакет отброшен: {e}"
+                        )
+
+            elapsed = time.monotonic() - started
+            logger.debug(
+                f"Записано {total} строк за {elapsed:.3f} с "
+                f"({total / elapsed if elapsed else 0:.0f} строк/с)"
+            )
+            return success
+
+    async def _run(self):
+        """Сбрасывает буфер по размеру или по таймеру до вызова stop()."""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(
+                    self._flush_requested.wait(), timeout=self.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"⚠ Ошибка фонового сброса буфера: {e}")
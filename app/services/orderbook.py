@@ -0,0 +1,262 @@
+"""."""
+
+import bisect
+import logging
+import typing
+
+logger = logging.getLogger(__name__)
+
+# Ключ Redis, под которым публикуется сводка стакана символа
+ORDERBOOK_KEY = "orderbook:{symbol}"
+# Глубины, объем которых поддерживается инкрементально (уровни сводки стакана)
+TRACKED_DEPTHS = (10,)
+
+
+class OrderBookSide:
+    """
+    Одна сторона стакана: уровни отсортированы от лучшей цены к худшей.
+
+    Цены хранятся в отсортированном списке ключей (для bids ключ = -price), поиск уровня
+    выполняется бинарным поиском. Суммарный объем стороны и объем первых N уровней для
+    каждого N из `depths` поддерживаются инкрементально: уровень входит в первые N, если
+    его ключ не хуже N-го ключа списка, и сумма поправляется на изменение объема или на
+    уровень, который при вставке или удалении пересекает N-ю позицию.
+
+    Сложность: изменение объема существующего уровня — O(1), добавление и удаление
+    уровня — O(log n) на поиск и O(n) на сдвиг списка (memmove; для 50–500 уровней Bybit
+    это быстрее SortedDict, см. tests/bench_orderbook.py), лучший уровень, объем стороны
+    и depth(N) для N из `depths` — O(1), depth(n) для прочих n и levels(n) — O(n).
+    """
+
+    def __init__(self, descending: bool, depths: typing.Iterable[int] = TRACKED_DEPTHS):
+        """
+        :param descending: True для bids (лучшая цена максимальная), False для asks.
+        :param depths: Число уровней, объем которых поддерживается инкрементально.
+        """
+        self._sign = -1.0 if descending else 1.0
+        self._keys: list[float] = []
+        self._sizes: dict[float, float] = {}
+        self._depths: dict[int, float] = {depth: 0.0 for depth in depths if depth > 0}
+        self.volume = 0.0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self):
+        """Удаляет все уровни."""
+        self._keys.clear()
+        self._sizes.clear()
+        self._depths = dict.fromkeys(self._depths, 0.0)
+        self.volume = 0.0
+
+    def _within(self, key: float, depth: int) -> bool:
+        """Входит ли уровень `key` в первые `depth` уровней."""
+        return len(self._keys) <= depth or key <= self._keys[depth - 1]
+
+    def set(self, price: float, size: float):
+        """Устанавливает объем уровня; нулевой объем удаляет уровень."""
+        key = price * self._sign
+        previous = self._sizes.get(key)
+        keys, sizes = self._keys, self._sizes
+        if size == 0:
+            if previous is None:
+                return
+            within = [depth for depth in self._depths if self._within(key, depth)]
+            del sizes[key]
+            del keys[bisect.bisect_left(keys, key)]
+            self.volume -= previous
+            for depth in within:
+                # На N-ю позицию поднимается следующий уровень
+                entering = sizes[keys[depth - 1]] if len(keys) >= depth else 0.0
+                self._depths[depth] += entering - previous
+            return
+
+        sizes[key] = size
+        if previous is None:
+            bisect.insort(keys, key)
+            self.volume += size
+            for depth in self._depths:
+                if self._within(key, depth):
+                    # Уровень, бывший N-м, уходит за первые N
+                    leaving = sizes[keys[depth]] if len(keys) > depth else 0.0
+                    self._depths[depth] += size - leaving
+            return
+
+        self.volume += size - previous
+        for depth in self._depths:
+            if self._within(key, depth):
+                self._depths[depth] += size - previous
+
+    def best(self) -> tuple[float, float] | None:
+        """Лучший уровень (цена, объем)."""
+        if not self._keys:
+            return None
+        key = self._keys[0]
+        return key * self._sign, self._sizes[key]
+
+    def levels(self, n: int | None = None) -> list[tuple[float, float]]:
+        """Первые `n` уровней (все, если n не задан) от лучшей цены."""
+        keys = self._keys if n is None else self._keys[:n]
+        return [(key * self._sign, self._sizes[key]) for key in keys]
+
+    def depth(self, n: int | None = None) -> float:
+        """
+        Суммарный объем первых `n` уровней: O(1) без `n` и для n из `depths`, иначе
+        O(n).
+        """
+        if n is None or n >= len(self._keys):
+            return self.volume
+        tracked = self._depths.get(n)
+        if tracked is not None:
+            return tracked
+        return sum(self._sizes[key] for key in self._keys[:n])
+
+
+class OrderBook:
+    """
+    Стакан одного символа, собираемый из snapshot и delta сообщений Bybit
+    `orderbook.{depth}.{symbol}`.
+
+    Каждая delta должна иметь `u` на единицу больше предыдущего. При пропуске стакан
+    помечается как рассинхронизированный и не принимает delta до следующего snapshot.
+    """
+
+    def __init__(self, symbol: str, depths: typing.Iterable[int] = TRACKED_DEPTHS):
+        """
+        :param depths: Глубины, для которых depth и imbalance считаются за O(1).
+        """
+        depths = tuple(depths)
+        self.symbol = symbol
+        self.bids = OrderBookSide(descending=True, depths=depths)
+        self.asks = OrderBookSide(descending=False, depths=depths)
+        self.update_id: int | None = None
+        self.seq: int | None = None
+        self.ts: int | None = None
+        self.is_synced = False
+
+    def apply(self, message: dict) -> bool:
+        """
+        Применяет сообщение стакана.
+
+        :param message: Сообщение Bybit с ключами `type`, `ts` и `data` ({s, b, a, u,
+            seq}).
+        :return: False, если обнаружен разрыв последовательности или стакан ждет
+            snapshot.
+        """
+        data = message["data"]
+        update_id = int(data["u"])
+
+        # u == 1 означает перезапуск сервиса Bybit и тоже является snapshot
+        if message.get("type") == "snapshot" or update_id == 1:
+            self.bids.clear()
+            self.asks.clear()
+        elif not self.is_synced:
+            return False
+        elif update_id != self.update_id + 1:
+            logger.warning(
+                f"⚠ Разрыв последовательности стакана {self.symbol}: ожидался "
+                f"u={self.update_id + 1}, получен u={update_id}"
+            )
+            self.is_synced = False
+            return False
+
+        for price, size in data.get("b", ()):
+            self.bids.set(float(price), float(size))
+        for price, size in data.get("a", ()):
+            self.asks.set(float(price), float(size))
+
+        self.update_id = update_id
+        self.seq = data.get("seq")
+        self.ts = message.get("ts")
+        self.is_synced = True
+        return True
+
+    @property
+    def best_bid(self) -> tuple[float, float] | None:
+        return self.bids.best()
+
+    @property
+    def best_ask(self) -> tuple[float, float] | None:
+        return self.asks.best()
+
+    @property
+    def mid(self) -> float | None:
+        bid, ask = self.best_bid, self.best_ask
+        if bid is None or ask is None:
+            return None
+        return (bid[0] + ask[0]) / 2
+
+    @property
+    def spread(self) -> float | None:
+        bid, ask = self.best_bid, self.best_ask
+        if bid is None or ask is None:
+            return None
+        return ask[0] - bid[0]
+
+    def imbalance(self, n: int | None = None) -> float | None:
+        """
+        Дисбаланс объемов (bids - asks) / (bids + asks) по первым `n` уровням: за O(1)
+        без `n` и для n из `depths`, иначе за O(n).
+        """
+        bid_volume, ask_volume = self.bids.depth(n), self.asks.depth(n)
+        total = bid_volume + ask_volume
+        if not total:
+            return None
+        return (bid_volume - ask_volume) / total
+
+    def summary(self, levels: int = 10) -> dict:
+        """Сводка состояния стакана для анализа."""
+        best_bid, best_ask = self.best_bid, self.best_ask
+        return {
+            "symbol": self.symbol,
+            "ts": self.ts,
+            "update_id": self.update_id,
+            "is_synced": self.is_synced,
+            "best_bid": best_bid,
+            "best_ask": best_ask,
+            "mid": self.mid,
+            "spread": self.spread,
+            "bid_volume": self.bids.volume,
+            "ask_volume": self.asks.volume,
+            "imbalance": self.imbalance(),
+            f"imbalance_{levels}": self.imbalance(levels),
+            "bids": self.bids.levels(levels),
+            "asks": self.asks.levels(levels),
+        }
+
+
+class OrderBookManager:
+    """Набор стаканов по символам."""
+
+    def __init__(self, on_gap: typing.Callable[[str], typing.Any] | None = None):
+        """
+        :param on_gap: Вызывается с символом, когда стакан рассинхронизирован и нужен
+            новый snapshot.
+        """
+        self.books: dict[str, OrderBook] = {}
+        self.on_gap = on_gap
+
+    def get(self, symbol: str) -> OrderBook | None:
+        return self.books.get(symbol)
+
+    def apply(self, message: dict) -> OrderBook:
+        """
+        Применяет сообщение к стакану символа, при разрыве запрашивает новый snapshot.
+        """
+        symbol = message["data"]["s"]
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = OrderBook(symbol)
+
+        was_synced = book.is_synced
+        if not book.apply(message) and was_synced and self.on_gap is not None:
+            self.on_gap(symbol)
+        return book
+
+    def summaries(self, levels: int = 10) -> dict[str, dict]:
+        """Сводки всех синхронизированных стаканов."""
+        return {
+            symbol: book.summary(levels)
+            for symbol, book in self.books.items()
+            if book.is_synced
+        }
@@ -0,0 +1,246 @@
+"""."""
+
+import collections
+import dataclasses
+import datetime
+import logging
+
+import numpy as np
+
+from app.services.indicators import sma
+
+logger = logging.getLogger(__name__)
+
+# Паттерн -> направление сигнала
+PATTERNS = {
+    "hammer": "bullish",
+    "inverted_hammer": "bullish",
+    "bullish_engulfing": "bullish",
+    "piercing_line": "bullish",
+    "three_white_soldiers": "bullish",
+    "hanging_man": "bearish",
+    "bearish_engulfing": "bearish",
+    "dark_cloud_cover": "bearish",
+    "three_black_crows": "bearish",
+    "doji": "neutral",
+}
+
+# Тренд перед свечой: закрытие предыдущей свечи относительно SMA закрытий за
+# TREND_PERIOD свечей
+TREND_PERIOD = 10
+# Тело доджи не больше этой доли диапазона свечи
+DOJI_BODY = 0.1
+# Длинная тень молота — не меньше SHADOW_RATIO тел, короткая — не больше SHORT_SHADOW
+# диапазона
+SHADOW_RATIO = 2.0
+SHORT_SHADOW = 0.1
+# Сколько предыдущих свечей нужно, чтобы определить паттерн на текущей
+CONTEXT = TREND_PERIOD + 2
+# Сколько найденных паттернов хранится в кэше на символ и интервал
+PATTERN_HISTORY = 1440
+
+
+def _prev(values: np.ndarray, n: int = 1) -> np.ndarray:
+    """
+    Значения n свечей назад; в начале ряда NaN (для bool — False), сравнения с ними
+    ложны.
+    """
+    out = np.empty_like(values)
+    fill = False if values.dtype == bool else np.nan
+    out[:n] = fill
+    out[n:] = values[: len(values) - n]
+    return out
+
+
+def scan_patterns(
+    open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray
+) -> dict[str, np.ndarray]:
+    """
+    Векторно размечает свечные паттерны за один проход по массивам OHLC.
+
+    :return: Для каждого паттерна из PATTERNS — булев массив той же длины; True на
+        свече, которой паттерн завершается.
+    """
+    o, h, l, c = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    body = np.abs(c - o)
+    span = h - l
+    upper = h - np.maximum(o, c)
+    lower = np.minimum(o, c) - l
+    bull = c > o
+    bear = c < o
+
+    trend = sma(c, TREND_PERIOD)
+    down = _prev(c) < _prev(trend)
+    up = _prev(c) > _prev(trend)
+
+    hammer_shape = (
+        (span > 0) & (lower >= SHADOW_RATIO * body) & (upper <= SHORT_SHADOW * span)
+    )
+    inverted_shape = (
+        (span > 0) & (upper >= SHADOW_RATIO * body) & (lower <= SHORT_SHADOW * span)
+    )
+
+    po, pc, pbody = _prev(o), _prev(c), _prev(body)
+    pbull, pbear = pc > po, pc < po
+    middle = (po + pc) / 2
+
+    # Каждая свеча открывается внутри тела предыдущей и закрывается дальше ее закрытия
+    soldier = bull & pbull & (o > po) & (o <= pc) & (c > pc)
+    crow = bear & pbear & (o < po) & (o >= pc) & (c < pc)
+
+    return {
+        "hammer": hammer_shape & down,
+        "inverted_hammer": inverted_shape & down,
+        "bullish_engulfing": pbear & bull & (o <= pc) & (c >= po) & (body > pbody),
+        "piercing_line": pbear & bull & (o < pc) & (c > middle) & (c < po),
+        "three_white_soldiers": soldier & _prev(soldier) & _prev(bull, 2),
+        "hanging_man": hammer_shape & up,
+        "bearish_engulfing": pbull & bear & (o >= pc) & (c <= po) & (body > pbody),
+        "dark_cloud_cover": pbull & bear & (o > pc) & (c < middle) & (c > po),
+        "three_black_crows": crow & _prev(crow) & _prev(bear, 2),
+        "doji": (span > 0) & (body <= DOJI_BODY * span),
+    }
+
+
+def detect_patterns(
+    start: np.ndarray,
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+) -> list[tuple[int, str]]:
+    """
+    Найденные паттерны в порядке времени.
+
+    :param start: Время открытия свечей, мс.
+    :return: Пары (время открытия свечи, название паттерна).
+    """
+    flags = scan_patterns(open_, high, low, close)
+    names = list(flags)
+    candles, kinds = np.nonzero(np.column_stack([flags[name] for name in names]))
+    start = np.asarray(start, dtype=np.int64)
+    return [(int(start[i]), names[k]) for i, k in zip(candles, kinds)]
+
+
+def format_patterns(patterns: list[tuple[int, str]]) -> list[dict]:
+    """
+    Компактное представление для анализа: время свечи (UTC), паттерн, направление
+    сигнала.
+    """
+    return [
+        {
+            "time": datetime.datetime.fromtimestamp(
+                start / 1000, datetime.UTC
+            ).strftime("%Y-%m-%dT%H:%M"),
+            "pattern": pattern,
+            "signal": PATTERNS[pattern],
+        }
+        for start, pattern in patterns
+    ]
+
+
+@dataclasses.dataclass
+class _ScanState:
+    last_start: int
+    context: dict[str, np.ndarray]
+    patterns: collections.deque[tuple[int, str]]
+
+
+class PatternScanner:
+    """
+    Кэш свечных паттернов по символу и интервалу.
+
+    Хранит найденные паттерны и последние CONTEXT свечей, поэтому при обновлении
+    сканируются только новые свечи, а повторный запрос без новых свечей не
+    пересчитывается.
+    """
+
+    def __init__(self, history: int = PATTERN_HISTORY):
+        """
+        :param history: Сколько последних найденных паттернов хранить на символ и
+            интервал.
+        """
+        self.history = history
+        self._cache: dict[tuple[str, str], _ScanState] = {}
+
+    def last_start(self, symbol: str, interval: str) -> int | None:
+        """Время открытия последней учтенной свечи, мс."""
+        state = self._cache.get((symbol, interval))
+        return state.last_start if state is not None else None
+
+    def reset(self, symbol: str, interval: str):
+        """Удаляет кэш символа, например, после разрыва в свечах."""
+        self._cache.pop((symbol, interval), None)
+
+    def update(
+        self,
+        symbol: str,
+        interval: str,
+        start: np.ndarray,
+        open_: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+    ) -> int:
+        """
+        Учитывает закрытые свечи, отсортированные по времени. Уже учтенные свечи
+        пропускаются.
+
+        :return: Количество найденных на новых свечах паттернов.
+        """
+        key = (symbol, interval)
+        arrays = {
+            "start": np.asarray(start, dtype=np.int64),
+            "open_": np.asarray(open_, dtype=np.float64),
+            "high": np.asarray(high, dtype=np.float64),
+            "low": np.asarray(low, dtype=np.float64),
+            "close": np.asarray(close, dtype=np.float64),
+        }
+        state = self._cache.get(key)
+        offset = 0
+        if state is not None:
+            fresh = arrays["start"] > state.last_start
+            arrays = {
+                name: np.concatenate((state.context[name], values[fresh]))
+                for name, values in arrays.items()
+            }
+            offset = len(state.context["start"])
+        if len(arrays["start"]) <= offset:
+            return 0
+
+        found = [
+            item
+            for item in detect_patterns(**arrays)
+            if item[0] > (state.last_start if state else -1)
+        ]
+        if state is None:
+            state = self._cache[key] = _ScanState(
+                0, {}, collections.deque(maxlen=self.history)
+            )
+        state.last_start = int(arrays["start"][-1])
+        state.context = {name: values[-CONTEXT:] for name, values in arrays.items()}
+        state.patterns.extend(found)
+        return len(found)
+
+    def recent(
+        self,
+        symbol: str,
+        interval: str,
+        since: int | None = None,
+        limit: int | None = None,
+    ) -> list[dict]:
+        """
+        Найденные паттерны в виде format_patterns.
+
+        :param since: Время открытия свечи (мс), начиная с которого вернуть паттерны.
+        :param limit: Вернуть не больше `limit` последних паттернов.
+        """
+        state = self._cache.get((symbol, interval))
+        if state is None:
+            return []
+        patterns = [
+            item for item in state.patterns if since is None or item[0] >= since
+        ]
+        if limit is not None:
+            patterns = patterns[-limit:]
+        return format_patterns(patterns)
@@ -0,0 +1,316 @@
+"""."""
+
+import dataclasses
+import datetime
+import json
+import logging
+import math
+import re
+import typing
+
+logger = logging.getLogger(__name__)
+
+# Фрагменты, на которые BPE-токенизаторы (cl100k/o200k) обычно режут текст:
+# группы до 3 цифр, слова, отдельные знаки препинания
+TOKEN_PATTERN = re.compile(r"\d{1,3}|[^\W\d_]+|[^\w\s]|_+")
+# Символов слова на токен: латиница ~4, кириллица заметно меньше
+CHARS_PER_TOKEN = 4
+CYRILLIC_CHARS_PER_TOKEN = 2
+CYRILLIC = re.compile(r"[а-яё]", re.IGNORECASE)
+
+# Меньше строк в таблице не оставляем, даже если бюджет превышен
+MIN_ROWS = 2
+# По скольким записям таблицы определяются колонки и оценивается исходный размер JSON
+SAMPLE_ROWS = 1000
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Локальная оценка числа токенов без обращения к API и без токенизатора модели.
+
+    Погрешность на JSON/CSV с числами — порядка 10–15 %, для контроля бюджета этого
+    достаточно.
+    """
+    tokens = 0
+    for piece in TOKEN_PATTERN.findall(text):
+        if len(piece) <= 3:
+            tokens += 1
+        else:
+            per_token = (
+                CYRILLIC_CHARS_PER_TOKEN if CYRILLIC.match(piece) else CHARS_PER_TOKEN
+            )
+            tokens += math.ceil(len(piece) / per_token)
+    return tokens
+
+
+@dataclasses.dataclass
+class SerializedPrompt:
+    """Результат сериализации данных для промта."""
+
+    text: str
+    tokens: int
+    # Оценка длины исходного JSON по выборке записей
+    raw_chars: int
+    max_rows: int | None
+
+    @property
+    def compression(self) -> float:
+        """
+        Во сколько раз текст короче JSON тех же данных (без отступов, с ними разница еще
+        больше).
+        """
+        return self.raw_chars / max(len(self.text), 1)
+
+
+@dataclasses.dataclass
+class _Table:
+    name: str
+    columns: list[str]
+    rows: list[dict]
+    total: int
+    raw_chars: int
+    # Строки форматируются при выводе и кэшируются: при прореживании выводится малая
+    # часть записей
+    lines: dict[int, str] = dataclasses.field(default_factory=dict)
+
+
+def _is_table(value: typing.Any) -> bool:
+    """
+    Список словарей или группа {"entries": [...], "count": n} из AggregatedMarketData.
+    """
+    if isinstance(value, dict) and set(value) == {"entries", "count"}:
+        value = value["entries"]
+    return (
+        isinstance(value, list)
+        and bool(value)
+        and all(isinstance(item, dict) for item in value)
+    )
+
+
+def _contains_table(value: dict) -> bool:
+    return any(
+        _is_table(item) or isinstance(item, dict) and _contains_table(item)
+        for item in value.values()
+    )
+
+
+def _flatten(row: dict, prefix: str = "") -> dict:
+    """
+    Вложенные словари разворачиваются в ключи через точку, поля записи `data` — без
+    префикса.
+    """
+    flat = {}
+    for key, value in row.items():
+        if isinstance(value, dict):
+            flat |= _flatten(
+                value, f"{prefix}{key}." if prefix or key != "data" else ""
+            )
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _sample(count: int, limit: int) -> list[int]:
+    """
+    Равномерная выборка `limit` индексов из `count`, первый и последний сохраняются.
+    """
+    if count <= limit:
+        return list(range(count))
+    if limit <= 1:
+        return [count - 1]
+    return sorted({round(i * (count - 1) / (limit - 1)) for i in range(limit)})
+
+
+class PromptSerializer:
+    """
+    Компактное представление агрегированных рыночных данных для промта с бюджетом
+    токенов.
+
+    Скаляры и небольшие словари записываются в JSON без отступов, списки записей
+    (AggregatedMarketData.grouped_data, history, patterns) — CSV-таблицами с общим
+    заголовком. Числа округляются до `precision` значащих цифр. Если текст не помещается
+    в `token_budget`, таблицы равномерно прореживаются с сохранением первой и последней
+    записи.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 6000,
+        precision: int = 6,
+        exclude: typing.Iterable[str] = ("id", "currency", "kind"),
+    ):
+        """
+        :param token_budget: Бюджет токенов на данные в промте (по оценке
+            estimate_tokens).
+        :param precision: Значащих цифр у чисел с плавающей точкой.
+        :param exclude: Колонки таблиц, которые не передаются (дублируют заголовок
+            таблицы).
+        """
+        self.token_budget = token_budget
+        self.precision = precision
+        self.exclude = frozenset(exclude)
+
+    def _scalar(self, value: typing.Any) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, float):
+            return f"{value:.{self.precision}g}"
+        if isinstance(value, datetime.datetime):
+            return value.isoformat(sep=" ", timespec="seconds")
+        if isinstance(value, (list, tuple, dict)):
+            return json.dumps(
+                self._round(value),
+                separators=(",", ":"),
+                ensure_ascii=False,
+                default=str,
+            )
+        text = str(value)
+        return (
+            json.dumps(text, ensure_ascii=False)
+            if any(c in text for c in ',"\n')
+            else text
+        )
+
+    def _round(self, value: typing.Any) -> typing.Any:
+        if isinstance(value, float):
+            return (
+                float(f"{value:.{self.precision}g}") if math.isfinite(value) else None
+            )
+        if isinstance(value, dict):
+            return {
+                key: self._round(item)
+                for key, item in value.items()
+                if item is not None
+            }
+        if isinstance(value, (list, tuple)):
+            return [self._round(item) for item in value]
+        if isinstance(value, datetime.datetime):
+            return value.isoformat(sep=" ", timespec="seconds")
+        return value
+
+    def _table(self, name: str, value: typing.Any) -> _Table:
+        total = None
+        if isinstance(value, dict):
+            value, total = value["entries"], value["count"]
+        sample = [value[i] for i in _sample(len(value), SAMPLE_ROWS)]
+        columns = list(
+            dict.fromkeys(
+                key
+                for row in sample
+                for key in _flatten(row)
+                if key not in self.exclude
+            )
+        )
+        raw_chars = (
+            sum(len(json.dumps(row, default=str)) + 2 for row in sample)
+            * len(value)
+            // len(sample)
+        )
+        return _Table(
+            name=name,
+            columns=columns,
+            rows=value,
+            total=total if total is not None else len(value),
+            raw_chars=raw_chars + len(name),
+        )
+
+    def _collect(self, value: dict, prefix: str = "") -> list[str | _Table]:
+        """Разбивает данные на неизменяемые строки и таблицы."""
+        parts: list[str | _Table] = []
+        for key, item in value.items():
+            name = f"{prefix}{key}"
+            if item is None or item == {} or item == []:
+                continue
+            if _is_table(item):
+                parts.append(self._table(name, item))
+            elif isinstance(item, dict) and _contains_table(item):
+                parts.extend(self._collect(item, f"{name}."))
+            else:
+                parts.append(f"{name}={self._scalar(item)}")
+        return parts
+
+    def _render_table(self, table: _Table, max_rows: int | None) -> str:
+        indexes = (
+            _sample(len(table.rows), max_rows)
+            if max_rows is not None
+            else range(len(table.rows))
+        )
+        lines = [
+            f"{table.name} [{len(indexes)}/{table.total}]:",
+            ",".join(table.columns),
+        ]
+        for i in indexes:
+            line = table.lines.get(i)
+            if line is None:
+                row = _flatten(table.rows[i])
+                line = table.lines[i] = ",".join(
+                    self._scalar(row.get(column)) for column in table.columns
+                )
+            lines.append(line)
+        return "\n".join(lines)
+
+    def _render(self, parts: list[str | _Table], max_rows: int | None) -> str:
+        return "\n".join(
+            part if isinstance(part, str) else self._render_table(part, max_rows)
+            for part in parts
+        )
+
+    def serialize(self, data: dict) -> SerializedPrompt:
+        """
+        Сериализует данные в пределах бюджета токенов.
+
+        :param data: Словарь данных, например, AggregatedMarketData.model_dump().
+        :return: Текст, оценка токенов и исходный размер для расчета степени сжатия.
+        """
+        parts = self._collect(data)
+        raw_chars = sum(
+            part.raw_chars if isinstance(part, _Table) else len(part) for part in parts
+        )
+        longest = max(
+            (len(part.rows) for part in parts if isinstance(part, _Table)), default=0
+        )
+
+        # Бинарный поиск наибольшего лимита строк на таблицу, при котором текст
+        # помещается в бюджет. Строка таблицы — хотя бы один токен, поэтому больше
+        # token_budget строк не выводится никогда
+        low, high = min(MIN_ROWS, longest), min(longest, self.token_budget)
+        text = self._render(parts, high)
+        tokens = estimate_tokens(text)
+        max_rows = high
+        if tokens > self.token_budget:
+            text = self._render(parts, low)
+            tokens = estimate_tokens(text)
+            max_rows = low
+            high -= 1
+            while low < high:
+                middle = (low + high + 1) // 2
+                candidate = self._render(parts, middle)
+                candidate_tokens = estimate_tokens(candidate)
+                if candidate_tokens <= self.token_budget:
+                    low, max_rows, text, tokens = (
+                        middle,
+                        middle,
+                        candidate,
+                        candidate_tokens,
+                    )
+                else:
+                    high = middle - 1
+        if max_rows == longest:
+            max_rows = None
+
+        result = SerializedPrompt(
+            text=text, tokens=tokens, raw_chars=raw_chars, max_rows=max_rows
+        )
+        if tokens > self.token_budget:
+            logger.warning(
+                f"⚠ Данные для промта не помещаются в бюджет: ~{tokens} токенов при "
+                f"бюджете {self.token_budget}"
+            )
+        logger.info(
+            f"Промт: ~{tokens} токенов (бюджет {self.token_budget}), {len(text)} "
+            f"символов вместо {raw_chars}, сжатие {result.compression:.1f}x, строк в "
+            f"таблице не больше {max_rows or 'всех'}"
+        )
+        return result
@@ -0,0 +1,290 @@
+"""."""
+
+import asyncio
+import collections
+import dataclasses
+import hashlib
+import json
+import logging
+import math
+import re
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+# Ключ ответа в общем кэше: модель, температура и хэш нормализованных сообщений
+RESPONSE_KEY = "chatgpt:response:{digest}"
+WHITESPACE = re.compile(r"\s+")
+# Поля, которые меняются при каждом запуске и без изменения рынка: время, номера
+# обновлений стакана, идентификаторы записей. В ключ ответа они не входят
+VOLATILE_FIELDS = frozenset(
+    {
+        "id",
+        "ts",
+        "u",
+        "seq",
+        "update_id",
+        "created",
+        "recommended",
+        "since",
+        "covered_since",
+        "time_range",
+        "time",
+        "start",
+        "end",
+        "bucket",
+        "timestamp",
+        "T",
+        "updatedTime",
+    }
+)
+
+
+def normalize_data(value: typing.Any, precision: int = 6) -> typing.Any:
+    """
+    Данные запроса для ключа ответа: без VOLATILE_FIELDS, числа округлены до `precision`
+    значащих цифр (как в PromptSerializer). Запуски на неизменившемся рынке получают
+    один ключ.
+    """
+    if isinstance(value, dict):
+        return {
+            key: normalize_data(item, precision)
+            for key, item in value.items()
+            if key not in VOLATILE_FIELDS
+        }
+    if isinstance(value, (list, tuple)):
+        return [normalize_data(item, precision) for item in value]
+    if isinstance(value, float):
+        return float(f"{value:.{precision}g}") if math.isfinite(value) else None
+    return value
+
+
+class LeaderCancelled(Exception):
+    """
+    Запрос, вызывавший модель для ожидающих, отменен; ожидающие повторяют вызов сами.
+    """
+
+
+class CacheBackend(typing.Protocol):
+    """Общий кэш ответов между процессами; RedisClient реализует этот интерфейс."""
+
+    async def connect(self): ...
+
+    async def get(self, key: str) -> dict | None: ...
+
+    async def set(self, key: str, value: dict, expire: int = 60): ...
+
+
+class InMemoryCacheBackend:
+    """Кэш в памяти процесса с TTL вместо Redis: для тестов и локального запуска."""
+
+    def __init__(self):
+        # Как и в Redis, хранится сериализованный ответ: изменения полученного словаря
+        # не портят кэш
+        self.data: dict[str, tuple[float, str]] = {}
+
+    async def connect(self):
+        pass
+
+    async def get(self, key: str) -> dict | None:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires <= time.monotonic():
+            del self.data[key]
+            return None
+        return json.loads(value)
+
+    async def set(self, key: str, value: dict, expire: int = 60):
+        self.data[key] = (time.monotonic() + expire, json.dumps(value))
+
+
+@dataclasses.dataclass
+class CacheStats:
+    """Статистика кэша ответов."""
+
+    local_hits: int = 0
+    shared_hits: int = 0
+    coalesced: int = 0
+    misses: int = 0
+    errors: int = 0
+
+    @property
+    def requests(self) -> int:
+        return self.local_hits + self.shared_hits + self.coalesced + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Доля запросов, обслуженных без вызова модели (включая ожидание уже идущего
+        вызова).
+        """
+        return (self.requests - self.misses) / self.requests if self.requests else 0.0
+
+    def as_dict(self) -> dict:
+        return dataclasses.asdict(self) | {
+            "requests": self.requests,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+class ResponseCache:
+    """
+    Кэш ответов модели по содержимому запроса.
+
+    Ключ — хэш модели, температуры, формата ответа и сообщений с нормализованными
+    пробелами; сообщения для ключа строятся по данным normalize_data. Поиск идет сначала
+    в LRU процесса, затем в общем кэше (Redis) с TTL. Одинаковые запросы, пришедшие
+    одновременно, ждут один вызов модели (single-flight); если вызывающий запрос
+    отменен, вызов повторяет один из ожидающих. Ошибки вызова не кэшируются,
+    недоступность общего кэша не мешает вызову модели. LRU хранит сериализованные
+    ответы, каждый запрос получает свою копию.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend | None = None,
+        ttl: int = 300,
+        max_size: int = 1024,
+    ):
+        """
+        :param backend: Общий кэш (RedisClient или InMemoryCacheBackend); None — только
+            LRU процесса.
+        :param ttl: Время жизни ответа, сек.; 0 — не кэшировать, только объединять
+            одновременные запросы.
+        :param max_size: Размер LRU процесса.
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stats = CacheStats()
+        self._local: collections.OrderedDict[str, tuple[float, str]] = (
+            collections.OrderedDict()
+        )
+        self._inflight: dict[str, asyncio.Future[str]] = {}
+
+    @staticmethod
+    def key(
+        model: str,
+        temperature: float,
+        messages: typing.Sequence[dict],
+        response_format: dict | None = None,
+    ) -> str:
+        """
+        Ключ ответа для запроса.
+
+        :param messages: Сообщения запроса, построенного по данным normalize_data.
+        :param response_format: Формат ответа модели (response_format chat.completions).
+        """
+        normalized = [
+            {
+                "role": message["role"],
+                "content": WHITESPACE.sub(" ", message["content"]).strip(),
+            }
+            for message in messages
+        ]
+        payload = json.dumps(
+            [model, temperature, response_format, normalized],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return RESPONSE_KEY.format(digest=hashlib.sha256(payload.encode()).hexdigest())
+
+    def _get_local(self, key: str) -> dict | None:
+        item = self._local.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires <= time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return json.loads(value)
+
+    def _set_local(self, key: str, value: str):
+        self._local[key] = (time.monotonic() + self.ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+
+    async def _get_shared(self, key: str) -> dict | None:
+        if self.backend is None:
+            return None
+        try:
+            await self.backend.connect()
+            return await self.backend.get(key)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"⚠ Общий кэш ответов недоступен: {e}")
+            return None
+
+    async def _set_shared(self, key: str, value: dict):
+        if self.backend is None:
+            return
+        try:
+            await self.backend.connect()
+            await self.backend.set(key, value, expire=self.ttl)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"⚠ Не удалось сохранить ответ в общий кэш: {e}")
+
+    async def get_or_call(
+        self, key: str, call: typing.Callable[[], typing.Awaitable[dict]]
+    ) -> dict:
+        """
+        Возвращает закэшированный ответ или вызывает `call` и кэширует результат.
+
+        :param key: Ключ из ResponseCache.key.
+        :param call: Корутина вызова модели.
+        """
+        if self.ttl > 0:
+            value = self._get_local(key)
+            if value is not None:
+                self.stats.local_hits += 1
+                return value
+
+        while (inflight := self._inflight.get(key)) is not None:
+            try:
+                payload = await asyncio.shield(inflight)
+            except LeaderCancelled:
+                # Первый возобновившийся ожидающий становится ведущим, остальные ждут
+                # уже его
+                continue
+            except Exception:
+                self.stats.coalesced += 1
+                raise
+            self.stats.coalesced += 1
+            return json.loads(payload)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._get_shared(key) if self.ttl > 0 else None
+            if value is not None:
+                self.stats.shared_hits += 1
+            else:
+                self.stats.misses += 1
+                value = await call()
+                if self.ttl > 0:
+                    await self._set_shared(key, value)
+            payload = json.dumps(value)
+            if self.ttl > 0:
+                self._set_local(key, payload)
+            future.set_result(payload)
+            return value
+        except asyncio.CancelledError:
+            # Отмена касается только этого запроса, ожидающие не должны получить
+            # CancelledError
+            future.set_exception(LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Ошибку получат ожидающие запросы; если их нет, не оставляем ее
+            # неполученной
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
@@ -1,13 +1,15 @@
+import datetime
 import logging
+import time
+import typing
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 import asyncio
 
 from app.enums.market import TOP_20_SYMBOLS
-from app.schemas.market import AggregatedMarketData
 from app.schemas.trade import TradeRecommendationSchema
-from app.services.chat_gpt import ChatGPTService
-from app.services.market import MarketService
+from app.services.market_storage import MarketStorageService
+from app.services.response_cache import ResponseCache
 from app.services.trade import TradeService
 
 logger = logging.getLogger(__name__)
@@ -16,54 +18,246 @@ logger = logging.getLogger(__name__)
 class SchedulerService:
     trade_service: TradeService
     scheduler: AsyncIOScheduler
+    market_storage: MarketStorageService | None
+    response_cache: ResponseCache | None
 
     def __init__(
-            self,
-            trade_service: TradeService,
-            scheduler: AsyncIOScheduler
+        self,
+        trade_service: TradeService,
+        scheduler: AsyncIOScheduler,
+        market_storage: MarketStorageService | None = None,
+        maintenance_interval_minutes: int = 60,
+        analysis_concurrency: int = 5,
+        symbol_timeout: float = 120.0,
+        symbols: typing.Sequence[str] = TOP_20_SYMBOLS,
+        response_cache: ResponseCache | None = None,
+        long_term_batch: bool = False,
+        batch_poll_interval: float = 60.0,
+        batch_timeout: float = 86400.0,
+        short_term_backend: str | None = None,
+        long_term_backend: str | None = None,
     ):
         """
-        :param trade_service: Сервис для получения агрегированных рыночных данных (MarketService или его обёртка).
-        :param scheduler: Сервис, который интегрирует вызов ChatGPT и сохранение рекомендаций.
+        :param trade_service: Сервис для получения агрегированных рыночных данных
+            (MarketService или его обёртка).
+        :param scheduler: Сервис, который интегрирует вызов ChatGPT и сохранение
+            рекомендаций.
+        :param market_storage: Сервис обслуживания хранилища рыночных данных (секции,
+            агрегаты, архив).
+        :param maintenance_interval_minutes: Интервал обслуживания хранилища в минутах.
+        :param analysis_concurrency: Сколько символов анализируется одновременно.
+        :param symbol_timeout: Максимальное время анализа одного символа, сек.
+        :param symbols: Символы для анализа.
+        :param response_cache: Кэш ответов модели, его статистика выводится в итогах
+            анализа.
+        :param long_term_batch: Выполнять долгосрочный анализ одним пакетным заданием
+            Batch API.
+        :param batch_poll_interval: Интервал опроса пакетного задания, сек.
+        :param batch_timeout: Максимальное время ожидания пакетного задания, сек.
+        :param short_term_backend: Бэкенд краткосрочного анализа (например, локальный
+            "local"), None — ChatGPT.
+        :param long_term_backend: Бэкенд долгосрочного анализа без пакетного режима,
+            None — ChatGPT.
         """
         self.trade_service = trade_service
         self.scheduler = scheduler
+        self.market_storage = market_storage
+        self.maintenance_interval_minutes = maintenance_interval_minutes
+        self.analysis_concurrency = analysis_concurrency
+        self.symbol_timeout = symbol_timeout
+        self.symbols = symbols
+        self.response_cache = response_cache
+        self.long_term_batch = long_term_batch
+        self.batch_poll_interval = batch_poll_interval
+        self.batch_timeout = batch_timeout
+        self.short_term_backend = short_term_backend
+        self.long_term_backend = long_term_backend
 
     async def short_term_analysis(self):
         """
         Краткосрочный анализ: анализ данных за последние 5 минут.
         """
-        for currency in TOP_20_SYMBOLS:
-            try:
-                logger.info(f"[Краткосрочный] Запуск анализа рыночных данных для {currency}")
-                recommendation: TradeRecommendationSchema = await self.trade_service.analyze_and_save_final_recommendation(currency, minutes=5)
-                logger.info(f"[Краткосрочный] Рекомендация для {currency} получена и сохранена: {recommendation.id}")
-            except Exception as e:
-                logger.error(f"[Краткосрочный] Ошибка анализа для {currency}: {e}")
+        await self.run_analysis(
+            "Краткосрочный", minutes=5, backend=self.short_term_backend
+        )
 
     async def long_term_analysis(self):
         """
         Долгосрочный анализ: анализ данных за последние сутки.
+
+        Задержка здесь не важна, поэтому при `long_term_batch` все символы отправляются
+        одним пакетным заданием: дешевле и не расходует лимиты краткосрочного анализа.
+        Пакетный режим всегда использует ChatGPT.
+        """
+        # Например, агрегируем данные за последние 1440 минут (24 часа)
+        if not self.long_term_batch:
+            await self.run_analysis(
+                "Долгосрочный", minutes=1440, backend=self.long_term_backend
+            )
+            return
+
+        started = time.monotonic()
+        try:
+            recommendations = await self.trade_service.analyze_batch(
+                self.symbols,
+                minutes=1440,
+                poll_interval=self.batch_poll_interval,
+                timeout=self.batch_timeout,
+            )
+        except Exception as e:
+            logger.error(f"[Долгосрочный] Ошибка пакетного анализа: {e}")
+            return
+        done = sum(
+            recommendation is not None for recommendation in recommendations.values()
+        )
+        logger.info(
+            "[Долгосрочный] Пакетный анализ завершен за "
+            f"{time.monotonic() - started:.0f} с: успешно {done}/{len(recommendations)}"
+        )
+
+    async def resume_long_term_batch(self):
+        """
+        Продолжает пакетный долгосрочный анализ, отправленный до перезапуска: результаты
+        задания не теряются, и оно не отправляется повторно.
+        """
+        try:
+            recommendations = await self.trade_service.resume_batch(
+                poll_interval=self.batch_poll_interval, timeout=self.batch_timeout
+            )
+        except Exception as e:
+            logger.error(f"[Долгосрочный] Ошибка продолжения пакетного анализа: {e}")
+            return
+        if recommendations is not None:
+            done = sum(
+                recommendation is not None
+                for recommendation in recommendations.values()
+            )
+            logger.info(
+                "[Долгосрочный] Пакетный анализ после перезапуска: успешно "
+                f"{done}/{len(recommendations)}"
+            )
+
+    async def run_analysis(
+        self, label: str, minutes: int, backend: str | None = None
+    ) -> dict[str, float | None]:
+        """
+        Параллельный анализ всех символов: не больше `analysis_concurrency`
+        одновременно, каждый символ ограничен `symbol_timeout` секундами. Ошибка или
+        таймаут одного символа не прерывает остальные.
+
+        :param label: Название анализа для логов.
+        :param minutes: Интервал выборки данных в минутах.
+        :param backend: Бэкенд анализа, None — ChatGPT.
+        :return: Время анализа каждого символа в секундах (None при ошибке или
+            таймауте).
+        """
+        semaphore = asyncio.Semaphore(self.analysis_concurrency)
+        latencies: dict[str, float | None] = {}
+        started = time.monotonic()
+
+        async def analyze(currency: str):
+            async with semaphore:
+                symbol_started = time.monotonic()
+                try:
+                    logger.info(
+                        f"[{label}] Запуск анализа рыночных данных для {currency}"
+                    )
+                    async with asyncio.timeout(self.symbol_timeout):
+                        service = self.trade_service
+                        recommendation: TradeRecommendationSchema = (
+                            await service.analyze_and_save_final_recommendation(
+                                currency, minutes=minutes, backend=backend
+                            )
+                        )
+                    latencies[currency] = time.monotonic() - symbol_started
+                    logger.info(
+                        f"[{label}] Рекомендация для {currency} получена и сохранена: "
+                        f"{recommendation.id} ({latencies[currency]:.1f} с)"
+                    )
+                except TimeoutError:
+                    latencies[currency] = None
+                    logger.error(
+                        f"[{label}] Таймаут анализа для {currency} "
+                        f"({self.symbol_timeout} с)"
+                    )
+                except Exception as e:
+                    latencies[currency] = None
+                    logger.error(f"[{label}] Ошибка анализа для {currency}: {e}")
+
+        async with asyncio.TaskGroup() as group:
+            for currency in self.symbols:
+                group.create_task(analyze(currency))
+
+        elapsed = time.monotonic() - started
+        done = [latency for latency in latencies.values() if latency is not None]
+        logger.info(
+            f"[{label}] Анализ завершен за {elapsed:.1f} с: успешно "
+            f"{len(done)}/{len(latencies)}"
+            + (
+                f", на символ: среднее {sum(done) / len(done):.1f} с, максимум "
+                f"{max(done):.1f} с"
+                if done
+                else ""
+            )
+        )
+        if self.response_cache is not None:
+            logger.info(
+                f"[{label}] Кэш ответов модели: {self.response_cache.stats.as_dict()}"
+            )
+        return latencies
+
+    async def storage_maintenance(self):
+        """
+        Обслуживание хранилища: секции market, агрегирование, архивирование и удаление
+        сырых данных.
         """
-        for currency in TOP_20_SYMBOLS:
-            try:
-                logger.info(f"[Долгосрочный] Запуск анализа рыночных данных для {currency}")
-                # Например, агрегируем данные за последние 1440 минут (24 часа)
-                recommendation: TradeRecommendationSchema = await self.trade_service.analyze_and_save_final_recommendation(currency, minutes=1440)
-                logger.info(f"[Долгосрочный] Рекомендация для {currency} получена и сохранена: {recommendation.id}")
-            except Exception as e:
-                logger.error(f"[Долгосрочный] Ошибка анализа для {currency}: {e}")
+        await self.market_storage.maintain()
 
     def start(self):
         """
-        Запускает планировщик APScheduler с двумя заданиями:
+        Запускает планировщик APScheduler с заданиями:
         - Краткосрочный анализ каждые 5 минут.
         - Долгосрочный анализ раз в сутки.
+        - Обслуживание хранилища (сразу при старте и далее по интервалу).
+        - Продолжение пакетного задания, отправленного до перезапуска (однократно при
+          старте).
         """
-        self.scheduler.add_job(self.short_term_analysis, trigger=IntervalTrigger(minutes=5), id="short_term")
-        self.scheduler.add_job(self.long_term_analysis, trigger=IntervalTrigger(minutes=1440), id="long_term")
+        # max_instances=1 + coalesce: следующий запуск не стартует, пока идет
+        # предыдущий, пропущенные запуски схлопываются в один
+        self.scheduler.add_job(
+            self.short_term_analysis,
+            trigger=IntervalTrigger(minutes=5),
+            id="short_term",
+            max_instances=1,
+            coalesce=True,
+        )
+        self.scheduler.add_job(
+            self.long_term_analysis,
+            trigger=IntervalTrigger(minutes=1440),
+            id="long_term",
+            max_instances=1,
+            coalesce=True,
+        )
+        if self.long_term_batch:
+            self.scheduler.add_job(
+                self.resume_long_term_batch,
+                id="long_term_resume",
+                next_run_time=datetime.datetime.now(),
+            )
+        if self.market_storage is not None:
+            self.scheduler.add_job(
+                self.storage_maintenance,
+                trigger=IntervalTrigger(minutes=self.maintenance_interval_minutes),
+                id="storage_maintenance",
+                next_run_time=datetime.datetime.now(),
+                max_instances=1,
+                coalesce=True,
+            )
         self.scheduler.start()
-        logger.info("APScheduler запущен: краткосрочный анализ каждые 5 минут, долгосрочный анализ раз в сутки.")
+        logger.info(
+            "APScheduler запущен: краткосрочный анализ каждые 5 минут, долгосрочный "
+            "анализ раз в сутки."
+        )
 
     def shutdown(self):
         """
@@ -0,0 +1,257 @@
+"""."""
+
+import json
+import logging
+import re
+import typing
+
+import pydantic
+
+from app.schemas.analysis import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+# Режимы ответа: JSON-схема (Structured Outputs), JSON-режим без схемы, обычный текст
+RESPONSE_FORMATS = ("json_schema", "json_object", "text")
+# Сколько символов до начала JSON-объекта допускается в потоке, прежде чем ответ
+# считается некорректным
+MAX_PREAMBLE = 500
+# Сколько последних запятых пробовать при восстановлении оборванного ответа
+REPAIR_ATTEMPTS = 20
+WORD = re.compile(r"[A-Za-z_]\w*")
+LITERALS = {"True": "true", "False": "false", "None": "null"}
+CLOSERS = {"{": "}", "[": "]"}
+
+
+class MalformedOutputError(ValueError):
+    """Ответ модели не является JSON-объектом нужной схемы."""
+
+
+def strict_json_schema(model: type[pydantic.BaseModel]) -> dict:
+    """
+    JSON-схема модели для Structured Outputs в строгом режиме: у каждого объекта все
+    поля обязательные (необязательные допускают null) и нет дополнительных полей.
+    """
+    schema = model.model_json_schema(by_alias=False)
+
+    def strict(node: typing.Any):
+        if isinstance(node, dict):
+            node.pop("default", None)
+            if node.get("type") == "object" and "properties" in node:
+                node["additionalProperties"] = False
+                node["required"] = list(node["properties"])
+                for value in node["properties"].values():
+                    strict(value)
+            for key, value in node.items():
+                if key != "properties":
+                    strict(value)
+        elif isinstance(node, list):
+            for item in node:
+                strict(item)
+
+    strict(schema)
+    return schema
+
+
+def build_response_format(kind: str) -> dict | None:
+    """
+    Параметр response_format запроса chat.completions.
+
+    :param kind: json_schema — ответ ограничен схемой AnalysisResult (gpt-4o-mini и
+        новее), json_object — любой JSON-объект, text — без ограничений.
+    :return: Значение response_format или None для text.
+    """
+    if kind == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "analysis_result",
+                "strict": True,
+                "schema": strict_json_schema(AnalysisResult),
+            },
+        }
+    if kind == "json_object":
+        return {"type": "json_object"}
+    if kind == "text":
+        return None
+    raise ValueError(
+        f"Неизвестный формат ответа {kind!r}, допустимы: {', '.join(RESPONSE_FORMATS)}"
+    )
+
+
+class JSONStreamScanner:
+    """
+    Проверка ответа по мере поступления фрагментов потока.
+
+    feed возвращает True, когда JSON-объект верхнего уровня закрыт, — дальше читать не
+    нужно (текст после объекта отбрасывается). MalformedOutputError, если объект не
+    начался за `max_preamble` символов или скобки не парные: такой ответ не
+    дочитывается.
+    """
+
+    def __init__(self, max_preamble: int = MAX_PREAMBLE):
+        self.max_preamble = max_preamble
+        self.preamble = 0
+        self.stack: list[str] = []
+        self.started = False
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, delta: str) -> bool:
+        for char in delta:
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self.stack.append("}")
+                    continue
+                self.preamble += 1
+                if self.preamble > self.max_preamble:
+                    raise MalformedOutputError(
+                        f"JSON-объект не начался за {self.max_preamble} символов ответа"
+                    )
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in CLOSERS:
+                self.stack.append(CLOSERS[char])
+            elif char in "}]":
+                if char != self.stack.pop():
+                    raise MalformedOutputError(f"Непарная скобка {char!r} в ответе")
+                if not self.stack:
+                    return True
+        return False
+
+
+def _drop_trailing_comma(out: list[str]):
+    end = len(out)
+    while end and out[end - 1].isspace():
+        end -= 1
+    if end and out[end - 1] == ",":
+        del out[end - 1]
+
+
+def _close(out: list[str], stack: list[str]) -> str:
+    out = list(out)
+    _drop_trailing_comma(out)
+    text = "".join(out).rstrip()
+    # Оборванный член объекта: "ключ": без значения
+    text = re.sub(r":\s*$", ": null", text)
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> dict:
+    """
+    Извлекает JSON-объект из ответа модели, исправляя типичные ошибки.
+
+    - текст до первой '{' и после закрытия объекта (пояснения, ```json) отбрасывается;
+    - строки в одинарных кавычках, переводы строк внутри строк, True/False/None, висячие
+      запятые;
+    - оборванный ответ закрывается, при необходимости с отбрасыванием последнего
+      неполного члена.
+
+    :raises MalformedOutputError: Объект не удалось восстановить.
+    """
+    start = text.find("{")
+    if start < 0:
+        raise MalformedOutputError("В ответе нет JSON-объекта")
+
+    out: list[str] = []
+    stack: list[str] = []
+    # Позиции запятых верхних уровней с открытыми скобками — точки отката для
+    # оборванного ответа
+    checkpoints: list[tuple[int, tuple[str, ...]]] = []
+    quote: str | None = None
+    escape = False
+    i = start
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if escape:
+                escape = False
+                if char == "'":
+                    out[-1] = char
+                    i += 1
+                    continue
+                out.append(char)
+            elif char == "\\":
+                escape = True
+                out.append(char)
+            elif char == quote:
+                quote = None
+                out.append('"')
+            elif char == '"':
+                out.append('\\"')
+            elif char == "\n":
+                out.append("\\n")
+            else:
+                out.append(char)
+        elif char in "\"'":
+            quote = char
+            out.append('"')
+        elif char in CLOSERS:
+            stack.append(CLOSERS[char])
+            out.append(char)
+        elif char in "}]":
+            _drop_trailing_comma(out)
+            out.append(stack.pop())
+            if not stack:
+                break
+        elif char == ",":
+            checkpoints.append((len(out), tuple(stack)))
+            out.append(char)
+        elif match := WORD.match(text, i):
+            word = match.group()
+            out.append(LITERALS.get(word, word))
+            i = match.end()
+            continue
+        else:
+            out.append(char)
+        i += 1
+
+    if quote:
+        out.append('"')
+    candidates = ["".join(out) if not stack else _close(out, stack)]
+    if stack:
+        candidates += [
+            _close(out[:position], list(opened))
+            for position, opened in reversed(checkpoints[-REPAIR_ATTEMPTS:])
+        ]
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data
+    raise MalformedOutputError("Не удалось восстановить JSON-объект из ответа")
+
+
+def parse_analysis(text: str | None) -> AnalysisResult:
+    """
+    Валидирует ответ модели в AnalysisResult; если ответ не является чистым JSON нужной
+    схемы, пробует восстановить его (repair_json).
+
+    :raises MalformedOutputError: Ответ пустой или не соответствует схеме.
+    """
+    if not text or not text.strip():
+        raise MalformedOutputError("Пустой ответ ChatGPT")
+    try:
+        return AnalysisResult.model_validate_json(text)
+    except pydantic.ValidationError:
+        pass
+    try:
+        result = AnalysisResult.model_validate(repair_json(text))
+    except pydantic.ValidationError as e:
+        raise MalformedOutputError(
+            f"Ответ ChatGPT не соответствует схеме AnalysisResult: {e}"
+        ) from e
+    logger.warning(
+        "⚠ Ответ ChatGPT не является чистым JSON схемы AnalysisResult, восстановлен"
+    )
+    return result
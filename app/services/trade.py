@@ -1,110 +1,123 @@
+import asyncio
 import datetime
-import json
 import logging
+import time
+import typing
+
 import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models import Trade, TradeRecommendation
 from app.repositories.db import DBRepository
 from app.resources.database import Database
-from app.schemas.market import AggregatedMarketData
+from app.resources.redis_client import RedisClient
+from app.schemas.analysis import AnalysisResult
 from app.schemas.repository import RepositoryOutSchema
-from app.schemas.trade import TradeSchema, TradeRecommendationSchema, TradeCreateSchema, \
-    TradeRecommendationsCreateSchema
+from app.schemas.trade import (
+    TradeSchema,
+    TradeRecommendationSchema,
+    TradeCreateSchema,
+    TradeRecommendationsCreateSchema,
+)
+from app.services.analysis_backend import AnalysisBackend
 from app.services.chat_gpt import ChatGPTService
 from app.services.market import MarketService
 
 logger = logging.getLogger(__name__)
 
+# Отправленное, но еще не разобранное пакетное задание: опрос продолжается после
+# перезапуска
+PENDING_BATCH_KEY = "chatgpt:batch:pending"
+
 
 class TradeService:
     def __init__(
-            self,
-            db: Database,
-            chatgpt_service: ChatGPTService,
-            repository_trade: DBRepository[Trade, TradeSchema],
-            repository_trade_recommendation: DBRepository[TradeRecommendation, TradeRecommendationSchema],
-            market_service: MarketService
+        self,
+        db: Database,
+        chatgpt_service: ChatGPTService,
+        repository_trade: DBRepository[Trade, TradeSchema],
+        repository_trade_recommendation: DBRepository[
+            TradeRecommendation, TradeRecommendationSchema
+        ],
+        market_service: MarketService,
+        backends: typing.Mapping[str, AnalysisBackend] | None = None,
+        redis_client: RedisClient | None = None,
     ):
+        """
+        :param backends: Бэкенды анализа по имени в дополнение к ChatGPT (например,
+            локальный "local").
+        :param redis_client: Хранилище идентификатора пакетного задания; None — задание
+            теряется при перезапуске.
+        """
         self.db = db
         self.chatgpt_service = chatgpt_service
         self.repository_trade = repository_trade
         self.repository_trade_recommendation = repository_trade_recommendation
         self.market_service = market_service
+        self.backends: dict[str, AnalysisBackend] = {
+            chatgpt_service.name: chatgpt_service,
+            **(backends or {}),
+        }
+        self.redis_client = redis_client
+
+    def get_backend(self, name: str | None = None) -> AnalysisBackend:
+        """Бэкенд анализа по имени, по умолчанию ChatGPT."""
+        if name is None:
+            return self.chatgpt_service
+        try:
+            return self.backends[name]
+        except KeyError:
+            raise ValueError(
+                f"Неизвестный бэкенд анализа {name!r}, доступны: "
+                f"{', '.join(self.backends)}"
+            ) from None
 
-    async def analyze_and_save_final_recommendation(self, currency: str, minutes: int = 5) -> TradeRecommendationSchema:
+    async def analyze_and_save_final_recommendation(
+        self, currency: str, minutes: int = 5, backend: str | None = None
+    ) -> TradeRecommendationSchema:
         """
-        Проводит анализ агрегированных рыночных данных с учетом предыдущей рекомендации (если она существует)
-        и сохраняет новую торговую рекомендацию в базе данных.
+        Проводит анализ агрегированных рыночных данных с учетом предыдущей рекомендации
+        (если она существует) и сохраняет новую торговую рекомендацию в базе данных.
 
         Алгоритм:
-         1. Извлекаем агрегированные данные за последние `minutes` минут через MarketService.
-         2. Пытаемся получить последнюю запись из TradeRecommendation для указанной валютной пары.
-         3. Если предыдущая рекомендация найдена, объединяем её данные с текущими агрегированными данными и
+         1. Извлекаем агрегированные данные за последние `minutes` минут через
+         MarketService.
+         2. Пытаемся получить последнюю запись из TradeRecommendation для указанной
+         валютной пары.
+            Оба чтения выполняются параллельно в сессиях только для чтения, которые
+            закрываются до анализа: соединения пула не удерживаются на время запроса к
+            модели.
+         3. Если предыдущая рекомендация найдена, объединяем её данные с текущими
+         агрегированными данными и
             вызываем ChatGPT для дополнительного анализа.
          4. Если предыдущей рекомендации нет, выполняется обычный анализ.
-         5. Ответ от ChatGPT парсится (ожидается формат JSON).
-         6. На основе парсенного ответа создается объект TradeRecommendationsCreateSchema, который используется
-            для вставки новой записи в базу.
+            Вместо ChatGPT может использоваться другой бэкенд анализа (`backend`),
+            например локальный.
+         5. Ответ от ChatGPT валидируется в AnalysisResult (JSON-схема ответа).
+         6. На основе парсенного ответа создается объект
+         TradeRecommendationsCreateSchema, который используется
+            для вставки новой записи в базу (короткая отдельная сессия записи).
 
         :param currency: Валютная пара, например, "BTCUSDT".
         :param minutes: Интервал выборки агрегированных данных (по умолчанию 5 минут).
+        :param backend: Имя бэкенда анализа (см. backends), по умолчанию ChatGPT.
         :return: Сохраненная рекомендация в виде TradeRecommendationSchema.
         """
         try:
-            async with self.db.session() as session:
-                # 1. Получаем агрегированные данные
-                aggregated_data: AggregatedMarketData = await self.market_service.get_aggregated_market_data(
-                    currency=currency,
-                    minutes=minutes,
-                    session=session
-                )
-                aggregated_dict = aggregated_data.model_dump()
-
-                # 2. Пытаемся получить последнюю рекомендацию
-                stmt = (
-                    sa.select(TradeRecommendation)
-                    .where(TradeRecommendation.currency == currency)
-                    .order_by(TradeRecommendation.recommended.desc())
-                    .limit(1)
-                )
-                last_rec = await self.repository_trade_recommendation.item(session=session, statement=stmt)
-
-                # 3. Если предыдущая рекомендация существует, объединяем данные для дополнительного анализа
-                if last_rec:
-                    prev_rec_dict = last_rec.model_dump()
-                    logger.info("Обнаружена предыдущая рекомендация. Выполняется дополнительный анализ.")
-                    response: dict = await self.chatgpt_service.final_analysis(
-                        primary_analysis=prev_rec_dict,
-                        secondary_analysis=aggregated_dict
-                    )
-                else:
-                    logger.info("Предыдущая рекомендация не найдена. Выполняется первичный анализ.")
-                    response: dict = await self.chatgpt_service.analyze(aggregated_dict)
-
-                logger.info("Получен ответ от ChatGPT для финального анализа.")
-
-
-                # 5. Создаем полезную нагрузку с использованием TradeRecommendationsCreateSchema
-                rec_payload = TradeRecommendationsCreateSchema(
-                    currency=currency,
-                    recommended=datetime.datetime.now(),
-                    recommended_action=response.get("recommended_action", ""),
-                    confidence=response.get("index_gpt", {}).get("growth_probability", 0.0),
-                    # Добавляем вероятность роста
-                    data=response  # Сохраняем все данные из ответа ChatGPT
-                )
-
-                # 6. Сохраняем новую рекомендацию в базе
-                stmt_insert = (
-                    sa.insert(TradeRecommendation)
-                    .values(**rec_payload.model_dump())
-                    .returning(TradeRecommendation)
-                )
-                new_rec: TradeRecommendationSchema = await self.repository_trade_recommendation.item(
-                    session=session,
-                    statement=stmt_insert
+            analysis_backend = self.get_backend(backend)
+            aggregated_dict, previous = await self._collect(
+                currency, minutes, analysis_backend.raw_data
+            )
+            response: AnalysisResult = await analysis_backend.recommend(
+                aggregated_dict, previous
+            )
+            logger.info(
+                f"Получен ответ бэкенда {analysis_backend.name} для финального анализа."
+            )
+            async with self.db.session_rw() as session:
+                new_rec = await self._save_recommendation(
+                    currency, response, session, analysis_backend.name
                 )
-                logger.info(f"Новая рекомендация для {currency} сохранена в базе.")
                 await session.commit()
             return new_rec
 
@@ -112,26 +125,238 @@ class TradeService:
             logger.error(f"Ошибка в анализе и сохранении финальной рекомендации: {e}")
             raise
 
+    async def analyze_batch(
+        self,
+        currencies: typing.Sequence[str],
+        minutes: int = 1440,
+        poll_interval: float = 60.0,
+        timeout: float = 86400.0,
+    ) -> dict[str, TradeRecommendationSchema | None]:
+        """
+        Анализ нескольких валютных пар одним пакетным заданием Batch API: запросы
+        строятся так же, как в analyze_and_save_final_recommendation, рекомендации
+        сохраняются по мере разбора результатов. Идентификатор задания сохраняется в
+        Redis: после перезапуска опрос продолжает resume_batch.
+
+        :param currencies: Валютные пары.
+        :param minutes: Интервал выборки агрегированных данных.
+        :param poll_interval: Интервал опроса статуса задания, сек.
+        :param timeout: Максимальное время ожидания задания, сек.
+        :return: Сохраненная рекомендация по каждой паре (None при ошибке).
+        """
+        recommendations: dict[str, TradeRecommendationSchema | None] = {
+            currency: None for currency in currencies
+        }
+        prompts = {}
+        built = await asyncio.gather(
+            *(self._build_prompt(currency, minutes) for currency in currencies),
+            return_exceptions=True,
+        )
+        for currency, prompt in zip(currencies, built):
+            if isinstance(prompt, Exception):
+                logger.error(f"Ошибка подготовки запроса для {currency}: {prompt}")
+            else:
+                prompts[currency] = prompt
+        if not prompts:
+            return recommendations
+
+        batch_id = await self.chatgpt_service.submit_batch(prompts)
+        pending = {
+            "batch_id": batch_id,
+            "currencies": list(prompts),
+            "submitted": time.time(),
+        }
+        await self._set_pending_batch(pending, timeout)
+        recommendations.update(
+            await self._collect_batch(pending, poll_interval, timeout)
+        )
+        return recommendations
+
+    async def resume_batch(
+        self, poll_interval: float = 60.0, timeout: float = 86400.0
+    ) -> dict[str, TradeRecommendationSchema | None] | None:
+        """
+        Продолжает опрос пакетного задания, отправленного до перезапуска, и сохраняет
+        его рекомендации.
+
+        :param poll_interval: Интервал опроса статуса задания, сек.
+        :param timeout: Максимальное время ожидания задания с момента отправки, сек.
+        :return: Рекомендации по парам задания или None, если незавершенного задания
+            нет.
+        """
+        if self.redis_client is None:
+            return None
+        await self.redis_client.connect()
+        pending = await self.redis_client.get(PENDING_BATCH_KEY)
+        if pending is None:
+            return None
+        logger.info(
+            f"Продолжается опрос пакетного задания {pending['batch_id']} "
+            f"({len(pending['currencies'])} пар)"
+        )
+        remaining = max(timeout - (time.time() - pending["submitted"]), 0.0)
+        return await self._collect_batch(pending, poll_interval, remaining)
+
+    async def _collect_batch(
+        self, pending: dict, poll_interval: float, timeout: float
+    ) -> dict[str, TradeRecommendationSchema | None]:
+        """
+        Ждет пакетное задание и сохраняет рекомендации. Сохраненный идентификатор
+        удаляется, когда задание разобрано или отменено по таймауту; при остановке
+        процесса он остается для resume_batch.
+        """
+        recommendations: dict[str, TradeRecommendationSchema | None] = {
+            currency: None for currency in pending["currencies"]
+        }
+        try:
+            responses = await self.chatgpt_service.batch_results(
+                pending["batch_id"],
+                pending["currencies"],
+                poll_interval=poll_interval,
+                timeout=timeout,
+            )
+        except TimeoutError:
+            await self._clear_pending_batch()
+            raise
+        for currency, response in responses.items():
+            if isinstance(response, Exception):
+                logger.error(f"Ошибка пакетного анализа для {currency}: {response}")
+                continue
+            try:
+                async with self.db.session_rw() as session:
+                    recommendations[currency] = await self._save_recommendation(
+                        currency, response, session, self.chatgpt_service.name
+                    )
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"Ошибка сохранения рекомендации для {currency}: {e}")
+        await self._clear_pending_batch()
+        return recommendations
+
+    async def _set_pending_batch(self, pending: dict, timeout: float):
+        if self.redis_client is None:
+            return
+        try:
+            await self.redis_client.connect()
+            # Ключ живет не дольше ожидания задания
+            await self.redis_client.set(
+                PENDING_BATCH_KEY, pending, expire=int(timeout) + 3600
+            )
+        except Exception as e:
+            logger.error(
+                f"⚠ Не удалось сохранить пакетное задание {pending['batch_id']}: {e}"
+            )
+
+    async def _clear_pending_batch(self):
+        if self.redis_client is None:
+            return
+        try:
+            await self.redis_client.delete(PENDING_BATCH_KEY)
+        except Exception as e:
+            logger.error(f"⚠ Не удалось удалить сохраненное пакетное задание: {e}")
+
+    async def _build_prompt(self, currency: str, minutes: int) -> str:
+        """
+        Запрос ChatGPT по агрегированным данным за `minutes` минут с учетом предыдущей
+        рекомендации.
+        """
+        aggregated_dict, previous = await self._collect(currency, minutes)
+        return self.chatgpt_service.build_prompt(aggregated_dict, previous)
+
+    async def _collect(
+        self, currency: str, minutes: int, raw: bool = True
+    ) -> tuple[dict, dict | None]:
+        """
+        Агрегированные данные за `minutes` минут и предыдущая рекомендация по валютной
+        паре. Оба чтения выполняются параллельно, каждое в своей сессии только для
+        чтения.
+
+        :param raw: Читать записи окна (см. MarketService.get_aggregated_market_data).
+        """
+        # 1-2. Агрегированные данные и последняя рекомендация
+        aggregated_data, last_rec = await asyncio.gather(
+            self.market_service.get_aggregated_market_data(
+                currency=currency, minutes=minutes, raw=raw
+            ),
+            self._last_recommendation(currency),
+        )
+        aggregated_dict = aggregated_data.model_dump()
+
+        # 3. Если предыдущая рекомендация существует, объединяем данные для
+        # дополнительного анализа
+        if last_rec:
+            logger.info(
+                "Обнаружена предыдущая рекомендация. Выполняется дополнительный анализ."
+            )
+            return aggregated_dict, last_rec.model_dump()
+        logger.info("Предыдущая рекомендация не найдена. Выполняется первичный анализ.")
+        return aggregated_dict, None
+
+    async def _last_recommendation(
+        self, currency: str
+    ) -> TradeRecommendationSchema | None:
+        """Последняя рекомендация по валютной паре."""
+        stmt = (
+            sa.select(TradeRecommendation)
+            .where(TradeRecommendation.currency == currency)
+            .order_by(TradeRecommendation.recommended.desc())
+            .limit(1)
+        )
+        async with self.db.session_ro() as session:
+            return await self.repository_trade_recommendation.item(
+                session=session, statement=stmt
+            )
+
+    async def _save_recommendation(
+        self,
+        currency: str,
+        response: AnalysisResult,
+        session: AsyncSession,
+        backend: str = "chatgpt",
+    ) -> TradeRecommendationSchema:
+        """Сохраняет рекомендацию по ответу ChatGPT (без commit)."""
+        # 5. Создаем полезную нагрузку с использованием TradeRecommendationsCreateSchema
+        rec_payload = TradeRecommendationsCreateSchema(
+            currency=currency,
+            recommended=datetime.datetime.now(),
+            recommended_action=response.recommended_action,
+            confidence=response.growth_probability,
+            # Сохраняем все данные из ответа и бэкенд, который его дал
+            data=response.model_dump(mode="json") | {"backend": backend},
+        )
+
+        # 6. Сохраняем новую рекомендацию в базе
+        stmt_insert = (
+            sa.insert(TradeRecommendation)
+            .values(**rec_payload.model_dump())
+            .returning(TradeRecommendation)
+        )
+        new_rec: TradeRecommendationSchema = (
+            await self.repository_trade_recommendation.item(
+                session=session, statement=stmt_insert
+            )
+        )
+        logger.info(f"Новая рекомендация для {currency} сохранена в базе.")
+        return new_rec
+
     async def add_trade(self, payload: TradeCreateSchema) -> TradeSchema:
         """
-        Добавляет новую сделку в архив, используя данные из Pydantic-модели TradeCreateSchema.
+        Добавляет новую сделку в архив, используя данные из Pydantic-модели
+        TradeCreateSchema.
 
         :param payload: Экземпляр TradeCreateSchema с данными сделки.
         :return: Схема сохраненной сделки (TradeSchema).
         """
         async with self.db.session() as session:
-            stmt = (
-                sa.insert(Trade)
-                .values(**payload.model_dump())
-                .returning(Trade)
-            )
+            stmt = sa.insert(Trade).values(**payload.model_dump()).returning(Trade)
             trade: TradeSchema = await self.repository_trade.item(
-                session=session,
-                statement=stmt
+                session=session, statement=stmt
             )
             return trade
 
-    async def get_trade_archive(self, currency: str, minutes: int = 1440) -> RepositoryOutSchema[TradeSchema]:
+    async def get_trade_archive(
+        self, currency: str, minutes: int = 1440
+    ) -> RepositoryOutSchema[TradeSchema]:
         """
         Извлекает сделки для указанной валютной пары за последние `minutes` минут.
 
@@ -142,12 +367,10 @@ class TradeService:
         time_threshold = datetime.datetime.now() - datetime.timedelta(minutes=minutes)
         async with self.db.session() as session:
             stmt = sa.select(Trade).where(
-                Trade.currency == currency,
-                Trade.opened >= time_threshold
+                Trade.currency == currency, Trade.opened >= time_threshold
             )
-            trades: RepositoryOutSchema[TradeSchema] = await self.repository_trade.items(
-                session=session,
-                statement=stmt
+            trades: RepositoryOutSchema[TradeSchema] = (
+                await self.repository_trade.items(session=session, statement=stmt)
             )
         return trades
 
@@ -160,12 +383,18 @@ class TradeService:
         :param minutes: Период выборки в минутах.
         :return: Словарь со сводной информацией.
         """
-        trades: RepositoryOutSchema[TradeSchema] = await self.get_trade_archive(currency, minutes)
+        trades: RepositoryOutSchema[TradeSchema] = await self.get_trade_archive(
+            currency, minutes
+        )
         total_trades = trades.total
-        avg_pnl = sum(trade.pnl for trade in trades.items) / total_trades if total_trades > 0 else 0
+        avg_pnl = (
+            sum(trade.pnl for trade in trades.items) / total_trades
+            if total_trades > 0
+            else 0
+        )
         summary = {
             "currency": currency,
             "total_trades": total_trades,
             "average_pnl": avg_pnl,
         }
-        return summary
\ No newline at end of file
+        return summary
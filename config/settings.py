@@ -11,6 +11,14 @@ class BybitSettings(BaseSettings):
     """Bybit settings."""
     api_key: str = ""
     api_secret: str = ""
+    # Public WebSocket topics (symbol x stream) are spread over at least ws_connections connections
+    ws_connections: int = 1
+    ws_topics_per_connection: int = 200
+    # Topics per subscribe request
+    ws_subscribe_batch: int = 10
+    ws_url: str = "wss://stream.bybit.com/v5/public/linear"
+    # Seconds between {"op": "ping"} messages; a connection without a pong by the next ping is reopened
+    ws_ping_interval: float = 20.0
 
 
 class DBSettings(BaseSettings):
@@ -25,12 +33,101 @@ class RedisSettings(BaseSettings):
     """Redis settings."""
 
     password: str = ""
+    # Transport for websocket messages: "list" (LPUSH/BLMPOP) or "stream" (XADD/XREADGROUP)
+    transport: str = "list"
+    stream_maxlen: int = 1_000_000
+    consumer_group: str = "market_ingest"
+    consumer_name: str = ""
+    claim_idle_ms: int = 60000
+    # Corrupt stream entries are moved to "<stream>:dead" and acked after this many deliveries
+    stream_max_deliveries: int = 3
+    # Format of new queue/stream entries: "json" or "msgpack" (needs msgpack); consumers read both,
+    # so switch consumers first
+    queue_format: str = "json"
+
+
+class IngestSettings(BaseSettings):
+    """Market ingest settings."""
+
+    batch_size: int = 5000
+    flush_interval: float = 1.0
+    max_pending: int = 50000
+    # Write attempts of a failed DB batch before it is dropped
+    max_retries: int = 3
+    consumer_batch_size: int = 1000
+    consumer_block_timeout: float = 1.0
+    stats_interval: float = 30.0
+    # WebSocket -> Redis buffer
+    flush_size: int = 500
+    flush_max_age_ms: int = 200
+    buffer_capacity: int = 100000
+    overflow_policy: str = "drop_oldest"
+    orderbook_publish_interval: float = 1.0
+    # Rolling aggregate windows, minutes
+    aggregate_windows: list[int] = [5, 1440]
+    aggregate_publish_interval: float = 5.0
+    # Rolling window buckets are saved to Redis this often (seconds) and restored on start
+    aggregate_persist_interval: float = 30.0
+    # Also keep raw messages of typed topics in the JSONB market table
+    write_jsonb: bool = False
+    # JSON codec of the ingest path (WebSocket frames, Redis, JSONB): auto, json, orjson or msgspec
+    codec: str = "auto"
+
+
+class StorageSettings(BaseSettings):
+    """Market data storage settings."""
+
+    partition_days_ahead: int = 3
+    raw_retention_days: int = 30
+    maintenance_interval_minutes: int = 60
+    # Raw trades/liquidations older than this are rolled up into 1m/5m/1h aggregates
+    downsample_after_hours: int = 6
+    # Parquet archive of raw data before deletion, empty to delete without archiving (needs pyarrow)
+    archive_dir: str = ""
+    archive_compression: str = "zstd"
+
+
+class SchedulerSettings(BaseSettings):
+    """Analysis scheduler settings."""
+
+    analysis_concurrency: int = 5
+    symbol_timeout: float = 120.0
+    # Daily analysis via the OpenAI Batch API (cheaper, separate rate limits, results within 24h)
+    long_term_batch: bool = False
+    batch_poll_interval: float = 60.0
+    batch_timeout: float = 86400.0
+    # Analysis backend per job: chatgpt or local (rule-based scoring of indicators, patterns and order book)
+    short_term_backend: str = "chatgpt"
+    long_term_backend: str = "chatgpt"
 
 
 class ChatGPTSettings(BaseSettings):
     """ChatGPT settings."""
 
     api_key: str = ""
+    model: str = "gpt-4o-mini"
+    # json_schema (Structured Outputs, gpt-4o-mini and newer), json_object or text; replies are validated either way
+    response_format: str = "json_schema"
+    # Stream replies: first-token latency is logged, malformed output is aborted early
+    stream: bool = True
+    # Empty for api.openai.com, otherwise an OpenAI-compatible endpoint
+    base_url: str = ""
+    requests_per_minute: int = 500
+    tokens_per_minute: int = 200000
+    max_concurrency: int = 8
+    max_retries: int = 5
+    request_timeout: float = 60.0
+    # Deadline for one analysis call including rate limit waits and retries
+    deadline: float = 120.0
+    # Circuit breaker: consecutive server errors before calls are suspended for reset_timeout seconds
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+    # Token budget for market data in a prompt (local estimate), tables are downsampled to fit
+    prompt_token_budget: int = 6000
+    prompt_precision: int = 6
+    # Responses are cached by model, temperature and prompt hash (LRU in process + Redis), 0 disables caching
+    cache_ttl: int = 300
+    cache_max_size: int = 1024
 
 
 class Settings(BaseSettings):
@@ -47,3 +144,6 @@ class Settings(BaseSettings):
     bybit: BybitSettings = BybitSettings()
     redis: RedisSettings = RedisSettings()
     chatgpt: ChatGPTSettings = ChatGPTSettings()
+    ingest: IngestSettings = IngestSettings()
+    storage: StorageSettings = StorageSettings()
+    scheduler: SchedulerSettings = SchedulerSettings()
@@ -0,0 +1,190 @@
+"""Benchmark: JSON codecs on the ingest path, frame -> Redis -> typed rows and JSONB.
+
+The old path decodes the frame with json, encodes it again for Redis, decodes it in the
+consumer and validates MarketCreateSchema before encoding data for JSONB. The codec path
+decodes the frame once, sends the original frame to Redis (RawMessage), decodes it in
+the consumer and encodes JSONB data straight from the message. Every message is also
+written to JSONB (ingest.write_jsonb).
+
+Run: python -m tests.bench_ingest_codec
+"""
+
+import datetime
+import json
+import random
+import time
+import typing
+
+from app.resources.codec import CODECS, RawMessage, encode, get_codec
+from app.schemas.market import MarketCreateSchema
+from app.services.market_parser import market_record, market_row, parse_message
+
+MESSAGES = 50000
+# Messages per ingest buffer flush (ingest.flush_size)
+BATCH = 500
+LEVELS = 25
+SYMBOLS = ("BTCUSDT", "ETHUSDT", "SOLUSDT", "XRPUSDT")
+STAGES = ("socket decode", "redis encode", "redis decode", "rows + jsonb")
+
+
+def generate_frames(count: int = MESSAGES) -> list[str]:
+    """Bybit-like text frames: 70% orderbook deltas, 25% trades, 5% klines."""
+    rng = random.Random(42)
+    frames = []
+    for i in range(count):
+        symbol = rng.choice(SYMBOLS)
+        ts = 1703485237953 + i * 20
+        roll = rng.random()
+        if roll < 0.7:
+            levels = rng.randint(1, LEVELS)
+            message = {
+                "topic": f"orderbook.50.{symbol}",
+                "type": "delta",
+                "ts": ts,
+                "cts": ts - 2,
+                "data": {
+                    "s": symbol,
+                    "u": 2043081 + i,
+                    "seq": 139512846207 + i,
+                    "b": [
+                        [f"{43510 - j * 0.1:.1f}", f"{rng.random():.3f}"]
+                        for j in range(levels)
+                    ],
+                    "a": [
+                        [f"{43510.1 + j * 0.1:.1f}", f"{rng.random():.3f}"]
+                        for j in range(levels)
+                    ],
+                },
+            }
+        elif roll < 0.95:
+            message = {
+                "topic": f"publicTrade.{symbol}",
+                "type": "snapshot",
+                "ts": ts,
+                "data": [
+                    {
+                        "T": ts,
+                        "s": symbol,
+                        "S": rng.choice(("Buy", "Sell")),
+                        "v": f"{rng.random():.3f}",
+                        "p": f"{43510 + rng.random():.1f}",
+                        "L": "PlusTick",
+                        "i": f"{i:08d}-{j}",
+                        "BT": False,
+                    }
+                    for j in range(rng.randint(1, 4))
+                ],
+            }
+        else:
+            message = {
+                "topic": f"kline.1.{symbol}",
+                "type": "snapshot",
+                "ts": ts,
+                "data": [
+                    {
+                        "start": ts - ts % 60000,
+                        "end": ts - ts % 60000 + 59999,
+                        "interval": "1",
+                        "open": "43498.1",
+                        "close": "43510.6",
+                        "high": "43514.9",
+                        "low": "43495.0",
+                        "volume": "61.874",
+                        "turnover": "2691652.0391",
+                        "confirm": rng.random() < 0.1,
+                        "timestamp": ts,
+                    }
+                ],
+            }
+        frames.append(json.dumps(message))
+    return frames
+
+
+def old_step(frames: list[str], timings: dict[str, float], created: datetime.datetime):
+    """json everywhere, MarketCreateSchema before JSONB."""
+    codec = get_codec("json")
+    started = time.perf_counter()
+    messages = [json.loads(frame) for frame in frames]
+    timings["socket decode"] += time.perf_counter() - started
+    started = time.perf_counter()
+    queued = [json.dumps(message) for message in messages]
+    timings["redis encode"] += time.perf_counter() - started
+    started = time.perf_counter()
+    consumed = [json.loads(item) for item in queued]
+    timings["redis decode"] += time.perf_counter() - started
+    started = time.perf_counter()
+    for message in consumed:
+        parse_message(message, created)
+        data = message["data"]
+        payload = MarketCreateSchema(
+            currency=message["topic"].rsplit(".", 1)[-1],
+            kind=message["topic"],
+            data=data[0] if isinstance(data, list) else data,
+        )
+        market_record(payload, created, codec)
+    timings["rows + jsonb"] += time.perf_counter() - started
+
+
+def codec_step(
+    frames: list[str], timings: dict[str, float], created: datetime.datetime, name: str
+):
+    """Frame decoded once on the socket, passed to Redis as is."""
+    codec = get_codec(name)
+    started = time.perf_counter()
+    messages = [RawMessage(codec.loads(frame), frame) for frame in frames]
+    timings["socket decode"] += time.perf_counter() - started
+    started = time.perf_counter()
+    queued = [encode(codec, message) for message in messages]
+    timings["redis encode"] += time.perf_counter() - started
+    started = time.perf_counter()
+    consumed = [codec.loads(item) for item in queued]
+    timings["redis decode"] += time.perf_counter() - started
+    started = time.perf_counter()
+    for message in consumed:
+        parse_message(message, created)
+        market_row(message, created, codec)
+    timings["rows + jsonb"] += time.perf_counter() - started
+
+
+def run(frames: list[str], step: typing.Callable[..., None], *args) -> dict[str, float]:
+    """Runs the path in batches of BATCH frames, as the ingest buffer flushes them."""
+    timings = dict.fromkeys(STAGES, 0.0)
+    created = datetime.datetime.utcnow()
+    for start in range(0, len(frames), BATCH):
+        step(frames[start : start + BATCH], timings, created, *args)
+    return timings
+
+
+def main() -> None:
+    """."""
+    frames = generate_frames()
+    print(
+        f"messages: {len(frames)}, avg frame: "
+        f"{sum(map(len, frames)) / len(frames):.0f} bytes"
+    )
+
+    results = {"old (json)": run(frames, old_step)}
+    for name in CODECS:
+        try:
+            results[name] = run(frames, codec_step, name)
+        except RuntimeError as e:
+            print(f"{name}: skipped ({e})")
+
+    print(
+        f"{'path':<12}"
+        + "".join(f"{stage:>15}" for stage in STAGES)
+        + f"{'total':>12}{'us/msg':>9}"
+    )
+    baseline = sum(results["old (json)"].values())
+    for name, timings in results.items():
+        total = sum(timings.values())
+        print(
+            f"{name:<12}"
+            + "".join(f"{timings[stage]:>14.3f}s" for stage in STAGES)
+            + f"{total:>11.3f}s{total / len(frames) * 1e6:>9.1f}  "
+            f"({baseline / total:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
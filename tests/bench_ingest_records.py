@@ -0,0 +1,95 @@
+"""Benchmark: ingest consumer, Redis entry -> JSONB market record, messages per second.
+
+"pydantic" is the old path: decode, then MarketCreateSchema and model_dump() for every
+message. "model_construct" skips validation but still builds a model. The fast paths
+decode with the shape check of the codec (a compiled msgspec decoder into BybitMessage)
+and build MarketRecord directly.
+
+Run: python -m tests.bench_ingest_records
+"""
+
+import datetime
+import json
+import time
+import typing
+
+from app.resources.codec import CODECS, get_codec
+from app.schemas.market import MarketCreateSchema
+from app.services.market_parser import market_record, market_row
+from tests.bench_ingest_codec import BATCH, generate_frames
+
+RUNS = 3
+
+
+def pydantic_path(entries: list[bytes], created: datetime.datetime) -> None:
+    for entry in entries:
+        message = json.loads(entry)
+        data = message["data"]
+        payload = MarketCreateSchema(
+            currency=message["topic"].rsplit(".", 1)[-1],
+            kind=message["topic"],
+            data=data[0] if isinstance(data, list) else data,
+        )
+        payload.model_dump()
+        market_record(payload, created, get_codec("json"))
+
+
+def construct_path(entries: list[bytes], created: datetime.datetime) -> None:
+    for entry in entries:
+        message = json.loads(entry)
+        data = message["data"]
+        payload = MarketCreateSchema.model_construct(
+            currency=message["topic"].rsplit(".", 1)[-1],
+            kind=message["topic"],
+            data=data[0] if isinstance(data, list) else data,
+        )
+        market_record(payload, created, get_codec("json"))
+
+
+def fast_path(name: str) -> typing.Callable[[list[bytes], datetime.datetime], None]:
+    codec = get_codec(name)
+
+    def run(entries: list[bytes], created: datetime.datetime) -> None:
+        for entry in entries:
+            market_row(codec.decode_message(entry), created, codec)
+
+    return run
+
+
+def rate(
+    entries: list[bytes], path: typing.Callable[[list[bytes], datetime.datetime], None]
+) -> float:
+    """Best messages per second over RUNS, in ingest-sized batches."""
+    created = datetime.datetime.utcnow()
+    best = float("inf")
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        for start in range(0, len(entries), BATCH):
+            path(entries[start : start + BATCH], created)
+        best = min(best, time.perf_counter() - started)
+    return len(entries) / best
+
+
+def main() -> None:
+    """."""
+    entries = [frame.encode() for frame in generate_frames(20000)]
+    paths = {"pydantic": pydantic_path, "model_construct": construct_path}
+    for name in CODECS:
+        try:
+            paths[f"{name} + MarketRecord"] = fast_path(name)
+        except RuntimeError as e:
+            print(f"{name}: skipped ({e})")
+
+    print(f"messages: {len(entries)}")
+    baseline = None
+    for label, path in paths.items():
+        messages_per_second = rate(entries, path)
+        baseline = baseline or messages_per_second
+        print(
+            f"{label:<26}{messages_per_second:>12,.0f} msg/s  "
+            f"({messages_per_second / baseline:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
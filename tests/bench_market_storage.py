@@ -0,0 +1,175 @@
+"""Benchmark: JSONB market table vs typed tables, storage size and query time.
+
+Needs the migrated database from config (DB__URL_RW). Writes synthetic rows for a fake
+symbol into both layouts, reports table sizes and the time of a typical "last N minutes"
+query, then deletes the rows.
+
+Run: python -m tests.bench_market_storage
+"""
+
+import asyncio
+import datetime
+import random
+import time
+
+import sqlalchemy as sa
+
+from app.models.market import Market, PublicTrade
+from app.repositories.db import DBRepository
+from app.resources.database import Database
+from app.schemas.market import MarketCreateSchema, MarketSchema
+from app.services.market import MarketService
+from app.services.market_parser import parse_message
+from config.settings import Settings
+
+SYMBOL = "BENCHUSDT"
+MESSAGES = 50000
+TRADES_PER_MESSAGE = 4
+QUERY_MINUTES = 5
+QUERY_RUNS = 20
+
+
+def generate_messages(count: int = MESSAGES) -> list[dict]:
+    """publicTrade messages over the last hour."""
+    rng = random.Random(42)
+    now_ms = int(datetime.datetime.now(datetime.UTC).timestamp() * 1000)
+    step = 3_600_000 // count
+    price = 100.0
+    messages = []
+    for i in range(count):
+        ts = now_ms - 3_600_000 + i * step
+        trades = []
+        for j in range(TRADES_PER_MESSAGE):
+            price = round(price * (1 + rng.gauss(0, 0.0005)), 4)
+            trades.append(
+                {
+                    "T": ts + j,
+                    "s": SYMBOL,
+                    "S": rng.choice(("Buy", "Sell")),
+                    "v": f"{rng.random():.3f}",
+                    "p": str(price),
+                    "L": "ZeroPlusTick",
+                    "i": f"{i}-{j}",
+                    "BT": False,
+                }
+            )
+        messages.append(
+            {
+                "topic": f"publicTrade.{SYMBOL}",
+                "ts": ts + TRADES_PER_MESSAGE,
+                "data": trades,
+            }
+        )
+    return messages
+
+
+async def relation_size(session, table: str) -> int:
+    """
+    Table size with indexes, summed over partitions for the partitioned market table.
+    """
+    return await session.scalar(
+        sa.text(
+            f"SELECT coalesce(sum(pg_total_relation_size(relid)), 0) "
+            f"FROM pg_partition_tree('{Market.metadata.schema}.{table}')"
+        )
+    )
+
+
+async def timed(session, statement) -> tuple[float, int]:
+    """Average query time over QUERY_RUNS and the number of returned rows."""
+    rows = 0
+    started = time.perf_counter()
+    for _ in range(QUERY_RUNS):
+        rows = len((await session.execute(statement)).all())
+    return (time.perf_counter() - started) / QUERY_RUNS, rows
+
+
+async def main() -> None:
+    """."""
+    settings = Settings()
+    db = Database(
+        url_rw=settings.db.url_rw,
+        url_ro=settings.db.url_ro,
+        application_name="smart_trade_ai",
+    )
+    service = MarketService(
+        db=db, repository=DBRepository[Market, MarketSchema](Market, MarketSchema)
+    )
+    messages = generate_messages()
+
+    async with db.session() as session:
+        jsonb_before = await relation_size(session, Market.__tablename__)
+        typed_before = await relation_size(session, PublicTrade.__tablename__)
+
+    # Как и в ingest: created — время получения сообщения
+    created = datetime.datetime.utcnow()
+    started = time.perf_counter()
+    await service.create_many(
+        [
+            MarketCreateSchema(currency=SYMBOL, kind=message["topic"], data=trade)
+            for message in messages
+            for trade in message["data"]
+        ]
+    )
+    jsonb_write = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rows = [row for message in messages for row in parse_message(message, created)[1]]
+    await service.copy_rows(PublicTrade, rows)
+    typed_write = time.perf_counter() - started
+
+    threshold = datetime.datetime.utcnow() - datetime.timedelta(minutes=QUERY_MINUTES)
+    async with db.session() as session:
+        await session.execute(
+            sa.text(f"ANALYZE {Market.metadata.schema}.{Market.__tablename__}")
+        )
+        await session.execute(
+            sa.text(f"ANALYZE {Market.metadata.schema}.{PublicTrade.__tablename__}")
+        )
+        jsonb_size = await relation_size(session, Market.__tablename__) - jsonb_before
+        typed_size = (
+            await relation_size(session, PublicTrade.__tablename__) - typed_before
+        )
+
+        # Типичный запрос анализа: цены и объемы сделок за последние минуты
+        jsonb_query, jsonb_rows = await timed(
+            session,
+            sa.select(
+                Market.data["p"].astext.cast(sa.Double),
+                Market.data["v"].astext.cast(sa.Double),
+            ).where(
+                Market.currency == SYMBOL,
+                Market.kind.like("publicTrade%"),
+                sa.cast(Market.data["T"].astext, sa.BigInteger)
+                >= int(threshold.timestamp() * 1000),
+            ),
+        )
+        typed_query, typed_rows = await timed(
+            session,
+            sa.select(PublicTrade.price, PublicTrade.size).where(
+                PublicTrade.currency == SYMBOL, PublicTrade.ts >= threshold
+            ),
+        )
+
+        await session.execute(sa.delete(Market).where(Market.currency == SYMBOL))
+        await session.execute(
+            sa.delete(PublicTrade).where(PublicTrade.currency == SYMBOL)
+        )
+        await session.commit()
+
+    print(f"trades: {len(rows)}")
+    print(f"write  jsonb: {jsonb_write:.3f} s   typed: {typed_write:.3f} s")
+    print(
+        f"size   jsonb: {jsonb_size / 2 ** 20:.1f} MiB   typed: "
+        f"{typed_size / 2 ** 20:.1f} MiB "
+        f"({jsonb_size / typed_size if typed_size else 0:.1f}x)"
+    )
+    print(
+        f"query  jsonb: {jsonb_query * 1000:.2f} ms ({jsonb_rows} rows)   "
+        f"typed: {typed_query * 1000:.2f} ms ({typed_rows} rows) "
+        f"({jsonb_query / typed_query if typed_query else 0:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""Benchmark: MarketBulkWriter throughput, rows/s from add_rows() until written.
+
+Two sinks: "noop" replaces copy_rows with a no-op and measures the writer's own overhead
+(the ceiling the buffer can sustain); "db" writes public_trade rows with COPY into the
+migrated database from config (DB__URL_RW) and deletes them afterwards. The ingest
+target is 20k rows/s.
+
+Run: python -m tests.bench_market_writer [--db]
+"""
+
+import argparse
+import asyncio
+import datetime
+import time
+
+import sqlalchemy as sa
+
+from app.models.market import Market, PublicTrade
+from app.repositories.db import DBRepository
+from app.resources.database import Database
+from app.schemas.market import MarketSchema
+from app.services.market import MarketService
+from app.services.market_writer import MarketBulkWriter
+from config.settings import Settings
+
+SYMBOL = "BENCHUSDT"
+ROWS = 200000
+# Rows per add_rows() call, as the Redis consumer hands over one decoded batch
+CHUNK = 1000
+TARGET = 20000
+
+
+class NoopMarketService:
+    """copy_rows that only counts rows."""
+
+    async def copy_rows(self, model, records) -> int:
+        await asyncio.sleep(0)
+        return len(records)
+
+
+def generate_rows(count: int = ROWS) -> list[tuple]:
+    """public_trade rows in COPY_COLUMNS order."""
+    now = datetime.datetime.utcnow()
+    return [
+        (
+            SYMBOL,
+            now + datetime.timedelta(milliseconds=i),
+            f"bench-{i}",
+            "Buy" if i % 2 else "Sell",
+            43510.0 + i % 100 / 10,
+            0.001 * (i % 50 + 1),
+            "PlusTick",
+            False,
+            now,
+        )
+        for i in range(count)
+    ]
+
+
+async def measure(service, rows: list[tuple]) -> float:
+    """
+    Rows/s through a started writer with the default ingest settings, including the
+    final drain.
+    """
+    settings = Settings().ingest
+    writer = MarketBulkWriter(
+        service,
+        batch_size=settings.batch_size,
+        flush_interval=settings.flush_interval,
+        max_pending=settings.max_pending,
+    )
+    await writer.start()
+    started = time.perf_counter()
+    for i in range(0, len(rows), CHUNK):
+        await writer.add_rows(PublicTrade, rows[i : i + CHUNK])
+    await writer.stop()
+    elapsed = time.perf_counter() - started
+    assert writer.rows_written == len(rows), (writer.rows_written, writer.rows_failed)
+    return len(rows) / elapsed
+
+
+async def main() -> None:
+    """."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--db", action="store_true", help="also write into the database from config"
+    )
+    args = parser.parse_args()
+
+    rows = generate_rows()
+    results = {"noop": await measure(NoopMarketService(), rows)}
+    if args.db:
+        settings = Settings()
+        db = Database(
+            url_rw=settings.db.url_rw,
+            url_ro=settings.db.url_ro,
+            application_name="smart_trade_ai",
+        )
+        service = MarketService(
+            db=db, repository=DBRepository[Market, MarketSchema](Market, MarketSchema)
+        )
+        try:
+            results["db"] = await measure(service, rows)
+        finally:
+            async with db.session() as session:
+                await session.execute(
+                    sa.delete(PublicTrade).where(PublicTrade.currency == SYMBOL)
+                )
+                await session.commit()
+
+    print(f"rows: {len(rows)}, add_rows chunk: {CHUNK}")
+    for sink, rate in results.items():
+        print(
+            f"{sink:<5} {rate:>10.0f} rows/s  ({rate / TARGET:.1f}x of {TARGET} rows/s "
+            "target)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
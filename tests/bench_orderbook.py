@@ -0,0 +1,108 @@
+"""Benchmark: order book deltas and depth-at-N for 50-level and 5000-level books.
+
+Compares OrderBookSide (sorted key list, running top-N depth) with a SortedDict side
+(O(log n) insert/delete, rank lookup per update) and with the untracked list (depth as a
+slice sum).
+
+The SortedDict variant needs sortedcontainers, which is not a project dependency.
+
+Run: pip install sortedcontainers && python -m tests.bench_orderbook
+"""
+
+import random
+import time
+
+from sortedcontainers import SortedDict
+
+from app.services.orderbook import OrderBookSide
+
+DELTAS = 200_000
+DEPTH = 10
+
+
+class SortedDictSide:
+    """
+    Reference side: SortedDict levels, running depth maintained through the rank of each
+    update.
+    """
+
+    def __init__(self, depth: int):
+        self._levels = SortedDict()
+        self._depth = depth
+        self._tracked = 0.0
+
+    def set(self, price: float, size: float):
+        levels, depth = self._levels, self._depth
+        key = -price
+        previous = levels.get(key)
+        if size == 0:
+            if previous is not None:
+                rank = levels.index(key)
+                del levels[key]
+                if rank < depth:
+                    entering = (
+                        levels.peekitem(depth - 1)[1] if len(levels) >= depth else 0.0
+                    )
+                    self._tracked += entering - previous
+            return
+        levels[key] = size
+        rank = levels.index(key)
+        if rank < depth:
+            if previous is None:
+                leaving = levels.peekitem(depth)[1] if len(levels) > depth else 0.0
+                self._tracked += size - leaving
+            else:
+                self._tracked += size - previous
+
+    def depth(self, n: int) -> float:
+        return self._tracked
+
+
+def generate_deltas(levels: int, count: int = DELTAS) -> list[tuple[float, float]]:
+    """
+    Updates around `levels` price steps: ~1/4 deletions, the rest inserts or size
+    changes.
+    """
+    rng = random.Random(42)
+    return [
+        (
+            float(rng.randrange(levels * 2)),
+            0.0 if rng.random() < 0.25 else rng.random() * 10,
+        )
+        for _ in range(count)
+    ]
+
+
+def run(side, deltas: list[tuple[float, float]]) -> tuple[float, float]:
+    """Seconds spent applying deltas and reading depth(DEPTH) after each one."""
+    started = time.perf_counter()
+    for price, size in deltas:
+        side.set(price, size)
+    applied = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in deltas:
+        side.depth(DEPTH)
+    return applied, time.perf_counter() - started
+
+
+def main() -> None:
+    """."""
+    for levels in (50, 5000):
+        deltas = generate_deltas(levels)
+        sides = (
+            ("untracked", OrderBookSide(descending=True, depths=())),
+            ("tracked", OrderBookSide(descending=True, depths=(DEPTH,))),
+            ("sorteddict", SortedDictSide(DEPTH)),
+        )
+        for name, side in sides:
+            applied, depth = run(side, deltas)
+            print(
+                f"levels={levels:<5} {name:<10} set: "
+                f"{applied / len(deltas) * 1e9:7.0f} ns/op  depth({DEPTH}): "
+                f"{depth / len(deltas) * 1e9:6.0f} ns/op"
+            )
+
+
+if __name__ == "__main__":
+    main()
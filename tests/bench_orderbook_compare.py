@@ -0,0 +1,82 @@
+"""Benchmark: vectorized compare_orderbooks_series vs looping compare_orderbooks.
+
+Run: python -m tests.bench_orderbook_compare
+"""
+
+import random
+import time
+
+from app.services.market import MarketService
+
+SNAPSHOTS = 5000
+DEPTH = 50
+CHANGES_PER_STEP = 10
+
+
+def generate_snapshots(count: int = SNAPSHOTS, depth: int = DEPTH) -> list[dict]:
+    """Random walk of a Bybit-like orderbook.50 snapshot sequence."""
+    rng = random.Random(42)
+    bids = {round(100 - i * 0.1, 1): rng.random() for i in range(depth)}
+    asks = {round(100.1 + i * 0.1, 1): rng.random() for i in range(depth)}
+    snapshots = []
+    for _ in range(count):
+        for book in (bids, asks):
+            for _ in range(CHANGES_PER_STEP):
+                price = rng.choice(list(book))
+                roll = rng.random()
+                if roll < 0.3 and len(book) > depth // 2:
+                    del book[price]
+                elif roll < 0.7:
+                    book[price] = round(rng.random(), 3)
+                else:
+                    book[round(price + rng.choice((-0.05, 0.05)), 2)] = round(
+                        rng.random(), 3
+                    )
+        snapshots.append(
+            {
+                "b": [[str(price), str(size)] for price, size in bids.items()],
+                "a": [[str(price), str(size)] for price, size in asks.items()],
+            }
+        )
+    return snapshots
+
+
+def main() -> None:
+    """."""
+    snapshots = generate_snapshots()
+
+    started = time.perf_counter()
+    for prev, new in zip(snapshots, snapshots[1:]):
+        MarketService.compare_orderbooks(prev, new)
+    loop_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    MarketService.compare_orderbooks_series(snapshots)
+    series_elapsed = time.perf_counter() - started
+
+    # Numeric arrays, as read from typed storage: string parsing excluded
+    arrays = [
+        MarketService.orderbook_levels_to_arrays(
+            [snapshot[side] for snapshot in snapshots]
+        )
+        for side in ("b", "a")
+    ]
+    started = time.perf_counter()
+    for side_arrays in arrays:
+        MarketService.compare_orderbook_arrays(*side_arrays)
+    arrays_elapsed = time.perf_counter() - started
+
+    print(f"snapshots: {len(snapshots)}, depth: {DEPTH}")
+    print(f"compare_orderbooks loop:            {loop_elapsed:.3f} s")
+    print(
+        f"compare_orderbooks_series:          {series_elapsed:.3f} s "
+        f"({loop_elapsed / series_elapsed:.1f}x)"
+    )
+    print(
+        f"compare_orderbook_arrays (parsed):  {arrays_elapsed:.3f} s "
+        f"({loop_elapsed / arrays_elapsed:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark: size and speed of JSON vs msgpack entries of the websocket_messages queue.
+
+Uses a capture recorded with tests.record_bybit, or synthetic Bybit-like frames without
+one. Entry sizes approximate the Redis memory and network traffic per message.
+
+Run: python -m tests.bench_queue_format [--capture capture.jsonl]
+"""
+
+import argparse
+import json
+import pathlib
+import time
+
+from app.resources.codec import RawMessage, get_codec
+from app.resources.queue_format import QueueFormat
+from tests.bench_ingest_codec import generate_frames
+
+RUNS = 3
+
+
+def measure(frames: list[str], name: str, write: str) -> tuple[int, float, float]:
+    """Total entry size, best encode and decode time over RUNS."""
+    codec = get_codec(name)
+    queue_format = QueueFormat(codec, write)
+    messages = [RawMessage(codec.loads(frame), frame) for frame in frames]
+    # Запись JSON из сокета уходит как есть, поэтому кодирование меряется по обычным
+    # словарям
+    plain = [dict(message) for message in messages]
+    encode_time = decode_time = float("inf")
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        entries = [queue_format.encode(message) for message in plain]
+        encode_time = min(encode_time, time.perf_counter() - started)
+        entries = [
+            entry.encode() if isinstance(entry, str) else entry for entry in entries
+        ]
+        started = time.perf_counter()
+        for entry in entries:
+            queue_format.decode(entry)
+        decode_time = min(decode_time, time.perf_counter() - started)
+    return sum(map(len, entries)), encode_time, decode_time
+
+
+def main() -> None:
+    """."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capture", help="JSON Lines capture from tests.record_bybit")
+    args = parser.parse_args()
+    if args.capture:
+        frames = pathlib.Path(args.capture).read_text().splitlines()
+    else:
+        # Ключи и значения пересобираются в компактный JSON, как их отправляет Bybit
+        frames = [
+            json.dumps(json.loads(frame), separators=(",", ":"))
+            for frame in generate_frames(20000)
+        ]
+    raw = sum(len(frame.encode()) for frame in frames)
+    print(
+        f"messages: {len(frames)}, raw frames: {raw / 1e6:.2f} MB "
+        f"({raw / len(frames):.0f} B/msg)"
+    )
+    print(
+        f"{'format':<18}{'size MB':>9}{'B/msg':>7}{'ratio':>7}"
+        f"{'encode msg/s':>14}{'decode msg/s':>14}"
+    )
+    for name, write in (("json", "json"), ("orjson", "json"), ("orjson", "msgpack")):
+        size, encode_time, decode_time = measure(frames, name, write)
+        print(
+            f"{write + ' (' + name + ')':<18}{size / 1e6:>9.2f}"
+            f"{size / len(frames):>7.0f}{size / raw:>7.2f}"
+            f"{len(frames) / encode_time:>14,.0f}{len(frames) / decode_time:>14,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
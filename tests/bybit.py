@@ -1,4 +1,3 @@
-import json
 import time
 from collections import defaultdict
 
@@ -7,10 +6,25 @@ from pybit.unified_trading import WebSocket
 from app.schemas.market import MarketCreateSchema
 
 TOP_20_SYMBOLS = [
-    "BTCUSDT", "ETHUSDT", "BNBUSDT", "XRPUSDT", "SOLUSDT",
-    "ADAUSDT", "DOGEUSDT", "MATICUSDT", "DOTUSDT", "LTCUSDT",
-    "AVAXUSDT", "LINKUSDT", "ATOMUSDT", "XMRUSDT",
-    "ETCUSDT", "BCHUSDT", "NEARUSDT", "APTUSDT", "FILUSDT"
+    "BTCUSDT",
+    "ETHUSDT",
+    "BNBUSDT",
+    "XRPUSDT",
+    "SOLUSDT",
+    "ADAUSDT",
+    "DOGEUSDT",
+    "MATICUSDT",
+    "DOTUSDT",
+    "LTCUSDT",
+    "AVAXUSDT",
+    "LINKUSDT",
+    "ATOMUSDT",
+    "XMRUSDT",
+    "ETCUSDT",
+    "BCHUSDT",
+    "NEARUSDT",
+    "APTUSDT",
+    "FILUSDT",
 ]
 
 
@@ -38,7 +52,7 @@ class Bybit:
                     continue
 
                 data = message["data"]
-                print(f'data: {data}')
+                print(f"data: {data}")
 
                 # Обрабатываем список или словарь
                 if isinstance(data, list):
@@ -59,12 +73,12 @@ class Bybit:
                     print(f"⚠ Пустой словарь данных: {message}")
                     continue
 
-                payloads.append(MarketCreateSchema(
-                    currency=symbol,
-                    kind=message["topic"],
-                    data=data
-                ))
-        print(f'payloads: {payloads}')
+                payloads.append(
+                    MarketCreateSchema(
+                        currency=symbol, kind=message["topic"], data=data
+                    )
+                )
+        print(f"payloads: {payloads}")
         self.buffer.clear()
         self.last_flush_time = time.monotonic()  # Обновляем время последнего сброса
 
@@ -74,12 +88,16 @@ class Bybit:
         while True:
             try:
                 for symbol in TOP_20_SYMBOLS:
-                    ws.orderbook_stream(symbol=symbol, callback=self.add_to_buffer, depth=50)
-                    ws.kline_stream(symbol=symbol, interval=1, callback=self.add_to_buffer)
+                    ws.orderbook_stream(
+                        symbol=symbol, callback=self.add_to_buffer, depth=50
+                    )
+                    ws.kline_stream(
+                        symbol=symbol, interval=1, callback=self.add_to_buffer
+                    )
                     ws.trade_stream(symbol=symbol, callback=self.add_to_buffer)
                     ws.liquidation_stream(symbol=symbol, callback=self.add_to_buffer)
 
-                print(f"✅ Подписаны  валютных пар")
+                print("✅ Подписаны  валютных пар")
 
                 while True:
                     time.sleep(1)  # Проверяем раз в секунду
@@ -92,5 +110,6 @@ class Bybit:
                 print(f"⚠ Ошибка WebSocket: {e}. Переподключение через 5 секунд...")
             time.sleep(5)
 
+
 Bybit().run()
 print("Тест завершен")
@@ -0,0 +1,86 @@
+"""
+Local fake of the Bybit v5 public WebSocket stream for tests (aiohttp test server).
+"""
+
+import json
+import pathlib
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+FRAMES = pathlib.Path(__file__).parent / "data" / "bybit_frames.jsonl"
+
+
+def recorded_frames() -> list[str]:
+    """Recorded Bybit frames, one text frame per line."""
+    return FRAMES.read_text().splitlines()
+
+
+def frame_topic(raw: str) -> str | None:
+    """Topic of a frame, None for a frame that is not a JSON object."""
+    try:
+        return json.loads(raw)["topic"]
+    except (ValueError, TypeError):
+        return None
+
+
+class FakeBybit:
+    """
+    Answers subscribe/unsubscribe/ping like Bybit and, on subscribe, replays the
+    recorded frames of the subscribed topics; frames that are not JSON objects go with
+    every subscribe. Every request is kept as (connection number, request).
+    """
+
+    def __init__(self, frames: list[str] | None = None, pong: bool = True):
+        self.frames = recorded_frames() if frames is None else frames
+        self.pong = pong
+        self.requests: list[tuple[int, dict]] = []
+        self.connections: list[web.WebSocketResponse] = []
+        app = web.Application()
+        app.router.add_get("/v5/public/linear", self.handle)
+        self.server = TestServer(app)
+
+    @property
+    def url(self) -> str:
+        return str(self.server.make_url("/v5/public/linear")).replace("http", "ws", 1)
+
+    async def __aenter__(self) -> "FakeBybit":
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.server.close()
+
+    def topics(self, connection: int, op: str = "subscribe") -> list[str]:
+        return [
+            topic
+            for index, request in self.requests
+            if index == connection and request["op"] == op
+            for topic in request["args"]
+        ]
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        index = len(self.connections)
+        self.connections.append(ws)
+        async for frame in ws:
+            message = json.loads(frame.data)
+            self.requests.append((index, message))
+            if message["op"] == "ping" and not self.pong:
+                continue
+            await ws.send_json(
+                {
+                    "success": True,
+                    "ret_msg": "pong" if message["op"] == "ping" else "",
+                    "conn_id": f"conn-{index}",
+                    "req_id": message.get("req_id"),
+                    "op": message["op"],
+                }
+            )
+            if message["op"] == "subscribe":
+                for raw in self.frames:
+                    topic = frame_topic(raw)
+                    if topic is None or topic in message["args"]:
+                        await ws.send_str(raw)
+        return ws
@@ -0,0 +1,146 @@
+"""
+Local fake of the OpenAI Files and Batch API for tests (httpx.MockTransport handler).
+"""
+
+import itertools
+import json
+import re
+import typing
+
+import httpx
+
+COMPLETION = {
+    "id": "chatcmpl-batch",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-test",
+    "choices": [
+        {
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": ""},
+        }
+    ],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+}
+
+
+class FakeBatchAPI:
+    """
+    Batch jobs go validating -> in_progress -> completed on successive polls. On
+    completion every request line is answered by `respond(custom_id, body)`: a string
+    becomes the assistant message, an exception becomes a per-request error in the error
+    file.
+    """
+
+    def __init__(self, respond: typing.Callable[[str, dict], str]):
+        self.respond = respond
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, dict] = {}
+        self.requests: list[str] = []
+        self._ids = itertools.count(1)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.removeprefix("/v1")
+        self.requests.append(f"{request.method} {path}")
+        if request.method == "POST" and path == "/files":
+            return self._upload(request)
+        if request.method == "POST" and path == "/batches":
+            return self._create(json.loads(request.content))
+        if match := re.fullmatch(r"/batches/([\w-]+)", path):
+            return httpx.Response(200, json=self._poll(match.group(1)))
+        if match := re.fullmatch(r"/batches/([\w-]+)/cancel", path):
+            batch = self.batches[match.group(1)]
+            batch["status"] = "cancelled"
+            return httpx.Response(200, json=batch)
+        if match := re.fullmatch(r"/files/([\w-]+)/content", path):
+            return httpx.Response(200, content=self.files[match.group(1)])
+        return httpx.Response(404, json={"error": {"message": f"unknown route {path}"}})
+
+    def _upload(self, request: httpx.Request) -> httpx.Response:
+        boundary = request.headers["content-type"].split("boundary=")[1].encode()
+        part = next(
+            part
+            for part in request.content.split(b"--" + boundary)
+            if b'name="file"' in part
+        )
+        content = part.split(b"\r\n\r\n", 1)[1].removesuffix(b"\r\n")
+        file_id = f"file-{next(self._ids)}"
+        self.files[file_id] = content
+        return httpx.Response(
+            200,
+            json={
+                "id": file_id,
+                "object": "file",
+                "bytes": len(content),
+                "created_at": 0,
+                "filename": "batch.jsonl",
+                "purpose": "batch",
+                "status": "processed",
+            },
+        )
+
+    def _create(self, payload: dict) -> httpx.Response:
+        batch_id = f"batch_{next(self._ids)}"
+        lines = self.files[payload["input_file_id"]].decode().splitlines()
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": payload["endpoint"],
+            "input_file_id": payload["input_file_id"],
+            "completion_window": payload["completion_window"],
+            "created_at": 0,
+            "status": "validating",
+            "metadata": payload.get("metadata"),
+            "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+        }
+        return httpx.Response(200, json=self.batches[batch_id])
+
+    def _poll(self, batch_id: str) -> dict:
+        batch = self.batches[batch_id]
+        if batch["status"] == "validating":
+            batch["status"] = "in_progress"
+        elif batch["status"] == "in_progress":
+            self._complete(batch)
+        return batch
+
+    def _complete(self, batch: dict):
+        output, errors = [], []
+        for line in self.files[batch["input_file_id"]].decode().splitlines():
+            item = json.loads(line)
+            try:
+                completion = json.loads(json.dumps(COMPLETION))
+                completion["choices"][0]["message"]["content"] = self.respond(
+                    item["custom_id"], item["body"]
+                )
+                output.append(
+                    {
+                        "custom_id": item["custom_id"],
+                        "response": {"status_code": 200, "body": completion},
+                        "error": None,
+                    }
+                )
+            except Exception as e:
+                errors.append(
+                    {
+                        "custom_id": item["custom_id"],
+                        "response": None,
+                        "error": {"code": "server_error", "message": str(e)},
+                    }
+                )
+        for key, rows in (("output_file_id", output), ("error_file_id", errors)):
+            if rows:
+                file_id = f"file-{next(self._ids)}"
+                self.files[file_id] = "\n".join(
+                    json.dumps(row) for row in rows
+                ).encode()
+                batch[key] = file_id
+        batch["status"] = "completed"
+        batch["request_counts"] = {
+            "total": len(output) + len(errors),
+            "completed": len(output),
+            "failed": len(errors),
+        }
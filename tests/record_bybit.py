@@ -0,0 +1,42 @@
+"""Records raw frames of the Bybit public stream into a JSON Lines benchmark capture.
+
+Run: python -m tests.record_bybit --seconds 60 --output capture.jsonl
+"""
+
+import argparse
+import asyncio
+
+from app.enums.market import TOP_20_SYMBOLS
+from app.resources.bybit import BybitWebSocketPool
+
+
+async def record(output: str, seconds: float) -> int:
+    """Writes every topic frame as received, one per line."""
+    pool = BybitWebSocketPool()
+    frames = 0
+    with open(output, "w") as file:
+
+        def on_message(message) -> None:
+            nonlocal frames
+            frames += 1
+            file.write(message.raw + "\n")
+
+        await pool.subscribe(TOP_20_SYMBOLS, on_message)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await pool.close()
+    return frames
+
+
+def main() -> None:
+    """."""
+    parser = argparse.ArgumentParser(description="Record Bybit public stream frames.")
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--output", default="capture.jsonl")
+    args = parser.parse_args()
+    print(f"frames: {asyncio.run(record(args.output, args.seconds))} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
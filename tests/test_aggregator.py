@@ -0,0 +1,233 @@
+"""."""
+
+import contextlib
+import datetime
+import json
+import time
+
+import pytest
+
+from app.schemas.market import MarketSchema
+from app.schemas.repository import RepositoryOutSchema
+from app.services.aggregator import (
+    AGGREGATE_KEY,
+    BUCKET_MS,
+    MarketAggregator,
+    window_covered,
+)
+from app.services.market import MarketService
+
+BASE = 1_700_000_000_000 - 1_700_000_000_000 % BUCKET_MS
+
+
+def _trade(
+    aggregator: MarketAggregator, ts: int, price: float, size: float, side: str
+) -> None:
+    aggregator.apply(
+        {
+            "topic": "publicTrade.BTCUSDT",
+            "data": [
+                {"s": "BTCUSDT", "T": ts, "p": str(price), "v": str(size), "S": side}
+            ],
+        }
+    )
+
+
+def test_rolling_windows() -> None:
+    """."""
+    aggregator = MarketAggregator(windows=(2, 5))
+    _trade(aggregator, BASE, 100, 1, "Buy")
+    _trade(aggregator, BASE + 1000, 105, 1, "Sell")
+    _trade(aggregator, BASE + BUCKET_MS, 95, 2, "Buy")
+    _trade(aggregator, BASE + 2 * BUCKET_MS, 101, 1, "Buy")
+    aggregator.apply(
+        {
+            "topic": "liquidation.BTCUSDT",
+            "data": {
+                "updatedTime": BASE + 2 * BUCKET_MS,
+                "symbol": "BTCUSDT",
+                "side": "Sell",
+                "size": "3",
+            },
+        }
+    )
+    aggregator.on_orderbook("BTCUSDT", BASE + 2 * BUCKET_MS, 100.5, 1.0, 0.2)
+
+    symbol = aggregator.get("BTCUSDT")
+    now = BASE + 2 * BUCKET_MS + 10_000
+
+    short = symbol.summary(2, now)
+    assert (short["open"], short["high"], short["low"], short["close"]) == (
+        95,
+        101,
+        95,
+        101,
+    )
+    assert short["volume"] == 3
+    assert short["vwap"] == 97
+    assert short["liquidation_sell_volume"] == 3
+    assert short["avg_imbalance"] == 0.2
+
+    long = symbol.summary(5, now)
+    assert (long["open"], long["high"], long["low"], long["close"]) == (
+        100,
+        105,
+        95,
+        101,
+    )
+    assert long["trades"] == 4
+    assert (long["buy_volume"], long["sell_volume"]) == (4, 1)
+
+    # Через 5 минут без данных окна пустеют
+    assert symbol.summary(2, now + 5 * BUCKET_MS)["volume"] == 0
+    assert symbol.summary(7, now) is None
+
+
+def test_window_coverage_after_start() -> None:
+    """."""
+    aggregator = MarketAggregator(windows=(5,))
+    _trade(aggregator, BASE + 30_000, 100, 1, "Buy")
+    symbol = aggregator.get("BTCUSDT")
+    # Первая минута после запуска неполная: окно покрыто с BASE + 1 мин.
+    assert symbol.covered_since == BASE + BUCKET_MS
+
+    for minute in range(1, 6):
+        now = BASE + minute * BUCKET_MS + 1000
+        _trade(aggregator, now, 100, 1, "Buy")
+        assert window_covered(symbol.summary(5, now), 5, now) == (minute >= 5)
+
+
+def test_state_restore() -> None:
+    """."""
+    aggregator = MarketAggregator(windows=(2, 5))
+    for minute in range(4):
+        _trade(aggregator, BASE + minute * BUCKET_MS, 100 + minute, 1, "Buy")
+    now = BASE + 3 * BUCKET_MS + 10_000
+    symbol = aggregator.get("BTCUSDT")
+    ((name, state),) = aggregator.states(now)
+    assert name == "BTCUSDT"
+    state = json.loads(json.dumps(state))
+
+    # Перезапуск в ту же минуту: окна и покрытие продолжаются
+    restored = MarketAggregator(windows=(2, 5)).get("BTCUSDT")
+    restored.restore(state, now + 20_000)
+    for minutes in (2, 5):
+        assert restored.summary(minutes, now + 20_000) == symbol.summary(
+            minutes, now + 20_000
+        )
+    _trade(aggregator, now + 30_000, 110, 2, "Sell")
+    restored.on_trade(now + 30_000, 110, 2, "Sell")
+    assert restored.summary(5, now + 30_000) == symbol.summary(5, now + 30_000)
+
+    # Долгий перерыв: данные за него потеряны, окно покрыто с первой полной минуты после
+    # перезапуска
+    later = now + 3 * BUCKET_MS
+    restored = MarketAggregator(windows=(2, 5)).get("BTCUSDT")
+    restored.restore(state, later)
+    summary = restored.summary(5, later)
+    assert summary["volume"] == 2 and summary["open"] == 102
+    assert summary["covered_since"] == later - later % BUCKET_MS + BUCKET_MS
+    assert not window_covered(summary, 5, later)
+
+
+class FakeRedis:
+    """Published aggregate for the window."""
+
+    def __init__(self, summary: dict):
+        self.summary = summary
+
+    async def connect(self):
+        pass
+
+    async def get(self, key: str) -> dict | None:
+        return (
+            self.summary
+            if key == AGGREGATE_KEY.format(symbol="BTCUSDT", minutes=1440)
+            else None
+        )
+
+
+class FakeDatabase:
+    """."""
+
+    @contextlib.asynccontextmanager
+    async def session_ro(self, session=None):
+        yield session or object()
+
+
+class FakeRepository:
+    """Raw JSONB rows of the window."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def items(self, session, statement):
+        self.statements.append(statement)
+        entry = MarketSchema(
+            id=1,
+            currency="BTCUSDT",
+            created=datetime.datetime.utcnow(),
+            kind="publicTrade.BTCUSDT",
+            data={},
+        )
+        return RepositoryOutSchema(limit=1, offset=0, total=1, items=[entry])
+
+
+class SummaryMarketService(MarketService):
+    """MarketService without indicators and patterns."""
+
+    async def get_indicators(self, currency, session, limit=1440):
+        return None
+
+    async def get_patterns(self, currency, since, session, interval="1"):
+        return None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("covered", [True, False], ids=["full", "partial"])
+async def test_partial_window_falls_back_to_db(covered: bool) -> None:
+    """."""
+    now_ms = int(time.time() * 1000)
+    current_start = now_ms - now_ms % BUCKET_MS
+    # Полное окно 1440 минут или только 30 минут после перезапуска
+    covered_since = current_start - (1439 if covered else 30) * BUCKET_MS
+    summary = {
+        "symbol": "BTCUSDT",
+        "window_minutes": 1440,
+        "volume": 1.0,
+        "covered_since": covered_since,
+    }
+    repository = FakeRepository()
+    service = SummaryMarketService(
+        FakeDatabase(), repository, redis_client=FakeRedis(summary)
+    )
+
+    data = await service.get_aggregated_market_data("BTCUSDT", 1440)
+    if covered:
+        assert data.summary == summary and data.grouped_data == {}
+        assert not repository.statements
+    else:
+        assert data.summary is None
+        assert data.grouped_data["publicTrade"].count == 1
+        assert len(repository.statements) == 1
+
+
+def test_liquidation_short_form_with_zero_time() -> None:
+    """."""
+    aggregator = MarketAggregator(windows=(2,))
+    aggregator.apply(
+        {
+            "topic": "allLiquidation.BTCUSDT",
+            "ts": BASE,
+            "data": [
+                {"T": 0, "s": "BTCUSDT", "S": "Sell", "v": 5, "p": 0},
+                {"s": "BTCUSDT", "S": "Sell", "v": "2", "p": "1"},
+            ],
+        }
+    )
+    # T=0 — метка ликвидации, а не отсутствие поля: она вне окна, без T берется метка
+    # сообщения
+    assert (
+        aggregator.get("BTCUSDT").summary(2, BASE + 1000)["liquidation_sell_volume"]
+        == 2
+    )
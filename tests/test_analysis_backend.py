@@ -0,0 +1,74 @@
+"""."""
+
+import time
+
+import numpy as np
+import pytest
+
+from app.services.analysis_backend import RuleBasedBackend
+from app.services.indicators import compute_indicators, latest
+
+
+def market(drift: float, imbalance: float, signal: str) -> dict:
+    """
+    Агрегированные данные по синтетическим минутным свечам с трендом `drift` на свечу.
+    """
+    rng = np.random.default_rng(7)
+    close = 50_000 + np.cumsum(drift + rng.normal(0, 5, 300))
+    high, low = close + 10, close - 10
+    start = np.arange(300, dtype=np.int64) * 60_000
+    indicators = latest(
+        compute_indicators(start, high, low, close, np.full(300, 2.0)), close
+    )
+    return {
+        "currency": "BTCUSDT",
+        "indicators": indicators,
+        "patterns": [
+            {"time": "2024-01-01T00:00:00", "pattern": "hammer", "signal": signal}
+        ],
+        "orderbook": {"imbalance_10": imbalance},
+    }
+
+
+@pytest.mark.asyncio
+async def test_rule_based_backend() -> None:
+    """."""
+    backend = RuleBasedBackend()
+
+    data = market(drift=8, imbalance=0.4, signal="bullish")
+    started = time.perf_counter()
+    rising = await backend.recommend(data)
+    assert time.perf_counter() - started < 0.05
+
+    falling = await backend.recommend(
+        market(drift=-8, imbalance=-0.4, signal="bearish")
+    )
+    flat = await backend.recommend(
+        {
+            "indicators": {
+                "candles": 300,
+                "close": 100.0,
+                "ema_20": 100.1,
+                "ema_50": 100.0,
+                "atr_14": 1.0,
+                "macd_hist": -0.05,
+                "rsi_14": 52.0,
+                "bb_upper": 102.0,
+                "bb_middle": 100.0,
+                "vwap": 100.2,
+            },
+            "patterns": [],
+            "orderbook": {"imbalance": 0.1},
+        }
+    )
+
+    assert rising.recommended_action == "buy" and rising.growth_probability > 60
+    assert "стоп-лосс" in rising.detailed_recommendations
+    assert falling.recommended_action == "sell" and falling.growth_probability < 40
+    assert flat.recommended_action == "hold"
+    assert (
+        rising.index_gpt.growth_probability + rising.index_gpt.fall_probability == 100
+    )
+
+    with pytest.raises(ValueError):
+        await backend.recommend({"currency": "BTCUSDT", "indicators": None})
@@ -0,0 +1,63 @@
+"""."""
+
+import json
+
+import httpx
+import pytest
+
+from app.resources.openai_client import OpenAIClient
+from app.schemas.analysis import AnalysisResult
+from app.services.chat_gpt import ChatGPTService
+from tests.fake_openai import FakeBatchAPI
+
+
+def result(symbol: str) -> dict:
+    """."""
+    return {
+        "technical_indicators": f"RSI {symbol}",
+        "candlestick_patterns": "-",
+        "index_gpt": {"growth_probability": 60, "fall_probability": 40},
+        "recommended_action": "buy",
+        "detailed_recommendations": "-",
+        "decision_tree": None,
+    }
+
+
+def respond(custom_id: str, body: dict) -> str:
+    """."""
+    assert body["model"] == "gpt-test"
+    assert body["response_format"]["json_schema"]["strict"] is True
+    assert body["messages"][-1]["content"] == f"prompt {custom_id}"
+    if custom_id == "FAILUSDT":
+        raise RuntimeError("model overloaded")
+    if custom_id == "TEXTUSDT":
+        return "not json"
+    return json.dumps(result(custom_id))
+
+
+@pytest.mark.asyncio
+async def test_analyze_batch() -> None:
+    """."""
+    api = FakeBatchAPI(respond)
+    http_client = httpx.AsyncClient(transport=api.transport())
+    service = ChatGPTService(
+        api_key="test",
+        model="gpt-test",
+        client=OpenAIClient(
+            api_key="test", base_url="http://fake/v1", http_client=http_client
+        ),
+    )
+    symbols = ["BTCUSDT", "ETHUSDT", "FAILUSDT", "TEXTUSDT"]
+
+    results = await service.analyze_batch(
+        {symbol: f"prompt {symbol}" for symbol in symbols}, poll_interval=0
+    )
+    await http_client.aclose()
+
+    assert results["BTCUSDT"] == AnalysisResult.model_validate(result("BTCUSDT"))
+    assert results["ETHUSDT"].growth_probability == 60
+    assert "model overloaded" in str(results["FAILUSDT"])
+    assert isinstance(results["TEXTUSDT"], ValueError)
+    # Один файл и одно задание на все символы
+    assert api.requests.count("POST /files") == 1
+    assert api.requests.count("POST /batches") == 1
@@ -0,0 +1,71 @@
+"""."""
+
+import asyncio
+import time
+
+import pytest
+
+from app.resources.bybit import BybitWebSocketPool
+from app.services.bybit_stream import WebSocketService
+from tests.fake_bybit import FakeBybit
+
+SYMBOLS = [f"S{i}USDT" for i in range(30)]
+
+
+@pytest.mark.asyncio
+async def test_topics_are_sharded_and_batched() -> None:
+    """."""
+    async with FakeBybit(frames=[]) as server:
+        pool = BybitWebSocketPool(
+            connections=2, topics_per_connection=40, subscribe_batch=4, url=server.url
+        )
+        received = []
+        await pool.subscribe(SYMBOLS, received.append, depth=50, interval=1)
+        try:
+            # 120 топиков по 40 на соединение -> 3 соединения, стаканы поровну
+            assert len(pool.shards) == 3
+            assert len(pool.topics) == 120
+            assert all(len(request["args"]) <= 4 for _, request in server.requests)
+            for connection in range(3):
+                topics = server.topics(connection)
+                assert len(topics) == 40
+                assert sum(topic.startswith("orderbook.50.") for topic in topics) == 10
+
+            owner = next(
+                index
+                for index in range(3)
+                if "orderbook.50.S7USDT" in server.topics(index)
+            )
+            pool.resubscribe("orderbook.50.S7USDT")
+            await asyncio.sleep(0.05)
+            assert [
+                index
+                for index, request in server.requests
+                if request["op"] == "unsubscribe"
+            ] == [owner]
+
+            now = int(time.time() * 1000)
+            for _ in range(5):
+                pool.shards[0].callback(
+                    {"topic": "orderbook.50.S0USDT", "ts": now - 100}
+                )
+            stats = pool.stats()
+            assert [item["messages"] for item in stats] == [5, 0, 0]
+            assert stats[0]["lag_ms"] >= 100 and stats[1]["lag_ms"] is None
+            assert all(item["connected"] and item["reconnects"] == 0 for item in stats)
+            assert len(received) == 5
+        finally:
+            await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_symbols_are_split_across_processes() -> None:
+    """."""
+    shards = [
+        WebSocketService(
+            None, None, None, None, symbols=SYMBOLS, shard_index=index, shard_count=3
+        ).symbols
+        for index in range(3)
+    ]
+    assert sorted(sum(shards, [])) == sorted(SYMBOLS)
+    assert all(len(symbols) == 10 for symbols in shards)
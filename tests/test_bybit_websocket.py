@@ -0,0 +1,126 @@
+"""."""
+
+import asyncio
+import json
+import threading
+import typing
+
+import pytest
+
+from app.resources.bybit import BybitWebSocket, BybitWebSocketPool
+from app.services.bybit_stream import WebSocketService
+from tests.fake_bybit import FakeBybit, recorded_frames
+
+TOPICS = [
+    "orderbook.50.BTCUSDT",
+    "publicTrade.BTCUSDT",
+    "kline.1.BTCUSDT",
+    "liquidation.BTCUSDT",
+]
+
+
+async def until(condition: typing.Callable[[], bool], timeout: float = 2.0) -> None:
+    """Ждет выполнения условия."""
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_replay_and_resubscribe_on_reconnect() -> None:
+    """."""
+    received, threads = [], set()
+
+    def on_message(message: dict) -> None:
+        threads.add(threading.get_ident())
+        received.append(message)
+
+    async with FakeBybit() as server:
+        client = BybitWebSocket(
+            server.url, ping_interval=10, subscribe_batch=3, reconnect_delay=0.01
+        )
+        await client.subscribe(TOPICS)
+        await client.connect(on_message)
+        try:
+            await until(lambda: len(received) == 5)
+            # Кадры доставлены как есть: delta стакана не превращается в snapshot,
+            # колбэк — в потоке loop
+            assert received == [json.loads(raw) for raw in recorded_frames()]
+            assert threads == {threading.get_ident()}
+            assert [len(request["args"]) for _, request in server.requests] == [3, 1]
+
+            # Разрыв со стороны сервера: новое соединение подписывается на те же топики
+            await server.connections[0].close()
+            await until(lambda: len(received) == 10)
+            assert client.reconnects == 1
+            assert sorted(server.topics(1)) == sorted(TOPICS)
+
+            await client.unsubscribe(["liquidation.BTCUSDT"])
+            client.resubscribe("orderbook.50.BTCUSDT")
+            await until(lambda: len(received) == 12)
+            assert server.topics(1, "unsubscribe") == [
+                "liquidation.BTCUSDT",
+                "orderbook.50.BTCUSDT",
+            ]
+            assert client.topics == TOPICS[:3]
+        finally:
+            await client.close()
+        assert not client.connected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("pong", "reconnects", "pings"),
+    [(True, 0, 3), (False, 1, 1)],
+    ids=["pong", "no_pong"],
+)
+async def test_ping_pong(pong: bool, reconnects: int, pings: int) -> None:
+    """."""
+    async with FakeBybit(pong=pong) as server:
+        client = BybitWebSocket(server.url, ping_interval=0.05, reconnect_delay=10)
+        await client.connect(lambda message: None)
+        try:
+            await asyncio.sleep(0.3)
+            assert client.reconnects == reconnects
+            # Без pong соединение закрывается на следующем ping, новое откроется через
+            # reconnect_delay
+            assert (
+                sum(request["op"] == "ping" for _, request in server.requests) >= pings
+            )
+        finally:
+            await client.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_updates_service_state() -> None:
+    """."""
+    async with FakeBybit() as server:
+        pool = BybitWebSocketPool(url=server.url)
+        service = WebSocketService(None, pool, None, None, symbols=["BTCUSDT"])
+        await pool.subscribe(service.symbols, service._on_message, depth=50, interval=1)
+        try:
+            await until(lambda: len(service.ingest_buffer) == 5)
+            book = service.orderbooks.books["BTCUSDT"]
+            assert book.is_synced
+            assert book.best_bid == (43510.4, 0.015)
+            assert pool.stats()[0]["messages"] == 5
+        finally:
+            await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_corrupt_frame_is_skipped() -> None:
+    """."""
+    frames = recorded_frames()
+    corrupt = ['{"topic": "publicTrade.BTCUSDT", "ts": ', "[1, 2]"]
+    async with FakeBybit(frames=corrupt + frames) as server:
+        pool = BybitWebSocketPool(url=server.url)
+        received = []
+        await pool.subscribe(["BTCUSDT"], received.append, depth=50, interval=1)
+        try:
+            await until(lambda: len(received) == len(frames))
+            (stats,) = pool.stats()
+            assert stats["decode_errors"] == 2
+            assert stats["reconnects"] == 0 and stats["connected"]
+        finally:
+            await pool.close()
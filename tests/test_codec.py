@@ -0,0 +1,79 @@
+"""."""
+
+import datetime
+import json
+
+import numpy as np
+import pytest
+
+from app.resources.codec import CODECS, RawMessage, encode, get_codec
+from app.schemas.market import MarketCreateSchema
+from app.services.market_parser import market_record, market_row
+from tests.fake_bybit import recorded_frames
+
+
+@pytest.mark.parametrize("name", list(CODECS))
+def test_codec_round_trip(name: str) -> None:
+    """."""
+    try:
+        codec = get_codec(name)
+    except RuntimeError:
+        pytest.skip(f"{name} не установлен")
+    value = {
+        "symbol": "BTCUSDT",
+        "close": np.float64(43510.6),
+        "levels": np.array([1.5, 2.0]),
+        "ok": True,
+    }
+    assert codec.loads(codec.dumps(value)) == {
+        "symbol": "BTCUSDT",
+        "close": 43510.6,
+        "levels": [1.5, 2.0],
+        "ok": True,
+    }
+
+    created = datetime.datetime(2024, 1, 1)
+    for frame in recorded_frames():
+        message = RawMessage(codec.loads(frame), frame)
+        # Кадр из сокета уходит в Redis без повторной сериализации
+        assert encode(codec, message) is frame
+        data = (
+            message["data"][0] if isinstance(message["data"], list) else message["data"]
+        )
+        payload = MarketCreateSchema(
+            currency="BTCUSDT", kind=message["topic"], data=data
+        )
+        row = market_row(codec.loads(encode(codec, message)), created, codec)
+        assert row == market_record(payload, created, codec)
+        assert codec.loads(row[3]) == data
+
+    assert (
+        market_row({"topic": "publicTrade.BTCUSDT", "data": []}, created, codec) is None
+    )
+    with pytest.raises(ValueError):
+        get_codec("pickle")
+
+
+@pytest.mark.parametrize("name", list(CODECS))
+def test_message_boundary(name: str) -> None:
+    """."""
+    try:
+        codec = get_codec(name)
+    except RuntimeError:
+        pytest.skip(f"{name} не установлен")
+    for frame in recorded_frames():
+        message = codec.decode_message(frame.encode())
+        assert message["topic"] == json.loads(frame)["topic"]
+        assert (
+            market_row(message, datetime.datetime(2024, 1, 1), codec).kind
+            == message["topic"]
+        )
+
+    for entry in (
+        b'{"op": "pong"}',
+        b'{"topic": "kline.1.BTCUSDT", "ts": "1", "data": []}',
+        b"[1, 2]",
+        b"{",
+    ):
+        with pytest.raises(ValueError):
+            codec.decode_message(entry)
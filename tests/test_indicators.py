@@ -0,0 +1,144 @@
+"""."""
+
+import math
+
+import numpy as np
+import pytest
+
+from app.services import indicators
+from app.services.indicators import IndicatorEngine, compute_indicators, latest
+
+
+def _candles(n: int = 400, seed: int = 7) -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+    return {
+        # Начало за 3 часа до полуночи UTC, чтобы VWAP сбрасывался внутри ряда
+        "start": 1700000000000
+        - 1700000000000 % indicators.DAY_MS
+        - 180 * 60000
+        + np.arange(n) * 60000,
+        "high": close * (1 + rng.random(n) * 0.003),
+        "low": close * (1 - rng.random(n) * 0.003),
+        "close": close,
+        "volume": rng.random(n) * 5,
+    }
+
+
+def _reference_ema(
+    values: list[float], period: int, alpha: float | None = None
+) -> list[float]:
+    """Textbook recursion: SMA seed, then y = a * x + (1 - a) * y."""
+    alpha = alpha if alpha is not None else 2 / (period + 1)
+    out = [math.nan] * len(values)
+    if len(values) < period:
+        return out
+    out[period - 1] = sum(values[:period]) / period
+    for i in range(period, len(values)):
+        out[i] = alpha * values[i] + (1 - alpha) * out[i - 1]
+    return out
+
+
+def test_simple_reference_values() -> None:
+    """."""
+    np.testing.assert_allclose(
+        indicators.sma(np.arange(1.0, 6.0), 3), [np.nan, np.nan, 2, 3, 4]
+    )
+    # EMA(3): seed 2, then 0.5 * 4 + 0.5 * 2 = 3, 0.5 * 5 + 0.5 * 3 = 4
+    np.testing.assert_allclose(
+        indicators.ema(np.arange(1.0, 6.0), 3), [np.nan, np.nan, 2, 3, 4]
+    )
+    np.testing.assert_allclose(
+        indicators.obv(np.array([1.0, 2, 2, 1]), np.array([5.0, 3, 4, 2])), [0, 3, 3, 1]
+    )
+    # Только рост — RSI 100
+    assert indicators.rsi(np.arange(1.0, 20.0))[-1] == 100
+
+
+def test_against_reference_loops() -> None:
+    """."""
+    candles = _candles()
+    close = candles["close"].tolist()
+    high, low = candles["high"].tolist(), candles["low"].tolist()
+
+    np.testing.assert_allclose(
+        indicators.ema(candles["close"], 20), _reference_ema(close, 20), rtol=1e-10
+    )
+
+    deltas = [b - a for a, b in zip(close, close[1:])]
+    gains = _reference_ema([max(d, 0) for d in deltas], 14, 1 / 14)
+    losses = _reference_ema([max(-d, 0) for d in deltas], 14, 1 / 14)
+    expected_rsi = [math.nan] + [
+        100 - 100 / (1 + g / l_) for g, l_ in zip(gains, losses)
+    ]
+    np.testing.assert_allclose(
+        indicators.rsi(candles["close"]), expected_rsi, rtol=1e-10
+    )
+
+    tr = [high[0] - low[0]] + [
+        max(h - l_, abs(h - c), abs(l_ - c))
+        for h, l_, c in zip(high[1:], low[1:], close)
+    ]
+    np.testing.assert_allclose(
+        indicators.atr(candles["high"], candles["low"], candles["close"]),
+        _reference_ema(tr, 14, 1 / 14),
+        rtol=1e-10,
+    )
+
+    line, signal, _ = indicators.macd(candles["close"])
+    expected_line = np.array(_reference_ema(close, 12)) - np.array(
+        _reference_ema(close, 26)
+    )
+    np.testing.assert_allclose(line, expected_line, rtol=1e-10)
+    np.testing.assert_allclose(
+        signal[25:], _reference_ema(expected_line[25:].tolist(), 9), rtol=1e-10
+    )
+
+    upper, middle, _ = indicators.bollinger(candles["close"])
+    window = close[-20:]
+    mean = sum(window) / 20
+    assert middle[-1] == pytest.approx(mean)
+    assert upper[-1] == pytest.approx(
+        mean + 2 * math.sqrt(sum((x - mean) ** 2 for x in window) / 20)
+    )
+
+
+def test_vwap_resets_daily() -> None:
+    """."""
+    candles = _candles()
+    result = indicators.vwap(
+        candles["high"],
+        candles["low"],
+        candles["close"],
+        candles["volume"],
+        candles["start"],
+    )
+    typical = (candles["high"] + candles["low"] + candles["close"]) / 3
+    # Свечи с 180-й начинаются в новых сутках
+    assert result[179] == pytest.approx(
+        np.sum(typical[:180] * candles["volume"][:180]) / candles["volume"][:180].sum()
+    )
+    assert result[180] == pytest.approx(typical[180])
+
+
+@pytest.mark.parametrize("seeded", [0, 30, 300])
+def test_incremental_matches_vectorized(seeded: int) -> None:
+    """."""
+    candles = _candles()
+    expected = latest(compute_indicators(**candles), candles["close"])
+
+    engine = IndicatorEngine("BTCUSDT")
+    engine.seed(**{name: values[:seeded] for name, values in candles.items()})
+    for i in range(seeded, len(candles["close"])):
+        assert engine.update(
+            *(
+                float(candles[name][i])
+                for name in ("start", "high", "low", "close", "volume")
+            )
+        )
+    assert not engine.update(int(candles["start"][-1]), 1, 1, 1, 1)
+    snapshot = engine.snapshot()
+
+    assert snapshot.keys() == expected.keys()
+    for name, value in expected.items():
+        assert snapshot[name] == pytest.approx(value, rel=1e-9), name
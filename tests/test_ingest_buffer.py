@@ -0,0 +1,138 @@
+"""."""
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.ingest_buffer import DROP_NEWEST, DROP_OLDEST, IngestBuffer
+
+
+class Sink:
+    """Collects batches; may wait or fail on the next calls."""
+
+    def __init__(self, delay: float = 0.0, failures: int = 0):
+        self.delay = delay
+        self.failures = failures
+        self.batches: list[tuple[float, list]] = []
+
+    async def __call__(self, batch: list):
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("redis is down")
+        self.batches.append((time.monotonic(), batch))
+
+    @property
+    def messages(self) -> list:
+        return [message for _, batch in self.batches for message in batch]
+
+
+@pytest.mark.asyncio
+async def test_flush_by_size() -> None:
+    """."""
+    sink = Sink()
+    buffer = IngestBuffer(sink, max_size=5, max_age_ms=10000)
+    await buffer.start()
+    try:
+        for start, stop in ((0, 5), (5, 10), (10, 12)):
+            for i in range(start, stop):
+                buffer.append(i)
+            await asyncio.sleep(0.01)
+        # Два полных пакета ушли сразу, остаток ждет max_age
+        assert [batch for _, batch in sink.batches] == [
+            [0, 1, 2, 3, 4],
+            [5, 6, 7, 8, 9],
+        ]
+        assert len(buffer) == 2
+    finally:
+        await buffer.stop()
+    assert sink.messages == list(range(12))
+
+
+@pytest.mark.asyncio
+async def test_flush_by_age() -> None:
+    """."""
+    sink = Sink()
+    buffer = IngestBuffer(sink, max_size=100, max_age_ms=50)
+    await buffer.start()
+    try:
+        appended = time.monotonic()
+        buffer.append("a")
+        await asyncio.sleep(0.02)
+        buffer.append("b")
+        await asyncio.sleep(0.01)
+        assert not sink.batches
+        await asyncio.sleep(0.1)
+        # Возраст считается от первого сообщения пакета
+        ((flushed, batch),) = sink.batches
+        assert batch == ["a", "b"]
+        assert 0.05 <= flushed - appended < 0.09
+    finally:
+        await buffer.stop()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("policy", "kept"),
+    [(DROP_OLDEST, [5, 6, 7, 8, 9]), (DROP_NEWEST, [0, 1, 2, 3, 4])],
+    ids=["oldest", "newest"],
+)
+async def test_overflow_policy(policy: str, kept: list[int]) -> None:
+    """."""
+    sink = Sink()
+    buffer = IngestBuffer(sink, max_size=5, capacity=5, overflow_policy=policy)
+    for i in range(10):
+        buffer.append(i)
+    assert len(buffer) == 5 and buffer.dropped == 5 and buffer.received == 10
+    await buffer.flush()
+    assert sink.messages == kept
+
+
+@pytest.mark.asyncio
+async def test_requeue_after_sink_failure() -> None:
+    """."""
+    sink = Sink(failures=1)
+    buffer = IngestBuffer(sink, max_size=4, capacity=6)
+    for i in range(4):
+        buffer.append(i)
+    with pytest.raises(ConnectionError):
+        await buffer.flush()
+    # Пакет вернулся в начало буфера, новые сообщения — за ним; лишнее отбрасывается по
+    # capacity
+    for i in range(4, 8):
+        buffer.append(i)
+    assert list(buffer._active) == [2, 3, 4, 5, 6, 7] and buffer.dropped == 2
+    await buffer.flush()
+    assert sink.messages == [2, 3, 4, 5, 6, 7] and buffer.flushed == 6
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_in_flight_batch() -> None:
+    """."""
+    sink = Sink(delay=0.1)
+    buffer = IngestBuffer(sink, max_size=3, max_age_ms=10000)
+    await buffer.start()
+    for i in range(3):
+        buffer.append(i)
+    await asyncio.sleep(0.01)
+    # Фоновый сброс уже забрал пакет и ждет sink
+    assert len(buffer) == 0 and not sink.batches
+    buffer.append(3)
+    await buffer.stop()
+    assert sink.messages == [0, 1, 2, 3]
+    assert len(buffer) == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_flush_requeues() -> None:
+    """."""
+    sink = Sink(delay=1)
+    buffer = IngestBuffer(sink, max_size=10)
+    buffer.append("a")
+    task = asyncio.create_task(buffer.flush())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert list(buffer._active) == ["a"]
@@ -0,0 +1,148 @@
+"""."""
+
+import datetime
+
+from app.models.market import Kline, Liquidation, OrderbookSnapshot, PublicTrade
+from app.services.market_parser import COPY_COLUMNS, parse_message
+
+CREATED = datetime.datetime(2024, 1, 1)
+
+
+def test_parse_trade() -> None:
+    """."""
+    message = {
+        "topic": "publicTrade.BTCUSDT",
+        "ts": 1700000000100,
+        "data": [
+            {
+                "T": 1700000000000,
+                "s": "BTCUSDT",
+                "S": "Buy",
+                "v": "0.5",
+                "p": "37000.5",
+                "L": "PlusTick",
+                "i": "abc",
+                "BT": False,
+            },
+            {
+                "T": 1700000000050,
+                "s": "BTCUSDT",
+                "S": "Sell",
+                "v": "1",
+                "p": "36999",
+                "L": "MinusTick",
+                "i": "abd",
+                "BT": False,
+            },
+        ],
+    }
+    model, rows = parse_message(message, CREATED)
+    assert model is PublicTrade
+    assert len(rows) == 2
+    assert all(len(row) == len(COPY_COLUMNS[PublicTrade]) for row in rows)
+    assert rows[0] == (
+        "BTCUSDT",
+        datetime.datetime(2023, 11, 14, 22, 13, 20),
+        "abc",
+        "Buy",
+        37000.5,
+        0.5,
+        "PlusTick",
+        False,
+        CREATED,
+    )
+
+
+def test_parse_kline_confirmed_only() -> None:
+    """."""
+    kline = {
+        "start": 1700000000000,
+        "end": 1700000059999,
+        "interval": "1",
+        "open": "1",
+        "close": "2",
+        "high": "3",
+        "low": "0.5",
+        "volume": "10",
+        "turnover": "15",
+        "confirm": False,
+    }
+    message = {"topic": "kline.1.BTCUSDT", "data": [kline]}
+    assert parse_message(message, CREATED) == (Kline, [])
+
+    message["data"] = [{**kline, "confirm": True}]
+    _, rows = parse_message(message, CREATED)
+    assert rows[0][:3] == ("BTCUSDT", "1", datetime.datetime(2023, 11, 14, 22, 13, 20))
+    assert rows[0][4:10] == (1.0, 3.0, 0.5, 2.0, 10.0, 15.0)
+
+
+def test_parse_orderbook_and_unknown() -> None:
+    """."""
+    message = {
+        "topic": "orderbook.50.BTCUSDT",
+        "type": "snapshot",
+        "ts": 1700000000000,
+        "data": {
+            "s": "BTCUSDT",
+            "b": [["100", "1"], ["99", "2"]],
+            "a": [["101", "3"]],
+            "u": 7,
+            "seq": 9,
+        },
+    }
+    model, rows = parse_message(message, CREATED)
+    assert model is OrderbookSnapshot
+    assert rows[0][2:] == (
+        "snapshot",
+        7,
+        9,
+        [100.0, 99.0],
+        [1.0, 2.0],
+        [101.0],
+        [3.0],
+        CREATED,
+    )
+
+    assert parse_message({"topic": "tickers.BTCUSDT", "data": {"s": "BTCUSDT"}}) is None
+
+
+def test_parse_liquidation_zero_values() -> None:
+    """."""
+    full = {
+        "topic": "liquidation.BTCUSDT",
+        "ts": 1700000000100,
+        "data": {
+            "updatedTime": 1700000000000,
+            "symbol": "BTCUSDT",
+            "side": "Sell",
+            "price": "0",
+            "size": "0",
+        },
+    }
+    short = {
+        "topic": "allLiquidation.BTCUSDT",
+        "ts": 1700000000000,
+        "data": [{"T": 0, "s": "BTCUSDT", "S": "Buy", "v": "0", "p": "0"}],
+    }
+
+    model, rows = parse_message(full, CREATED)
+    assert model is Liquidation
+    assert rows == [
+        (
+            "BTCUSDT",
+            datetime.datetime(2023, 11, 14, 22, 13, 20),
+            "Sell",
+            0.0,
+            0.0,
+            CREATED,
+        )
+    ]
+    # Нулевые значения короткой формы не подменяются полной формой или меткой сообщения
+    _, rows = parse_message(short, CREATED)
+    assert rows == [
+        ("BTCUSDT", datetime.datetime(1970, 1, 1), "Buy", 0.0, 0.0, CREATED)
+    ]
+
+    del short["data"][0]["T"]
+    _, rows = parse_message(short, CREATED)
+    assert rows[0][1] == datetime.datetime(2023, 11, 14, 22, 13, 20)
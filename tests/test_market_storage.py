@@ -0,0 +1,495 @@
+"""."""
+
+import contextlib
+import copy
+import datetime
+import re
+import types
+
+import pytest
+import pytest_asyncio
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.models.market import Market
+from app.resources.database import Database
+from app.schemas.repository import RepositoryOutSchema
+from app.services.market import MarketService
+from app.services.market_storage import MarketStorageService, floor_hour, resolution_for
+from config.settings import Settings
+
+
+def test_partition_names() -> None:
+    """."""
+    day = datetime.date(2026, 10, 17)
+    assert MarketStorageService.partition_name(day) == "market_p20261017"
+    assert MarketStorageService.partition_day("market_p20261017") == day
+    assert MarketStorageService.partition_day("market_default") is None
+
+
+def test_rollup_resolution() -> None:
+    """Long analysis windows read coarser rollups."""
+    assert resolution_for(5) == "1m"
+    assert resolution_for(1440) == "5m"
+    assert resolution_for(7 * 1440) == "1h"
+    assert floor_hour(datetime.datetime(2026, 10, 17, 15, 42, 7)) == datetime.datetime(
+        2026, 10, 17, 15
+    )
+
+
+@pytest_asyncio.fixture
+async def storage() -> MarketStorageService:
+    """
+    Storage service on the local database, skipped when the partitioned schema is not
+    available.
+    """
+    settings = Settings()
+    db = Database(
+        url_rw=settings.db.url_rw,
+        url_ro=settings.db.url_ro,
+        application_name="smart_trade_ai",
+    )
+    service = MarketStorageService(db=db, partition_days_ahead=1)
+    try:
+        partitions = await service.list_partitions()
+    except Exception:
+        pytest.skip("Local Postgres is not available")
+    if not partitions:
+        pytest.skip("market table is not partitioned, run alembic upgrade head")
+    yield service
+
+
+@pytest.mark.asyncio
+async def test_recent_query_uses_index_and_prunes_partitions(
+    storage: MarketStorageService,
+) -> None:
+    """
+    The get_aggregated_market_data filter scans only recent partitions through the
+    composite index.
+    """
+    await storage.ensure_partitions()
+    threshold = datetime.datetime.utcnow() - datetime.timedelta(minutes=5)
+    statement = sa.select(Market).where(
+        Market.currency == "BTCUSDT",
+        Market.created >= threshold,
+        Market.kind.not_like("orderbook%"),
+    )
+    sql = statement.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+
+    async with storage.db.session() as session:
+        # На пустых секциях планировщик предпочитает seq scan, проверяем именно
+        # применимость индекса
+        await session.execute(sa.text("SET LOCAL enable_seqscan = off"))
+        plan = "\n".join((await session.execute(sa.text(f"EXPLAIN {sql}"))).scalars())
+
+    yesterday = storage.partition_name(threshold.date() - datetime.timedelta(days=1))
+    assert "currency_kind_created" in plan
+    assert storage.partition_name(threshold.date()) in plan
+    assert yesterday not in plan
+
+
+class FakePartitions:
+    """
+    Partitioned market table of a fake Postgres: daily partitions and the default
+    partition. Every session is a transaction, changes are kept only after commit().
+    """
+
+    def __init__(
+        self,
+        partitions: list[str],
+        default_rows: list[datetime.datetime],
+        fail: str | None = None,
+    ):
+        self.partitions = set(partitions)
+        self.default_rows = list(default_rows)
+        self.rows: dict[str, list[datetime.datetime]] = {}
+        self.default_attached = True
+        self.fail = fail
+        self.transactions: list[list[str]] = []
+
+    @contextlib.asynccontextmanager
+    async def session(self):
+        state = copy.deepcopy(
+            (self.partitions, self.default_rows, self.rows, self.default_attached)
+        )
+        session = FakePartitionSession(self)
+        try:
+            yield session
+        finally:
+            if session.committed:
+                self.transactions.append(session.statements)
+            else:
+                self.partitions, self.default_rows, self.rows, self.default_attached = (
+                    state
+                )
+
+
+class FakePartitionSession:
+    """."""
+
+    def __init__(self, db: FakePartitions):
+        self.db = db
+        self.statements: list[str] = []
+        self.committed = False
+
+    def _in(self, row: datetime.datetime, params: dict) -> bool:
+        if "threshold" in params:
+            return row < params["threshold"]
+        start = datetime.datetime.combine(params["start"], datetime.time())
+        end = datetime.datetime.combine(params["end"], datetime.time())
+        return start <= row < end
+
+    async def scalar(self, statement, params=None):
+        self.statements.append(str(statement))
+        return sum(self._in(row, params) for row in self.db.default_rows)
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        db = self.db
+        if "pg_inherits" in sql:
+            names = sorted(
+                db.partitions | ({"market_default"} if db.default_attached else set())
+            )
+            return types.SimpleNamespace(scalars=lambda: names)
+        if sql.startswith("CREATE TABLE"):
+            name = re.search(r'"(market_p\d{8})"', sql).group(1)
+            start = datetime.datetime.strptime(
+                re.search(r"FROM \('([\d-]+)'\)", sql).group(1), "%Y-%m-%d"
+            )
+            if name == db.fail:
+                raise RuntimeError(f"could not create {name}")
+            if db.default_attached and any(
+                start <= row < start + datetime.timedelta(days=1)
+                for row in db.default_rows
+            ):
+                raise RuntimeError(
+                    "updated partition constraint for default partition would be "
+                    "violated"
+                )
+            db.partitions.add(name)
+            db.rows.setdefault(name, [])
+        elif sql.startswith("DROP TABLE"):
+            db.partitions.discard(re.search(r'"(market_p\d{8})"', sql).group(1))
+        elif "DETACH PARTITION" in sql:
+            db.default_attached = False
+        elif "ATTACH PARTITION" in sql:
+            db.default_attached = True
+        elif sql.startswith("INSERT"):
+            for row in db.default_rows:
+                if self._in(row, params):
+                    db.rows[MarketStorageService.partition_name(row.date())].append(row)
+        elif sql.startswith("DELETE"):
+            kept = [row for row in db.default_rows if not self._in(row, params)]
+            deleted, db.default_rows = len(db.default_rows) - len(kept), kept
+            return types.SimpleNamespace(rowcount=deleted)
+        elif sql.startswith("SELECT count(*), min(created)"):
+            rows = db.default_rows
+            return types.SimpleNamespace(
+                one=lambda: (
+                    len(rows),
+                    min(rows, default=None),
+                    max(rows, default=None),
+                )
+            )
+        return types.SimpleNamespace(rowcount=0)
+
+    async def commit(self):
+        self.committed = True
+
+
+TODAY = datetime.date(2026, 10, 17)
+
+
+@pytest.mark.asyncio
+async def test_ensure_partitions_moves_rows_out_of_default() -> None:
+    """."""
+    tomorrow = datetime.datetime(2026, 10, 18, 3)
+    db = FakePartitions(
+        ["market_p20261017"],
+        [
+            tomorrow,
+            tomorrow + datetime.timedelta(hours=1),
+            datetime.datetime(2026, 12, 1),
+        ],
+        fail="market_p20261019",
+    )
+    storage = MarketStorageService(db=db, partition_days_ahead=3)
+
+    created = await storage.ensure_partitions(TODAY)
+    # Ошибка одного дня не отменяет остальные, строки дня перенесены из секции по
+    # умолчанию
+    assert created == ["market_p20261018", "market_p20261020"]
+    assert db.partitions == {"market_p20261017", "market_p20261018", "market_p20261020"}
+    assert db.rows["market_p20261018"] == [
+        tomorrow,
+        tomorrow + datetime.timedelta(hours=1),
+    ]
+    assert db.default_rows == [datetime.datetime(2026, 12, 1)] and db.default_attached
+    assert (
+        sum(
+            any("DETACH" in sql for sql in statements) for statements in db.transactions
+        )
+        == 1
+    )
+
+    # Следующий запуск создает пропущенный день
+    assert await storage.ensure_partitions(TODAY) == []
+    db.fail = None
+    assert await storage.ensure_partitions(TODAY) == ["market_p20261019"]
+
+
+@pytest.mark.asyncio
+async def test_drop_expired_partitions_purges_default() -> None:
+    """."""
+    old, recent = datetime.datetime(2026, 9, 1), datetime.datetime(2026, 10, 16)
+    db = FakePartitions(["market_p20260901", "market_p20261016"], [old, recent])
+    storage = MarketStorageService(db=db, raw_retention_days=30)
+
+    assert await storage.drop_expired_partitions(TODAY) == ["market_p20260901"]
+    assert db.partitions == {"market_p20261016"}
+    # Строки секции по умолчанию старше срока хранения удалены, свежие остаются
+    assert db.default_rows == [recent]
+
+
+class FakeRollupSession:
+    """
+    Records rollup statements; scalar() answers the last rollup and oldest raw data
+    queries in turn.
+    """
+
+    def __init__(self, *scalars):
+        self.scalars = list(scalars)
+        self.executed: list[tuple[str, dict]] = []
+        self.commits = 0
+
+    async def scalar(self, statement):
+        return self.scalars.pop(0)
+
+    async def execute(self, statement, params=None):
+        self.executed.append((str(statement), params))
+
+    async def commit(self):
+        self.commits += 1
+
+
+class FakeSessionDatabase:
+    """."""
+
+    def __init__(self, session):
+        self._session = session
+
+    @contextlib.asynccontextmanager
+    async def session(self):
+        yield self._session
+
+
+@pytest.mark.asyncio
+async def test_downsample_resumes_from_last_rollup_by_day() -> None:
+    """."""
+    session = FakeRollupSession(datetime.datetime(2026, 10, 15, 20, 30))
+    storage = MarketStorageService(
+        db=FakeSessionDatabase(session), downsample_after_hours=6
+    )
+
+    cutoff = await storage.downsample(now=datetime.datetime(2026, 10, 17, 15, 42))
+    assert cutoff == datetime.datetime(2026, 10, 17, 9)
+    # Последний час повторяется (upsert), интервал делится на сутки, каждая — отдельная
+    # транзакция
+    chunks = [
+        (params["start"], params["end"])
+        for sql, params in session.executed
+        if "resolution" not in params
+    ]
+    assert chunks == [
+        (datetime.datetime(2026, 10, 15, 20), datetime.datetime(2026, 10, 16, 20)),
+        (datetime.datetime(2026, 10, 16, 20), cutoff),
+    ]
+    assert [params.get("resolution") for _, params in session.executed] == [
+        None,
+        "5m",
+        "1h",
+    ] * 2
+    assert session.commits == 2
+
+
+@pytest.mark.asyncio
+async def test_downsample_without_data() -> None:
+    """."""
+    session = FakeRollupSession(None, None)
+    storage = MarketStorageService(db=FakeSessionDatabase(session))
+    assert await storage.downsample(now=datetime.datetime(2026, 10, 17, 15)) is None
+    assert not session.executed and not session.commits
+
+
+class FakeStreamSession:
+    """
+    Streams rows in partitions like
+    AsyncSession.stream(...).mappings().partitions(size).
+    """
+
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+
+    async def stream(self, statement):
+        rows = self.rows
+
+        class Result:
+            def mappings(self):
+                return self
+
+            async def partitions(self, size):
+                for i in range(0, len(rows), size):
+                    yield rows[i : i + size]
+
+        return Result()
+
+
+@pytest.mark.asyncio
+async def test_archive_to_parquet(tmp_path, monkeypatch) -> None:
+    """."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr("app.services.market_storage.ARCHIVE_BATCH_SIZE", 2)
+    rows = [
+        {
+            "id": i,
+            "created": datetime.datetime(2026, 9, 1, i),
+            "kind": "publicTrade.BTCUSDT",
+            "data": {"p": str(i)},
+        }
+        for i in range(3)
+    ]
+    storage = MarketStorageService(db=None, archive_dir=str(tmp_path))
+    path = storage._archive_path("market", datetime.date(2026, 9, 1))
+
+    assert (
+        await storage.archive(FakeStreamSession(rows), sa.text("SELECT 1"), path) == 3
+    )
+    assert pq.read_table(path).to_pylist() == [
+        {**row, "data": f'{{"p": "{row["id"]}"}}'} for row in rows
+    ]
+    assert sorted(p.name for p in path.parent.iterdir()) == ["2026-09-01.parquet"]
+
+    # Пустой результат не создает файл
+    empty = path.with_name("empty.parquet")
+    assert await storage.archive(FakeStreamSession([]), sa.text("SELECT 1"), empty) == 0
+    assert not empty.exists()
+    # Без каталога архива строки удаляются без выгрузки
+    assert (
+        await MarketStorageService(db=None).archive(
+            FakeStreamSession(rows), sa.text("SELECT 1"), path
+        )
+        is None
+    )
+
+
+class FakeReadDatabase:
+    """."""
+
+    def __init__(self, last_rollup: datetime.datetime):
+        self.last_rollup = last_rollup
+
+    @contextlib.asynccontextmanager
+    async def session_ro(self, session=None):
+        last_rollup = self.last_rollup
+
+        class Session:
+            async def scalar(self, statement):
+                return last_rollup
+
+        yield Session()
+
+
+class FakeMarketRepository:
+    """."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def items(self, session, statement):
+        self.statements.append(statement)
+        return RepositoryOutSchema(limit=0, offset=0, total=0, items=[])
+
+
+class TieredMarketService(MarketService):
+    """MarketService recording where each kind of data is read from."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads: dict[str, datetime.datetime | tuple] = {}
+
+    async def get_rollups(self, currency, resolution, since, until, session):
+        self.reads["rollup"] = (resolution, since, until)
+        return []
+
+    async def get_klines(self, currency, interval, since, session):
+        self.reads["kline"] = since
+        return []
+
+    async def get_public_trades(self, currency, since, session):
+        self.reads["publicTrade"] = since
+        return []
+
+    async def get_liquidations(self, currency, since, session):
+        self.reads["liquidation"] = since
+        return []
+
+    async def get_orderbook_snapshots(self, currency, since, session):
+        self.reads["orderbook"] = since
+        return []
+
+    async def get_indicators(self, currency, session, limit=1440):
+        return None
+
+    async def get_patterns(self, currency, since, session, interval="1"):
+        return None
+
+
+@pytest.mark.asyncio
+async def test_aggregated_market_data_tier_boundary() -> None:
+    """
+    Trades and liquidations before the boundary come from rollups, klines and the order
+    book from the window start.
+    """
+    now = datetime.datetime.utcnow()
+    # Последний свернутый час — 5 часов назад, хранение сырых 2 часа: граница сразу
+    # после него
+    last_rollup = floor_hour(now - datetime.timedelta(hours=5))
+    boundary = last_rollup + datetime.timedelta(hours=1)
+    repository = FakeMarketRepository()
+    service = TieredMarketService(
+        FakeReadDatabase(last_rollup),
+        repository,
+        repository_kline=object(),
+        repository_rollup=object(),
+        downsample_after_hours=2,
+    )
+
+    data = await service.get_aggregated_market_data("BTCUSDT", 1440)
+    window_start = service.reads["kline"]
+    assert (
+        now - datetime.timedelta(minutes=1440)
+        <= window_start
+        < now - datetime.timedelta(minutes=1439)
+    )
+    assert service.reads["rollup"] == ("5m", window_start, boundary)
+    assert service.reads["publicTrade"] == service.reads["liquidation"] == boundary
+    assert service.reads["orderbook"] == window_start
+    assert data.history == []
+
+    # JSONB-строки: все окно, кроме сделок и ликвидаций до границы
+    (statement,) = repository.statements
+    compiled = statement.compile(dialect=postgresql.dialect())
+    assert (
+        window_start in compiled.params.values()
+        and boundary in compiled.params.values()
+    )
+    assert "OR NOT (smart_trade_ai.market.kind LIKE" in str(compiled)
+
+    # Окно целиком после границы читается только из сырых данных
+    service.reads.clear()
+    await service.get_aggregated_market_data("BTCUSDT", 60)
+    assert "rollup" not in service.reads
+    assert service.reads["publicTrade"] == service.reads["kline"]
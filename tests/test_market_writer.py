@@ -0,0 +1,270 @@
+"""."""
+
+import asyncio
+import contextlib
+import datetime
+import types
+
+import pytest
+
+from app.models.market import Market, PublicTrade
+from app.services.bybit_stream import WebSocketService
+from app.services.market import COPY_COLUMNS, MarketService
+from app.services.market_writer import MarketBulkWriter
+
+CREATED = datetime.datetime(2024, 12, 25, 6, 20)
+
+
+class FakeMarketService:
+    """copy_rows with optional delay and a number of failing calls."""
+
+    def __init__(self, delay: float = 0.0, failures: int = 0):
+        self.delay = delay
+        self.failures = failures
+        self.batches: list[tuple[type, list[tuple]]] = []
+
+    async def copy_rows(self, model, records) -> int:
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("db is down")
+        self.batches.append((model, list(records)))
+        return len(records)
+
+    @property
+    def rows(self) -> list[tuple]:
+        return [row for _, batch in self.batches for row in batch]
+
+
+def rows(count: int, start: int = 0) -> list[tuple]:
+    """Строки public_trade в порядке COPY_COLUMNS, trade_id — номер строки."""
+    return [
+        ("BTCUSDT", CREATED, str(i), "Buy", 43510.0, 0.1, "PlusTick", False, CREATED)
+        for i in range(start, start + count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_flush_by_size_and_interval() -> None:
+    """."""
+    service = FakeMarketService()
+    writer = MarketBulkWriter(
+        service, batch_size=10, flush_interval=0.1, max_pending=100
+    )
+    await writer.start()
+    try:
+        # Полный пакет сбрасывается сразу, не дожидаясь таймера
+        await writer.add_rows(PublicTrade, rows(10))
+        await asyncio.sleep(0.02)
+        assert len(service.rows) == 10
+
+        # Неполный пакет сбрасывается по таймеру
+        await writer.add_rows(PublicTrade, rows(3, 10))
+        await asyncio.sleep(0.02)
+        assert len(service.rows) == 10
+        await asyncio.sleep(0.15)
+        assert len(service.rows) == 13
+        assert writer.pending == 0 and writer.rows_written == 13
+    finally:
+        await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_back_pressure() -> None:
+    """."""
+    service = FakeMarketService()
+    writer = MarketBulkWriter(service, batch_size=10, flush_interval=10, max_pending=20)
+    await writer.add_rows(PublicTrade, rows(20))
+    # Буфер полон: add ждет, пока сброс не заберет строки
+    blocked = asyncio.create_task(writer.add_rows(PublicTrade, rows(5, 20)))
+    await asyncio.sleep(0.05)
+    assert not blocked.done() and writer.pending == 20
+
+    assert await writer.flush()
+    await asyncio.wait_for(blocked, timeout=1)
+    assert writer.pending == 5 and len(service.rows) == 20
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_in_flight_batch() -> None:
+    """."""
+    service = FakeMarketService(delay=0.1)
+    writer = MarketBulkWriter(
+        service, batch_size=10, flush_interval=10, max_pending=100
+    )
+    await writer.start()
+    await writer.add_rows(PublicTrade, rows(10))
+    await asyncio.sleep(0.01)
+    # Фоновый сброс уже забрал пакет из буфера и ждет БД, в буфере новые строки
+    assert writer.pending == 0 and not service.batches
+    await writer.add_rows(PublicTrade, rows(5, 10))
+    await writer.stop()
+    assert [row[2] for row in service.rows] == [str(i) for i in range(15)]
+    assert writer.pending == 0 and writer.rows_failed == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried() -> None:
+    """."""
+    service = FakeMarketService(failures=1)
+    writer = MarketBulkWriter(service, batch_size=10, max_retries=2)
+    await writer.add_rows(PublicTrade, rows(4))
+    assert not await writer.flush()
+    assert writer.pending == 4 and writer.rows_failed == 0
+    assert await writer.flush()
+    assert len(service.rows) == 4 and writer.pending == 0
+
+    # После max_retries неудачных попыток пакет отбрасывается
+    service.failures = 2
+    await writer.add_rows(PublicTrade, rows(3))
+    await writer.stop()
+    assert writer.pending == 0 and writer.rows_failed == 3
+
+    # Без requeue (консьюмер стрима) пакет не возвращается в буфер
+    service.failures = 1
+    await writer.add_rows(PublicTrade, rows(2))
+    assert not await writer.flush(requeue=False)
+    assert writer.pending == 0 and writer.rows_failed == 5
+
+
+class FakeSession:
+    """Session whose driver connection has COPY (asyncpg) or not."""
+
+    def __init__(self, copy: bool):
+        self.copied, self.executed = [], []
+        driver = types.SimpleNamespace()
+        if copy:
+
+            async def copy_records_to_table(table, schema_name, columns, records):
+                self.copied.append((table, columns, list(records)))
+
+            driver.copy_records_to_table = copy_records_to_table
+        self.raw = types.SimpleNamespace(driver_connection=driver)
+
+    async def connection(self):
+        async def get_raw_connection():
+            return self.raw
+
+        return types.SimpleNamespace(get_raw_connection=get_raw_connection)
+
+    async def execute(self, statement, params):
+        self.executed.append((statement.table.name, params))
+
+    async def commit(self):
+        pass
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("copy", [True, False], ids=["copy", "insert"])
+async def test_copy_rows_falls_back_to_insert(copy: bool) -> None:
+    """."""
+    session = FakeSession(copy)
+
+    @contextlib.asynccontextmanager
+    async def open_session():
+        yield session
+
+    service = MarketService(types.SimpleNamespace(session=open_session), None)
+    market = [("BTCUSDT", CREATED, "publicTrade.BTCUSDT", '{"p":"1"}')]
+
+    assert await service.copy_rows(PublicTrade, rows(2)) == 2
+    assert await service.copy_rows(Market, market) == 1
+    if copy:
+        assert [(table, len(records)) for table, _, records in session.copied] == [
+            ("public_trade", 2),
+            ("market", 1),
+        ]
+        assert not session.executed
+    else:
+        assert not session.copied
+        trades, markets = session.executed
+        assert trades[0] == "public_trade" and trades[1][0] == dict(
+            zip(COPY_COLUMNS[PublicTrade], rows(1)[0])
+        )
+        # JSONB передается INSERT объектом, а не строкой
+        assert markets[1][0]["data"] == {"p": "1"}
+
+
+class FakeQueueRedis:
+    """The first pop returns a batch after a delay, later pops time out empty."""
+
+    def __init__(self, batch: list[dict], delay: float):
+        self.batch = batch
+        self.delay = delay
+        self.popping = asyncio.Event()
+        self.queue_stats = {}
+        self.redis = types.SimpleNamespace(close=self.connect)
+
+    async def connect(self):
+        pass
+
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, expire=60):
+        pass
+
+    async def add_to_queue_batch(self, queue_name, messages, batch_size=100):
+        pass
+
+    async def pop_batch_from_queue(self, queue_name, count=1000, timeout=1.0):
+        self.popping.set()
+        batch, self.batch = self.batch, []
+        await asyncio.sleep(self.delay if batch else timeout)
+        return batch
+
+
+class FakeWebSocketPool:
+    """."""
+
+    async def subscribe(self, symbols, callback, depth, interval):
+        pass
+
+    async def close(self):
+        pass
+
+    def stats(self):
+        return []
+
+
+@pytest.mark.asyncio
+async def test_stop_keeps_batch_popped_by_consumer() -> None:
+    """."""
+    trades = [
+        {
+            "topic": "publicTrade.BTCUSDT",
+            "ts": 1700000000100,
+            "data": [
+                {
+                    "T": 1700000000000 + i,
+                    "s": "BTCUSDT",
+                    "S": "Buy",
+                    "v": "0.5",
+                    "p": "37000.5",
+                    "L": "PlusTick",
+                    "i": str(i),
+                    "BT": False,
+                },
+            ],
+        }
+        for i in range(3)
+    ]
+    service = FakeMarketService()
+    redis = FakeQueueRedis(trades, delay=0.1)
+    writer = MarketBulkWriter(service, batch_size=1000, flush_interval=10)
+    stream = WebSocketService(
+        None,
+        FakeWebSocketPool(),
+        redis,
+        writer,
+        symbols=["BTCUSDT"],
+        consumer_block_timeout=0.05,
+    )
+
+    started = asyncio.create_task(stream.start())
+    await redis.popping.wait()
+    # Пакет уже забран из списка Redis, но еще не передан в буфер БД
+    await stream.stop()
+    await started
+    assert [row[2] for row in service.rows] == ["0", "1", "2"]
+    assert writer.pending == 0
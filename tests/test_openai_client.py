@@ -0,0 +1,179 @@
+"""."""
+
+import asyncio
+import json
+import time
+
+import openai
+import pytest
+import pytest_asyncio
+
+from app.resources.openai_client import CircuitOpenError, OpenAIClient, TokenBucket
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-test",
+    "choices": [
+        {
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": '{"ok": true}'},
+        }
+    ],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+}
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+class StubServer:
+    """
+    Local OpenAI-compatible HTTP server answering with scripted (status, headers, delay)
+    responses.
+    """
+
+    def __init__(self):
+        self.script: list[tuple[int, dict, float]] = []
+        self.requests = 0
+        self.running = 0
+        self.peak = 0
+        self.server: asyncio.Server | None = None
+        self.connections: set[asyncio.Task] = set()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections.add(asyncio.current_task())
+        try:
+            while head := await reader.readuntil(b"\r\n\r\n"):
+                length = next(
+                    (
+                        int(line.split(b":")[1])
+                        for line in head.split(b"\r\n")
+                        if line.lower().startswith(b"content-length")
+                    ),
+                    0,
+                )
+                await reader.readexactly(length)
+                self.requests += 1
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+                status, headers, delay = (
+                    self.script.pop(0) if self.script else (200, {}, 0.0)
+                )
+                await asyncio.sleep(delay)
+                self.running -= 1
+                body = json.dumps(
+                    COMPLETION if status == 200 else {"error": {"message": "stub"}}
+                ).encode()
+                lines = [
+                    f"HTTP/1.1 {status} Stub",
+                    "Content-Type: application/json",
+                    f"Content-Length: {len(body)}",
+                ]
+                lines += [f"{name}: {value}" for name, value in headers.items()]
+                writer.write("\r\n".join(lines).encode() + b"\r\n\r\n" + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+            self.connections.discard(asyncio.current_task())
+
+    async def close(self):
+        self.server.close()
+        for task in list(self.connections):
+            task.cancel()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+
+
+@pytest_asyncio.fixture
+async def stub() -> StubServer:
+    """."""
+    stub = StubServer()
+    stub.server = await asyncio.start_server(stub.handle, "127.0.0.1", 0)
+    yield stub
+    await stub.close()
+
+
+@pytest_asyncio.fixture
+async def client_factory(stub: StubServer):
+    """."""
+    clients = []
+
+    def create(**kwargs) -> OpenAIClient:
+        clients.append(
+            OpenAIClient(
+                api_key="test", base_url=stub.base_url, backoff_base=0.01, **kwargs
+            )
+        )
+        return clients[-1]
+
+    yield create
+    for client in clients:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_honored(stub: StubServer, client_factory) -> None:
+    """."""
+    stub.script = [(429, {"Retry-After": "0.2"}, 0.0), (503, {}, 0.0)]
+    client = client_factory()
+
+    started = time.monotonic()
+    response = await client.chat(MESSAGES, "gpt-test", 0.7, prompt_tokens=10)
+
+    assert response.choices[0].message.content == '{"ok": true}'
+    assert stub.requests == 3
+    assert time.monotonic() - started >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_retries_exhausted_then_circuit_opens(
+    stub: StubServer, client_factory
+) -> None:
+    """."""
+    stub.script = [(500, {}, 0.0)] * 3 + [(400, {}, 0.0)]
+    client = client_factory(max_retries=2, failure_threshold=3, reset_timeout=60)
+
+    with pytest.raises(openai.InternalServerError):
+        await client.chat(MESSAGES, "gpt-test", 0.7, prompt_tokens=10)
+    assert stub.requests == 3
+    with pytest.raises(CircuitOpenError):
+        await client.chat(MESSAGES, "gpt-test", 0.7, prompt_tokens=10)
+    assert stub.requests == 3
+
+
+@pytest.mark.asyncio
+async def test_deadline(stub: StubServer, client_factory) -> None:
+    """."""
+    client = client_factory()
+    stub.script = [(200, {}, 5.0)]
+    with pytest.raises(TimeoutError):
+        await client.chat(MESSAGES, "gpt-test", 0.7, prompt_tokens=10, deadline=0.2)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit(stub: StubServer, client_factory) -> None:
+    """."""
+    client = client_factory(max_concurrency=2)
+    stub.script = [(200, {}, 0.05)] * 6
+    await asyncio.gather(
+        *(client.chat(MESSAGES, "gpt-test", 0.7, prompt_tokens=10) for _ in range(6))
+    )
+    assert stub.peak == 2
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_rate() -> None:
+    """."""
+    bucket = TokenBucket(rate_per_minute=600, capacity=2)
+    started = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    # 2 из запаса, еще 2 по 0.1 с
+    assert 0.18 <= time.monotonic() - started < 0.5
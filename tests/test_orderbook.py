@@ -0,0 +1,79 @@
+"""."""
+
+import random
+
+import pytest
+
+from app.services.orderbook import OrderBook, OrderBookManager
+
+
+def _message(kind: str, u: int, bids: list, asks: list) -> dict:
+    return {
+        "topic": "orderbook.50.BTCUSDT",
+        "type": kind,
+        "ts": 1700000000000 + u,
+        "data": {"s": "BTCUSDT", "b": bids, "a": asks, "u": u, "seq": 100 + u},
+    }
+
+
+def test_snapshot_and_delta() -> None:
+    """."""
+    book = OrderBook("BTCUSDT")
+    assert book.apply(
+        _message(
+            "snapshot", 10, [["100", "1"], ["99", "2"]], [["101", "3"], ["102", "4"]]
+        )
+    )
+    assert book.best_bid == (100.0, 1.0)
+    assert book.best_ask == (101.0, 3.0)
+    assert book.mid == 100.5
+    assert book.spread == 1.0
+
+    # Удаление лучшего bid, новый уровень ask и изменение объема
+    assert book.apply(
+        _message(
+            "delta", 11, [["100", "0"], ["99.5", "5"]], [["100.8", "1"], ["102", "2"]]
+        )
+    )
+    assert book.bids.levels() == [(99.5, 5.0), (99.0, 2.0)]
+    assert book.asks.levels() == [(100.8, 1.0), (101.0, 3.0), (102.0, 2.0)]
+    assert book.bids.volume == 7.0
+    assert book.asks.volume == 6.0
+    assert book.imbalance() == 1 / 13
+    assert book.asks.depth(2) == 4.0
+
+
+def test_gap_requires_snapshot() -> None:
+    """."""
+    gaps = []
+    manager = OrderBookManager(on_gap=gaps.append)
+    manager.apply(_message("snapshot", 1, [["100", "1"]], [["101", "1"]]))
+    book = manager.apply(_message("delta", 3, [["100", "2"]], []))
+
+    assert gaps == ["BTCUSDT"]
+    assert not book.is_synced
+    assert book.best_bid == (100.0, 1.0)
+    assert not book.apply(_message("delta", 4, [["100", "5"]], []))
+    assert manager.summaries() == {}
+
+    manager.apply(_message("snapshot", 20, [["98", "1"]], [["99", "1"]]))
+    assert book.is_synced
+    assert book.best_bid == (98.0, 1.0)
+    assert gaps == ["BTCUSDT"]
+
+
+def test_tracked_depth_matches_levels() -> None:
+    """."""
+    rng = random.Random(7)
+    book = OrderBook("BTCUSDT", depths=(1, 3, 10))
+    book.apply(_message("snapshot", 1, [[str(100 - i), "1"] for i in range(5)], []))
+    for u in range(2, 2000):
+        bids = [
+            [str(rng.randint(80, 100)), str(rng.choice((0, 0, 1, 2.5, 4)))]
+            for _ in range(3)
+        ]
+        assert book.apply(_message("delta", u, bids, []))
+        sizes = [size for _, size in book.bids.levels()]
+        for n in (1, 3, 5, 10):
+            assert book.bids.depth(n) == pytest.approx(sum(sizes[:n]))
+        assert book.bids.volume == pytest.approx(sum(sizes))
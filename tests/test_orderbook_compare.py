@@ -0,0 +1,72 @@
+"""."""
+
+import numpy as np
+import pytest
+
+from app.services.market import MarketService
+from tests.bench_orderbook_compare import generate_snapshots
+
+
+def loop_compare(snapshots: list[dict], side: str) -> dict[str, list[float]]:
+    """The same per-step metrics computed from pairwise compare_orderbooks."""
+    result = {
+        key: []
+        for key in (
+            "added_count",
+            "removed_count",
+            "updated_count",
+            "added_volume",
+            "removed_volume",
+            "updated_delta",
+        )
+    }
+    for prev, new in zip(snapshots, snapshots[1:]):
+        diff = MarketService.compare_orderbooks(prev, new)[side]
+        prev_sizes = {
+            price: float(size) for price, size in prev["b" if side == "bids" else "a"]
+        }
+        result["added_count"].append(len(diff["added"]))
+        result["removed_count"].append(len(diff["removed"]))
+        result["updated_count"].append(len(diff["updated"]))
+        result["added_volume"].append(sum(size for _, size in diff["added"]))
+        result["removed_volume"].append(sum(size for _, size in diff["removed"]))
+        result["updated_delta"].append(
+            sum(size - prev_sizes[price] for price, size in diff["updated"])
+        )
+    return result
+
+
+@pytest.mark.parametrize("numeric", [False, True], ids=["strings", "numbers"])
+def test_series_matches_pairwise_loop(numeric: bool) -> None:
+    """."""
+    snapshots = generate_snapshots(count=200, depth=20)
+    expected = {side: loop_compare(snapshots, side) for side in ("bids", "asks")}
+    if numeric:
+        # Числовые уровни, как из типизированных таблиц и очереди msgpack
+        snapshots = [
+            {
+                side: [[float(price), float(size)] for price, size in snapshot[side]]
+                for side in ("b", "a")
+            }
+            for snapshot in snapshots
+        ]
+
+    series = MarketService.compare_orderbooks_series(snapshots)
+    for side in ("bids", "asks"):
+        for key, values in expected[side].items():
+            assert len(series[side][key]) == len(snapshots) - 1
+            np.testing.assert_allclose(
+                series[side][key], values, atol=1e-9, err_msg=f"{side} {key}"
+            )
+
+
+def test_levels_to_arrays() -> None:
+    """."""
+    counts, prices, sizes = MarketService.orderbook_levels_to_arrays(
+        [[["1.5", "2"], [1.4, 3]], []]
+    )
+    assert counts.tolist() == [2, 0]
+    assert prices.tolist() == [1.5, 1.4] and sizes.tolist() == [2.0, 3.0]
+
+    counts, prices, sizes = MarketService.orderbook_levels_to_arrays([[], []])
+    assert counts.tolist() == [0, 0] and len(prices) == len(sizes) == 0
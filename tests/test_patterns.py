@@ -0,0 +1,117 @@
+"""."""
+
+import numpy as np
+import pytest
+
+from app.services.patterns import (
+    PATTERNS,
+    PatternScanner,
+    detect_patterns,
+    format_patterns,
+    scan_patterns,
+)
+
+MINUTE = 60000
+
+
+def _trend(direction: int, n: int = 12) -> list[tuple[float, float, float, float]]:
+    """Плавный тренд маленькими свечами: open, high, low, close."""
+    candles = []
+    price = 100.0
+    for _ in range(n):
+        close = price + direction * 0.5
+        candles.append((price, max(price, close) + 0.1, min(price, close) - 0.1, close))
+        price = close
+    return candles
+
+
+def _flags(candles: list[tuple[float, float, float, float]]) -> dict[str, bool]:
+    """Паттерны на последней свече."""
+    o, h, l, c = (np.array(column) for column in zip(*candles))
+    return {
+        name: bool(values[-1]) for name, values in scan_patterns(o, h, l, c).items()
+    }
+
+
+@pytest.mark.parametrize(
+    "direction, candles, expected",
+    [
+        # Длинная нижняя тень после падения / роста
+        (-1, [(94.0, 94.6, 92.0, 94.5)], {"hammer"}),
+        (1, [(106.5, 106.6, 104.0, 106.0)], {"hanging_man"}),
+        (-1, [(94.0, 96.0, 93.9, 94.5)], {"inverted_hammer"}),
+        (-1, [(93.0, 96.0, 92.0, 93.1)], {"doji"}),
+        (
+            -1,
+            [(93.8, 93.9, 92.5, 92.6), (92.5, 94.2, 92.4, 94.0)],
+            {"bullish_engulfing"},
+        ),
+        (
+            1,
+            [(106.2, 107.5, 106.1, 107.4), (107.5, 107.6, 105.9, 106.0)],
+            {"bearish_engulfing"},
+        ),
+        (-1, [(94.0, 94.1, 91.9, 92.0), (91.5, 93.6, 91.4, 93.5)], {"piercing_line"}),
+        (
+            1,
+            [(106.0, 108.1, 105.9, 108.0), (108.5, 108.6, 106.4, 106.5)],
+            {"dark_cloud_cover"},
+        ),
+        (
+            -1,
+            [
+                (94.0, 95.1, 93.9, 95.0),
+                (94.5, 96.1, 94.4, 96.0),
+                (95.5, 97.1, 95.4, 97.0),
+            ],
+            {"three_white_soldiers"},
+        ),
+        (
+            1,
+            [
+                (106.0, 106.1, 104.9, 105.0),
+                (105.5, 105.6, 103.9, 104.0),
+                (104.5, 104.6, 102.9, 103.0),
+            ],
+            {"three_black_crows"},
+        ),
+    ],
+)
+def test_detects_pattern_on_last_candle(
+    direction: int, candles: list, expected: set[str]
+) -> None:
+    """."""
+    flags = _flags(_trend(direction) + candles)
+    assert {name for name, value in flags.items() if value} == expected
+
+
+def test_incremental_scan_matches_full_scan() -> None:
+    """."""
+    rng = np.random.default_rng(3)
+    n = 2000
+    close = 100 + np.cumsum(rng.normal(0, 0.3, n))
+    open_ = np.concatenate(([100.0], close[:-1])) + rng.normal(0, 0.05, n)
+    high = np.maximum(open_, close) + rng.random(n) * 0.4
+    low = np.minimum(open_, close) - rng.random(n) * 0.4
+    start = 1700000000000 + np.arange(n) * MINUTE
+    expected = detect_patterns(start, open_, high, low, close)
+    assert expected and {name for _, name in expected} == set(PATTERNS)
+
+    scanner = PatternScanner(history=n * len(PATTERNS))
+    for begin, end in [(0, 5), (0, 700), (650, 1500), (1500, 1501), (1400, n)]:
+        scanner.update(
+            "BTCUSDT",
+            "1",
+            start[begin:end],
+            open_[begin:end],
+            high[begin:end],
+            low[begin:end],
+            close[begin:end],
+        )
+    assert scanner.update("BTCUSDT", "1", start, open_, high, low, close) == 0
+
+    assert scanner.recent("BTCUSDT", "1") == format_patterns(expected)
+    since = int(start[-30])
+    assert scanner.recent("BTCUSDT", "1", since=since, limit=3) == format_patterns(
+        [item for item in expected if item[0] >= since][-3:]
+    )
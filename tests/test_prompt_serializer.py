@@ -0,0 +1,68 @@
+"""."""
+
+import datetime
+
+from app.schemas.market import AggregatedGroup, AggregatedMarketData, MarketSchema
+from app.services.prompt_serializer import PromptSerializer, estimate_tokens
+
+
+def _aggregated(trades: int) -> dict:
+    created = datetime.datetime(2025, 1, 1)
+    entries = [
+        MarketSchema(
+            id=i,
+            currency="BTCUSDT",
+            created=created + datetime.timedelta(seconds=i),
+            kind="publicTrade",
+            data={
+                "price": 65000 + i * 0.123456789,
+                "size": 0.001 * (i % 7 + 1),
+                "side": "Buy" if i % 2 else "Sell",
+            },
+        )
+        for i in range(trades)
+    ]
+    return AggregatedMarketData(
+        currency="BTCUSDT",
+        time_range="Последние 1440 минут",
+        grouped_data={
+            "publicTrade": AggregatedGroup(entries=entries, count=len(entries))
+        },
+        indicators={"candles": 1440, "rsi_14": 55.123456789, "macd": None},
+        patterns=[{"time": "2025-01-01T00:05", "pattern": "doji", "signal": "neutral"}],
+    ).model_dump()
+
+
+def test_small_data_is_kept_whole() -> None:
+    """."""
+    result = PromptSerializer(token_budget=6000).serialize(_aggregated(3))
+
+    assert result.max_rows is None
+    assert result.text.splitlines()[:2] == [
+        "currency=BTCUSDT",
+        "time_range=Последние 1440 минут",
+    ]
+    assert (
+        "grouped_data.publicTrade [3/3]:\ncreated,price,size,side\n2025-01-01 "
+        "00:00:00,65000,0.001,Sell" in result.text
+    )
+    assert 'indicators={"candles":1440,"rsi_14":55.1235}' in result.text
+    assert (
+        "patterns [1/1]:\ntime,pattern,signal\n2025-01-01T00:05,doji,neutral"
+        in result.text
+    )
+    assert result.tokens == estimate_tokens(result.text)
+
+
+def test_large_data_fits_budget() -> None:
+    """."""
+    data = _aggregated(20000)
+    result = PromptSerializer(token_budget=2000).serialize(data)
+
+    assert result.tokens <= 2000
+    assert result.max_rows is not None and result.max_rows > 50
+    assert f"grouped_data.publicTrade [{result.max_rows}/20000]:" in result.text
+    # Первая и последняя записи сохраняются
+    assert "2025-01-01 00:00:00," in result.text
+    assert "2025-01-01 05:33:19," in result.text
+    assert result.compression > 100
@@ -0,0 +1,47 @@
+"""."""
+
+import datetime
+import json
+
+import pytest
+
+from app.resources.codec import RawMessage, get_codec
+from app.resources.queue_format import QueueFormat
+from app.services.market_parser import parse_message
+from tests.fake_bybit import recorded_frames
+
+pytest.importorskip("msgpack")
+
+
+def test_msgpack_round_trip() -> None:
+    """."""
+    codec = get_codec("json")
+    writer, reader = QueueFormat(codec, "msgpack"), QueueFormat(codec, "json")
+    created = datetime.datetime(2024, 1, 1)
+    for frame in recorded_frames():
+        message = json.loads(frame)
+        entry = writer.encode(RawMessage(message, frame))
+        assert entry[:2] == b"\xc1\x01" and len(entry) < len(frame)
+        decoded = reader.decode(entry)
+        # Цены и объемы приходят числами, строки таблиц совпадают с разбором исходного
+        # JSON
+        assert parse_message(decoded, created) == parse_message(message, created)
+        assert reader.decode(frame.encode()) == message
+
+    # Поля вне раскладки и None не теряются
+    trade = json.loads(recorded_frames()[2])
+    trade["data"][0] |= {"RPI": True, "seq": 12, "L": None}
+    trade["id"] = "abc"
+    decoded = reader.decode(writer.encode(trade))
+    assert decoded["id"] == "abc"
+    assert decoded["data"][0] == trade["data"][0] | {"v": 0.3, "p": 43510.6}
+
+    # Уровни не в десятичной записи передаются числами без общего множителя
+    book = json.loads(recorded_frames()[1])
+    book["data"]["a"] = [["1e-5", "2"]]
+    assert reader.decode(writer.encode(book))["data"]["a"] == [[1e-5, 2.0]]
+
+    with pytest.raises(ValueError, match="версия"):
+        reader.decode(b"\xc1\x07" + entry[2:])
+    with pytest.raises(ValueError):
+        QueueFormat(codec, "protobuf")
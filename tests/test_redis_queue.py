@@ -0,0 +1,177 @@
+"""."""
+
+import json
+
+import pytest
+from redis.exceptions import ResponseError
+
+from app.resources import redis_client as redis_module
+from app.resources.redis_client import QueueStats, RedisClient
+
+QUEUE = "websocket_messages"
+
+
+class FakeRedis:
+    """List queue with BLMPOP (Redis >= 7) or only RPOP with count (Redis < 7)."""
+
+    def __init__(self, items: list, blmpop: bool = True):
+        # Как в Redis: LPUSH кладет в начало, RPOP/BLMPOP RIGHT забирают с конца
+        self.items = list(reversed(items))
+        self.has_blmpop = blmpop
+        self.calls: list[tuple] = []
+
+    def _pop(self, count: int) -> list:
+        popped = self.items[::-1][:count]
+        del self.items[len(self.items) - len(popped) :]
+        return popped
+
+    async def blmpop(self, timeout, numkeys, *keys, direction, count):
+        self.calls.append(("blmpop", timeout, keys, direction, count))
+        if not self.has_blmpop:
+            raise ResponseError("unknown command 'BLMPOP'")
+        popped = self._pop(count)
+        return [keys[0].encode(), popped] if popped else None
+
+    async def rpop(self, name, count=None):
+        self.calls.append(("rpop", name, count))
+        return self._pop(count) or None
+
+
+def messages(count: int) -> list[bytes]:
+    """."""
+    return [
+        json.dumps({"topic": "publicTrade.BTCUSDT", "ts": i, "data": []}).encode()
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list[float]:
+    """Records pauses of the client instead of sleeping."""
+    calls = []
+
+    async def sleep(delay):
+        calls.append(delay)
+
+    monkeypatch.setattr(redis_module.asyncio, "sleep", sleep)
+    return calls
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("blmpop", [True, False], ids=["blmpop", "rpop"])
+async def test_pop_batch(blmpop: bool, sleeps: list[float]) -> None:
+    """."""
+    client = RedisClient(codec="json")
+    client.redis = FakeRedis(messages(5), blmpop=blmpop)
+
+    batch = await client.pop_batch_from_queue(QUEUE, count=3, timeout=0.5)
+    assert [message["ts"] for message in batch] == [0, 1, 2]
+    batch = await client.pop_batch_from_queue(QUEUE, count=3, timeout=0.5)
+    assert [message["ts"] for message in batch] == [3, 4]
+    assert client.queue_stats[QUEUE].total == 5
+    if blmpop:
+        assert client.redis.calls[0] == ("blmpop", 0.5, (QUEUE,), "RIGHT", 3)
+    else:
+        # Redis < 7: после первой ошибки BLMPOP сразу используется RPOP с count
+        assert [call[0] for call in client.redis.calls] == ["blmpop", "rpop", "rpop"]
+        assert not client.has_blmpop
+        assert client.redis.calls[1] == ("rpop", QUEUE, 3)
+    assert sleeps == []
+
+    # Пустая очередь: BLMPOP блокируется сам, RPOP без блокировки — пауза на timeout
+    assert await client.pop_batch_from_queue(QUEUE, count=3, timeout=0.5) == []
+    assert sleeps == ([] if blmpop else [0.5])
+
+
+def test_queue_stats_rate(monkeypatch) -> None:
+    """."""
+    now = [100.0]
+    monkeypatch.setattr(redis_module.time, "monotonic", lambda: now[0])
+    stats = QueueStats(window=10.0)
+
+    stats.add(300)
+    now[0] = 105.0
+    stats.add(200)
+    # Скорость пересчитывается только по окончании окна
+    assert stats.rate == 0.0 and stats.total == 500
+
+    now[0] = 110.0
+    stats.add(500)
+    assert stats.rate == pytest.approx(100.0)
+
+    now[0] = 130.0
+    stats.add(0)
+    assert stats.rate == 0.0 and stats.total == 1000
+
+
+class FakeStreamRedis:
+    """
+    Consumer group of one stream: XREADGROUP, XAUTOCLAIM, XPENDING, XACK and the
+    dead-letter XADD.
+    """
+
+    def __init__(self, entries: dict[bytes, bytes]):
+        self.entries = entries
+        self.delivered: dict[bytes, int] = {}
+        self.acked: list[bytes] = []
+        self.added: dict[str, list[dict]] = {}
+
+    def _deliver(self, ids) -> list:
+        for entry_id in ids:
+            self.delivered[entry_id] = self.delivered.get(entry_id, 0) + 1
+        return [(entry_id, {b"m": self.entries[entry_id]}) for entry_id in ids]
+
+    async def xreadgroup(self, group, consumer, streams, count, block):
+        new = [entry_id for entry_id in self.entries if entry_id not in self.delivered]
+        return [[next(iter(streams)).encode(), self._deliver(new)]] if new else []
+
+    async def xautoclaim(self, name, group, consumer, min_idle_time, count):
+        pending = [
+            entry_id for entry_id in self.delivered if entry_id not in self.acked
+        ]
+        return [b"0-0", self._deliver(pending), []]
+
+    async def xpending_range(self, name, groupname, min, max, count):
+        if min in self.acked:
+            return []
+        return [
+            {
+                "message_id": min,
+                "consumer": b"c",
+                "time_since_delivered": 0,
+                "times_delivered": self.delivered[min],
+            }
+        ]
+
+    async def xadd(self, name, fields):
+        self.added.setdefault(name, []).append(fields)
+
+    async def xack(self, name, group, *ids):
+        self.acked += ids
+
+
+@pytest.mark.asyncio
+async def test_corrupt_stream_entries_go_to_dead_letter() -> None:
+    """."""
+    valid = json.dumps({"topic": "publicTrade.BTCUSDT", "ts": 1, "data": []}).encode()
+    corrupt, newer = b'{"topic": ', bytes((0xC1, 9)) + b"future"
+    client = RedisClient(stream_max_deliveries=2)
+    client.redis = FakeStreamRedis({b"1-0": valid, b"2-0": corrupt, b"3-0": newer})
+
+    entries = await client.read_stream_group(QUEUE, "group", "c")
+    assert [entry_id for entry_id, _ in entries] == [b"1-0"]
+    await client.ack_stream(QUEUE, "group", [b"1-0"])
+    assert client.redis.acked == [b"1-0"] and not client.redis.added
+
+    # Вторая доставка: поврежденная запись перенесена и подтверждена, запись новой
+    # версии ждет консьюмера
+    assert await client.claim_stale_stream_entries(QUEUE, "group", "c") == []
+    assert client.redis.acked == [b"1-0", b"2-0"]
+    (dead,) = client.redis.added[f"{QUEUE}:dead"]
+    assert dead[b"m"] == corrupt and dead[b"id"] == b"2-0"
+
+    assert await client.claim_stale_stream_entries(QUEUE, "group", "c") == []
+    assert (
+        b"3-0" not in client.redis.acked
+        and len(client.redis.added[f"{QUEUE}:dead"]) == 1
+    )
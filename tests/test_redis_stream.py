@@ -0,0 +1,61 @@
+"""."""
+
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from app.resources.redis_client import RedisClient
+from config.settings import Settings
+
+
+@pytest_asyncio.fixture
+async def redis_client() -> RedisClient:
+    """Local Redis client, the test is skipped when Redis is not available."""
+    client = RedisClient(password=Settings().redis.password or None)
+    try:
+        await client.connect()
+        await client.redis.ping()
+    except Exception:
+        pytest.skip("Local Redis is not available")
+    yield client
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_at_least_once(redis_client: RedisClient) -> None:
+    """Unacked entries of a dead consumer are reclaimed by another one."""
+    stream = f"test_stream_{uuid.uuid4().hex}"
+    group = "test_group"
+    messages = [
+        {"topic": "publicTrade.BTCUSDT", "data": [{"p": str(i)}]} for i in range(5)
+    ]
+    try:
+        await redis_client.ensure_consumer_group(stream, group)
+        await redis_client.ensure_consumer_group(stream, group)
+        await redis_client.add_to_stream_batch(stream, messages, maxlen=100)
+
+        entries = await redis_client.read_stream_group(
+            stream, group, "dead", count=10, timeout=0.1
+        )
+        assert [message for _, message in entries] == messages
+
+        assert (
+            await redis_client.read_stream_group(
+                stream, group, "alive", count=10, timeout=0.1
+            )
+            == []
+        )
+
+        claimed = await redis_client.claim_stale_stream_entries(
+            stream, group, "alive", min_idle_ms=0
+        )
+        assert [message for _, message in claimed] == messages
+
+        await redis_client.ack_stream(
+            stream, group, [entry_id for entry_id, _ in claimed]
+        )
+        pending = await redis_client.redis.xpending(stream, group)
+        assert pending["pending"] == 0
+    finally:
+        await redis_client.redis.delete(stream)
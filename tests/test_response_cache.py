@@ -0,0 +1,201 @@
+"""."""
+
+import asyncio
+import datetime
+
+import pytest
+
+from app.services.chat_gpt import ChatGPTService
+from app.services.response_cache import InMemoryCacheBackend, ResponseCache
+from app.services.structured_output import build_response_format
+
+RESULT = {
+    "technical_indicators": "-",
+    "candlestick_patterns": "-",
+    "index_gpt": {"growth_probability": 60, "fall_probability": 40},
+    "recommended_action": "hold",
+    "detailed_recommendations": "-",
+    "decision_tree": None,
+}
+MESSAGES = [
+    {"role": "system", "content": "analyst"},
+    {"role": "user", "content": "data:\n  BTCUSDT  1.5"},
+]
+
+
+class FakeModel:
+    """Counts calls; the first `failures` calls raise."""
+
+    def __init__(self, failures: int = 0):
+        self.calls = 0
+        self.failures = failures
+
+    async def __call__(self) -> dict:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.calls <= self.failures:
+            raise ValueError("boom")
+        return {"answer": self.calls}
+
+
+def test_key_normalizes_whitespace() -> None:
+    """."""
+    same = [MESSAGES[0], {"role": "user", "content": " data: BTCUSDT 1.5 "}]
+    other = [MESSAGES[0], {"role": "user", "content": "data: BTCUSDT 1.6"}]
+
+    assert ResponseCache.key("gpt", 0.7, MESSAGES) == ResponseCache.key(
+        "gpt", 0.7, same
+    )
+    assert ResponseCache.key("gpt", 0.7, MESSAGES) != ResponseCache.key(
+        "gpt", 0.7, other
+    )
+    assert ResponseCache.key("gpt", 0.7, MESSAGES) != ResponseCache.key(
+        "gpt", 0.2, MESSAGES
+    )
+
+
+@pytest.mark.asyncio
+async def test_single_flight_and_shared_cache() -> None:
+    """."""
+    backend = InMemoryCacheBackend()
+    model = FakeModel()
+    cache = ResponseCache(backend=backend, ttl=60)
+    key = cache.key("gpt", 0.7, MESSAGES)
+
+    results = await asyncio.gather(*(cache.get_or_call(key, model) for _ in range(10)))
+    assert results == [{"answer": 1}] * 10
+    assert await cache.get_or_call(key, model) == {"answer": 1}
+    assert model.calls == 1
+    assert cache.stats.as_dict() == {
+        "local_hits": 1,
+        "shared_hits": 0,
+        "coalesced": 9,
+        "misses": 1,
+        "errors": 0,
+        "requests": 11,
+        "hit_rate": round(10 / 11, 4),
+    }
+
+    # Другой процесс с тем же общим кэшем
+    other = ResponseCache(backend=backend, ttl=60)
+    assert await other.get_or_call(key, model) == {"answer": 1}
+    assert other.stats.shared_hits == 1 and model.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_but_not_cached() -> None:
+    """."""
+    model = FakeModel(failures=1)
+    cache = ResponseCache(backend=InMemoryCacheBackend(), ttl=60)
+    key = cache.key("gpt", 0.7, MESSAGES)
+
+    results = await asyncio.gather(
+        *(cache.get_or_call(key, model) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+    assert await cache.get_or_call(key, model) == {"answer": 2}
+    assert model.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_hands_off_to_waiters() -> None:
+    """."""
+    model = FakeModel()
+    cache = ResponseCache(backend=InMemoryCacheBackend(), ttl=60)
+    key = cache.key("gpt", 0.7, MESSAGES)
+
+    leader = asyncio.create_task(cache.get_or_call(key, model))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(cache.get_or_call(key, model)) for _ in range(3)]
+    await asyncio.sleep(0)
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+    # Вызов повторяет один из ожидающих, остальные получают его ответ
+    assert await asyncio.gather(*waiters) == [{"answer": 2}] * 3
+    assert model.calls == 2
+    assert cache.stats.misses == 2 and cache.stats.coalesced == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_responses_are_copies() -> None:
+    """."""
+    cache = ResponseCache(ttl=60)
+    key = cache.key("gpt", 0.7, MESSAGES)
+
+    results = await asyncio.gather(
+        cache.get_or_call(key, FakeModel()), cache.get_or_call(key, FakeModel())
+    )
+    for result in results:
+        result["answer"] = "changed"
+    assert await cache.get_or_call(key, FakeModel()) == {"answer": 1}
+
+
+def market_data(ts: int, price: float) -> dict:
+    """
+    Aggregated data of one run; only timestamps and sequence numbers depend on `ts`.
+    """
+    return {
+        "currency": "BTCUSDT",
+        "time_range": f"run {ts}",
+        "grouped_data": {
+            "publicTrade": {
+                "count": 1,
+                "entries": [
+                    {
+                        "id": ts,
+                        "created": datetime.datetime.fromtimestamp(ts),
+                        "data": {"p": price, "v": 0.5},
+                    },
+                ],
+            }
+        },
+        "orderbook": {
+            "ts": ts * 1000,
+            "update_id": ts,
+            "best_bid": price,
+            "best_ask": price + 0.1,
+        },
+        "summary": {
+            "since": ts * 1000,
+            "covered_since": ts * 1000,
+            "volume": 12.5,
+            "close": price,
+        },
+        "patterns": [
+            {
+                "time": f"2026-10-17T{ts % 24:02d}:00",
+                "pattern": "Doji",
+                "signal": "neutral",
+            }
+        ],
+    }
+
+
+@pytest.mark.asyncio
+async def test_unchanged_market_data_hits_cache() -> None:
+    """."""
+    cache = ResponseCache(ttl=60)
+    service = ChatGPTService(api_key="test", cache=cache, client=object())
+    calls = []
+
+    async def complete(messages):
+        calls.append(messages)
+        return RESULT
+
+    service._complete = complete
+    await service.recommend(market_data(1, 100.0), None)
+    # Другие метки времени, номера обновлений и шум ниже точности промта — тот же ключ
+    await service.recommend(market_data(2, 100.0000001), None)
+    assert len(calls) == 1 and cache.stats.local_hits == 1
+    # Время прошлого запуска вошло в промт, но не в ключ
+    assert "1000" in calls[0][-1]["content"]
+
+    await service.recommend(market_data(3, 101.0), None)
+    assert len(calls) == 2
+
+    # Другой формат ответа — другой ключ
+    service.response_format = build_response_format("json_object")
+    await service.recommend(market_data(4, 101.0), None)
+    assert len(calls) == 3
@@ -0,0 +1,51 @@
+"""."""
+
+import asyncio
+import types
+
+import pytest
+
+from app.services.scheduler import SchedulerService
+
+
+class FakeTradeService:
+    """Records peak concurrency; SLOW never finishes in time, FAIL raises."""
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+
+    async def analyze_and_save_final_recommendation(
+        self, currency: str, minutes: int, backend: str | None = None
+    ):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(10 if currency == "SLOW" else 0.01)
+            if currency == "FAIL":
+                raise ValueError("boom")
+            return types.SimpleNamespace(id=1)
+        finally:
+            self.running -= 1
+
+
+@pytest.mark.asyncio
+async def test_run_analysis_bounded_and_isolated() -> None:
+    """."""
+    trade_service = FakeTradeService()
+    symbols = ["SLOW", "FAIL"] + [f"S{i}USDT" for i in range(8)]
+    scheduler = SchedulerService(
+        trade_service=trade_service,
+        scheduler=None,
+        analysis_concurrency=3,
+        symbol_timeout=0.2,
+        symbols=symbols,
+    )
+
+    latencies = await scheduler.run_analysis("test", minutes=5)
+
+    assert trade_service.peak == 3
+    assert latencies.keys() == set(symbols)
+    assert latencies["SLOW"] is None
+    assert latencies["FAIL"] is None
+    assert all(latencies[symbol] is not None for symbol in symbols[2:])
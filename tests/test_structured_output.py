@@ -0,0 +1,151 @@
+"""."""
+
+import json
+
+import httpx
+import pytest
+
+from app.resources.openai_client import OpenAIClient
+from app.services.chat_gpt import ChatGPTService
+from app.services.structured_output import (
+    JSONStreamScanner,
+    MalformedOutputError,
+    parse_analysis,
+    repair_json,
+)
+
+RESULT = {
+    "technical_indicators": "RSI 28, перепроданность",
+    "candlestick_patterns": "Hammer",
+    "index_gpt": {"growth_probability": 62.5, "fall_probability": 37.5},
+    "recommended_action": "buy",
+    "detailed_recommendations": "Вход от 64000, плечо 3x",
+    "decision_tree": None,
+}
+
+
+def sse(content: str, chunk: int = 7) -> bytes:
+    """Ответ chat.completions потоком: content частями по `chunk` символов."""
+    events = [
+        {
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-test",
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": {"content": content[i : i + chunk]},
+                    "finish_reason": None,
+                }
+            ],
+        }
+        for i in range(0, len(content), chunk)
+    ]
+    events.append(
+        {
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-test",
+            "choices": [],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 50, "total_tokens": 60},
+        }
+    )
+    return (
+        b"".join(f"data: {json.dumps(event)}\n\n".encode() for event in events)
+        + b"data: [DONE]\n\n"
+    )
+
+
+def test_repair_parser() -> None:
+    """."""
+    result = json.dumps(RESULT, ensure_ascii=False)
+    wrapped = f"Конечно! Вот анализ:\n```json\n{result}\n```\nУдачи."
+    assert parse_analysis(wrapped).growth_probability == 62.5
+
+    legacy = (
+        "{'technical_indicators': {'rsi': 28}, 'candlestick_patterns': 'Doji', "
+        "'final_index_gpt': {'growth_probability': '55%', 'fall_probability': 45,}, "
+        "'final_recommended_action': 'Long', 'final_detailed_recommendations': 'Ждать "
+        "пробоя', 'decision_tree': None,}"
+    )
+    result = parse_analysis(legacy)
+    assert result.recommended_action == "buy"
+    assert result.technical_indicators == '{"rsi":28}'
+    assert result.index_gpt.growth_probability == 55
+
+    # Оборванный ответ: неполный последний член отбрасывается
+    assert repair_json('{"a": 1, "b": {"c": [1, 2], "d": "обрыв') == {
+        "a": 1,
+        "b": {"c": [1, 2], "d": "обрыв"},
+    }
+    assert repair_json('{"a": 1, "b": {"c": 1, "d"') == {"a": 1, "b": {"c": 1}}
+
+    with pytest.raises(MalformedOutputError):
+        parse_analysis("Не могу дать рекомендацию.")
+    with pytest.raises(MalformedOutputError):
+        parse_analysis('{"recommended_action": "buy"}')
+
+
+def test_stream_scanner() -> None:
+    """."""
+    scanner = JSONStreamScanner()
+    assert [
+        scanner.feed(part)
+        for part in ('Ответ: {"a": "}{', '", "b": [1', "]}", " и пояснение")
+    ] == [False, False, True, False]
+    with pytest.raises(MalformedOutputError):
+        JSONStreamScanner(max_preamble=10).feed("Давайте сначала обсудим рынок")
+    with pytest.raises(MalformedOutputError):
+        JSONStreamScanner().feed('{"a": [1}')
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("content", "error"),
+    [
+        (json.dumps(RESULT), None),
+        # Пояснение после объекта не дочитывается
+        (
+            json.dumps(RESULT)
+            + "\n\nЭти рекомендации не являются инвестиционным советом." * 20,
+            None,
+        ),
+        (
+            "Рынок сегодня очень интересный. " * 40 + json.dumps(RESULT),
+            MalformedOutputError,
+        ),
+    ],
+    ids=["json", "trailing_prose", "long_preamble"],
+)
+async def test_streaming_analysis(content: str, error: type[Exception] | None) -> None:
+    """."""
+    requests = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(
+            200, headers={"content-type": "text/event-stream"}, content=sse(content)
+        )
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+    service = ChatGPTService(
+        api_key="test",
+        model="gpt-test",
+        client=OpenAIClient(
+            api_key="test", base_url="http://fake/v1", http_client=http_client
+        ),
+    )
+    try:
+        if error is not None:
+            with pytest.raises(error):
+                await service.analyze({}, prompt="prompt")
+        else:
+            assert (await service.analyze({}, prompt="prompt")).model_dump() == RESULT
+    finally:
+        await http_client.aclose()
+
+    assert len(requests) == 1
+    assert requests[0]["stream"] is True
+    assert requests[0]["response_format"]["type"] == "json_schema"
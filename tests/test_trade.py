@@ -0,0 +1,234 @@
+"""."""
+
+import asyncio
+import contextlib
+import datetime
+import types
+
+import httpx
+import pytest
+import sqlalchemy as sa
+
+from app.resources.openai_client import OpenAIClient
+from app.schemas.analysis import AnalysisResult
+from app.schemas.market import AggregatedMarketData
+from app.schemas.trade import TradeRecommendationSchema
+from app.services.chat_gpt import ChatGPTService
+from app.services.trade import PENDING_BATCH_KEY, TradeService
+from tests.fake_openai import FakeBatchAPI
+
+RESULT = AnalysisResult(
+    technical_indicators="-",
+    candlestick_patterns="-",
+    index_gpt={"growth_probability": 70, "fall_probability": 30},
+    recommended_action="buy",
+    detailed_recommendations="-",
+)
+
+
+class FakeDatabase:
+    """
+    Tracks open sessions per kind and the peak of concurrently open read-only sessions.
+    """
+
+    def __init__(self):
+        self.open = {"ro": 0, "rw": 0}
+        self.peak_ro = 0
+        self.commits = 0
+
+    @contextlib.asynccontextmanager
+    async def _session(self, kind: str, session=None):
+        if session is not None:
+            yield session
+            return
+        self.open[kind] += 1
+        self.peak_ro = max(self.peak_ro, self.open["ro"])
+        try:
+            yield types.SimpleNamespace(kind=kind, commit=self._commit)
+        finally:
+            self.open[kind] -= 1
+
+    async def _commit(self):
+        self.commits += 1
+
+    def session_ro(self, session=None):
+        return self._session("ro", session)
+
+    def session_rw(self, session=None):
+        return self._session("rw", session)
+
+
+class FakeMarketService:
+    """."""
+
+    def __init__(self, db: FakeDatabase):
+        self.db = db
+
+    async def get_aggregated_market_data(
+        self, currency: str, minutes: int, raw: bool = True
+    ) -> AggregatedMarketData:
+        async with self.db.session_ro():
+            await asyncio.sleep(0.05)
+        return AggregatedMarketData(
+            currency=currency, time_range=f"{minutes}", grouped_data={}
+        )
+
+
+class FakeRepository:
+    """Select returns no previous recommendation, insert returns the stored row."""
+
+    async def item(self, session, statement):
+        if isinstance(statement, sa.Insert):
+            assert session.kind == "rw"
+            values = {
+                column.key: value.value for column, value in statement._values.items()
+            }
+            return TradeRecommendationSchema(id=1, **values)
+        assert session.kind == "ro"
+        await asyncio.sleep(0.05)
+        return None
+
+
+class FakeBackend:
+    """Checks that no database session is held while the model is called."""
+
+    name = "fake"
+    raw_data = True
+
+    def __init__(self, db: FakeDatabase):
+        self.db = db
+
+    async def recommend(
+        self, aggregated_data: dict, previous_recommendation: dict | None = None
+    ) -> AnalysisResult:
+        assert self.db.open == {"ro": 0, "rw": 0}
+        assert (
+            previous_recommendation is None and aggregated_data["currency"] == "BTCUSDT"
+        )
+        return RESULT
+
+
+@pytest.mark.asyncio
+async def test_sessions_are_released_during_analysis() -> None:
+    """."""
+    db = FakeDatabase()
+    service = TradeService(
+        db=db,
+        chatgpt_service=types.SimpleNamespace(name="chatgpt"),
+        repository_trade=None,
+        repository_trade_recommendation=FakeRepository(),
+        market_service=FakeMarketService(db),
+        backends={"fake": FakeBackend(db)},
+    )
+
+    recommendation = await service.analyze_and_save_final_recommendation(
+        "BTCUSDT", backend="fake"
+    )
+
+    assert (
+        recommendation.recommended_action == "buy" and recommendation.confidence == 70
+    )
+    assert recommendation.data["backend"] == "fake"
+    assert isinstance(recommendation.recommended, datetime.datetime)
+    # Агрегация и поиск предыдущей рекомендации выполнялись одновременно
+    assert db.peak_ro == 2
+    assert db.commits == 1 and db.open == {"ro": 0, "rw": 0}
+
+
+class FakeRedis:
+    """."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def connect(self):
+        pass
+
+    async def get(self, key: str) -> dict | None:
+        return self.data.get(key)
+
+    async def set(self, key: str, value: dict, expire: int = 60):
+        self.data[key] = value
+
+    async def delete(self, key: str):
+        self.data.pop(key, None)
+
+
+class RecordingRepository(FakeRepository):
+    """Keeps inserted recommendations."""
+
+    def __init__(self):
+        self.inserted = []
+
+    async def item(self, session, statement):
+        recommendation = await super().item(session, statement)
+        if recommendation is not None:
+            self.inserted.append(recommendation)
+        return recommendation
+
+
+def batch_result(custom_id: str, body: dict) -> str:
+    """."""
+    action = "buy" if custom_id == "BTCUSDT" else "sell"
+    return RESULT.model_copy(update={"recommended_action": action}).model_dump_json()
+
+
+@pytest.mark.asyncio
+async def test_batch_is_resumed_after_restart() -> None:
+    """."""
+    api = FakeBatchAPI(batch_result)
+    http_client = httpx.AsyncClient(transport=api.transport())
+    chatgpt = ChatGPTService(
+        api_key="test",
+        model="gpt-test",
+        client=OpenAIClient(
+            api_key="test", base_url="http://fake/v1", http_client=http_client
+        ),
+    )
+    redis = FakeRedis()
+
+    def trade_service() -> tuple[TradeService, RecordingRepository, FakeDatabase]:
+        db, repository = FakeDatabase(), RecordingRepository()
+        service = TradeService(
+            db=db,
+            chatgpt_service=chatgpt,
+            repository_trade=None,
+            repository_trade_recommendation=repository,
+            market_service=FakeMarketService(db),
+            redis_client=redis,
+        )
+        return service, repository, db
+
+    # Процесс останавливается, пока задание выполняется
+    service, repository, _ = trade_service()
+    task = asyncio.create_task(
+        service.analyze_batch(["BTCUSDT", "ETHUSDT"], poll_interval=10)
+    )
+    while "POST /batches" not in api.requests:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert redis.data[PENDING_BATCH_KEY]["currencies"] == ["BTCUSDT", "ETHUSDT"]
+    assert not repository.inserted
+
+    # После перезапуска опрос продолжается, задание не отправляется повторно
+    service, repository, db = trade_service()
+    recommendations = await service.resume_batch(poll_interval=0)
+    await http_client.aclose()
+
+    assert {
+        currency: rec.recommended_action for currency, rec in recommendations.items()
+    } == {
+        "BTCUSDT": "buy",
+        "ETHUSDT": "sell",
+    }
+    assert [(rec.currency, rec.data["backend"]) for rec in repository.inserted] == [
+        ("BTCUSDT", "chatgpt"),
+        ("ETHUSDT", "chatgpt"),
+    ]
+    assert db.commits == 2
+    assert api.requests.count("POST /batches") == 1
+    assert PENDING_BATCH_KEY not in redis.data
+    assert await service.resume_batch() is None